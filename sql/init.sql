@@ -29,5 +29,8 @@ GRANT REPLICATION CLIENT ON *.* TO 'test_user'@'%';
 GRANT REPLICATION SLAVE ON *.* TO 'test_user'@'%';
 GRANT SUPER ON *.* TO 'test_user'@'%';
 
+-- Necesario para el bloqueo global breve (FLUSH TABLES WITH READ LOCK) del snapshot consistente
+GRANT RELOAD ON *.* TO 'test_user'@'%';
+
 -- Aplicar los cambios de privilegios
 FLUSH PRIVILEGES; 
\ No newline at end of file
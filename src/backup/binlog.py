@@ -0,0 +1,439 @@
+"""
+Módulo de lectura de binary logs de MySQL.
+Lee directamente los archivos binlog (formato v4) del volumen montado, sin
+lanzar `mysqlbinlog`, e itera los eventos de forma perezosa entre cualquier
+número de archivos. Incluye un escritor que convierte los eventos en SQL
+reproducible por el cliente `mysql`, con el mismo esquema que usa mysqlbinlog
+para el formato ROW (sentencias `BINLOG '<base64>'`).
+"""
+import binascii
+import glob
+import os
+import re
+import struct
+import zlib
+from typing import Iterator, List, Optional
+
+from src.db.config import DatabaseConfig
+
+BINLOG_MAGIC = b"\xfebin"
+HEADER = struct.Struct('<IBIIIH')
+HEADER_SIZE = HEADER.size
+
+# Tipos de evento
+QUERY_EVENT = 2
+STOP_EVENT = 3
+ROTATE_EVENT = 4
+INTVAR_EVENT = 5
+FORMAT_DESCRIPTION_EVENT = 15
+XID_EVENT = 16
+TABLE_MAP_EVENT = 19
+WRITE_ROWS_EVENT_V1 = 23
+UPDATE_ROWS_EVENT_V1 = 24
+DELETE_ROWS_EVENT_V1 = 25
+ROWS_QUERY_EVENT = 29
+WRITE_ROWS_EVENT = 30
+UPDATE_ROWS_EVENT = 31
+DELETE_ROWS_EVENT = 32
+GTID_EVENT = 33
+ANONYMOUS_GTID_EVENT = 34
+PREVIOUS_GTIDS_EVENT = 35
+TRANSACTION_PAYLOAD_EVENT = 40
+
+ROWS_EVENTS = (
+    WRITE_ROWS_EVENT_V1, UPDATE_ROWS_EVENT_V1, DELETE_ROWS_EVENT_V1,
+    WRITE_ROWS_EVENT, UPDATE_ROWS_EVENT, DELETE_ROWS_EVENT,
+)
+STMT_END_F = 0x0001
+CHECKSUM_ALG_CRC32 = 1
+CHECKSUM_SIZE = 4
+
+# Bits de Q_FLAGS2 en los eventos QUERY
+OPTION_NO_FOREIGN_KEY_CHECKS = 1 << 26
+OPTION_RELAXED_UNIQUE_CHECKS = 1 << 27
+
+# Cabecera y cierre del SQL generado (los mismos que emite mysqlbinlog)
+SQL_HEADER = (
+    "/*!50530 SET @@SESSION.PSEUDO_SLAVE_MODE=1*/;\n"
+    "/*!50003 SET @OLD_COMPLETION_TYPE=@@COMPLETION_TYPE,COMPLETION_TYPE=0*/;\n"
+    "DELIMITER /*!*/;\n"
+)
+SQL_TRAILER = (
+    "DELIMITER ;\n"
+    "# End of log file\n"
+    "/*!50003 SET COMPLETION_TYPE=@OLD_COMPLETION_TYPE*/;\n"
+    "/*!50530 SET @@SESSION.PSEUDO_SLAVE_MODE=0*/;\n"
+)
+
+_FILE_SEQUENCE = re.compile(r"^(.*)\.(\d+)$")
+_EVENT_SIZE = struct.Struct('<I')
+
+
+def file_sequence(name: str) -> int:
+    """Número de secuencia de un archivo binlog (p. ej. 3 para 'mysql-bin.000003')."""
+    match = _FILE_SEQUENCE.match(name)
+    if not match:
+        raise ValueError(f"Nombre de archivo binlog inesperado: {name}")
+    return int(match.group(2))
+
+
+def _event_size(buf: bytes, offset: int) -> int:
+    """Tamaño total del evento que comienza en `offset` (campo event_size de la cabecera)."""
+    return _EVENT_SIZE.unpack_from(buf, offset + 9)[0]
+
+
+class BinlogEvent:
+    """Evento del binary log con su ubicación y sus bytes originales."""
+    __slots__ = ('file', 'position', 'timestamp', 'type_code', 'server_id', 'flags',
+                 'raw', 'checksum_size')
+
+    def __init__(self, file, position, raw, checksum_size):
+        self.file = file
+        self.position = position
+        self.raw = raw
+        self.checksum_size = checksum_size
+        self.timestamp, self.type_code, self.server_id, _, _, self.flags = HEADER.unpack_from(raw)
+
+    @property
+    def next_position(self) -> int:
+        """Posición del evento siguiente en el mismo archivo."""
+        return self.position + len(self.raw)
+
+    @property
+    def body(self) -> bytes:
+        """Contenido del evento sin cabecera ni checksum."""
+        return self.raw[HEADER_SIZE:len(self.raw) - self.checksum_size]
+
+    def is_transaction_boundary(self) -> bool:
+        """True si el evento cierra una transacción o es una sentencia DDL autónoma."""
+        if self.type_code == XID_EVENT:
+            return True
+        return self.type_code == QUERY_EVENT and not is_begin(self)
+
+
+def is_begin(event: BinlogEvent) -> bool:
+    """True si el evento es el QUERY `BEGIN` que abre una transacción (sin decodificarlo)."""
+    return (event.type_code == QUERY_EVENT
+            and event.raw.endswith(b"\0BEGIN", 0, len(event.raw) - event.checksum_size))
+
+
+def parse_query_event(event: BinlogEvent) -> dict:
+    """
+    Decodifica un evento QUERY.
+
+    Returns:
+        dict: 'db', 'query', 'error_code' y las variables de sesión conocidas
+              ('sql_mode', 'charset', 'flags2') si están presentes
+    """
+    body = event.body
+    _, _, db_len, error_code, status_len = struct.unpack_from('<IIBHH', body)
+    status = body[13:13 + status_len]
+    db_start = 13 + status_len
+    result = {
+        'db': body[db_start:db_start + db_len].decode('utf-8', 'replace'),
+        'query': body[db_start + db_len + 1:].decode('utf-8', 'replace'),
+        'error_code': error_code,
+    }
+    result.update(_parse_status_vars(status))
+    return result
+
+
+# Longitud fija de las variables de estado de QUERY que no se interpretan
+_STATUS_FIXED = {3: 4, 7: 2, 8: 2, 9: 8, 10: 4, 13: 3, 16: 1, 17: 8, 18: 2, 19: 1, 20: 1}
+
+
+def _parse_status_vars(status: bytes) -> dict:
+    """Extrae sql_mode, charset y flags2 de las variables de estado de un QUERY."""
+    result = {}
+    i = 0
+    while i < len(status):
+        code = status[i]
+        i += 1
+        if code == 0:  # Q_FLAGS2_CODE
+            result['flags2'] = struct.unpack_from('<I', status, i)[0]
+            i += 4
+        elif code == 1:  # Q_SQL_MODE_CODE
+            result['sql_mode'] = struct.unpack_from('<Q', status, i)[0]
+            i += 8
+        elif code == 4:  # Q_CHARSET_CODE
+            result['charset'] = struct.unpack_from('<HHH', status, i)
+            i += 6
+        elif code in (5, 6):  # Q_TIME_ZONE_CODE, Q_CATALOG_NZ_CODE
+            i += 1 + status[i]
+        elif code == 2:  # Q_CATALOG_CODE (formato antiguo)
+            i += 2 + status[i]
+        elif code == 11:  # Q_INVOKER
+            i += 1 + status[i]
+            i += 1 + status[i]
+        elif code == 12:  # Q_UPDATED_DB_NAMES
+            count = status[i]
+            i += 1
+            if count != 254:
+                for _ in range(count):
+                    i = status.index(b'\0', i) + 1
+        elif code in _STATUS_FIXED:
+            i += _STATUS_FIXED[code]
+        else:
+            break  # Código desconocido: no se puede seguir avanzando con seguridad
+    return result
+
+
+def parse_gtid_event(event: BinlogEvent) -> tuple:
+    """
+    Decodifica un evento GTID.
+
+    Returns:
+        tuple: (uuid del servidor, número de transacción)
+    """
+    body = event.body
+    sid = body[1:17].hex()
+    uuid = f"{sid[0:8]}-{sid[8:12]}-{sid[12:16]}-{sid[16:20]}-{sid[20:32]}"
+    return uuid, struct.unpack_from('<q', body, 17)[0]
+
+
+class BinlogReader:
+    """
+    Lector de archivos binlog sobre un directorio (por defecto el volumen de MySQL).
+
+    Args:
+        binlog_dir (str): Directorio con los archivos binlog y su índice
+        verify_checksums (bool): Verificar el CRC32 de cada evento si el servidor lo escribe
+    """
+
+    def __init__(self, binlog_dir: Optional[str] = None, verify_checksums: Optional[bool] = None):
+        self.binlog_dir = binlog_dir or DatabaseConfig.BINLOG_DIR
+        self.verify_checksums = (
+            DatabaseConfig.BINLOG_VERIFY_CHECKSUMS if verify_checksums is None else verify_checksums
+        )
+
+    def list_files(self, reference: str) -> List[str]:
+        """
+        Lista los archivos binlog en orden, usando el archivo .index del servidor.
+
+        Args:
+            reference (str): Nombre de un archivo binlog (para obtener el prefijo)
+
+        Returns:
+            list: Nombres de archivo en orden de creación
+        """
+        match = _FILE_SEQUENCE.match(reference)
+        if not match:
+            raise ValueError(f"Nombre de archivo binlog inesperado: {reference}")
+        prefix = match.group(1)
+
+        index_path = os.path.join(self.binlog_dir, f"{prefix}.index")
+        if os.path.exists(index_path):
+            with open(index_path, 'r') as f:
+                return [os.path.basename(line.strip()) for line in f if line.strip()]
+
+        files = [
+            os.path.basename(path)
+            for path in glob.glob(os.path.join(self.binlog_dir, f"{prefix}.*"))
+            if _FILE_SEQUENCE.match(os.path.basename(path)) and not path.endswith('.index')
+        ]
+        return sorted(files, key=file_sequence)
+
+    def events(self, start_file: str, start_pos: int = 4, stop_file: Optional[str] = None,
+               stop_pos: Optional[int] = None) -> Iterator[BinlogEvent]:
+        """
+        Itera los eventos desde (start_file, start_pos) hasta (stop_file, stop_pos).
+
+        Por cada archivo se entrega primero su evento FORMAT_DESCRIPTION (necesario
+        para reproducir los eventos ROW), aunque la posición inicial sea posterior.
+        La iteración se detiene antes del primer evento cuya posición sea mayor o
+        igual que `stop_pos` en `stop_file`; sin límite, llega al final del último archivo.
+
+        Yields:
+            BinlogEvent: Eventos en orden
+        """
+        files = self.list_files(start_file)
+        if start_file not in files:
+            raise ValueError(f"El archivo {start_file} no está en el índice de binlogs")
+        first = files.index(start_file)
+        last = files.index(stop_file) if stop_file else len(files) - 1
+        if last < first:
+            raise ValueError(f"El archivo final {stop_file} es anterior a {start_file}")
+
+        for name in files[first:last + 1]:
+            yield from self.file_events(
+                name,
+                start_pos if name == start_file else 4,
+                stop_pos if name == stop_file else None,
+            )
+
+    def file_events(self, name: str, start_pos: int = 4, stop_pos: Optional[int] = None) -> Iterator[BinlogEvent]:
+        """
+        Itera los eventos de un archivo (FORMAT_DESCRIPTION primero).
+
+        El archivo se lee en bloques de DatabaseConfig.BINLOG_READ_BUFFER bytes y los
+        eventos se cortan del bloque en memoria. Un evento incompleto al final del
+        archivo (el servidor aún lo está escribiendo) termina la iteración.
+        """
+        path = os.path.join(self.binlog_dir, name)
+        block_size = DatabaseConfig.BINLOG_READ_BUFFER
+        with open(path, 'rb', buffering=0) as f:
+            buf = f.read(block_size)
+            if buf[:4] != BINLOG_MAGIC:
+                raise ValueError(f"{path} no es un archivo binlog válido")
+
+            # FORMAT_DESCRIPTION siempre reserva los 4 bytes del CRC; el byte anterior
+            # indica el algoritmo que usan el resto de eventos del archivo
+            end = 4 + _event_size(buf, 4) if len(buf) >= 4 + HEADER_SIZE else 0
+            if not end or len(buf) < end or buf[4 + 4] != FORMAT_DESCRIPTION_EVENT:
+                raise ValueError(f"{path} no comienza con un evento FORMAT_DESCRIPTION")
+            description = BinlogEvent(name, 4, buf[4:end], CHECKSUM_SIZE)
+            checksum_size = CHECKSUM_SIZE if buf[end - CHECKSUM_SIZE - 1] == CHECKSUM_ALG_CRC32 else 0
+            verify = bool(checksum_size and self.verify_checksums)
+            if verify:
+                self._verify(description.raw, name, 4)
+            yield description
+
+            position = max(start_pos, end)
+            if position != end:
+                f.seek(position)
+                buf = b""
+            else:
+                buf = buf[end:]
+            offset = 0
+            while stop_pos is None or position < stop_pos:
+                available = len(buf) - offset
+                size = _event_size(buf, offset) if available >= HEADER_SIZE else HEADER_SIZE
+                if available < size:
+                    data = f.read(max(block_size, size - available))
+                    if not data:
+                        break
+                    buf = buf[offset:] + data
+                    offset = 0
+                    continue
+
+                if size < HEADER_SIZE + checksum_size:
+                    raise ValueError(f"Evento corrupto en {name}:{position} (tamaño {size})")
+                raw = buf[offset:offset + size]
+                if verify:
+                    self._verify(raw, name, position)
+                yield BinlogEvent(name, position, raw, checksum_size)
+                offset += size
+                position += size
+
+    @staticmethod
+    def _verify(raw: bytes, name: str, position: int):
+        expected = struct.unpack_from('<I', raw, len(raw) - CHECKSUM_SIZE)[0]
+        if zlib.crc32(memoryview(raw)[:-CHECKSUM_SIZE]) != expected:
+            raise ValueError(f"Checksum inválido en {name}:{position}")
+
+
+class BinlogSqlWriter:
+    """
+    Convierte eventos del binlog en SQL aplicable con el cliente `mysql`.
+
+    Sigue el esquema de mysqlbinlog para el formato ROW: los eventos de filas
+    (junto con sus TABLE_MAP) se emiten en sentencias `BINLOG '<base64>'` que el
+    servidor aplica tal cual, y las sentencias DDL se emiten como texto con su
+    base de datos y variables de sesión. Antes de cada transacción se escribe un
+    comentario `# at <archivo>:<posición> ts=<timestamp>` con su ubicación.
+
+    Args:
+        out: Destino con un método write(text), p. ej. un BackupWriter
+    """
+
+    def __init__(self, out):
+        self.out = out
+        self.events = 0
+        self.transactions = 0
+        self._pending = []
+        self._started = False
+        self._db = None
+
+    def _start(self):
+        self._started = True
+        self.out.write(SQL_HEADER)
+
+    def write_event(self, event: BinlogEvent):
+        """Escribe un evento; los eventos sin efecto en la restauración se omiten."""
+        if not self._started:
+            self._start()
+        self.events += 1
+        code = event.type_code
+
+        if code == FORMAT_DESCRIPTION_EVENT:
+            self.out.write(f"# at {event.file}:{event.position}\n")
+            self._write_binlog([event.raw])
+        elif code == TABLE_MAP_EVENT:
+            self._pending.append(event.raw)
+        elif code in ROWS_EVENTS:
+            self._pending.append(event.raw)
+            flags = struct.unpack_from('<H', event.raw, HEADER_SIZE + 6)[0]
+            if flags & STMT_END_F:
+                self._write_binlog(self._pending)
+                self._pending = []
+        elif code == XID_EVENT:
+            self._flush()
+            self.out.write("COMMIT/*!*/;\n")
+            self.transactions += 1
+        elif code == QUERY_EVENT:
+            self._write_query(event)
+        elif code == INTVAR_EVENT:
+            kind, value = struct.unpack_from('<BQ', event.body)
+            variable = "LAST_INSERT_ID" if kind == 1 else "INSERT_ID"
+            self.out.write(f"SET {variable}={value}/*!*/;\n")
+        elif code == TRANSACTION_PAYLOAD_EVENT:
+            raise ValueError(
+                f"Transacción comprimida en {event.file}:{event.position}; "
+                "desactive binlog_transaction_compression"
+            )
+
+    def _write_query(self, event: BinlogEvent):
+        if is_begin(event):
+            self.out.write(f"# at {event.file}:{event.position} ts={event.timestamp}\n"
+                           f"SET TIMESTAMP={event.timestamp}/*!*/;\nBEGIN/*!*/;\n")
+            return
+        query = parse_query_event(event)
+        text = query['query']
+        if text in ('COMMIT', 'ROLLBACK'):
+            self._flush()
+            self.out.write(f"{text}/*!*/;\n")
+            self.transactions += 1
+            return
+
+        # Sentencia autónoma (DDL)
+        self._flush()
+        self.out.write(f"# at {event.file}:{event.position} ts={event.timestamp}\n")
+        if query['db'] and query['db'] != self._db:
+            self._db = query['db']
+            self.out.write(f"use `{self._db.replace('`', '``')}`/*!*/;\n")
+        session = [f"SET TIMESTAMP={event.timestamp}"]
+        if 'flags2' in query:
+            flags2 = query['flags2']
+            session.append(
+                f"SET @@session.foreign_key_checks={0 if flags2 & OPTION_NO_FOREIGN_KEY_CHECKS else 1}, "
+                f"@@session.unique_checks={0 if flags2 & OPTION_RELAXED_UNIQUE_CHECKS else 1}"
+            )
+        if 'sql_mode' in query:
+            session.append(f"SET @@session.sql_mode={query['sql_mode']}")
+        if 'charset' in query:
+            client, connection, server = query['charset']
+            session.append(
+                f"SET @@session.character_set_client={client},"
+                f"@@session.collation_connection={connection},@@session.collation_server={server}"
+            )
+        for statement in session:
+            self.out.write(f"{statement}/*!*/;\n")
+        self.out.write(f"{text}\n/*!*/;\n")
+        self.transactions += 1
+
+    def _write_binlog(self, raws: List[bytes]):
+        # El servidor decodifica varios eventos consecutivos de un mismo bloque base64
+        encoded = binascii.b2a_base64(b"".join(raws), newline=False).decode('ascii')
+        self.out.write(f"BINLOG '\n{encoded}\n'/*!*/;\n")
+
+    def _flush(self):
+        if self._pending:
+            self._write_binlog(self._pending)
+            self._pending = []
+
+    def close(self):
+        """Escribe los eventos pendientes y restaura las variables de sesión."""
+        if not self._started:
+            return
+        self._flush()
+        self.out.write(SQL_TRAILER)
@@ -0,0 +1,270 @@
+"""
+Módulo de índice de binary logs para recuperación a un punto en el tiempo.
+Mantiene en disco un índice disperso que asocia el timestamp de las
+transacciones (y sus GTID, si el servidor los usa) con el archivo binlog y la
+posición donde empiezan, de modo que encontrar un instante no requiere
+decodificar los binlogs. El índice se actualiza de forma incremental: cada
+actualización continúa desde la última posición indexada.
+
+Uso:
+    python3 -m src.backup.binlog_index --until "2026-10-18 13:45:00"
+"""
+import argparse
+import json
+import mmap
+import os
+import re
+import struct
+from datetime import datetime
+from typing import Optional, Tuple
+
+from src.backup.binlog import (
+    ANONYMOUS_GTID_EVENT, FORMAT_DESCRIPTION_EVENT, GTID_EVENT, QUERY_EVENT, XID_EVENT,
+    BinlogReader, file_sequence, is_begin, parse_gtid_event,
+)
+from src.db.config import DatabaseConfig
+from src.db.utils import fetch_one
+
+# (máximo timestamp hasta la transacción, secuencia del archivo, posición)
+TIME_RECORD = struct.Struct('<IIQ')
+# (número de transacción del GTID, secuencia del archivo, posición)
+GTID_RECORD = struct.Struct('<QIQ')
+
+_GTID = re.compile(r"^([0-9a-fA-F-]{36}):(\d+)$")
+
+
+class BinlogIndex:
+    """
+    Índice disperso timestamp/GTID -> (archivo, posición) de los binlogs.
+
+    Para los timestamps se guarda un registro cada vez que el máximo timestamp
+    visto aumenta, en la posición de la transacción que lo aumenta. Así las
+    claves son estrictamente crecientes aunque los timestamps de los eventos
+    no lo sean, y la primera transacción posterior a un instante se encuentra
+    con una búsqueda binaria. Los GTID se indexan por servidor de origen, un
+    registro cada DatabaseConfig.BINLOG_INDEX_GTID_INTERVAL transacciones.
+
+    Args:
+        index_dir (str): Directorio del índice (por defecto DatabaseConfig.BINLOG_INDEX_DIR)
+        reader (BinlogReader): Lector de los archivos binlog
+    """
+
+    def __init__(self, index_dir: Optional[str] = None, reader: Optional[BinlogReader] = None):
+        self.index_dir = index_dir or DatabaseConfig.BINLOG_INDEX_DIR
+        self.reader = reader or BinlogReader()
+        self.time_path = os.path.join(self.index_dir, "timestamps.idx")
+        self.state_path = os.path.join(self.index_dir, "state.json")
+        self.state = self._load_state()
+
+    def _load_state(self) -> dict:
+        try:
+            with open(self.state_path, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'prefix': None, 'file': None, 'position': 4, 'max_timestamp': 0,
+                    'sizes': {}, 'gtid_pending': {}}
+
+    def _save_state(self):
+        tmp = f"{self.state_path}.tmp"
+        with open(tmp, 'w') as f:
+            json.dump(self.state, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.state_path)
+
+    def _gtid_path(self, uuid: str) -> str:
+        return os.path.join(self.index_dir, f"gtid_{uuid}.idx")
+
+    def _file_name(self, sequence: int) -> str:
+        return f"{self.state['prefix']}.{sequence:06d}"
+
+    def update(self, current_file: str) -> int:
+        """
+        Indexa los eventos escritos desde la última actualización.
+
+        Args:
+            current_file (str): Archivo binlog activo (o cualquiera, para obtener el índice de archivos)
+
+        Returns:
+            int: Registros agregados al índice
+        """
+        os.makedirs(self.index_dir, exist_ok=True)
+        state = self.state
+        if state['prefix'] is None:
+            state['prefix'] = current_file.rsplit('.', 1)[0]
+            state['file'] = self.reader.list_files(current_file)[0]
+
+        # Descartar registros escritos tras el último estado guardado (actualización interrumpida)
+        for name, size in state['sizes'].items():
+            path = os.path.join(self.index_dir, name)
+            if os.path.exists(path) and os.path.getsize(path) > size:
+                os.truncate(path, size)
+
+        files = self.reader.list_files(current_file)
+        if state['file'] not in files:
+            raise ValueError(f"El archivo {state['file']} ya no está en el índice de binlogs")
+        added = 0
+        outputs = {}
+        in_transaction = False
+        try:
+            for name in files[files.index(state['file']):]:
+                sequence = file_sequence(name)
+                start = state['position'] if name == state['file'] else 4
+                for event in self.reader.file_events(name, start):
+                    code = event.type_code
+                    if code == FORMAT_DESCRIPTION_EVENT:
+                        continue
+                    starts = False
+                    if code in (GTID_EVENT, ANONYMOUS_GTID_EVENT):
+                        starts, in_transaction = True, True
+                        if code == GTID_EVENT:
+                            added += self._add_gtid(outputs, event, sequence)
+                    elif code == QUERY_EVENT:
+                        starts = not in_transaction
+                        in_transaction = is_begin(event)
+                    elif code == XID_EVENT:
+                        in_transaction = False
+
+                    if starts and event.timestamp > state['max_timestamp']:
+                        state['max_timestamp'] = event.timestamp
+                        self._append(outputs, "timestamps.idx",
+                                     TIME_RECORD.pack(event.timestamp, sequence, event.position))
+                        added += 1
+                    if not in_transaction:
+                        state['file'], state['position'] = name, event.next_position
+        finally:
+            for name, out in outputs.items():
+                out.flush()
+                os.fsync(out.fileno())
+                state['sizes'][name] = out.tell()
+                out.close()
+            self._save_state()
+        return added
+
+    def _append(self, outputs: dict, name: str, record: bytes):
+        if name not in outputs:
+            outputs[name] = open(os.path.join(self.index_dir, name), 'ab')
+        outputs[name].write(record)
+
+    def _add_gtid(self, outputs: dict, event, sequence: int) -> int:
+        uuid, gno = parse_gtid_event(event)
+        pending = self.state['gtid_pending'].get(uuid, 0)
+        self.state['gtid_pending'][uuid] = (pending + 1) % DatabaseConfig.BINLOG_INDEX_GTID_INTERVAL
+        if pending:
+            return 0
+        self._append(outputs, os.path.basename(self._gtid_path(uuid)),
+                     GTID_RECORD.pack(gno, sequence, event.position))
+        return 1
+
+    def find_time(self, timestamp: float) -> Optional[Tuple[str, int]]:
+        """
+        Ubica la primera transacción con timestamp posterior a `timestamp`.
+
+        Returns:
+            tuple: (archivo, posición) donde detener la restauración, o None si
+                   ninguna transacción indexada es posterior
+        """
+        record = _search(self.time_path, TIME_RECORD, int(timestamp), after=True)
+        if record is None:
+            return None
+        _, sequence, position = record
+        return self._file_name(sequence), position
+
+    def find_gtid(self, uuid: str, gno: int) -> Optional[Tuple[str, int]]:
+        """
+        Ubica el final de la transacción con GTID `uuid:gno`.
+
+        Busca en el índice el registro anterior más cercano y recorre el binlog
+        desde allí (como máximo BINLOG_INDEX_GTID_INTERVAL transacciones).
+
+        Returns:
+            tuple: (archivo, posición) inmediatamente posterior a la transacción,
+                   o None si no se encuentra
+        """
+        record = _search(self._gtid_path(uuid.lower()), GTID_RECORD, gno, after=False)
+        if record is None:
+            return None
+        _, sequence, position = record
+        found = False
+        for event in self.reader.events(self._file_name(sequence), position):
+            if event.type_code == GTID_EVENT:
+                if found:
+                    return event.file, event.position
+                found = parse_gtid_event(event) == (uuid.lower(), gno)
+            elif found and event.is_transaction_boundary():
+                return event.file, event.next_position
+        return None
+
+    def find(self, until: str) -> Optional[Tuple[str, int]]:
+        """
+        Ubica la posición de corte para `until`: un GTID 'uuid:n' o una fecha
+        'YYYY-MM-DD HH:MM:SS' (hora local, como --stop-datetime de mysqlbinlog).
+        """
+        match = _GTID.match(until.strip())
+        if match:
+            return self.find_gtid(match.group(1), int(match.group(2)))
+        moment = datetime.strptime(until.strip(), '%Y-%m-%d %H:%M:%S')
+        return self.find_time(moment.timestamp())
+
+
+def _search(path: str, record: struct.Struct, key: int, after: bool) -> Optional[tuple]:
+    """
+    Búsqueda binaria sobre un archivo de registros ordenados por su primer campo.
+
+    Args:
+        after (bool): True para el primer registro con clave > key;
+                      False para el último con clave <= key
+
+    Returns:
+        tuple: Registro encontrado o None
+    """
+    if not os.path.exists(path) or os.path.getsize(path) < record.size:
+        return None
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        low, high = 0, len(data) // record.size
+        while low < high:
+            middle = (low + high) // 2
+            if record.unpack_from(data, middle * record.size)[0] <= key:
+                low = middle + 1
+            else:
+                high = middle
+        if after:
+            return record.unpack_from(data, low * record.size) if low < len(data) // record.size else None
+        return record.unpack_from(data, (low - 1) * record.size) if low > 0 else None
+
+
+def update_index(current_file: Optional[str] = None) -> BinlogIndex:
+    """
+    Actualiza el índice hasta el final del binlog activo.
+
+    Args:
+        current_file (str): Archivo binlog activo (por defecto se consulta SHOW MASTER STATUS)
+
+    Returns:
+        BinlogIndex: Índice actualizado
+    """
+    if current_file is None:
+        current_file = fetch_one("SHOW MASTER STATUS")[0]
+    index = BinlogIndex()
+    added = index.update(current_file)
+    print(f"Índice de binlog actualizado: {added} registros nuevos "
+          f"(hasta {index.state['file']}:{index.state['position']})")
+    return index
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--until", help="Fecha 'YYYY-MM-DD HH:MM:SS' o GTID 'uuid:n' a ubicar")
+    args = parser.parse_args()
+
+    index = update_index()
+    if args.until:
+        position = index.find(args.until)
+        if position is None:
+            print(f"Ninguna transacción indexada es posterior a {args.until}")
+        else:
+            print(f"Posición de corte para {args.until}: {position[0]}:{position[1]}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,485 @@
+"""
+Módulo de backup completo en formato de carga masiva (LOAD DATA).
+En lugar de sentencias INSERT, el backup es un directorio con:
+- `schema.sql`: estructura (DROP + CREATE) de todas las tablas, y al final las vistas
+- `data/NNNNNN.tsv`: un archivo por tabla (o por rango de clave de una tabla
+  grande) en el formato por defecto de LOAD DATA: campos separados por
+  tabulador, filas por salto de línea, `\\N` para NULL y escapes con barra
+  invertida; las columnas binarias se escriben en hexadecimal
+- `manifest.json`: tablas, columnas, archivos, filas y bytes de cada archivo
+
+Todos los archivos se comprimen con el códec del backup. La restauración crea
+las tablas sin índices secundarios, carga cada archivo con
+`LOAD DATA LOCAL INFILE` (los comprimidos se descomprimen a una FIFO, sin
+archivos temporales) repartiendo los archivos entre varias conexiones, y
+construye los índices al final. El servidor debe tener `local_infile=ON`.
+"""
+import datetime
+import decimal
+import hashlib
+import json
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional, Tuple
+
+from src.backup.compression import READ_BUFFER_SIZE, BackupWriter, backup_filename, detect_codec, open_backup_reader
+from src.backup.encryption import is_encrypted
+from src.backup.dump import plan_dump_tasks, write_table_structure, write_views
+from src.backup.parallel_restore import _LOAD_SESSION, build_indexes, split_secondary_indexes
+from src.backup.restore import iter_statements
+from src.db import metrics
+from src.db.config import DatabaseConfig
+from src.db.encoder import BINARY_TYPES, time_literal
+from src.db.pool import get_pool
+from src.db.schema import get_schema
+from src.db.utils import iter_table_rows
+
+BULK_FORMAT = "tsv/1"
+BULK_EXTENSION = ".tsv"
+MANIFEST = "manifest.json"
+
+# Escapes reconocidos por LOAD DATA con ESCAPED BY '\\'
+_TSV_ESCAPES = str.maketrans({
+    '\\': '\\\\',
+    '\t': '\\t',
+    '\n': '\\n',
+    '\r': '\\r',
+    '\0': '\\0',
+})
+
+
+def is_bulk_backup(path: str) -> bool:
+    """Indica si la ruta es un backup en formato de carga masiva."""
+    return os.path.isfile(os.path.join(path, MANIFEST))
+
+
+def get_columns(table: str) -> List[dict]:
+    """
+    Columnas de una tabla en el orden de SELECT *.
+
+    Returns:
+        list: {'name', 'type', 'generated'} por columna (ver SchemaCatalog.columns)
+    """
+    return get_schema().columns(table)
+
+
+def tsv_field(value) -> str:
+    """
+    Convierte un valor de una columna no binaria en un campo TSV de LOAD DATA.
+
+    Args:
+        value: Valor devuelto por el driver
+
+    Returns:
+        str: Campo escapado (`\\N` para NULL)
+    """
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, datetime.timedelta):
+        return time_literal(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return str(value)
+    if isinstance(value, (bytes, bytearray)):
+        # Texto que el driver entrega sin decodificar (p. ej. JSON)
+        value = value.decode('utf-8')
+    if isinstance(value, set):
+        value = ','.join(sorted(value))
+    return str(value).translate(_TSV_ESCAPES)
+
+
+def _column_plan(columns: List[dict]) -> List[int]:
+    """Índices (en SELECT *) de las columnas que se escriben: las generadas se recalculan al cargar."""
+    return [index for index, column in enumerate(columns) if not column['generated']]
+
+
+def table_info(columns: List[dict]) -> dict:
+    """Entrada del manifiesto de una tabla: columnas cargadas y las que requieren conversión."""
+    return {
+        'columns': [column['name'] for column in columns],
+        'loaded_columns': [columns[index]['name'] for index in _column_plan(columns)],
+        'binary_columns': [column['name'] for column in columns
+                           if column['type'] in BINARY_TYPES and not column['generated']],
+        'bit_columns': [column['name'] for column in columns
+                        if column['type'] == 'bit' and not column['generated']],
+    }
+
+
+def dump_table_tsv(task: dict, columns: List[dict], conn, out, chunk_size: Optional[int] = None,
+                   throttle=None) -> int:
+    """
+    Escribe las filas de una tarea del volcado en formato TSV.
+
+    Args:
+        task (dict): Tarea creada por plan_dump_tasks
+        columns (list): Columnas de la tabla (get_columns)
+        conn (MySQLConnection): Conexión del snapshot
+        out (BackupWriter): Archivo de datos
+        chunk_size (int): Filas leídas por consulta
+        throttle (Throttle): Limitador del volcado
+
+    Returns:
+        int: Filas escritas
+    """
+    table = task['table']
+    indexes = _column_plan(columns)
+    binary = {index for index in indexes if columns[index]['type'] in BINARY_TYPES}
+    rows_written = 0
+    for rows in iter_table_rows(table, chunk_size, conn, task['start'], task['end'], throttle):
+        started = time.perf_counter()
+        block = "".join(
+            "\t".join(
+                (row[index].hex() if row[index] is not None else "\\N") if index in binary
+                else tsv_field(row[index])
+                for index in indexes
+            ) + "\n"
+            for row in rows
+        )
+        metrics.observe('encode', time.perf_counter() - started, table, len(rows), len(block))
+        started = time.perf_counter()
+        out.write(block)
+        metrics.observe('write', time.perf_counter() - started, table, bytes=len(block))
+        if throttle:
+            throttle.wait(bytes=len(block))
+        rows_written += len(rows)
+    return rows_written
+
+
+class BulkBackup:
+    """
+    Resultado de un backup en formato de carga masiva, con la interfaz que
+    usa el catálogo (bytes_in, bytes_out, sha256 y codec).
+    """
+
+    def __init__(self, path: str, manifest: dict, codec):
+        self.path = path
+        self.manifest = manifest
+        self.codec = codec
+        self.bytes_in = sum(item['bytes_in'] for item in manifest['files']) + manifest['schema']['bytes_in']
+        self.bytes_out = sum(item['bytes_out'] for item in manifest['files']) + manifest['schema']['bytes_out']
+        # El manifiesto incluye el hash de cada archivo
+        with open(os.path.join(path, MANIFEST), 'rb') as f:
+            self.sha256 = hashlib.sha256(f.read()).hexdigest()
+
+
+def _file_entry(writer: BackupWriter, directory: str, **fields) -> dict:
+    return {'file': os.path.relpath(writer.path, directory), 'bytes_in': writer.bytes_in,
+            'bytes_out': writer.bytes_out, 'sha256': writer.sha256, **fields}
+
+
+def write_bulk_backup(directory: str, tables: List[str], connections: List, header: str,
+                      codec: Optional[str] = None, level: Optional[int] = None, threads: Optional[int] = None,
+                      chunk_size: Optional[int] = None, shard_rows: Optional[int] = None,
+                      throttle=None, encrypt: Optional[bool] = None,
+                      views: Optional[List[Tuple[str, str]]] = None) -> BulkBackup:
+    """
+    Escribe un backup completo en formato de carga masiva.
+
+    Los archivos de datos se escriben en paralelo, una conexión del snapshot
+    por worker; cada tarea (tabla o rango de clave) tiene su propio archivo.
+
+    Args:
+        directory (str): Directorio del backup (no debe existir)
+        tables (list): Tablas a volcar
+        connections (list): Conexiones abiertas con open_consistent_snapshot
+        header (str): Comentarios de cabecera del esquema
+        codec (str): Códec de compresión (por defecto DatabaseConfig.BACKUP_CODEC)
+        level (int): Nivel de compresión
+        threads (int): Hilos de compresión (solo zstd)
+        chunk_size (int): Filas leídas por consulta
+        shard_rows (int): Filas estimadas a partir de las cuales se divide una tabla
+        throttle (Throttle): Limitador del volcado
+        encrypt (bool): Cifrar el esquema y los archivos de datos (por defecto DatabaseConfig.BACKUP_ENCRYPTION)
+        views (list): (vista, sentencia CREATE VIEW) a escribir en el esquema después de las tablas
+
+    Returns:
+        BulkBackup: Backup escrito, con su manifiesto
+    """
+    os.makedirs(os.path.join(directory, "data"))
+    columns = {table: get_columns(table) for table in tables}
+
+    with BackupWriter(backup_filename(os.path.join(directory, "schema.sql"), codec), codec, level, threads,
+                      encrypt) as schema:
+        schema.write(header)
+        for table in tables:
+            write_table_structure(schema, table)
+        write_views(schema, views or [])
+    codec_name = schema.codec.name
+
+    tasks = plan_dump_tasks(tables, connections[0], shard_rows)
+    pending = queue.Queue()
+    for task in sorted(tasks, key=lambda t: t['rows'], reverse=True):
+        pending.put(task)
+    files = [None] * len(tasks)
+    failures = []
+
+    def worker(conn):
+        while not failures:
+            try:
+                task = pending.get_nowait()
+            except queue.Empty:
+                return
+            path = backup_filename(os.path.join(directory, "data", f"{task['index']:06d}{BULK_EXTENSION}"), codec)
+            try:
+                if throttle:
+                    throttle.acquire_slot()
+                try:
+                    with metrics.phase('dump', task['table']) as phase, \
+                            BackupWriter(path, codec, level, threads, encrypt) as out:
+                        rows = dump_table_tsv(task, columns[task['table']], conn, out, chunk_size, throttle)
+                        phase.add(rows=rows, bytes=out.bytes_in)
+                finally:
+                    if throttle:
+                        throttle.release_slot()
+                files[task['index']] = _file_entry(out, directory, table=task['table'], start=task['start'],
+                                                   end=task['end'], rows=rows)
+            except Exception as e:
+                failures.append(e)
+
+    workers = [threading.Thread(target=worker, args=(conn,)) for conn in connections]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    if failures:
+        raise failures[0]
+
+    manifest = {
+        'format': BULK_FORMAT,
+        'codec': codec_name,
+        'schema': _file_entry(schema, directory),
+        'tables': {table: table_info(columns[table]) for table in tables},
+        'files': files,
+    }
+    path = os.path.join(directory, MANIFEST)
+    with open(f"{path}.tmp", 'w') as f:
+        json.dump(manifest, f, indent=1, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(f"{path}.tmp", path)
+    return BulkBackup(directory, manifest, schema.codec)
+
+
+def load_manifest(directory: str) -> dict:
+    """
+    Lee el manifiesto de un backup de carga masiva.
+
+    Raises:
+        ValueError: Si el directorio no es un backup de carga masiva soportado
+    """
+    try:
+        with open(os.path.join(directory, MANIFEST), 'r') as f:
+            manifest = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"{directory} no es un backup en formato de carga masiva")
+    if manifest.get('format') != BULK_FORMAT:
+        raise ValueError(f"Formato de backup no soportado en {directory}: {manifest.get('format')}")
+    return manifest
+
+
+@contextmanager
+def readable_path(path: str):
+    """
+    Ruta que LOAD DATA LOCAL puede leer con el contenido sin comprimir de `path`.
+
+    Sin compresión ni cifrado es el mismo archivo; si no, una FIFO alimentada
+    por un hilo que descifra y descomprime en línea.
+
+    Yields:
+        str: Ruta a pasar a LOAD DATA LOCAL INFILE
+    """
+    if detect_codec(path).name == "none" and not is_encrypted(path):
+        yield path
+        return
+
+    tmp = tempfile.mkdtemp(prefix=".load_")
+    fifo = os.path.join(tmp, "data.tsv")
+    os.mkfifo(fifo)
+    errors = []
+    cancel = threading.Event()
+
+    def feed():
+        try:
+            with open_backup_reader(path) as reader, open(fifo, 'wb') as out:
+                while not cancel.is_set():
+                    data = reader.read(READ_BUFFER_SIZE)
+                    if not data:
+                        break
+                    out.write(data)
+        except BrokenPipeError:
+            pass
+        except Exception as e:
+            errors.append(e)
+
+    thread = threading.Thread(target=feed, daemon=True)
+    thread.start()
+    try:
+        yield fifo
+        thread.join()
+        if errors:
+            raise errors[0]
+    finally:
+        # Si LOAD DATA falló sin abrir la FIFO (o sin leerla entera), el escritor sigue
+        # bloqueado en open() o write(): abrir y cerrar el otro extremo lo libera
+        cancel.set()
+        while thread.is_alive():
+            fd = os.open(fifo, os.O_RDONLY | os.O_NONBLOCK)
+            thread.join(0.1)
+            os.close(fd)
+        shutil.rmtree(tmp, ignore_errors=True)
+
+
+def load_statement(table: str, path: str, info: dict) -> str:
+    """Sentencia LOAD DATA de un archivo de datos de la tabla."""
+    binary = set(info['binary_columns'])
+    bit = set(info['bit_columns'])
+    targets, assignments = [], []
+    for number, column in enumerate(info['loaded_columns']):
+        if column in binary or column in bit:
+            targets.append(f"@c{number}")
+            expression = f"UNHEX(@c{number})" if column in binary else f"CAST(@c{number} AS UNSIGNED)"
+            assignments.append(f"`{column}` = IF(@c{number} IS NULL, NULL, {expression})")
+        else:
+            targets.append(f"`{column}`")
+    path = path.replace('\\', '\\\\').replace("'", "\\'")
+    statement = (f"LOAD DATA LOCAL INFILE '{path}' INTO TABLE `{table}` CHARACTER SET utf8mb4 "
+                 f"FIELDS TERMINATED BY '\\t' ESCAPED BY '\\\\' LINES TERMINATED BY '\\n' "
+                 f"({', '.join(targets)})")
+    if assignments:
+        statement += " SET " + ", ".join(assignments)
+    return statement
+
+
+def _open_bulk_connection():
+    """Conexión de carga masiva: LOAD DATA LOCAL habilitado y sin verificaciones de llaves."""
+    conn = get_pool().new_connection(allow_local_infile=True)
+    cursor = conn.cursor()
+    for statement in _LOAD_SESSION + ("SET SESSION SQL_MODE = 'NO_AUTO_VALUE_ON_ZERO'",):
+        cursor.execute(statement)
+    cursor.close()
+    conn.autocommit = False
+    return conn
+
+
+def load_file(conn, directory: str, table: str, entry: dict, info: dict) -> int:
+    """
+    Carga un archivo de datos con LOAD DATA LOCAL INFILE en una transacción.
+
+    Returns:
+        int: Filas cargadas
+
+    Raises:
+        ValueError: Si el servidor informó advertencias (con LOCAL, los errores de datos son advertencias)
+    """
+    cursor = conn.cursor()
+    try:
+        with readable_path(os.path.join(directory, entry['file'])) as path:
+            cursor.execute(load_statement(table, path, info))
+        loaded = cursor.rowcount
+        if cursor.warning_count:
+            cursor.execute("SHOW WARNINGS LIMIT 5")
+            warnings = "; ".join(str(row[2]) for row in cursor.fetchall())
+            conn.rollback()
+            raise ValueError(f"LOAD DATA de `{table}` ({entry['file']}) con advertencias: {warnings}")
+        conn.commit()
+    finally:
+        cursor.close()
+    if entry.get('rows') is not None and loaded != entry['rows']:
+        raise ValueError(f"`{table}` ({entry['file']}): {loaded} filas cargadas, se esperaban {entry['rows']}")
+    return loaded
+
+
+def apply_bulk_backup(directory: str, workers: Optional[int] = None) -> dict:
+    """
+    Restaura un backup completo en formato de carga masiva.
+
+    Args:
+        directory (str): Directorio del backup
+        workers (int): Conexiones que cargan archivos en paralelo (por defecto DatabaseConfig.RESTORE_WORKERS)
+
+    Returns:
+        dict: Resumen con filas, archivos, bytes, duración y filas por segundo
+
+    Raises:
+        Exception: El primer error de carga
+    """
+    manifest = load_manifest(directory)
+    workers = max(1, workers or DatabaseConfig.RESTORE_WORKERS)
+    started = time.perf_counter()
+
+    # Estructura: tablas sin índices secundarios, que se crean al final en una pasada
+    alters = []
+    conn = get_pool().new_connection()
+    try:
+        cursor = conn.cursor()
+        with metrics.phase('schema'), open_backup_reader(os.path.join(directory, manifest['schema']['file'])) as reader:
+            for statement in iter_statements(reader):
+                if statement.lstrip().upper().startswith("CREATE TABLE"):
+                    statement, alter = split_secondary_indexes(statement)
+                    if alter:
+                        alters.append(alter)
+                cursor.execute(statement)
+        cursor.close()
+    finally:
+        conn.close()
+
+    pending = queue.Queue()
+    for entry in sorted(manifest['files'], key=lambda item: item['bytes_in'], reverse=True):
+        pending.put(entry)
+    results = []
+    failures = []
+
+    def loader():
+        conn = None
+        try:
+            conn = _open_bulk_connection()
+            while not failures:
+                try:
+                    entry = pending.get_nowait()
+                except queue.Empty:
+                    return
+                table = entry['table']
+                with metrics.phase('load', table) as phase:
+                    rows = load_file(conn, directory, table, entry, manifest['tables'][table])
+                    phase.add(rows=rows, bytes=entry['bytes_in'])
+                results.append((rows, entry['bytes_in']))
+        except Exception as e:
+            failures.append(e)
+        finally:
+            if conn is not None:
+                conn.close()
+
+    threads = [threading.Thread(target=loader) for _ in range(min(workers, len(manifest['files'])) or 1)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise failures[0]
+    loaded = time.perf_counter() - started
+
+    print(f"Datos cargados; creando índices secundarios de {len(alters)} tablas...")
+    with metrics.phase('build_indexes'):
+        build_indexes(alters, workers, list(_LOAD_SESSION))
+
+    rows = sum(count for count, _ in results)
+    elapsed = max(time.perf_counter() - started, 1e-6)
+    return {
+        'rows': rows,
+        'files': len(results),
+        'statements': len(results),
+        'bytes_applied': sum(size for _, size in results),
+        'elapsed': elapsed,
+        'rows_per_second': rows / max(loaded, 1e-6),
+        'deferred_index_tables': len(alters),
+    }
@@ -0,0 +1,322 @@
+"""
+Módulo de catálogo de backups.
+Registra cada backup en una base SQLite dentro del directorio de backups, con
+su tipo, backup padre, posiciones inicial y final del binary log, tamaños,
+códec, hash y tiempos. Reemplaza al antiguo `last_position.txt` y a la
+búsqueda de archivos por nombre: la cadena de restauración para cualquier
+punto se obtiene con una sola consulta recursiva.
+"""
+import os
+import sqlite3
+import time
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+
+from src.backup.binlog import file_sequence
+from src.db.config import DatabaseConfig
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS backups (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    type TEXT NOT NULL CHECK (type IN ('full', 'incremental')),
+    parent_id INTEGER REFERENCES backups(id),
+    path TEXT NOT NULL UNIQUE,
+    status TEXT NOT NULL DEFAULT 'running' CHECK (status IN ('running', 'complete', 'failed')),
+    start_file TEXT,
+    start_seq INTEGER,
+    start_pos INTEGER,
+    end_file TEXT,
+    end_seq INTEGER,
+    end_pos INTEGER,
+    codec TEXT,
+    bytes_in INTEGER,
+    bytes_out INTEGER,
+    sha256 TEXT,
+    started_at REAL NOT NULL,
+    finished_at REAL,
+    duration REAL,
+    error TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_backups_parent ON backups(parent_id);
+CREATE INDEX IF NOT EXISTS idx_backups_end ON backups(status, end_seq, end_pos);
+CREATE TABLE IF NOT EXISTS backup_tables (
+    backup_id INTEGER NOT NULL REFERENCES backups(id),
+    name TEXT NOT NULL,
+    structure_sha256 TEXT,
+    format TEXT,
+    create_time TEXT,
+    update_time TEXT,
+    observed_at TEXT,
+    checksum INTEGER,
+    data_length INTEGER,
+    data_offset INTEGER,
+    data_bytes INTEGER,
+    reused INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (backup_id, name)
+);
+CREATE TABLE IF NOT EXISTS table_checksums (
+    backup_id INTEGER NOT NULL REFERENCES backups(id),
+    name TEXT NOT NULL,
+    pk TEXT,
+    range_low INTEGER,
+    range_step INTEGER,
+    bucket INTEGER NOT NULL,
+    rows INTEGER NOT NULL,
+    checksum INTEGER NOT NULL,
+    PRIMARY KEY (backup_id, name, bucket)
+);
+"""
+
+# Cadena de restauración: desde el backup objetivo se sube por los padres hasta el completo
+_CHAIN_QUERY = """
+WITH RECURSIVE chain(id, parent_id, depth) AS (
+    SELECT id, parent_id, 0 FROM backups WHERE id = ({target})
+    UNION ALL
+    SELECT b.id, b.parent_id, chain.depth + 1
+    FROM backups b JOIN chain ON b.id = chain.parent_id
+)
+SELECT b.* FROM chain JOIN backups b ON b.id = chain.id
+ORDER BY chain.depth DESC
+"""
+
+# Backup completo más reciente
+_LATEST_TARGET = """
+    SELECT id FROM backups WHERE status = 'complete'
+    ORDER BY end_seq DESC, end_pos DESC, id DESC LIMIT 1
+"""
+
+# Primer backup cuyo rango de binlog contiene la posición (?, ?); entre rangos con
+# el mismo final se prefiere el más corto (un incremental antes que un diferencial
+# compactado que lo abarca, ya que solo el original puede cortarse en la posición)
+_POSITION_TARGET = """
+    SELECT id FROM backups
+    WHERE status = 'complete'
+      AND (start_seq < :seq OR (start_seq = :seq AND start_pos <= :pos))
+      AND (end_seq > :seq OR (end_seq = :seq AND end_pos >= :pos))
+    ORDER BY end_seq, end_pos, start_seq DESC, start_pos DESC, id DESC LIMIT 1
+"""
+
+_PATH_TARGET = "SELECT id FROM backups WHERE path IN (:path, :relative) AND status = 'complete'"
+
+
+def normalize_path(path: str) -> str:
+    """Ruta absoluta con la que se registra un backup, sin importar cómo se escribió."""
+    return os.path.abspath(path)
+
+
+def _path_keys(path: str) -> Tuple[str, str]:
+    """Ruta absoluta y relativa al directorio actual: los catálogos anteriores guardaban la relativa."""
+    path = normalize_path(path)
+    return path, os.path.relpath(path)
+
+
+def _split_position(position: Optional[str]) -> Tuple[Optional[str], Optional[int], Optional[int]]:
+    """Convierte 'archivo:posición' en (archivo, secuencia, posición)."""
+    if not position:
+        return None, None, None
+    name, pos = position.rsplit(':', 1)
+    return name, file_sequence(name), int(pos)
+
+
+class BackupCatalog:
+    """
+    Catálogo SQLite de backups.
+
+    Cada escritura es una transacción de SQLite (atómica y sincronizada a
+    disco); un backup se registra como 'running' al empezar y pasa a
+    'complete' solo cuando su archivo está cerrado y sincronizado, por lo que
+    un backup interrumpido nunca forma parte de una cadena de restauración.
+
+    Args:
+        path (str): Ruta de la base SQLite (por defecto DatabaseConfig.CATALOG_PATH)
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or DatabaseConfig.CATALOG_PATH
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.executescript(_SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30)
+        conn.row_factory = sqlite3.Row
+        conn.execute("PRAGMA synchronous=FULL")
+        conn.execute("PRAGMA foreign_keys=ON")
+        return conn
+
+    def _execute(self, query: str, params=()) -> sqlite3.Cursor:
+        with closing(self._connect()) as conn:
+            with conn:
+                return conn.execute(query, params)
+
+    def _fetch(self, query: str, params=()) -> List[dict]:
+        with closing(self._connect()) as conn:
+            return [dict(row) for row in conn.execute(query, params)]
+
+    def start_backup(self, kind: str, path: str, parent_id: Optional[int] = None,
+                     start_position: Optional[str] = None, codec: Optional[str] = None) -> int:
+        """
+        Registra un backup en curso.
+
+        Args:
+            kind (str): 'full' o 'incremental'
+            path (str): Ruta del archivo de backup (se guarda como ruta absoluta)
+            parent_id (int): Backup del que continúa (solo incrementales)
+            start_position (str): Posición inicial del binlog 'archivo:posición'
+            codec (str): Códec de compresión
+
+        Returns:
+            int: Identificador del backup
+        """
+        start_file, start_seq, start_pos = _split_position(start_position)
+        cursor = self._execute(
+            "INSERT INTO backups (type, parent_id, path, start_file, start_seq, start_pos, codec, started_at) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (kind, parent_id, normalize_path(path), start_file, start_seq, start_pos, codec, time.time()),
+        )
+        return cursor.lastrowid
+
+    def finish_backup(self, backup_id: int, end_position: Optional[str], writer) -> dict:
+        """
+        Marca un backup como completo con su posición final, tamaños y hash.
+
+        Args:
+            backup_id (int): Identificador devuelto por start_backup
+            end_position (str): Posición final del binlog 'archivo:posición'
+            writer (BackupWriter): Escritor ya cerrado del archivo de backup
+
+        Returns:
+            dict: Registro actualizado
+        """
+        end_file, end_seq, end_pos = _split_position(end_position)
+        finished = time.time()
+        self._execute(
+            "UPDATE backups SET status = 'complete', end_file = ?, end_seq = ?, end_pos = ?, "
+            "bytes_in = ?, bytes_out = ?, sha256 = ?, finished_at = ?, duration = ? - started_at "
+            "WHERE id = ?",
+            (end_file, end_seq, end_pos, writer.bytes_in, writer.bytes_out, writer.sha256,
+             finished, finished, backup_id),
+        )
+        return self.get(backup_id)
+
+    def fail_backup(self, backup_id: int, error: str):
+        """Marca un backup como fallido."""
+        self._execute(
+            "UPDATE backups SET status = 'failed', error = ?, finished_at = ? WHERE id = ?",
+            (error, time.time(), backup_id),
+        )
+
+    def reparent(self, old_parent_id: int, new_parent_id: int) -> int:
+        """
+        Hace que los hijos de un backup pasen a continuar desde otro.
+
+        Args:
+            old_parent_id (int): Backup padre actual
+            new_parent_id (int): Nuevo padre (p. ej. un diferencial que cubre el mismo rango)
+
+        Returns:
+            int: Backups actualizados
+        """
+        cursor = self._execute(
+            "UPDATE backups SET parent_id = ? WHERE parent_id = ? AND id != ?",
+            (new_parent_id, old_parent_id, new_parent_id),
+        )
+        return cursor.rowcount
+
+    def record_tables(self, backup_id: int, tables: List[dict]):
+        """
+        Registra las tablas de un backup completo: su huella para detectar cambios
+        y la ubicación de su sección de datos (en bytes sin comprimir).
+
+        Args:
+            backup_id (int): Identificador del backup
+            tables (list): Registros con las columnas de `backup_tables` (sin backup_id)
+        """
+        columns = ('name', 'structure_sha256', 'format', 'create_time', 'update_time', 'observed_at',
+                   'checksum', 'data_length', 'data_offset', 'data_bytes', 'reused')
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO backup_tables (backup_id, {', '.join(columns)}) "
+                    f"VALUES (?, {', '.join('?' for _ in columns)})",
+                    [(backup_id, *(table.get(column) for column in columns)) for table in tables],
+                )
+
+    def backup_tables(self, backup_id: int) -> Dict[str, dict]:
+        """Retorna los registros de las tablas de un backup completo, por nombre."""
+        rows = self._fetch("SELECT * FROM backup_tables WHERE backup_id = ?", (backup_id,))
+        return {row['name']: row for row in rows}
+
+    def record_checksums(self, backup_id: int, checksums: List[dict]):
+        """
+        Registra los checksums por tabla y rango de clave de un backup completo.
+
+        Args:
+            backup_id (int): Identificador del backup
+            checksums (list): Registros creados por src.backup.verify.compute_checksums
+        """
+        columns = ('name', 'pk', 'range_low', 'range_step', 'bucket', 'rows', 'checksum')
+        with closing(self._connect()) as conn:
+            with conn:
+                conn.executemany(
+                    f"INSERT OR REPLACE INTO table_checksums (backup_id, {', '.join(columns)}) "
+                    f"VALUES (?, {', '.join('?' for _ in columns)})",
+                    [(backup_id, *(record[column] for column in columns)) for record in checksums],
+                )
+
+    def checksums(self, backup_id: int) -> List[dict]:
+        """Retorna los checksums registrados para un backup completo."""
+        return self._fetch("SELECT * FROM table_checksums WHERE backup_id = ? ORDER BY name, bucket",
+                           (backup_id,))
+
+    def find(self, path: str) -> Optional[dict]:
+        """Retorna el registro del backup guardado en `path` (absoluta o relativa), o None."""
+        rows = self._fetch("SELECT * FROM backups WHERE path IN (?, ?) ORDER BY id DESC", _path_keys(path))
+        return rows[0] if rows else None
+
+    def latest_full(self) -> Optional[dict]:
+        """Retorna el backup completo terminado más reciente, o None."""
+        rows = self._fetch("SELECT * FROM backups WHERE type = 'full' AND status = 'complete' "
+                           "ORDER BY id DESC LIMIT 1")
+        return rows[0] if rows else None
+
+    def get(self, backup_id: int) -> Optional[dict]:
+        """Retorna el registro de un backup o None."""
+        rows = self._fetch("SELECT * FROM backups WHERE id = ?", (backup_id,))
+        return rows[0] if rows else None
+
+    def running(self) -> List[dict]:
+        """Retorna los backups que siguen en curso (o que quedaron así por una caída)."""
+        return self._fetch("SELECT * FROM backups WHERE status = 'running' ORDER BY id")
+
+    def latest(self) -> Optional[dict]:
+        """Retorna el backup completo con la posición final más reciente, o None."""
+        rows = self._fetch(f"SELECT * FROM backups WHERE id = ({_LATEST_TARGET})")
+        return rows[0] if rows else None
+
+    def restore_chain(self, position: Optional[Tuple[str, int]] = None,
+                      backup_path: Optional[str] = None) -> List[dict]:
+        """
+        Obtiene la cadena de restauración con una sola consulta.
+
+        Args:
+            position (tuple): (archivo, posición) del binlog a alcanzar; se elige el
+                              primer backup cuyo rango la contiene
+            backup_path (str): Ruta del backup final de la cadena
+            (sin argumentos, la cadena del backup más reciente)
+
+        Returns:
+            list: Registros desde el backup completo hasta el último incremental
+                  (vacía si no hay backups que cubran el punto)
+        """
+        if position is not None:
+            target, params = _POSITION_TARGET, {'seq': file_sequence(position[0]), 'pos': position[1]}
+        elif backup_path is not None:
+            absolute, relative = _path_keys(backup_path)
+            target, params = _PATH_TARGET, {'path': absolute, 'relative': relative}
+        else:
+            target, params = _LATEST_TARGET, {}
+        chain = self._fetch(_CHAIN_QUERY.format(target=target), params)
+        if chain and chain[0]['type'] != 'full':
+            raise ValueError(f"La cadena de {chain[-1]['path']} no comienza en un backup completo")
+        return chain
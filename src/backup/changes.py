@@ -0,0 +1,235 @@
+"""
+Módulo de detección de tablas sin cambios para el backup completo.
+Antes de volcar una tabla se compara una huella barata de su contenido con la
+registrada en el catálogo para el backup completo anterior. Si coincide, la
+sección de datos se copia desde ese backup en lugar de leerse otra vez de la
+base de datos, de modo que el nuevo backup sigue siendo completo y autónomo.
+
+Métodos de detección:
+    update_time  CREATE_TIME y UPDATE_TIME de information_schema (sin leer la tabla);
+                 si el servidor no conoce UPDATE_TIME (p. ej. tras un reinicio) se usa CHECKSUM TABLE
+    checksum     CHECKSUM TABLE sobre la conexión del snapshot (recorre la tabla en el servidor,
+                 pero no transfiere ni codifica filas)
+"""
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.backup.catalog import BackupCatalog
+from src.backup.compression import READ_BUFFER_SIZE, open_backup_reader
+from src.db.pool import get_pool
+from src.db.utils import get_table_structure
+
+DETECTION_MODES = ("none", "update_time", "checksum")
+
+
+def read_table_status() -> Tuple[Dict[str, dict], str]:
+    """
+    Lee CREATE_TIME, UPDATE_TIME y DATA_LENGTH de cada tabla junto con la hora del servidor.
+
+    Debe llamarse antes de abrir el snapshot: así todo cambio con UPDATE_TIME
+    anterior a la hora devuelta está incluido en los datos del backup.
+
+    Returns:
+        tuple: ({tabla: {'create_time', 'update_time', 'data_length'}}, hora del servidor)
+    """
+    conn = get_pool().new_connection()
+    try:
+        cursor = conn.cursor()
+        try:
+            # MySQL 8 cachea las estadísticas de information_schema (24 h por defecto)
+            cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+        except Exception:
+            pass
+        cursor.execute(
+            "SELECT TABLE_NAME, CREATE_TIME, UPDATE_TIME, DATA_LENGTH, NOW() FROM information_schema.TABLES "
+            "WHERE TABLE_SCHEMA = DATABASE()"
+        )
+        rows = cursor.fetchall()
+        if not rows:
+            cursor.execute("SELECT NOW()")
+            rows = [(None, None, None, None, cursor.fetchone()[0])]
+        cursor.close()
+    finally:
+        conn.close()
+
+    status = {
+        name: {
+            'create_time': str(created) if created else None,
+            'update_time': str(updated) if updated else None,
+            'data_length': int(length or 0),
+        }
+        for name, created, updated, length, _ in rows if name
+    }
+    return status, str(rows[0][4])
+
+
+def table_checksums(conn, tables: List[str]) -> Dict[str, Optional[int]]:
+    """
+    Calcula CHECKSUM TABLE de varias tablas en la conexión del snapshot.
+
+    Returns:
+        dict: {tabla: checksum} (None si el servidor no pudo calcularlo)
+    """
+    if not tables:
+        return {}
+    cursor = conn.cursor()
+    try:
+        cursor.execute("CHECKSUM TABLE " + ", ".join(f"`{table}`" for table in tables))
+        # Columnas: Table ('base.tabla'), Checksum
+        result = {name.split('.', 1)[-1]: checksum for name, checksum in cursor.fetchall()}
+    finally:
+        cursor.close()
+    return {table: result.get(table) for table in tables}
+
+
+def _format_key(options: dict) -> str:
+    """Opciones del volcado que cambian el texto de las sentencias INSERT."""
+    return json.dumps({key: options[key] for key in ('chunk_size', 'max_statement_bytes', 'extended_insert')},
+                      sort_keys=True)
+
+
+class PreviousBackup:
+    """
+    Secciones de datos de un backup completo anterior.
+
+    Lee el backup hacia adelante: las secciones se copian en el orden en que
+    aparecen (el mismo en que se vuelcan las tablas), así que el backup
+    anterior se descomprime a lo sumo una vez.
+
+    Args:
+        record (dict): Registro del backup en el catálogo
+        tables (dict): Registros de sus tablas ({nombre: registro})
+    """
+
+    def __init__(self, record: dict, tables: Dict[str, dict]):
+        self.record = record
+        self.tables = tables
+        self._reader = None
+        self._position = 0
+
+    @classmethod
+    def latest(cls, catalog: BackupCatalog) -> Optional['PreviousBackup']:
+        """Retorna el backup completo más reciente cuyo archivo sigue disponible, o None."""
+        record = catalog.latest_full()
+        if record is None or not os.path.exists(record['path']):
+            return None
+        tables = catalog.backup_tables(record['id'])
+        return cls(record, tables) if tables else None
+
+    def unchanged(self, table: str, fingerprint: dict) -> bool:
+        """
+        Indica si los datos de la tabla son los mismos que en el backup anterior.
+
+        Args:
+            table (str): Tabla
+            fingerprint (dict): Huella actual creada por detect_unchanged
+
+        Returns:
+            bool: True si la sección de datos anterior puede reutilizarse
+        """
+        previous = self.tables.get(table)
+        if previous is None or previous['data_offset'] is None:
+            return False
+        if (previous['structure_sha256'] != fingerprint['structure_sha256']
+                or previous['format'] != fingerprint['format']):
+            return False
+        if previous['checksum'] is not None and fingerprint['checksum'] is not None:
+            return previous['checksum'] == fingerprint['checksum']
+        # UPDATE_TIME tiene resolución de segundos: solo es concluyente si el último
+        # cambio conocido es anterior al segundo en que se leyó en el backup anterior
+        return (fingerprint['update_time'] is not None
+                and previous['update_time'] == fingerprint['update_time']
+                and previous['create_time'] == fingerprint['create_time']
+                and previous['update_time'] < previous['observed_at'])
+
+    def copy_section(self, table: str, out) -> int:
+        """
+        Copia la sección de datos de una tabla del backup anterior en `out`.
+
+        Returns:
+            int: Bytes copiados
+
+        Raises:
+            ValueError: Si el backup anterior termina antes que la sección
+        """
+        offset, length = self.tables[table]['data_offset'], self.tables[table]['data_bytes']
+        if self._reader is None or offset < self._position:
+            self.close()
+            self._reader = open_backup_reader(self.record['path'])
+            self._position = 0
+        self._skip(offset - self._position)
+
+        remaining = length
+        while remaining:
+            data = self._reader.read(min(READ_BUFFER_SIZE, remaining))
+            if not data:
+                raise ValueError(f"{self.record['path']} termina antes de la sección de datos de `{table}`")
+            out.write_bytes(data)
+            remaining -= len(data)
+        self._position = offset + length
+        return length
+
+    def _skip(self, count: int):
+        while count:
+            data = self._reader.read(min(READ_BUFFER_SIZE, count))
+            if not data:
+                raise ValueError(f"{self.record['path']} es más corto que lo registrado en el catálogo")
+            count -= len(data)
+            self._position += len(data)
+
+    def close(self):
+        if self._reader is not None:
+            self._reader.close()
+            self._reader = None
+
+
+def detect_unchanged(tables: List[str], conn, mode: str, options: dict,
+                     status: Optional[Dict[str, dict]] = None, observed_at: Optional[str] = None,
+                     previous: Optional[PreviousBackup] = None) -> Tuple[Dict[str, dict], Set[str]]:
+    """
+    Calcula la huella de cada tabla y decide cuáles no cambiaron desde el backup anterior.
+
+    Args:
+        tables (list): Tablas del backup
+        conn (MySQLConnection): Conexión del snapshot (para CHECKSUM TABLE)
+        mode (str): 'none', 'update_time' o 'checksum'
+        options (dict): Opciones del volcado (build_dump_options)
+        status (dict): Estado de las tablas leído con read_table_status antes del snapshot
+        observed_at (str): Hora del servidor devuelta por read_table_status
+        previous (PreviousBackup): Backup completo anterior
+
+    Returns:
+        tuple: ({tabla: huella a registrar en el catálogo}, tablas sin cambios)
+    """
+    if mode not in DETECTION_MODES:
+        raise ValueError(f"Método de detección de cambios no soportado: {mode}")
+    status = status or {}
+    fingerprints = {}
+    for table in tables:
+        info = status.get(table, {})
+        fingerprints[table] = {
+            'structure_sha256': hashlib.sha256(get_table_structure(table).encode('utf-8')).hexdigest(),
+            'format': _format_key(options),
+            'create_time': info.get('create_time'),
+            'update_time': info.get('update_time'),
+            'observed_at': observed_at,
+            'data_length': info.get('data_length'),
+            'checksum': None,
+        }
+    if mode == "none":
+        return fingerprints, set()
+
+    if mode == "checksum":
+        to_checksum = list(tables)
+    else:
+        # Sin UPDATE_TIME no se puede saber nada barato: se recurre a CHECKSUM TABLE
+        to_checksum = [table for table in tables if fingerprints[table]['update_time'] is None]
+    for table, checksum in table_checksums(conn, to_checksum).items():
+        fingerprints[table]['checksum'] = checksum
+
+    unchanged = set()
+    if previous is not None:
+        unchanged = {table for table in tables if previous.unchanged(table, fingerprints[table])}
+    return fingerprints, unchanged
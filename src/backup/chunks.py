@@ -0,0 +1,527 @@
+"""
+Módulo de almacenamiento deduplicado de backups por contenido.
+Divide el flujo de un backup en chunks definidos por su contenido, guarda cada
+chunk una sola vez bajo su hash SHA-256 (comprimido con el códec del backup) y
+escribe por backup una pequeña receta con la lista de chunks. Dos backups
+completos consecutivos comparten todos los chunks cuyas filas no cambiaron, así
+que cada noche solo se escriben los chunks nuevos. La restauración reconstruye
+el flujo a partir de los chunks al leerlo.
+
+Uso:
+    python3 -m src.backup.chunks --stats
+    python3 -m src.backup.chunks --gc
+"""
+import argparse
+import fcntl
+import glob
+import hashlib
+import io
+import json
+import os
+import threading
+import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+from src.backup.compression import RECIPE_EXTENSION, BackupWriter, Codec, get_codec
+from src.db.config import DatabaseConfig
+
+RECIPE_FORMAT = "chunks/1"
+
+
+class ContentChunker:
+    """
+    Divide un flujo de bytes en chunks cuyos límites dependen del contenido.
+
+    Los límites se eligen al final de una línea (en un volcado SQL, una fila o
+    una sentencia): una línea cierra el chunk si el CRC32 de su contenido, módulo
+    el tamaño medio, es menor que su longitud, es decir, con probabilidad
+    proporcional a sus bytes. Como la decisión solo depende de la línea, insertar
+    o borrar filas cambia los chunks vecinos y el resto vuelve a alinearse con
+    los del backup anterior. Las líneas que superan el tamaño máximo se cortan
+    en tamaños fijos.
+
+    Args:
+        min_size (int): Tamaño mínimo de un chunk (por defecto DatabaseConfig.CHUNK_MIN_BYTES)
+        avg_size (int): Tamaño medio esperado (por defecto DatabaseConfig.CHUNK_AVG_BYTES)
+        max_size (int): Tamaño máximo (por defecto DatabaseConfig.CHUNK_MAX_BYTES)
+    """
+
+    def __init__(self, min_size: Optional[int] = None, avg_size: Optional[int] = None,
+                 max_size: Optional[int] = None):
+        self.min_size = min_size or DatabaseConfig.CHUNK_MIN_BYTES
+        self.max_size = max_size or DatabaseConfig.CHUNK_MAX_BYTES
+        self._span = max(1, (avg_size or DatabaseConfig.CHUNK_AVG_BYTES) - self.min_size)
+        self._buf = b""
+        self._pos = 0  # siguiente byte a examinar
+        self._line_start = 0
+
+    def feed(self, data: bytes) -> Iterator[bytes]:
+        """Agrega datos y entrega los chunks que quedan cerrados."""
+        buf = self._buf + data if self._buf else bytes(data)
+        start, pos, line_start = 0, self._pos, self._line_start
+        min_size, max_size, span = self.min_size, self.max_size, self._span
+        while True:
+            if pos - start < min_size - 1:
+                # Ninguna línea que termine antes del mínimo puede cerrar el chunk
+                pos = start + min_size - 1
+                if pos > len(buf):
+                    break
+                line_start = buf.rfind(b"\n", start, pos) + 1 or start
+            newline = buf.find(b"\n", pos, start + max_size)
+            if newline == -1:
+                if len(buf) - start < max_size:
+                    break
+                # Línea más larga que el máximo: corte de tamaño fijo
+                start = line_start = pos = start + max_size
+                yield buf[start - max_size:start]
+                continue
+            end = newline + 1
+            if zlib.crc32(buf[line_start:end]) % span < end - line_start:
+                yield buf[start:end]
+                start = end
+            line_start = pos = end
+
+        self._buf = buf[start:]
+        self._pos = len(self._buf)
+        self._line_start = line_start - start
+
+    def finish(self) -> Iterator[bytes]:
+        """Entrega el último chunk incompleto."""
+        if self._buf:
+            yield self._buf
+        self._buf, self._pos, self._line_start = b"", 0, 0
+
+
+class ChunkStore:
+    """
+    Almacén de chunks direccionado por contenido.
+
+    Cada chunk se guarda en `<raíz>/<2 primeros caracteres del hash>/<hash><extensión del códec>`
+    con escritura atómica (archivo temporal, fsync y renombrado). Los backups en
+    curso toman un bloqueo compartido sobre el almacén y la recolección de
+    basura uno exclusivo, de modo que nunca se borra un chunk que un backup
+    acaba de reutilizar.
+
+    Args:
+        root (str): Directorio del almacén (por defecto DatabaseConfig.CHUNK_STORE_DIR)
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        self.root = root or DatabaseConfig.CHUNK_STORE_DIR
+        os.makedirs(self.root, exist_ok=True)
+        self._lock = None
+
+    def chunk_path(self, digest: str, codec: Codec) -> str:
+        return os.path.join(self.root, digest[:2], digest + codec.extension)
+
+    def lock(self, exclusive: bool = False, wait: bool = True) -> bool:
+        """
+        Toma el bloqueo del almacén.
+
+        Returns:
+            bool: False si `wait` es False y el bloqueo está tomado
+        """
+        self._lock = open(os.path.join(self.root, ".lock"), 'a')
+        flags = (fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH) | (0 if wait else fcntl.LOCK_NB)
+        try:
+            fcntl.flock(self._lock, flags)
+        except BlockingIOError:
+            self.unlock()
+            return False
+        return True
+
+    def unlock(self):
+        if self._lock is not None:
+            self._lock.close()
+            self._lock = None
+
+    def put(self, data: bytes, codec: Codec, level: Optional[int] = None) -> Tuple[str, int]:
+        """
+        Guarda un chunk si no existe.
+
+        Returns:
+            tuple: (hash del chunk, bytes escritos en disco; 0 si ya existía)
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        return digest, self.write(digest, data, codec, level)
+
+    def write(self, digest: str, data: bytes, codec: Codec, level: Optional[int] = None) -> int:
+        """
+        Guarda un chunk de hash conocido si no existe.
+
+        Returns:
+            int: Bytes escritos en disco (0 si ya existía)
+        """
+        path = self.chunk_path(digest, codec)
+        if os.path.exists(path):
+            return 0
+
+        buffer = io.BytesIO()
+        stream = codec.writer(buffer, level)
+        stream.write(data)
+        stream.close()
+        compressed = buffer.getvalue()
+
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+        with open(tmp, 'wb') as f:
+            f.write(compressed)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        return len(compressed)
+
+    def get(self, digest: str, codec: Codec) -> bytes:
+        """
+        Lee y descomprime un chunk, verificando su hash.
+
+        Raises:
+            ValueError: Si el chunk no existe o su contenido no coincide con el hash
+        """
+        path = self.chunk_path(digest, codec)
+        try:
+            with open(path, 'rb') as f:
+                data = codec.reader(io.BytesIO(f.read())).read()
+        except FileNotFoundError:
+            raise ValueError(f"Falta el chunk {digest} en {self.root}")
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise ValueError(f"El chunk {digest} está dañado")
+        return data
+
+    def iter_chunks(self) -> Iterator[Tuple[str, int]]:
+        """Itera (ruta, tamaño) de todos los chunks almacenados."""
+        for path in glob.glob(os.path.join(self.root, "??", "*")):
+            yield path, os.path.getsize(path)
+
+
+class ChunkedBackupWriter:
+    """
+    Escritor de backups sobre el almacén de chunks.
+
+    Tiene la misma interfaz que BackupWriter: el texto se divide en chunks a
+    medida que se escribe, los chunks nuevos se comprimen y se guardan en un
+    grupo de hilos (zlib y los demás códecs liberan el GIL), y al cerrar se
+    escribe la receta de forma atómica. `bytes_out` son los bytes
+    nuevos escritos en el almacén, y `sha256` es el hash de la receta.
+
+    Args:
+        path (str): Ruta de la receta (extensión .recipe)
+        codec (str): Códec de compresión de los chunks (por defecto DatabaseConfig.BACKUP_CODEC)
+        level (int): Nivel de compresión
+        threads (int): Hilos que comprimen y escriben chunks (por defecto DatabaseConfig.CHUNK_WORKERS)
+        store (ChunkStore): Almacén de chunks
+    """
+
+    def __init__(self, path: str, codec: Optional[str] = None, level: Optional[int] = None,
+                 threads: Optional[int] = None, store: Optional[ChunkStore] = None):
+        self.path = path
+        self.codec = get_codec(codec)
+        self.level = DatabaseConfig.BACKUP_COMPRESSION_LEVEL if level is None else level
+        self.store = store or ChunkStore()
+        self.store.lock()
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.new_chunks = 0
+        self.sha256 = None
+        self.closed = False
+        self._chunker = ContentChunker()
+        self._chunks = []
+        self.frames = []  # los chunks permiten leer desde cualquier posición
+        workers = threads or DatabaseConfig.CHUNK_WORKERS
+        self._pool = ThreadPoolExecutor(max_workers=workers)
+        self._pending = deque()
+        self._max_pending = 2 * workers
+        self._started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def write(self, text: str):
+        """Escribe texto en el backup."""
+        self.write_bytes(text.encode('utf-8'))
+
+    def write_bytes(self, data: bytes):
+        """Escribe bytes sin comprimir en el backup."""
+        self.bytes_in += len(data)
+        for chunk in self._chunker.feed(data):
+            self._store(chunk)
+
+    def _store(self, chunk: bytes):
+        # Cola acotada: la memoria retenida no pasa de unos pocos chunks por hilo
+        while len(self._pending) >= self._max_pending:
+            self._collect(self._pending.popleft())
+        self._pending.append((len(chunk), self._pool.submit(self.store.put, chunk, self.codec, self.level)))
+
+    def _collect(self, pending):
+        size, future = pending
+        digest, written = future.result()
+        self._chunks.append((digest, size))
+        if written:
+            self.new_chunks += 1
+            self.bytes_out += written
+
+    def _drain(self):
+        while self._pending:
+            self._collect(self._pending.popleft())
+
+    def append_part(self, part: BackupWriter):
+        """Anexa un archivo parcial ya cerrado (escrito sin compresión por part_writer)."""
+        with open(part.path, 'rb') as src:
+            while True:
+                data = src.read(DatabaseConfig.RESTORE_BUFFER_SIZE)
+                if not data:
+                    break
+                self.write_bytes(data)
+
+    def start_frame(self) -> int:
+        """Posición (en bytes sin comprimir) donde empieza lo siguiente que se escriba."""
+        return self.bytes_in
+
+    def part_writer(self, path: str) -> BackupWriter:
+        """Crea un escritor para un archivo parcial sin compresión ni cifrado (se divide en chunks al anexarlo)."""
+        return BackupWriter(path, "none", encrypt=False)
+
+    @property
+    def dedup_ratio(self) -> float:
+        """Bytes lógicos del backup por byte nuevo escrito en el almacén."""
+        return self.bytes_in / max(1, self.bytes_out)
+
+    def close(self):
+        """Guarda el último chunk y escribe la receta."""
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            for chunk in self._chunker.finish():
+                self._store(chunk)
+            self._drain()
+            _fsync_directories(self.store.root)
+            header = {
+                'format': RECIPE_FORMAT, 'codec': self.codec.name, 'bytes': self.bytes_in,
+                'chunks': len(self._chunks), 'store': os.path.relpath(self.store.root,
+                                                                      os.path.dirname(self.path) or "."),
+            }
+            lines = [json.dumps(header)] + [f"{digest} {size}" for digest, size in self._chunks]
+            data = ("\n".join(lines) + "\n").encode('utf-8')
+            tmp = f"{self.path}.tmp"
+            with open(tmp, 'wb') as f:
+                f.write(data)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.path)
+            self.sha256 = hashlib.sha256(data).hexdigest()
+            self.bytes_out += len(data)
+        finally:
+            self._pool.shutdown()
+            self.store.unlock()
+            self.elapsed = time.perf_counter() - self._started
+
+    def report(self) -> dict:
+        """Estadísticas de deduplicación e ingesta del backup."""
+        return {
+            'bytes_in': self.bytes_in,
+            'bytes_written': self.bytes_out,
+            'chunks': len(self._chunks),
+            'new_chunks': self.new_chunks,
+            'dedup_ratio': self.dedup_ratio,
+            'ingest_mb_s': self.bytes_in / 1024 / 1024 / max(self.elapsed, 1e-9),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if exc[0] is not None:
+            # Sin receta: los chunks ya escritos quedan para la recolección de basura
+            self.closed = True
+            self._pool.shutdown(cancel_futures=True)
+            self.store.unlock()
+            return
+        self.close()
+
+
+def _fsync_directories(root: str):
+    """Sincroniza los directorios del almacén para que los renombrados sean durables."""
+    for path in [root] + glob.glob(os.path.join(root, "??")):
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+
+def read_recipe(path: str) -> Tuple[dict, List[Tuple[str, int]]]:
+    """
+    Lee una receta.
+
+    Returns:
+        tuple: (cabecera, lista de (hash, tamaño sin comprimir))
+
+    Raises:
+        ValueError: Si el archivo no es una receta
+    """
+    with open(path, 'r') as f:
+        header = json.loads(f.readline() or "{}")
+        if header.get('format') != RECIPE_FORMAT:
+            raise ValueError(f"{path} no es una receta de backup")
+        chunks = [(digest, int(size)) for digest, size in (line.split() for line in f if line.strip())]
+    return header, chunks
+
+
+class ChunkedReader:
+    """
+    Stream de lectura que reconstruye un backup a partir de su receta.
+
+    Los chunks se leen, se descomprimen y se verifican de a uno, por lo que la
+    memoria usada no depende del tamaño del backup. `raw.tell()` indica los
+    bytes lógicos entregados (para el progreso de la restauración).
+    """
+
+    def __init__(self, path: str):
+        header, self._chunks = read_recipe(path)
+        self.codec = get_codec(header['codec'])
+        self.store = ChunkStore(os.path.normpath(os.path.join(os.path.dirname(path) or ".", header['store'])))
+        self.size = header['bytes']
+        self.raw = self
+        self._index = 0
+        self._current = b""
+        self._offset = 0
+        self._position = 0
+        self._closed = False
+
+    def read(self, size: int = -1) -> bytes:
+        parts = []
+        remaining = self.size if size is None or size < 0 else size
+        while remaining > 0:
+            if self._offset >= len(self._current):
+                if self._index >= len(self._chunks):
+                    break
+                digest, _ = self._chunks[self._index]
+                self._current = self.store.get(digest, self.codec)
+                self._index += 1
+                self._offset = 0
+                continue
+            part = self._current[self._offset:self._offset + remaining]
+            self._offset += len(part)
+            remaining -= len(part)
+            parts.append(part)
+        data = b"".join(parts)
+        self._position += len(data)
+        return data
+
+    def seek(self, offset: int) -> int:
+        """Se posiciona en un byte del backup, cargando solo el chunk que lo contiene."""
+        start = 0
+        for index, (_, size) in enumerate(self._chunks):
+            if start + size > offset:
+                break
+            start += size
+        else:
+            index = len(self._chunks)
+        self._index, self._current, self._offset = index, b"", 0
+        if index < len(self._chunks):
+            self._current = self.store.get(self._chunks[index][0], self.codec)
+            self._index, self._offset = index + 1, offset - start
+        self._position = min(offset, self.size)
+        return self._position
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readable(self) -> bool:
+        return True
+
+    def tell(self) -> int:
+        return self._position
+
+    @property
+    def closed(self) -> bool:
+        return self._closed
+
+    def close(self):
+        self._closed = True
+        self._current = b""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def _recipes(backup_dir: Optional[str] = None) -> List[str]:
+    return sorted(glob.glob(os.path.join(backup_dir or DatabaseConfig.BACKUP_DIR, f"*{RECIPE_EXTENSION}")))
+
+
+def collect_garbage(store: Optional[ChunkStore] = None, backup_dir: Optional[str] = None) -> Optional[dict]:
+    """
+    Borra los chunks que ninguna receta referencia.
+
+    Args:
+        store (ChunkStore): Almacén a limpiar
+        backup_dir (str): Directorio con las recetas (por defecto DatabaseConfig.BACKUP_DIR)
+
+    Returns:
+        dict: Chunks y bytes borrados, o None si hay un backup en curso
+    """
+    store = store or ChunkStore()
+    if not store.lock(exclusive=True, wait=False):
+        print("Hay un backup en curso sobre el almacén de chunks; se omite la recolección de basura")
+        return None
+    try:
+        referenced = set()
+        for recipe in _recipes(backup_dir):
+            header, chunks = read_recipe(recipe)
+            codec = get_codec(header['codec'])
+            referenced.update(store.chunk_path(digest, codec) for digest, _ in chunks)
+
+        removed, freed = 0, 0
+        for path, size in store.iter_chunks():
+            if path not in referenced:
+                os.remove(path)
+                removed += 1
+                freed += size
+    finally:
+        store.unlock()
+    print(f"Recolección de basura: {removed} chunks borrados ({freed} bytes liberados)")
+    return {'removed': removed, 'bytes_freed': freed}
+
+
+def store_stats(store: Optional[ChunkStore] = None, backup_dir: Optional[str] = None) -> dict:
+    """
+    Calcula la deduplicación del almacén: bytes lógicos de todas las recetas
+    frente a los bytes que ocupan los chunks en disco.
+    """
+    store = store or ChunkStore()
+    recipes = _recipes(backup_dir)
+    logical = sum(read_recipe(recipe)[0]['bytes'] for recipe in recipes)
+    chunks, physical = 0, 0
+    for _, size in store.iter_chunks():
+        chunks += 1
+        physical += size
+    return {
+        'recipes': len(recipes), 'logical_bytes': logical, 'chunks': chunks,
+        'stored_bytes': physical, 'dedup_ratio': logical / max(1, physical),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--gc", action="store_true", help="Borrar los chunks sin referencias")
+    parser.add_argument("--stats", action="store_true", help="Mostrar la deduplicación del almacén")
+    args = parser.parse_args()
+
+    if args.gc:
+        collect_garbage()
+    if args.stats or not args.gc:
+        stats = store_stats()
+        print(f"Recetas: {stats['recipes']}, chunks: {stats['chunks']}")
+        print(f"Bytes lógicos: {stats['logical_bytes']}, en disco: {stats['stored_bytes']} "
+              f"(deduplicación {stats['dedup_ratio']:.2f}x)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,479 @@
+"""
+Módulo de compresión de archivos de backup.
+Define códecs intercambiables (gzip, zstd, lz4) que comprimen mientras se
+escribe el backup y descomprimen mientras se restaura, sin archivos temporales
+sin comprimir. Los códecs opcionales solo están disponibles si su biblioteca
+está instalada (`zstandard`, `lz4`). Con cifrado, el flujo comprimido se cifra
+antes de llegar a disco (src/backup/encryption.py) y los lectores lo descifran
+de forma transparente.
+"""
+import gzip
+import hashlib
+import os
+import shutil
+import subprocess
+from typing import Any, Callable, Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - dependencia opcional
+    zstandard = None
+
+try:
+    import lz4.frame
+except ImportError:  # pragma: no cover - dependencia opcional
+    lz4 = None
+
+from src.backup.encryption import MAGIC as ENCRYPTION_MAGIC, DecryptingFile, EncryptingFile
+from src.db.config import DatabaseConfig
+
+READ_BUFFER_SIZE = 1024 * 1024
+RECIPE_EXTENSION = ".recipe"  # Backups guardados en el almacén de chunks (src/backup/chunks.py)
+
+
+class Codec:
+    """Códec sin compresión; base del resto de códecs."""
+    name = "none"
+    extension = ""
+    magic = b""
+
+    def available(self) -> bool:
+        return True
+
+    def writer(self, raw, level: Optional[int] = None, threads: Optional[int] = None):
+        """Retorna un stream binario que comprime hacia `raw` sin cerrarlo al finalizar."""
+        return _Passthrough(raw)
+
+    def reader(self, raw):
+        """Retorna un stream binario que descomprime desde `raw`."""
+        return raw
+
+
+class GzipCodec(Codec):
+    name = "gzip"
+    extension = ".gz"
+    magic = b"\x1f\x8b"
+
+    def writer(self, raw, level=None, threads=None):
+        # gzip no soporta compresión multihilo; `threads` se ignora
+        return gzip.GzipFile(fileobj=raw, mode='wb', compresslevel=6 if level is None else level)
+
+    def reader(self, raw):
+        return gzip.GzipFile(fileobj=raw, mode='rb')
+
+
+class ZstdCodec(Codec):
+    name = "zstd"
+    extension = ".zst"
+    magic = b"\x28\xb5\x2f\xfd"
+
+    def available(self):
+        return zstandard is not None
+
+    def writer(self, raw, level=None, threads=None):
+        compressor = zstandard.ZstdCompressor(level=3 if level is None else level, threads=threads or 0)
+        return compressor.stream_writer(raw, closefd=False)
+
+    def reader(self, raw):
+        return zstandard.ZstdDecompressor().stream_reader(raw, read_across_frames=True)
+
+
+class Lz4Codec(Codec):
+    name = "lz4"
+    extension = ".lz4"
+    magic = b"\x04\x22\x4d\x18"
+
+    def available(self):
+        return lz4 is not None
+
+    def writer(self, raw, level=None, threads=None):
+        # lz4 no soporta compresión multihilo; `threads` se ignora
+        return lz4.frame.LZ4FrameFile(raw, mode='wb', compression_level=0 if level is None else level)
+
+    def reader(self, raw):
+        return lz4.frame.LZ4FrameFile(raw, mode='rb')
+
+
+class _HashingFile:
+    """Archivo de escritura que calcula el SHA-256 de los bytes que llegan a disco."""
+
+    def __init__(self, raw):
+        self._raw = raw
+        self.hash = hashlib.sha256()
+
+    def write(self, data):
+        self.hash.update(data)
+        return self._raw.write(data)
+
+    def flush(self):
+        self._raw.flush()
+
+    def tell(self):
+        return self._raw.tell()
+
+    def fileno(self):
+        return self._raw.fileno()
+
+    @property
+    def closed(self):
+        return self._raw.closed
+
+    def close(self):
+        self._raw.close()
+
+
+class _Passthrough:
+    """Stream de escritura que no comprime ni cierra el archivo subyacente."""
+
+    def __init__(self, raw):
+        self._raw = raw
+
+    def write(self, data):
+        return self._raw.write(data)
+
+    def flush(self):
+        self._raw.flush()
+
+    def close(self):
+        pass
+
+
+CODECS = {codec.name: codec for codec in (Codec(), GzipCodec(), ZstdCodec(), Lz4Codec())}
+
+
+def get_codec(name: Optional[str] = None) -> Codec:
+    """
+    Obtiene un códec por nombre.
+
+    Args:
+        name (str): 'none', 'gzip', 'zstd' o 'lz4' (por defecto DatabaseConfig.BACKUP_CODEC)
+
+    Returns:
+        Codec: Códec solicitado
+
+    Raises:
+        ValueError: Si el códec no existe o su biblioteca no está instalada
+    """
+    name = (name or DatabaseConfig.BACKUP_CODEC).lower()
+    codec = CODECS.get(name)
+    if codec is None:
+        raise ValueError(f"Códec no soportado: {name}")
+    if not codec.available():
+        raise ValueError(f"El códec {name} requiere una biblioteca que no está instalada")
+    return codec
+
+
+def detect_codec(path: str) -> Codec:
+    """
+    Detecta el códec de un archivo de backup a partir de sus primeros bytes.
+
+    Args:
+        path (str): Ruta al archivo
+
+    Returns:
+        Codec: Códec del archivo ('none' si no está comprimido)
+    """
+    with _open_raw(path, workers=0) as f:
+        header = f.read(4)
+    for codec in CODECS.values():
+        if codec.magic and header.startswith(codec.magic):
+            if not codec.available():
+                raise ValueError(f"El archivo {path} usa {codec.name}, cuya biblioteca no está instalada")
+            return codec
+    return CODECS["none"]
+
+
+class BackupWriter:
+    """
+    Escritor de archivos de backup con compresión en línea.
+
+    El texto se codifica y se comprime a medida que se escribe. Se pueden
+    anexar archivos parciales ya comprimidos con el mismo códec (por ejemplo,
+    los escritos por los workers de un backup paralelo): gzip, zstd y lz4
+    admiten la concatenación de frames, así que se copian sin recomprimir.
+    Al cerrar, el archivo se sincroniza a disco y `sha256` contiene el hash
+    del archivo tal como quedó escrito (comprimido y, si corresponde, cifrado).
+    `frames` registra dónde empieza cada frame, para poder leer una sección sin
+    descomprimir las anteriores (ver open_backup_reader_at). Con cifrado, las
+    posiciones de los frames son del flujo comprimido antes de cifrar.
+    """
+
+    def __init__(self, path: str, codec: Optional[str] = None, level: Optional[int] = None,
+                 threads: Optional[int] = None, encrypt: Optional[bool] = None):
+        self.path = path
+        self.codec = get_codec(codec)
+        self.level = DatabaseConfig.BACKUP_COMPRESSION_LEVEL if level is None else level
+        self.threads = DatabaseConfig.BACKUP_COMPRESSION_THREADS if threads is None else threads
+        self.encrypt = DatabaseConfig.BACKUP_ENCRYPTION if encrypt is None else encrypt
+        self.bytes_in = 0
+        self._file = _HashingFile(open(path, 'wb'))
+        self._raw = self._file
+        if self.encrypt:
+            try:
+                self._raw = EncryptingFile(self._file)
+            except Exception:
+                self._file.close()
+                os.remove(path)
+                raise
+        self._frame = None
+        self._size = 0
+        self.frames = []  # (byte sin comprimir, byte en el archivo) del inicio de cada frame
+
+    def write(self, text: str):
+        """Escribe texto en el backup."""
+        self.write_bytes(text.encode('utf-8'))
+
+    def write_bytes(self, data: bytes):
+        """Escribe bytes sin comprimir en el backup."""
+        if self._frame is None:
+            self._mark_frame()
+            self._frame = self.codec.writer(self._raw, self.level, self.threads)
+        self._frame.write(data)
+        self.bytes_in += len(data)
+
+    def append_part(self, part: 'BackupWriter'):
+        """
+        Anexa un archivo parcial ya cerrado, escrito con el mismo códec.
+
+        Args:
+            part (BackupWriter): Escritor del archivo parcial
+        """
+        self._close_frame()
+        self._mark_frame()
+        # Un archivo parcial cifrado tiene su propia clave de archivo: se descifra y se vuelve a cifrar
+        with _open_raw(part.path) as src:
+            shutil.copyfileobj(src, self._raw, READ_BUFFER_SIZE)
+        self.bytes_in += part.bytes_in
+
+    def part_writer(self, path: str) -> 'BackupWriter':
+        """Crea un escritor para un archivo parcial con el mismo códec, nivel y cifrado."""
+        return BackupWriter(path, self.codec.name, self.level, self.threads, self.encrypt)
+
+    @property
+    def bytes_out(self) -> int:
+        """Bytes escritos en disco hasta el momento."""
+        return self._size if self._file.closed else self._file.tell()
+
+    def start_frame(self) -> int:
+        """
+        Termina el frame actual para que lo siguiente pueda leerse sin descomprimir lo anterior.
+
+        Returns:
+            int: Posición (en bytes sin comprimir) donde empieza lo siguiente que se escriba
+        """
+        self._close_frame()
+        return self.bytes_in
+
+    def _mark_frame(self):
+        if not self.frames or self.frames[-1][0] != self.bytes_in:
+            self.frames.append((self.bytes_in, self._raw.tell()))
+
+    def _close_frame(self):
+        if self._frame is not None:
+            self._frame.close()
+            self._frame = None
+
+    def close(self):
+        """Finaliza la compresión y cierra el archivo."""
+        if self._file.closed:
+            return
+        self._close_frame()
+        if self.encrypt:
+            self._raw.finish()
+        self._size = self._file.tell()
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+
+    @property
+    def sha256(self) -> str:
+        """Hash SHA-256 (hexadecimal) del contenido escrito en disco."""
+        return self._file.hash.hexdigest()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def backup_filename(base: str, codec: Optional[str] = None) -> str:
+    """
+    Agrega al nombre base la extensión del códec.
+
+    Args:
+        base (str): Ruta sin extensión de compresión (p. ej. 'backups/backup_completo_X.sql')
+        codec (str): Nombre del códec
+
+    Returns:
+        str: Ruta con la extensión del códec (p. ej. '.sql.gz')
+    """
+    return base + get_codec(codec).extension
+
+
+def _open_raw(path: str, workers: Optional[int] = None):
+    """Abre un archivo de backup en modo binario; si está cifrado, retorna su contenido descifrado."""
+    raw = open(path, 'rb')
+    if raw.read(len(ENCRYPTION_MAGIC)) != ENCRYPTION_MAGIC:
+        raw.seek(0)
+        return raw
+    try:
+        return DecryptingFile(raw, workers=workers)
+    except Exception:
+        raw.close()
+        raise
+
+
+def open_backup_reader(path: str):
+    """
+    Abre un archivo de backup para lectura, descifrando y descomprimiendo en línea.
+
+    Args:
+        path (str): Ruta al archivo
+
+    Returns:
+        stream: Stream binario con el contenido sin comprimir
+    """
+    if path.endswith(RECIPE_EXTENSION):
+        from src.backup.chunks import ChunkedReader  # chunks depende de este módulo
+        return ChunkedReader(path)
+    codec = detect_codec(path)
+    raw = _open_raw(path)
+    if codec.name == "none":
+        return raw
+    return _ClosingReader(codec.reader(raw), raw)
+
+
+def open_backup_reader_at(path: str, offset: int, frames: Optional[list] = None):
+    """
+    Abre un archivo de backup para leer desde una posición del contenido sin comprimir.
+
+    Sin compresión (y en las recetas del almacén de chunks) se posiciona
+    directamente; comprimido, empieza a descomprimir en el último frame que
+    empieza antes de `offset` y descarta lo que falte hasta llegar. Si el
+    archivo está cifrado, se descifra desde el registro que contiene ese frame.
+
+    Args:
+        path (str): Ruta del backup
+        offset (int): Byte del contenido sin comprimir desde el que leer
+        frames (list): Pares (byte sin comprimir, byte en el archivo) del inicio de cada frame
+
+    Returns:
+        stream: Stream binario posicionado en `offset`
+    """
+    if path.endswith(RECIPE_EXTENSION):
+        from src.backup.chunks import ChunkedReader
+        reader = ChunkedReader(path)
+        reader.seek(offset)
+        return reader
+    codec = detect_codec(path)
+    raw = _open_raw(path)
+    if codec.name == "none":
+        raw.seek(offset)
+        return raw
+    start, position = max((frame for frame in frames or [] if frame[0] <= offset), default=(0, 0))
+    raw.seek(position)
+    reader = _ClosingReader(codec.reader(raw), raw)
+    remaining = offset - start
+    while remaining:
+        data = reader.read(min(READ_BUFFER_SIZE, remaining))
+        if not data:
+            break
+        remaining -= len(data)
+    return reader
+
+
+def backup_size(path: str) -> int:
+    """
+    Tamaño de un backup tal como lo recorre su lector (para medir el progreso).
+
+    Para una receta del almacén de chunks son los bytes lógicos del backup; para
+    un archivo cifrado, los del flujo comprimido; para el resto, el tamaño del archivo.
+    """
+    if path.endswith(RECIPE_EXTENSION):
+        from src.backup.chunks import read_recipe
+        return read_recipe(path)[0]['bytes']
+    with _open_raw(path, workers=0) as raw:
+        if isinstance(raw, DecryptingFile):
+            return raw.length
+    return os.path.getsize(path)
+
+
+class _ClosingReader:
+    """Stream de lectura que cierra también el archivo subyacente."""
+
+    def __init__(self, stream, raw):
+        self._stream = stream
+        self.raw = raw
+
+    def read(self, size: int = -1) -> bytes:
+        return self._stream.read(size)
+
+    def readinto(self, buffer) -> int:
+        data = self._stream.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def readable(self) -> bool:
+        return True
+
+    @property
+    def closed(self) -> bool:
+        return self.raw.closed
+
+    def close(self):
+        try:
+            self._stream.close()
+        finally:
+            self.raw.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def iter_lines(reader) -> Iterator[bytes]:
+    """Itera las líneas (en bytes, con su salto de línea) de un stream binario leyendo en bloques."""
+    pending = b""
+    while True:
+        data = reader.read(READ_BUFFER_SIZE)
+        if not data:
+            break
+        lines = (pending + data).split(b"\n")
+        pending = lines.pop()
+        for line in lines:
+            yield line + b"\n"
+    if pending:
+        yield pending
+
+
+def stream_to_process(path: str, command: list, transform: Optional[Callable[[Any], Iterator[bytes]]] = None):
+    """
+    Envía el contenido descomprimido de un backup a la entrada estándar de un proceso.
+
+    Args:
+        path (str): Ruta al archivo de backup
+        command (list): Comando a ejecutar (p. ej. el cliente mysql)
+        transform (callable): Recibe el stream descomprimido y produce los bytes a enviar
+                              (por defecto se envía el contenido completo)
+
+    Raises:
+        subprocess.CalledProcessError: Si el proceso termina con error
+    """
+    with open_backup_reader(path) as reader:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE)
+        try:
+            if transform is None:
+                shutil.copyfileobj(reader, process.stdin, READ_BUFFER_SIZE)
+            else:
+                for data in transform(reader):
+                    process.stdin.write(data)
+        except BrokenPipeError:
+            pass
+        finally:
+            process.stdin.close()
+            returncode = process.wait()
+    if returncode != 0:
+        raise subprocess.CalledProcessError(returncode, command)
@@ -0,0 +1,299 @@
+"""
+Simulacros de recuperación (drills) con medición de RTO y RPO.
+Cada escenario provoca un desastre con src/db/disaster_simulator.py, lo
+recupera con el camino de restauración que le corresponde y verifica el
+resultado contra los checksums de las tablas afectadas tomados justo antes:
+
+    delete_rows     filas borradas al azar     -> restauración parcial del rango de clave afectado
+    corrupt_column  una columna alterada       -> restauración parcial del rango de clave afectado
+    drop_table      una tabla eliminada        -> restauración parcial de la tabla
+    full_wipe       todas las tablas eliminadas -> restauración completa (+ incrementales con --incremental)
+
+RTO medido: segundos desde el desastre hasta los datos restaurados y verificados
+(la detección es inmediata en un simulacro). RPO medido: segundos entre el punto
+de recuperación (snapshot del backup completo o final del último incremental
+aplicado) y el desastre; las filas que difieren del estado previo son los datos
+perdidos. Cada escenario se compara con DRILL_RTO_TARGET y DRILL_RPO_TARGET.
+
+Los simulacros corren sin pausas ni intervención y modifican la base de datos
+configurada: usar solo contra el MySQL local de docker-compose.
+
+Uso:
+    python3 -m src.backup.drill
+    python3 -m src.backup.drill --scenario drop_table --scenario full_wipe --incremental --seed 7
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from src.backup.catalog import BackupCatalog
+from src.backup.full import create_full_backup, restore_full_backup
+from src.backup.incremental import create_incremental_backup, restore_incremental_backup
+from src.backup.partial import restore_tables
+from src.backup.verify import compute_checksums, verify_checksums
+from src.db import metrics
+from src.db.config import DatabaseConfig
+from src.db.disaster_simulator import corrupt_column, delete_random_rows, simulate_disaster
+from src.db.pool import close_pool, get_pool
+from src.db.schema import get_schema
+
+SCENARIOS = ('delete_rows', 'corrupt_column', 'drop_table', 'full_wipe')
+
+
+def table_checksums(tables: List[str]) -> List[dict]:
+    """Checksums por rango de las tablas indicadas, con conexiones dedicadas."""
+    pool = get_pool()
+    connections = [pool.new_connection() for _ in range(max(1, DatabaseConfig.VERIFY_WORKERS))]
+    try:
+        return compute_checksums(tables, connections)
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def choose_table(scenario: str, rng: random.Random, table: Optional[str] = None) -> Optional[str]:
+    """Tabla del escenario: la indicada o una al azar (con clave primaria de una columna si hace falta)."""
+    if scenario == 'full_wipe':
+        return None
+    if table is not None:
+        return table
+    schema = get_schema()
+    tables = schema.tables()
+    if scenario in ('delete_rows', 'corrupt_column'):
+        tables = [name for name in tables if len(schema.primary_key(name)) == 1]
+    if not tables:
+        raise ValueError(f"No hay tablas para el escenario {scenario}")
+    return rng.choice(tables)
+
+
+def inject(scenario: str, table: Optional[str], rng: random.Random) -> dict:
+    """Provoca el desastre del escenario y retorna lo afectado."""
+    seed = rng.randrange(2 ** 31)
+    if scenario == 'delete_rows':
+        return delete_random_rows(table, DatabaseConfig.DRILL_DELETE_FRACTION, seed)
+    if scenario == 'corrupt_column':
+        return corrupt_column(table, fraction=DatabaseConfig.DRILL_CORRUPT_FRACTION, seed=seed)
+    tables = [table] if scenario == 'drop_table' else None
+    success, results = simulate_disaster(tables, "DROP")
+    if not success:
+        raise RuntimeError(f"La simulación del desastre falló: {results.get('failed_tables') or results.get('error')}")
+    return {'tables': results['affected_tables']}
+
+
+def _tables_restored(results: List[dict], tables: List[str]) -> bool:
+    """Indica si restore_tables aplicó sentencias en cada una de las tablas pedidas."""
+    restored = {result['table'] for result in results if result['statements']}
+    return restored >= set(tables)
+
+
+def recover(scenario: str, affected: dict, full: dict, incremental: Optional[dict]) -> bool:
+    """Ejecuta el camino de restauración del escenario y retorna si terminó correctamente."""
+    if scenario == 'full_wipe':
+        if incremental is not None:
+            return restore_incremental_backup(incremental['path'])
+        return restore_full_backup(full['path'], verify=False)
+    if scenario == 'drop_table':
+        return _tables_restored(restore_tables(full['path'], affected['tables']), affected['tables'])
+    if not affected['rows']:
+        return True
+    key_range = (affected['start'], affected['end']) if affected['start'] is not None else None
+    return _tables_restored(restore_tables(full['path'], [affected['table']], key_range=key_range),
+                            [affected['table']])
+
+
+def run_drill(scenario: str, full: dict, rng: random.Random, table: Optional[str] = None,
+              incremental: Optional[dict] = None, rto_target: Optional[float] = None,
+              rpo_target: Optional[float] = None, exact: bool = True) -> dict:
+    """
+    Ejecuta un escenario: estado previo, desastre, restauración y verificación.
+
+    El escenario pasa si la restauración terminó, no falta ninguna tabla, se
+    cumplen el RTO y el RPO y, con `exact`, los checksums coinciden con el
+    estado previo (ninguna fila perdida).
+
+    Args:
+        scenario (str): Uno de SCENARIOS
+        full (dict): Registro del catálogo del backup completo a usar
+        rng (random.Random): Generador de la tabla y las filas afectadas
+        table (str): Tabla afectada (por defecto una al azar)
+        incremental (dict): Último incremental de la cadena (solo full_wipe)
+        rto_target (float): RTO objetivo en segundos (por defecto DatabaseConfig.DRILL_RTO_TARGET)
+        rpo_target (float): RPO objetivo en segundos (por defecto DatabaseConfig.DRILL_RPO_TARGET)
+        exact (bool): Exigir que no se pierdan filas; corresponde cuando el backup es de
+            justo antes del simulacro (con un backup anterior, lo escrito después se pierde)
+
+    Returns:
+        dict: Resultado del escenario (tiempos por fase, RTO, RPO, filas perdidas y veredicto)
+    """
+    rto_target = rto_target if rto_target is not None else DatabaseConfig.DRILL_RTO_TARGET
+    rpo_target = rpo_target if rpo_target is not None else DatabaseConfig.DRILL_RPO_TARGET
+    result = {'scenario': scenario, 'backup': full['path'], 'incremental': incremental and incremental['path'],
+              'phases': {}, 'rto_target': rto_target, 'rpo_target': rpo_target}
+
+    print(f"\n=== Simulacro {scenario} ===")
+    with metrics.run(f"drill_{scenario}") as run:
+        table = choose_table(scenario, rng, table)
+        tables = [table] if table else get_schema().tables()
+
+        started = time.perf_counter()
+        with metrics.phase('baseline'):
+            expected = table_checksums(tables)
+        result['phases']['baseline'] = time.perf_counter() - started
+
+        disaster_at = time.time()
+        started = time.perf_counter()
+        with metrics.phase('inject'):
+            affected = inject(scenario, table, rng)
+        result['phases']['inject'] = time.perf_counter() - started
+        result['affected'] = affected
+
+        recovery_started = time.perf_counter()
+        with metrics.phase('restore'):
+            restored = recover(scenario, affected, full, incremental)
+        result['phases']['restore'] = time.perf_counter() - recovery_started
+
+        started = time.perf_counter()
+        with metrics.phase('verify'):
+            report = verify_checksums(expected)
+        result['phases']['verify'] = time.perf_counter() - started
+
+        rows = {}
+        for record in expected:
+            rows[record['name']] = rows.get(record['name'], 0) + record['rows']
+        recovery_point = incremental['finished_at'] if incremental else full['started_at']
+        result.update(
+            restored=bool(restored),
+            rto=time.perf_counter() - recovery_started,
+            rpo=max(0.0, disaster_at - recovery_point),
+            lost_rows=sum(max(m['expected_rows'], m['actual_rows']) for m in report['mismatches'])
+                      + sum(rows.get(name, 0) for name in report['missing_tables']),
+            mismatched_ranges=len(report['mismatches']),
+            missing_tables=report['missing_tables'],
+        )
+        result['rto_met'] = result['rto'] <= rto_target
+        result['rpo_met'] = result['rpo'] <= rpo_target
+        result['exact'] = exact
+        result['passed'] = result['restored'] and not result['missing_tables'] and \
+            result['rto_met'] and result['rpo_met'] and not (exact and result['lost_rows'])
+        if run is not None:
+            run.event(event='drill', **{key: value for key, value in result.items() if key != 'phases'})
+            run.success = result['passed']
+    return result
+
+
+def run_drills(scenarios: List[str], table: Optional[str] = None, seed: Optional[int] = None,
+               new_backup: bool = True, incremental: bool = False, rto_target: Optional[float] = None,
+               rpo_target: Optional[float] = None) -> List[dict]:
+    """
+    Ejecuta los escenarios en orden sobre el mismo backup completo.
+
+    Args:
+        scenarios (list): Escenarios a ejecutar (ver SCENARIOS)
+        table (str): Tabla afectada por los escenarios de una tabla (por defecto una al azar por escenario)
+        seed (int): Semilla para repetir la elección de tablas y filas
+        new_backup (bool): Crear un backup completo antes de los simulacros; si es False se usa
+            el más reciente del catálogo (el RPO medido refleja su antigüedad)
+        incremental (bool): Crear un incremental antes de full_wipe y restaurar la cadena completa
+        rto_target (float): RTO objetivo en segundos
+        rpo_target (float): RPO objetivo en segundos
+
+    Returns:
+        list: Resultado de run_drill por escenario
+
+    Raises:
+        RuntimeError: Si no hay un backup completo con el que recuperar
+    """
+    rng = random.Random(seed)
+    catalog = BackupCatalog()
+    if new_backup:
+        backup_file, _ = create_full_backup(store="file", dump_format="sql", change_detection="none")
+        if not backup_file:
+            raise RuntimeError("No se pudo crear el backup completo de los simulacros")
+        full = catalog.find(backup_file)
+    else:
+        full = catalog.latest_full()
+    if full is None:
+        raise RuntimeError("El catálogo no tiene un backup completo")
+    print(f"Backup completo de los simulacros: {full['path']}")
+
+    results = []
+    for scenario in scenarios:
+        last = None
+        if incremental and scenario == 'full_wipe':
+            backup_file, _, _ = create_incremental_backup()
+            if not backup_file:
+                raise RuntimeError("No se pudo crear el backup incremental del simulacro")
+            last = catalog.find(backup_file)
+        try:
+            # Un backup (o incremental) recién creado debe recuperar el estado previo sin pérdidas
+            results.append(run_drill(scenario, full, rng, table, last, rto_target, rpo_target,
+                                     exact=new_backup or last is not None))
+        except Exception as e:
+            print(f"Error en el simulacro {scenario}: {e}")
+            results.append({'scenario': scenario, 'backup': full['path'], 'passed': False, 'error': str(e)})
+    return results
+
+
+def print_results(results: List[dict]):
+    """Muestra una línea por escenario con RTO y RPO medidos contra sus objetivos."""
+    print("\n=== Resultados de los simulacros ===")
+    for result in results:
+        if 'error' in result:
+            print(f"{result['scenario']:<15} ERROR  {result['error']}")
+            continue
+        phases = ", ".join(f"{name} {seconds:.1f}s" for name, seconds in result['phases'].items())
+        print(f"{result['scenario']:<15} {'OK   ' if result['passed'] else 'FALLA'}  "
+              f"RTO {result['rto']:7.1f}s (objetivo {result['rto_target']}s)  "
+              f"RPO {result['rpo']:9.1f}s (objetivo {result['rpo_target']}s)  "
+              f"{result['lost_rows']} filas perdidas  [{phases}]")
+        if result['missing_tables']:
+            print(f"{'':<15} tablas sin restaurar: {', '.join(result['missing_tables'])}")
+
+
+def save_results(results: List[dict], report_dir: Optional[str] = None) -> str:
+    """Guarda los resultados como JSON en DRILL_REPORT_DIR y retorna la ruta."""
+    report_dir = report_dir or DatabaseConfig.DRILL_REPORT_DIR
+    os.makedirs(report_dir, exist_ok=True)
+    path = os.path.join(report_dir, f"drill_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump({'finished_at': datetime.now().isoformat(timespec='seconds'), 'results': results},
+                  f, indent=1, default=str)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--scenario", action="append", choices=SCENARIOS,
+                        help="Escenario a ejecutar (repetible; por defecto todos)")
+    parser.add_argument("--table", help="Tabla afectada por los escenarios de una tabla")
+    parser.add_argument("--seed", type=int, help="Semilla para repetir tablas y filas afectadas")
+    parser.add_argument("--reuse-backup", action="store_true",
+                        help="Usar el backup completo más reciente del catálogo en vez de crear uno")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Crear un incremental antes de full_wipe y restaurar la cadena")
+    parser.add_argument("--rto-target", type=float, default=DatabaseConfig.DRILL_RTO_TARGET,
+                        help="RTO objetivo en segundos")
+    parser.add_argument("--rpo-target", type=float, default=DatabaseConfig.DRILL_RPO_TARGET,
+                        help="RPO objetivo en segundos")
+    args = parser.parse_args()
+
+    try:
+        results = run_drills(args.scenario or list(SCENARIOS), args.table, args.seed,
+                             not args.reuse_backup, args.incremental, args.rto_target, args.rpo_target)
+    except RuntimeError as e:
+        print(f"Error: {e}")
+        sys.exit(2)
+    finally:
+        close_pool()
+    print_results(results)
+    print(f"\nReporte guardado en {save_results(results)}")
+    sys.exit(0 if all(result['passed'] for result in results) else 1)
+
+
+if __name__ == "__main__":
+    main()
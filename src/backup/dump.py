@@ -0,0 +1,387 @@
+"""
+Módulo de volcado de datos para el backup completo.
+Abre un snapshot consistente compartido por varios workers, reparte las tablas
+(y los rangos de clave primaria de las tablas grandes) entre ellos y escribe
+cada parte en orden en el archivo de backup.
+"""
+import os
+import queue
+import shutil
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Set, Tuple
+
+from mysql.connector import errors
+
+from src.backup.compression import BackupWriter
+from src.db import metrics
+from src.db.config import DatabaseConfig
+from src.db.pool import get_pool
+from src.db.schema import get_schema
+from src.db.utils import (
+    check_statement_bytes, execute_query, get_max_allowed_packet, get_primary_key, get_table_data,
+    get_table_structure,
+)
+
+INTEGER_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'bigint')
+
+
+def open_consistent_snapshot(workers: int, prepare: Optional[Callable] = None) -> Tuple[List, Optional[str]]:
+    """
+    Abre `workers` conexiones que leen del mismo snapshot de la base de datos.
+
+    Toma brevemente un bloqueo global de lectura, inicia en cada conexión una
+    transacción `WITH CONSISTENT SNAPSHOT`, lee la posición del binary log y
+    libera el bloqueo. Así todos los workers ven los mismos datos y la posición
+    guardada corresponde exactamente a ellos.
+
+    Si el bloqueo no puede tomarse, cada transacción empezaría en un instante
+    distinto: se abre una sola conexión, para que al menos todos los datos
+    salgan del mismo snapshot.
+
+    Args:
+        workers (int): Cantidad de conexiones a abrir
+        prepare (callable): Función que recibe la primera conexión del snapshot y se ejecuta
+            con el bloqueo tomado (ningún DDL puede ocurrir mientras tanto), p. ej. para leer
+            la lista de tablas y sus estructuras
+
+    Returns:
+        tuple: (lista de conexiones, posición del binary log en formato 'file:position')
+    """
+    pool = get_pool()
+    lock_conn = pool.new_connection()
+    connections = []
+    locked = False
+    try:
+        cursor = lock_conn.cursor()
+        cursor.execute(f"SET SESSION lock_wait_timeout = {DatabaseConfig.SNAPSHOT_LOCK_WAIT_TIMEOUT}")
+        try:
+            cursor.execute("FLUSH TABLES WITH READ LOCK")
+            locked = True
+        except errors.Error as e:
+            print(f"Advertencia: No se pudo tomar el bloqueo global ({e}). Se vuelca con un solo worker "
+                  "y la posición del binary log podría no coincidir con los datos")
+            workers = 1
+
+        for _ in range(workers):
+            conn = pool.new_connection()
+            connections.append(conn)
+            worker_cursor = conn.cursor()
+            worker_cursor.execute("SET SESSION TRANSACTION ISOLATION LEVEL REPEATABLE READ")
+            worker_cursor.execute("START TRANSACTION WITH CONSISTENT SNAPSHOT")
+            worker_cursor.close()
+
+        if prepare is not None:
+            prepare(connections[0])
+
+        # Columnas: File, Position, Binlog_Do_DB, Binlog_Ignore_DB, Executed_Gtid_Set
+        cursor.execute("SHOW MASTER STATUS")
+        row = cursor.fetchone()
+        position = f"{row[0]}:{row[1]}" if row else None
+
+        if locked:
+            cursor.execute("UNLOCK TABLES")
+        cursor.close()
+        return connections, position
+
+    except Exception:
+        close_snapshot(connections)
+        raise
+    finally:
+        lock_conn.close()
+
+
+def close_snapshot(connections: List):
+    """Finaliza las transacciones de snapshot y cierra las conexiones."""
+    for conn in connections:
+        try:
+            conn.rollback()
+            conn.close()
+        except Exception:
+            pass
+
+
+def _get_table_sizes() -> dict:
+    """Retorna el número estimado de filas de cada tabla según information_schema."""
+    rows = execute_query(
+        "SELECT TABLE_NAME, TABLE_ROWS FROM information_schema.TABLES "
+        "WHERE TABLE_SCHEMA = DATABASE()"
+    )
+    return {name: int(table_rows or 0) for name, table_rows in rows}
+
+
+def _get_integer_pk(table: str) -> Optional[str]:
+    """Retorna la columna de la clave primaria si es una única columna entera."""
+    pk_columns = get_primary_key(table)
+    if len(pk_columns) != 1:
+        return None
+    if get_schema().column_types(table)[pk_columns[0]] in INTEGER_TYPES:
+        return pk_columns[0]
+    return None
+
+
+def plan_dump_tasks(tables: List[str], conn, shard_rows: Optional[int] = None) -> List[dict]:
+    """
+    Divide el volcado en tareas independientes.
+
+    Cada tabla es una tarea. Las tablas con más de `shard_rows` filas estimadas
+    y clave primaria entera se dividen en rangos de clave de tamaño similar,
+    para que una tabla enorme no deje a los demás workers ociosos al final.
+
+    Args:
+        tables (list): Tablas a volcar, en el orden en que se escribirán
+        conn (MySQLConnection): Conexión del snapshot para leer los límites de la clave
+        shard_rows (int): Filas estimadas a partir de las cuales se divide una tabla
+
+    Returns:
+        list: Tareas con las claves 'index', 'table', 'start', 'end', 'pk' (columna de los
+              límites, None si la tabla no se divide) y 'rows'
+    """
+    shard_rows = shard_rows or DatabaseConfig.DUMP_SHARD_ROWS
+    sizes = _get_table_sizes()
+    tasks = []
+
+    for table in tables:
+        estimated = sizes.get(table, 0)
+        pk = _get_integer_pk(table) if estimated > shard_rows else None
+        boundaries = []
+
+        if pk:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT MIN(`{pk}`), MAX(`{pk}`) FROM `{table}`")
+            low, high = cursor.fetchone()
+            cursor.close()
+            if low is not None:
+                shards = -(-estimated // shard_rows)
+                step = max(1, (high - low + 1) // shards)
+                boundaries = list(range(low + step, high + 1, step))[:shards - 1]
+
+        edges = [None] + boundaries + [None]
+        for start, end in zip(edges, edges[1:]):
+            tasks.append({
+                'index': len(tasks),
+                'table': table,
+                'start': start,
+                'end': end,
+                'pk': pk if boundaries else None,
+                'rows': estimated // (len(edges) - 1),
+            })
+
+    return tasks
+
+
+def build_dump_options(chunk_size: Optional[int] = None, max_statement_bytes: Optional[int] = None,
+                       extended_insert: Optional[bool] = None, disable_keys: Optional[bool] = None) -> dict:
+    """
+    Reúne las opciones de formato del volcado, completando con DatabaseConfig.
+
+    Returns:
+        dict: Opciones 'chunk_size', 'max_statement_bytes', 'extended_insert' y 'disable_keys'
+
+    Raises:
+        ValueError: Si el tamaño máximo de sentencia es menor que MIN_STATEMENT_BYTES
+    """
+    extended_insert = DatabaseConfig.DUMP_EXTENDED_INSERT if extended_insert is None else extended_insert
+    if extended_insert and not max_statement_bytes:
+        max_statement_bytes = DatabaseConfig.DUMP_MAX_STATEMENT_BYTES or get_max_allowed_packet()
+    if extended_insert:
+        # Antes de abrir el snapshot: un límite demasiado chico no debe descubrirse a mitad del volcado
+        check_statement_bytes(max_statement_bytes)
+    return {
+        'chunk_size': chunk_size or DatabaseConfig.DUMP_CHUNK_SIZE,
+        'max_statement_bytes': max_statement_bytes,
+        'extended_insert': extended_insert,
+        'disable_keys': DatabaseConfig.DUMP_DISABLE_KEYS if disable_keys is None else disable_keys,
+    }
+
+
+def dump_task(task: dict, conn, out, options: dict, throttle=None) -> bool:
+    """
+    Escribe los INSERT de una tarea en `out`.
+
+    Args:
+        task (dict): Tarea creada por plan_dump_tasks
+        conn (MySQLConnection): Conexión del snapshot
+        out (BackupWriter): Destino de los INSERT
+        options (dict): Opciones de formato creadas con `build_dump_options`
+        throttle (Throttle): Limitador del volcado (src/backup/throttle.py)
+
+    Returns:
+        bool: True si se escribió al menos una fila
+    """
+    wrote_data = False
+    if throttle:
+        throttle.acquire_slot()
+    try:
+        with metrics.phase('dump', task['table']) as phase:
+            for chunk in get_table_data(task['table'], options['chunk_size'], conn, task['start'], task['end'],
+                                        options['max_statement_bytes'], options['extended_insert'], throttle):
+                started = time.perf_counter()
+                out.write(f"{chunk}\n")
+                metrics.observe('write', time.perf_counter() - started, task['table'], bytes=len(chunk) + 1)
+                phase.add(bytes=len(chunk) + 1)
+                wrote_data = True
+                if throttle:
+                    throttle.wait(bytes=len(chunk) + 1)
+    finally:
+        if throttle:
+            throttle.release_slot()
+    return wrote_data
+
+
+def run_parallel_dump(tasks: List[dict], connections: List, work_dir: str, options: dict,
+                      writer: BackupWriter, throttle=None) -> List[BackupWriter]:
+    """
+    Ejecuta las tareas en paralelo, una conexión de snapshot por worker.
+    Cada tarea se escribe en su propio archivo parcial dentro de `work_dir`,
+    comprimido con el mismo códec que el backup final.
+    Las tareas más grandes se reparten primero. Con `throttle`, solo leen a la
+    vez los workers que permite el limitador.
+
+    Returns:
+        list: Escritores (ya cerrados) de los archivos parciales, en el orden de las tareas
+
+    Raises:
+        Exception: El primer error ocurrido en cualquier worker
+    """
+    pending = queue.Queue()
+    for task in sorted(tasks, key=lambda t: t['rows'], reverse=True):
+        pending.put(task)
+
+    parts = [None] * len(tasks)
+    failures = []
+
+    def worker(conn):
+        while not failures:
+            try:
+                task = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                path = os.path.join(work_dir, f"{task['index']:06d}.part")
+                with writer.part_writer(path) as out:
+                    parts[task['index']] = out
+                    dump_task(task, conn, out, options, throttle)
+            except Exception as e:
+                failures.append(e)
+
+    threads = [threading.Thread(target=worker, args=(conn,)) for conn in connections]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    if failures:
+        raise failures[0]
+    return parts
+
+
+def write_table_structure(f, table: str):
+    """Escribe la sección de estructura (DROP + CREATE) de una tabla."""
+    f.write(f"--\n-- Estructura de la tabla `{table}`\n--\n\n")
+    f.write(f"DROP TABLE IF EXISTS `{table}`;\n")
+    f.write(f"{get_table_structure(table)};\n\n")
+
+
+def write_views(f, views: List[Tuple[str, str]]):
+    """
+    Escribe la sección de vistas (DROP + CREATE VIEW), después de todas las tablas.
+
+    Args:
+        f (BackupWriter): Archivo de backup abierto para escritura
+        views (list): (vista, sentencia CREATE VIEW) en orden de creación (SchemaCatalog.view_statements)
+    """
+    if not views:
+        return
+    f.write("--\n-- Vistas\n--\n\n")
+    for view, statement in views:
+        f.write(f"DROP VIEW IF EXISTS `{view}`;\n")
+        f.write(f"{statement};\n\n")
+
+
+def write_tables(f, tables: List[str], connections: List, backup_dir: str,
+                 options: dict, shard_rows: Optional[int] = None,
+                 previous=None, unchanged: Optional[Set[str]] = None, throttle=None) -> Dict[str, dict]:
+    """
+    Vuelca estructura y datos de todas las tablas en `f`, en orden.
+
+    Con una sola conexión se escribe directamente; con varias, los workers
+    escriben archivos parciales que luego se concatenan en el orden original.
+    Los datos de las tablas de `unchanged` no se leen de la base de datos: su
+    sección se copia desde el backup anterior.
+
+    Args:
+        f (BackupWriter): Archivo de backup abierto para escritura
+        tables (list): Tablas a volcar
+        connections (list): Conexiones abiertas con `open_consistent_snapshot`
+        backup_dir (str): Directorio donde crear los archivos temporales
+        options (dict): Opciones de formato creadas con `build_dump_options`
+        shard_rows (int): Umbral de filas para dividir una tabla en rangos
+        previous (PreviousBackup): Backup completo anterior (src/backup/changes.py)
+        unchanged (set): Tablas cuyos datos se copian desde `previous`
+        throttle (Throttle): Limitador de filas, bytes, bloques y workers (src/backup/throttle.py)
+
+    Returns:
+        dict: Por tabla, posición y tamaño (bytes sin comprimir del backup) de su estructura
+              ('structure_offset', 'structure_bytes') y de sus datos ('data_offset', 'data_bytes'),
+              'reused' si se copió del backup anterior y 'ranges' con la posición de cada rango
+              de clave volcado ('start', 'end', 'offset', 'length')
+    """
+    unchanged = unchanged or set()
+    tasks = plan_dump_tasks([table for table in tables if table not in unchanged], connections[0], shard_rows)
+    tasks_by_table = {}
+    for task in tasks:
+        tasks_by_table.setdefault(task['table'], []).append(task)
+
+    work_dir = None
+    parts = None
+    if len(connections) > 1 and tasks:
+        work_dir = tempfile.mkdtemp(prefix=".dump_", dir=backup_dir)
+
+    sections = {}
+    try:
+        if work_dir:
+            parts = run_parallel_dump(tasks, connections, work_dir, options, f, throttle)
+
+        for table in tables:
+            structure_offset = f.start_frame()
+            write_table_structure(f, table)
+            f.write(f"--\n-- Datos de la tabla `{table}`\n--\n\n")
+            if options['disable_keys']:
+                f.write(f"/*!40000 ALTER TABLE `{table}` DISABLE KEYS */;\n")
+            offset = f.start_frame()
+            ranges = []
+            if table in unchanged:
+                with metrics.phase('reuse', table) as phase:
+                    copied = previous.copy_section(table, f)
+                    phase.add(bytes=copied)
+                wrote_data = copied > 0
+                ranges.append({'start': None, 'end': None, 'offset': offset, 'length': f.bytes_in - offset})
+            else:
+                wrote_data = False
+                for task in tasks_by_table[table]:
+                    range_offset = f.start_frame()
+                    if parts is None:
+                        wrote_data = dump_task(task, connections[0], f, options, throttle) or wrote_data
+                    elif parts[task['index']].bytes_in:
+                        with metrics.phase('concat', table) as phase:
+                            f.append_part(parts[task['index']])
+                            phase.add(bytes=parts[task['index']].bytes_in)
+                        wrote_data = True
+                    ranges.append({'start': task['start'], 'end': task['end'], 'offset': range_offset,
+                                   'length': f.bytes_in - range_offset})
+            sections[table] = {'structure_offset': structure_offset, 'structure_bytes': offset - structure_offset,
+                               'data_offset': offset, 'data_bytes': f.bytes_in - offset,
+                               'reused': table in unchanged, 'ranges': ranges,
+                               'pk': next((task['pk'] for task in tasks_by_table.get(table, [])), None)}
+            if options['disable_keys']:
+                f.write(f"/*!40000 ALTER TABLE `{table}` ENABLE KEYS */;\n")
+            if wrote_data or options['disable_keys']:
+                f.write("\n")
+    finally:
+        if work_dir:
+            shutil.rmtree(work_dir, ignore_errors=True)
+        if previous is not None:
+            previous.close()
+    return sections
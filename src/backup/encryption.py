@@ -0,0 +1,414 @@
+"""
+Módulo de cifrado autenticado de archivos de backup.
+Cifra el flujo ya comprimido de un backup a medida que se escribe, en
+registros independientes de BACKUP_ENCRYPTION_RECORD_BYTES bytes, con un
+cifrado AEAD (AES-256-GCM o ChaCha20-Poly1305, de la biblioteca `cryptography`).
+Nunca se escribe en disco una copia sin cifrar:
+
+    encabezado   MAGIC | versión | cifrado | bytes por registro | id de la clave | sal
+    registro i   bloque i del flujo comprimido, cifrado, + etiqueta de 16 bytes
+
+- Cada archivo usa su propia clave, derivada con HKDF de la clave maestra y una
+  sal aleatoria, y el nonce de cada registro es su número: un registro movido,
+  repetido o tomado de otro archivo no se autentica
+- El último registro se cifra con una marca de final, de modo que un archivo
+  truncado justo en el límite de un registro también se rechaza
+- Todos los registros salvo el último tienen el mismo tamaño: la posición en
+  disco del registro que contiene un byte del flujo comprimido se calcula
+  directamente, así que los frames del índice de secciones (posiciones del
+  flujo comprimido) se leen descifrando solo desde su registro
+- Al leer en secuencia, los registros siguientes se descifran en paralelo y por
+  adelantado; después de un seek se descifra solo lo que se lee hasta que la
+  lectura vuelve a ser secuencial
+
+La clave maestra (32 bytes: binaria, hexadecimal o base64) se toma de
+BACKUP_ENCRYPTION_KEY o del archivo BACKUP_ENCRYPTION_KEY_FILE; los archivos
+cifrados se reconocen por su encabezado, no por su nombre.
+
+Uso:
+    python3 -m src.backup.encryption --generate-key /ruta/segura/backup.key
+    python3 -m src.backup.encryption --verify backups/backup_completo_X.sql.gz
+    python3 -m src.backup.encryption --decrypt backups/backup_completo_X.sql.gz --output /tmp/backup.sql.gz
+"""
+import argparse
+import base64
+import binascii
+import hashlib
+import hmac
+import os
+import struct
+import sys
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+try:
+    from cryptography.exceptions import InvalidTag
+    from cryptography.hazmat.primitives import hashes
+    from cryptography.hazmat.primitives.ciphers.aead import AESGCM, ChaCha20Poly1305
+    from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+except ImportError:  # pragma: no cover - dependencia opcional
+    AESGCM = None
+
+from src.db import metrics
+from src.db.config import DatabaseConfig
+
+MAGIC = b"\x8bBKE"
+FORMAT_VERSION = 1
+KEY_BYTES = 32
+TAG_BYTES = 16
+# magic, versión, cifrado, bytes por registro, id de la clave, sal
+_HEADER = struct.Struct(">4sBBI8s16s")
+CIPHERS = {'aes-256-gcm': 1, 'chacha20-poly1305': 2}
+_FINAL = b"\x01"
+_NOT_FINAL = b"\x00"
+
+
+def available() -> bool:
+    """Indica si la biblioteca `cryptography` está instalada."""
+    return AESGCM is not None
+
+
+def parse_key(data: bytes) -> bytes:
+    """
+    Interpreta una clave maestra de 32 bytes escrita en binario, hexadecimal o base64.
+
+    Raises:
+        ValueError: Si el contenido no es una clave de 32 bytes
+    """
+    if len(data) == KEY_BYTES:
+        return data
+    text = data.strip()
+    for decode in (binascii.unhexlify, base64.b64decode):
+        try:
+            key = decode(text)
+        except (binascii.Error, ValueError):
+            continue
+        if len(key) == KEY_BYTES:
+            return key
+    raise ValueError(f"La clave de cifrado debe tener {KEY_BYTES} bytes (binaria, hexadecimal o base64)")
+
+
+def load_key() -> bytes:
+    """
+    Clave maestra configurada en BACKUP_ENCRYPTION_KEY o BACKUP_ENCRYPTION_KEY_FILE.
+
+    Raises:
+        ValueError: Si no hay clave configurada o no es válida
+    """
+    if DatabaseConfig.BACKUP_ENCRYPTION_KEY:
+        return parse_key(DatabaseConfig.BACKUP_ENCRYPTION_KEY.encode('ascii'))
+    path = DatabaseConfig.BACKUP_ENCRYPTION_KEY_FILE
+    if not path:
+        raise ValueError("No hay clave de cifrado configurada (BACKUP_ENCRYPTION_KEY o BACKUP_ENCRYPTION_KEY_FILE)")
+    with open(path, 'rb') as f:
+        return parse_key(f.read())
+
+
+def key_id(key: bytes) -> bytes:
+    """Identificador de la clave maestra guardado en el encabezado (no revela la clave)."""
+    return hmac.new(key, b"backup key id", hashlib.sha256).digest()[:8]
+
+
+def _cipher(cipher_id: int, key: bytes, salt: bytes):
+    """Cifrado AEAD con la clave propia del archivo."""
+    file_key = HKDF(algorithm=hashes.SHA256(), length=KEY_BYTES, salt=salt, info=b"backup file key").derive(key)
+    return AESGCM(file_key) if cipher_id == CIPHERS['aes-256-gcm'] else ChaCha20Poly1305(file_key)
+
+
+def _nonce(index: int) -> bytes:
+    return index.to_bytes(12, 'big')
+
+
+def _require_library():
+    if not available():
+        raise ValueError("El cifrado de backups requiere la biblioteca cryptography, que no está instalada")
+
+
+class EncryptingFile:
+    """
+    Archivo de escritura que cifra en registros lo que se le escribe.
+
+    `tell()` retorna la posición en el flujo sin cifrar (el flujo comprimido),
+    que es la que registran los frames del backup. `finish()` cifra el último
+    registro; no cierra el archivo subyacente.
+
+    Args:
+        raw: Archivo de destino, ya abierto
+        key (bytes): Clave maestra (por defecto load_key())
+        cipher (str): 'aes-256-gcm' o 'chacha20-poly1305' (por defecto DatabaseConfig.BACKUP_ENCRYPTION_CIPHER)
+        record_bytes (int): Bytes por registro (por defecto DatabaseConfig.BACKUP_ENCRYPTION_RECORD_BYTES)
+    """
+
+    def __init__(self, raw, key: Optional[bytes] = None, cipher: Optional[str] = None,
+                 record_bytes: Optional[int] = None):
+        _require_library()
+        cipher = (cipher or DatabaseConfig.BACKUP_ENCRYPTION_CIPHER).lower()
+        if cipher not in CIPHERS:
+            raise ValueError(f"Cifrado no soportado: {cipher}")
+        key = key or load_key()
+        self.cipher = cipher
+        self.record_bytes = record_bytes or DatabaseConfig.BACKUP_ENCRYPTION_RECORD_BYTES
+        salt = os.urandom(16)
+        self.header = _HEADER.pack(MAGIC, FORMAT_VERSION, CIPHERS[cipher], self.record_bytes, key_id(key), salt)
+        self._aead = _cipher(CIPHERS[cipher], key, salt)
+        self._raw = raw
+        self._buffer = bytearray()
+        self._index = 0
+        self._position = 0
+        self._finished = False
+        raw.write(self.header)
+
+    def write(self, data) -> int:
+        self._buffer += data
+        self._position += len(data)
+        # Se conserva al menos un byte: el último registro se cifra en finish(), con la marca de final
+        while len(self._buffer) > self.record_bytes:
+            self._emit(bytes(self._buffer[:self.record_bytes]), _NOT_FINAL)
+            del self._buffer[:self.record_bytes]
+        return len(data)
+
+    def _emit(self, data: bytes, final: bytes):
+        started = time.perf_counter()
+        record = self._aead.encrypt(_nonce(self._index), data, self.header + final)
+        metrics.observe('encrypt', time.perf_counter() - started, bytes=len(data))
+        self._raw.write(record)
+        self._index += 1
+
+    def finish(self):
+        """Cifra lo pendiente como último registro."""
+        if not self._finished:
+            self._emit(bytes(self._buffer), _FINAL)
+            self._buffer = bytearray()
+            self._finished = True
+
+    def tell(self) -> int:
+        return self._position
+
+    def flush(self):
+        self._raw.flush()
+
+    @property
+    def closed(self) -> bool:
+        return self._raw.closed
+
+
+class DecryptingFile:
+    """
+    Archivo de lectura con el contenido descifrado de un backup cifrado.
+
+    Es posicionable (`seek`/`tell` en el flujo sin cifrar). Con más de un
+    worker, los registros siguientes al que se está leyendo se descifran en
+    paralelo; la cantidad anticipada crece con cada registro leído en secuencia
+    (hasta dos por worker) y vuelve a cero con cada seek, para que las lecturas
+    de una sección no descifren registros que no se van a usar. Los registros
+    se leen con pread, sin compartir la posición del archivo entre hilos.
+
+    Args:
+        file: Archivo cifrado abierto en modo binario (se cierra con close())
+        key (bytes): Clave maestra (por defecto load_key())
+        workers (int): Hilos que descifran por adelantado (por defecto
+            DatabaseConfig.BACKUP_ENCRYPTION_WORKERS, como máximo uno por CPU; 0 o 1 descifra al leer)
+
+    Raises:
+        ValueError: Si el archivo no está cifrado, está truncado o la clave no corresponde
+    """
+
+    def __init__(self, file, key: Optional[bytes] = None, workers: Optional[int] = None):
+        _require_library()
+        self.name = getattr(file, 'name', '<backup>')
+        self._file = file
+        self._fd = file.fileno()
+        self.header = os.pread(self._fd, _HEADER.size, 0)
+        if len(self.header) < _HEADER.size or not self.header.startswith(MAGIC):
+            raise ValueError(f"{self.name} no es un backup cifrado")
+        _, version, cipher_id, record_bytes, stored_id, salt = _HEADER.unpack(self.header)
+        if version != FORMAT_VERSION or cipher_id not in CIPHERS.values():
+            raise ValueError(f"{self.name} usa un formato de cifrado no soportado (versión {version}, cifrado {cipher_id})")
+        key = key or load_key()
+        if key_id(key) != stored_id:
+            raise ValueError(f"La clave de cifrado configurada no es la de {self.name}")
+        self._aead = _cipher(cipher_id, key, salt)
+        self.record_bytes = record_bytes
+
+        stride = record_bytes + TAG_BYTES
+        body = os.fstat(self._fd).st_size - _HEADER.size
+        self.records = max(1, -(-body // stride))
+        last = body - (self.records - 1) * stride
+        if last < TAG_BYTES:
+            raise ValueError(f"{self.name} está truncado")
+        self.length = (self.records - 1) * record_bytes + last - TAG_BYTES
+
+        workers = DatabaseConfig.BACKUP_ENCRYPTION_WORKERS if workers is None else workers
+        self.workers = min(workers, os.cpu_count() or 1)
+        self._executor = ThreadPoolExecutor(self.workers) if self.workers > 1 else None
+        self._pending = deque()
+        self._scheduled = 0  # Próximo registro a descifrar por adelantado
+        self._next = 0  # Próximo registro a entregar
+        self._first = 0  # Primer registro leído desde el último seek
+        self._current = b""
+        self._offset = 0
+        self._skip = 0  # Bytes a descartar del próximo registro después de un seek
+        self._position = 0
+
+    def decrypt_record(self, index: int) -> bytes:
+        """
+        Descifra y autentica un registro.
+
+        Raises:
+            ValueError: Si el registro no se autentica (alterado, truncado o de otro archivo)
+        """
+        started = time.perf_counter()
+        stride = self.record_bytes + TAG_BYTES
+        data = os.pread(self._fd, stride, _HEADER.size + index * stride)
+        final = _FINAL if index == self.records - 1 else _NOT_FINAL
+        try:
+            plain = self._aead.decrypt(_nonce(index), data, self.header + final)
+        except InvalidTag:
+            raise ValueError(f"El registro {index} de {self.name} no se pudo autenticar "
+                             f"(archivo alterado o truncado)") from None
+        metrics.observe('decrypt', time.perf_counter() - started, bytes=len(plain))
+        return plain
+
+    def _next_record(self) -> bytes:
+        index = self._next
+        self._next += 1
+        if self._executor is None:
+            return self.decrypt_record(index)
+        end = min(self.records, index + 1 + min(2 * self.workers, index - self._first))
+        while self._scheduled < end:
+            self._pending.append(self._executor.submit(self.decrypt_record, self._scheduled))
+            self._scheduled += 1
+        return self._pending.popleft().result()
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0:
+            size = self.length - self._position
+        parts = []
+        while size > 0 and self._position < self.length:
+            if self._offset >= len(self._current):
+                self._current = self._next_record()
+                self._offset, self._skip = self._skip, 0
+                continue
+            part = self._current[self._offset:self._offset + size]
+            self._offset += len(part)
+            self._position += len(part)
+            size -= len(part)
+            parts.append(part)
+        return parts[0] if len(parts) == 1 else b"".join(parts)
+
+    def readinto(self, buffer) -> int:
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+    def seek(self, offset: int, whence: int = os.SEEK_SET) -> int:
+        if whence == os.SEEK_CUR:
+            offset += self._position
+        elif whence == os.SEEK_END:
+            offset += self.length
+        offset = max(0, min(offset, self.length))
+        for future in self._pending:
+            future.cancel()
+        self._pending.clear()
+        self._next = self._scheduled = self._first = offset // self.record_bytes
+        self._skip = offset % self.record_bytes
+        self._current = b""
+        self._offset = 0
+        self._position = offset
+        return offset
+
+    def tell(self) -> int:
+        return self._position
+
+    def readable(self) -> bool:
+        return True
+
+    def seekable(self) -> bool:
+        return True
+
+    @property
+    def closed(self) -> bool:
+        return self._file.closed
+
+    def close(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def is_encrypted(path: str) -> bool:
+    """Indica si un archivo de backup está cifrado (por su encabezado)."""
+    with open(path, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def open_decrypted(path: str, workers: Optional[int] = None) -> DecryptingFile:
+    """Abre un backup cifrado para leer su contenido descifrado (todavía comprimido)."""
+    file = open(path, 'rb')
+    try:
+        return DecryptingFile(file, workers=workers)
+    except Exception:
+        file.close()
+        raise
+
+
+def generate_key(path: str):
+    """Escribe una clave maestra aleatoria (hexadecimal) legible solo por el usuario actual."""
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600)
+    with os.fdopen(fd, 'w') as f:
+        f.write(os.urandom(KEY_BYTES).hex() + "\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--generate-key", metavar="RUTA", help="Crear una clave maestra nueva (no sobrescribe)")
+    action.add_argument("--verify", metavar="BACKUP", help="Autenticar todos los registros de un backup cifrado")
+    action.add_argument("--decrypt", metavar="BACKUP", help="Descifrar un backup (queda comprimido)")
+    parser.add_argument("--output", help="Archivo de salida de --decrypt")
+    parser.add_argument("--workers", type=int, default=DatabaseConfig.BACKUP_ENCRYPTION_WORKERS,
+                        help="Hilos que descifran en paralelo")
+    args = parser.parse_args()
+
+    try:
+        if args.generate_key:
+            generate_key(args.generate_key)
+            print(f"Clave creada en {args.generate_key}: guárdala fuera del directorio de backups")
+            return
+        path = args.verify or args.decrypt
+        if args.decrypt and not args.output:
+            parser.error("--decrypt requiere --output")
+        started = time.perf_counter()
+        with open_decrypted(path, args.workers) as reader:
+            out = open(args.output, 'wb') if args.decrypt else None
+            try:
+                while True:
+                    data = reader.read(reader.record_bytes)
+                    if not data:
+                        break
+                    if out:
+                        out.write(data)
+            finally:
+                if out:
+                    out.close()
+            elapsed = max(time.perf_counter() - started, 1e-6)
+            print(f"{path}: {reader.records} registros autenticados, {reader.length} bytes "
+                  f"en {elapsed:.2f}s ({reader.length / 1048576 / elapsed:.1f} MB/s)")
+        if args.decrypt:
+            print(f"Contenido descifrado en {args.output}")
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
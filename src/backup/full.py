@@ -1,101 +1,250 @@
+import argparse
 import os
-import subprocess
 import time
 from datetime import datetime
+from src.db import metrics
 from src.db.config import DatabaseConfig
-from src.db.utils import get_table_list, get_table_structure, get_table_data, show_table_data, execute_query
+from src.db.schema import get_schema, invalidate_schema
+from src.db.utils import get_table_list, show_table_data
+from src.backup.bulk import BULK_EXTENSION, apply_bulk_backup, is_bulk_backup, write_bulk_backup
+from src.backup.catalog import BackupCatalog
+from src.backup.changes import PreviousBackup, detect_unchanged, read_table_status
+from src.backup.chunks import ChunkedBackupWriter
+from src.backup.compression import RECIPE_EXTENSION, BackupWriter, backup_filename
+from src.backup.restore import apply_backup, checkpoint_path
+from src.backup.parallel_restore import apply_backup_parallel
+from src.backup.dump import open_consistent_snapshot, close_snapshot, write_tables, write_views, build_dump_options
+from src.backup.partial import write_section_index
+from src.backup.throttle import create_throttle
+from src.backup.verify import compute_checksums, verify_backup
 from src.db.disaster_simulator import simulate_disaster, verify_disaster_simulation
 
-def save_backup_position(position):
-    """Guarda la posición actual del binary log"""
-    backup_dir = "backups"
-    if not os.path.exists(backup_dir):
-        os.makedirs(backup_dir)
-    with open(os.path.join(backup_dir, 'last_position.txt'), 'w') as f:
-        f.write(position)
-
-def get_binary_log_position():
-    """Obtiene la posición actual del binary log"""
-    result = execute_query("SHOW MASTER STATUS;")
-    if result and len(result.strip().split('\n')) > 1:
-        # El resultado tiene este formato:
-        # File    Position    Binlog_Do_DB    Binlog_Ignore_DB    Executed_Gtid_Set
-        # mysql-bin.000001    1234            ...
-        fields = result.strip().split('\n')[1].split('\t')
-        return f"{fields[0]}:{fields[1]}"
-    return None
-
-def create_full_backup():
+@metrics.instrumented('full_backup', success=lambda result: result[0] is not None)
+def create_full_backup(chunk_size=None, workers=None, shard_rows=None,
+                       max_statement_bytes=None, extended_insert=None, disable_keys=None,
+                       codec=None, compression_level=None, compression_threads=None, store=None,
+                       change_detection=None, checksums=None, throttle=None, dump_format=None, encrypt=None):
     """
     Crea un backup completo de la base de datos.
-    El archivo de backup se guarda en el directorio 'backups' con un timestamp.
+    El archivo de backup se guarda en DatabaseConfig.BACKUP_DIR con un timestamp
+    y se registra en el catálogo de backups con su posición del binary log.
+    Los datos se leen y escriben por bloques, por lo que la memoria usada no
+    depende del tamaño de las tablas.
+    
+    Todas las conexiones leen del mismo snapshot consistente y la posición del
+    binary log se captura en ese mismo instante, de modo que los backups
+    incrementales posteriores continúan exactamente desde los datos respaldados.
+    
+    Cada paso (estado de las tablas, snapshot, volcado, índice, checksums) y
+    cada tabla se miden con src/db/metrics.py.
+    
+    Args:
+        chunk_size (int): Filas leídas por consulta (por defecto DatabaseConfig.DUMP_CHUNK_SIZE)
+        workers (int): Conexiones que vuelcan en paralelo (por defecto DatabaseConfig.DUMP_WORKERS)
+        shard_rows (int): Filas estimadas a partir de las cuales una tabla se divide en rangos de clave
+        max_statement_bytes (int): Tamaño máximo de cada INSERT multi-fila (por defecto @@max_allowed_packet)
+        extended_insert (bool): Agrupar varias filas por INSERT (por defecto DatabaseConfig.DUMP_EXTENDED_INSERT)
+        disable_keys (bool): Envolver los datos de cada tabla con ALTER TABLE ... DISABLE/ENABLE KEYS
+        codec (str): Códec de compresión en línea (por defecto DatabaseConfig.BACKUP_CODEC)
+        compression_level (int): Nivel de compresión del códec
+        compression_threads (int): Hilos de compresión (solo zstd)
+        store (str): 'file' escribe un archivo por backup; 'chunks' guarda el volcado en el
+            almacén deduplicado y escribe solo una receta (por defecto DatabaseConfig.BACKUP_STORE)
+        change_detection (str): 'update_time' o 'checksum' copian desde el backup completo anterior
+            los datos de las tablas que no cambiaron; 'none' vuelca todo (por defecto
+            DatabaseConfig.DUMP_CHANGE_DETECTION)
+        checksums (bool): Calcular en el mismo snapshot los checksums por tabla y rango de clave
+            que verifican las restauraciones (por defecto DatabaseConfig.BACKUP_CHECKSUMS)
+        throttle (bool): Limitar filas, bytes, bloques y workers según la carga del servidor
+            (por defecto DatabaseConfig.THROTTLE_ENABLED)
+        dump_format (str): 'sql' escribe sentencias INSERT; 'tsv' escribe un directorio con el
+            esquema y un archivo por tabla para LOAD DATA (src/backup/bulk.py; por defecto
+            DatabaseConfig.DUMP_FORMAT)
+        encrypt (bool): Cifrar los archivos del backup (AEAD) después de comprimirlos
+            (src/backup/encryption.py; por defecto DatabaseConfig.BACKUP_ENCRYPTION)
     
     Returns:
         tuple: (ruta del archivo de backup, posición del binary log) o (None, None) si hubo un error
     """
+    connections = []
+    catalog = BackupCatalog()
+    backup_id = None
+    limiter = None
     try:
         # Crear directorio de backups si no existe
-        backup_dir = "backups"
+        backup_dir = DatabaseConfig.BACKUP_DIR
         if not os.path.exists(backup_dir):
             os.makedirs(backup_dir)
 
         # Generar nombre del archivo de backup con timestamp
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_file = os.path.join(backup_dir, f"backup_completo_{timestamp}.sql")
+        base = os.path.join(backup_dir, f"backup_completo_{timestamp}.sql")
+        bulk = (dump_format or DatabaseConfig.DUMP_FORMAT) == "tsv"
+        chunked = (store or DatabaseConfig.BACKUP_STORE) == "chunks"
+        if bulk and chunked:
+            print("Aviso: el formato tsv no usa el almacén de chunks; se escribe un directorio de archivos")
+            chunked = False
+        encrypt = DatabaseConfig.BACKUP_ENCRYPTION if encrypt is None else encrypt
+        if encrypt and chunked:
+            # Cifrar cada chunk con una clave aleatoria impediría deduplicarlo
+            print("Aviso: el almacén de chunks no se cifra; se escribe un archivo cifrado")
+            chunked = False
+        if bulk:
+            backup_file = os.path.join(backup_dir, f"backup_completo_{timestamp}{BULK_EXTENSION}")
+        else:
+            backup_file = base + RECIPE_EXTENSION if chunked else backup_filename(base, codec)
         
         db_params = DatabaseConfig.get_connection_params()
+        workers = max(1, workers or DatabaseConfig.DUMP_WORKERS)
+        options = build_dump_options(chunk_size, max_statement_bytes, extended_insert, disable_keys)
+        change_detection = change_detection or DatabaseConfig.DUMP_CHANGE_DETECTION
+        if bulk and change_detection != "none":
+            # Las secciones reutilizables son texto SQL; el formato TSV siempre vuelca todo
+            print("Aviso: la detección de tablas sin cambios no aplica al formato tsv")
+            change_detection = "none"
+        previous = PreviousBackup.latest(catalog) if change_detection != "none" else None
         
-        with open(backup_file, 'w') as f:
-            # Escribir metadata
-            f.write(f"-- Backup de la base de datos {db_params['database']}\n")
-            f.write(f"-- Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            
-            # Configuración inicial
-            f.write("SET FOREIGN_KEY_CHECKS=0;\n")
-            f.write("SET SQL_MODE = 'NO_AUTO_VALUE_ON_ZERO';\n")
-            f.write("SET AUTOCOMMIT = 0;\n")
-            f.write("START TRANSACTION;\n\n")
-            
-            # Obtener y procesar cada tabla
-            tables = get_table_list()
-            for table in tables:
-                f.write(f"--\n-- Estructura de la tabla `{table}`\n--\n\n")
-                f.write(f"DROP TABLE IF EXISTS `{table}`;\n")
-                f.write(f"{get_table_structure(table)};\n\n")
-                
-                f.write(f"--\n-- Datos de la tabla `{table}`\n--\n\n")
-                table_data = get_table_data(table)
-                if table_data:
-                    f.write(f"{table_data}\n\n")
-            
-            # Configuración final
-            f.write("COMMIT;\n")
-            f.write("SET FOREIGN_KEY_CHECKS=1;\n")
+        # El estado de las tablas se lee antes del snapshot: todo cambio que refleje ya está en él
+        with metrics.phase('table_status'):
+            table_status, observed_at = read_table_status()
         
-        # Obtener y guardar la posición del binary log
-        binary_log_pos = get_binary_log_position()
+        # El catálogo de esquema se revalida una vez, con el bloqueo del snapshot tomado para que
+        # tablas, estructuras y vistas correspondan a los datos; después responde sin consultar
+        schema = get_schema()
+        snapshot_schema = {}
+
+        def read_schema(conn):
+            with metrics.phase('schema'):
+                snapshot_schema['changed'] = schema.refresh()
+                snapshot_schema['tables'] = schema.tables()
+                for table in snapshot_schema['tables']:
+                    schema.create_statement(table)
+                snapshot_schema['views'] = schema.view_statements(conn)
+
+        # Abrir el snapshot y capturar la posición del binary log en el mismo instante
+        with metrics.phase('snapshot'):
+            connections, binary_log_pos = open_consistent_snapshot(workers, read_schema)
+        backup_id = catalog.start_backup('full', backup_file, start_position=binary_log_pos,
+                                         codec=codec or DatabaseConfig.BACKUP_CODEC)
+        
+        # Metadata y configuración inicial
+        header = f"-- Backup de la base de datos {db_params['database']}\n"
+        header += f"-- Generado: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n"
+        if binary_log_pos:
+            header += f"-- Posición del binary log: {binary_log_pos}\n"
+        header += "\n"
+        header += "SET FOREIGN_KEY_CHECKS=0;\n"
+        header += "SET SQL_MODE = 'NO_AUTO_VALUE_ON_ZERO';\n"
+        
+        changed, tables, views = snapshot_schema['changed'], snapshot_schema['tables'], snapshot_schema['views']
+        if changed:
+            print(f"Catálogo de esquema actualizado: {len(changed)} tablas nuevas o modificadas")
+        with metrics.phase('detect_changes'):
+            fingerprints, unchanged = detect_unchanged(tables, connections[0], change_detection, options,
+                                                       table_status, observed_at, previous)
+        limiter = create_throttle(workers, throttle)
+        if limiter:
+            limiter.start()
+        with metrics.phase('write_tables') as phase:
+            if bulk:
+                f = write_bulk_backup(backup_file, tables, connections, header, codec, compression_level,
+                                      compression_threads, options['chunk_size'], shard_rows, limiter, encrypt,
+                                      views)
+                sections = None
+            else:
+                with (ChunkedBackupWriter(backup_file, codec, compression_level, compression_threads) if chunked
+                      else BackupWriter(backup_file, codec, compression_level, compression_threads, encrypt)) as f:
+                    f.write(header)
+                    f.write("SET AUTOCOMMIT = 0;\n")
+                    f.write("START TRANSACTION;\n\n")
+                    sections = write_tables(f, tables, connections, backup_dir, options, shard_rows,
+                                            previous, unchanged, limiter)
+                    write_views(f, views)
+                    
+                    # Configuración final
+                    f.write("COMMIT;\n")
+                    f.write("SET FOREIGN_KEY_CHECKS=1;\n")
+            phase.add(bytes=f.bytes_in)
+        if limiter:
+            limiter.stop()
+            reductions = sum(1 for decision in limiter.decisions if decision['action'] == "reducir")
+            print(f"Limitación adaptativa: {reductions} reducciones, factor final {limiter.factor:.2f}")
+        
+        # Índice de secciones para restaurar tablas o rangos de clave sin leer todo el backup
+        if sections is not None:
+            with metrics.phase('section_index'):
+                write_section_index(backup_file, f, sections)
+        
+        # Checksums en el mismo snapshot; las tablas copiadas conservan los del backup anterior
+        table_checksums = []
+        if DatabaseConfig.BACKUP_CHECKSUMS if checksums is None else checksums:
+            started = time.perf_counter()
+            with metrics.phase('checksums') as phase:
+                if unchanged:
+                    table_checksums = [record for record in catalog.checksums(previous.record['id'])
+                                       if record['name'] in unchanged]
+                reused = {record['name'] for record in table_checksums}
+                table_checksums += compute_checksums([table for table in tables if table not in reused],
+                                                     connections)
+                phase.add(rows=sum(record['rows'] for record in table_checksums))
+            print(f"Checksums calculados para {len(tables)} tablas en {time.perf_counter() - started:.1f}s")
+        
+        # Registrar el backup con la posición del binary log capturada junto con el snapshot
+        with metrics.phase('catalog'):
+            catalog.finish_backup(backup_id, binary_log_pos, f)
+            catalog.record_tables(backup_id, [{'name': table, **fingerprints[table],
+                                               **(sections or {}).get(table, {})} for table in tables])
+            catalog.record_checksums(backup_id, table_checksums)
         if binary_log_pos:
-            save_backup_position(binary_log_pos)
-            print(f"Posición del binary log guardada: {binary_log_pos}")
+            print(f"Posición del binary log registrada en el catálogo: {binary_log_pos}")
         else:
             print("Advertencia: No se pudo obtener la posición del binary log")
         
         print(f"Backup creado exitosamente: {backup_file}")
+        if chunked:
+            report = f.report()
+            print(f"Chunks ({f.codec.name}): {report['new_chunks']} nuevos de {report['chunks']}, "
+                  f"{report['bytes_in']} -> {report['bytes_written']} bytes escritos "
+                  f"(deduplicación {report['dedup_ratio']:.2f}x, {report['ingest_mb_s']:.1f} MB/s)")
+        elif f.bytes_in:
+            print(f"Compresión ({f.codec.name}{', cifrado' if encrypt else ''}): {f.bytes_in} -> {f.bytes_out} bytes "
+                  f"(ratio {f.bytes_in / max(1, f.bytes_out):.2f})")
+        if unchanged:
+            skipped = sum(fingerprints[table]['data_length'] or 0 for table in unchanged)
+            copied = sum(sections[table]['data_bytes'] for table in unchanged)
+            print(f"Tablas sin cambios ({change_detection}): {len(unchanged)} de {len(tables)}, "
+                  f"copiadas de {previous.record['path']}; se evitó leer {skipped} bytes de la base "
+                  f"de datos ({copied} bytes de SQL reutilizados)")
         return backup_file, binary_log_pos
         
     except Exception as e:
         print(f"Error inesperado: {e}")
+        if backup_id is not None:
+            catalog.fail_backup(backup_id, str(e))
         return None, None
+    finally:
+        if limiter:
+            limiter.stop()
+        close_snapshot(connections)
 
-def restore_full_backup(backup_file):
+@metrics.instrumented('full_restore', success=bool)
+def restore_full_backup(backup_file, resume=False, workers=None, verify=None):
     """
     Restaura la base de datos desde un archivo de backup.
+    El códec de compresión se detecta automáticamente y el archivo se lee en
+    buffers de tamaño fijo, aplicando las sentencias una a una, por lo que la
+    memoria usada no depende del tamaño del backup.
     
     Args:
         backup_file (str): Ruta al archivo de backup
+        resume (bool): Reanudar desde el último punto de control de una restauración fallida
+        workers (int): Conexiones de carga; con más de una, las tablas se cargan en paralelo
+            y los índices secundarios se crean al final (sin puntos de control)
+        verify (bool): Comparar los datos restaurados con los checksums del backup
+            (por defecto DatabaseConfig.VERIFY_AFTER_RESTORE)
         
     Returns:
-        bool: True si la restauración fue exitosa, False en caso contrario
+        bool: True si la restauración fue exitosa (y los checksums coinciden), False en caso contrario
     """
     try:
         if not os.path.exists(backup_file):
@@ -104,34 +253,69 @@ def restore_full_backup(backup_file):
             
         print(f"\nRestaurando backup desde: {backup_file}")
         
-        db_params = DatabaseConfig.get_connection_params()
-        command = [
-            "mysql",
-            f"--host={db_params['host']}",
-            f"--user={db_params['user']}",
-            f"--password={db_params['password']}",
-            db_params['database']
-        ]
-        
-        with open(backup_file, 'r') as f:
-            process = subprocess.run(
-                command,
-                input=f.read(),
-                text=True,
-                check=True
-            )
-        
-        print("Restauración completada exitosamente")
+        workers = workers or DatabaseConfig.RESTORE_WORKERS
+        with metrics.phase('apply') as phase:
+            if is_bulk_backup(backup_file):
+                summary = apply_bulk_backup(backup_file, workers)
+            elif workers > 1:
+                summary = apply_backup_parallel(backup_file, workers)
+            else:
+                summary = apply_backup(backup_file, resume=resume)
+            phase.add(bytes=summary['bytes_applied'])
+        invalidate_schema()
+        
+        if 'rows' in summary:
+            print(f"Restauración completada exitosamente: {summary['rows']} filas de {summary['files']} "
+                  f"archivos en {summary['elapsed']:.1f}s ({summary['rows_per_second']:.0f} filas/s)")
+        else:
+            print(f"Restauración completada exitosamente: {summary['statements']} sentencias, "
+                  f"{summary['bytes_applied']} bytes en {summary['elapsed']:.1f}s")
+        
+        if DatabaseConfig.VERIFY_AFTER_RESTORE if verify is None else verify:
+            with metrics.phase('verify'):
+                report = verify_backup(backup_file)
+            if report and (report['mismatches'] or report['missing_tables']):
+                print("Error: Los datos restaurados no coinciden con el backup")
+                return False
         return True
         
     except Exception as e:
         print(f"Error inesperado: {e}")
+        invalidate_schema()
+        if os.path.exists(checkpoint_path(backup_file)):
+            print("Se puede reanudar la restauración con resume=True")
         return False
 
 def main():
     """
     Función principal que ejecuta el proceso completo de backup, simulación de desastre y restauración.
     """
+    parser = argparse.ArgumentParser(description="Backup completo, simulación de desastre y restauración")
+    parser.add_argument("--workers", type=int, default=DatabaseConfig.DUMP_WORKERS,
+                        help="Conexiones que vuelcan tablas en paralelo")
+    parser.add_argument("--codec", default=DatabaseConfig.BACKUP_CODEC,
+                        help="Códec de compresión: none, gzip, zstd o lz4")
+    parser.add_argument("--format", choices=["sql", "tsv"], default=DatabaseConfig.DUMP_FORMAT,
+                        help="Formato del volcado: sentencias INSERT o archivos TSV para LOAD DATA")
+    parser.add_argument("--store", choices=["file", "chunks"], default=DatabaseConfig.BACKUP_STORE,
+                        help="Almacenamiento: un archivo por backup o almacén de chunks deduplicado")
+    parser.add_argument("--change-detection", choices=["none", "update_time", "checksum"],
+                        default=DatabaseConfig.DUMP_CHANGE_DETECTION,
+                        help="Reutilizar del backup anterior los datos de las tablas sin cambios")
+    parser.add_argument("--encrypt", action="store_true", default=DatabaseConfig.BACKUP_ENCRYPTION,
+                        help="Cifrar el backup (AEAD) después de comprimirlo")
+    parser.add_argument("--throttle", action="store_true", default=DatabaseConfig.THROTTLE_ENABLED,
+                        help="Limitar el volcado según la carga del servidor")
+    parser.add_argument("--restore-workers", type=int, default=DatabaseConfig.RESTORE_WORKERS,
+                        help="Conexiones que cargan datos en paralelo durante la restauración")
+    parser.add_argument("--level", type=int, default=DatabaseConfig.BACKUP_COMPRESSION_LEVEL,
+                        help="Nivel de compresión")
+    parser.add_argument("--profile", action="store_true",
+                        help="Perfilar el backup y la restauración con cProfile")
+    args = parser.parse_args()
+    if args.profile:
+        DatabaseConfig.METRICS_PROFILE = True
+    
     print("=== Sistema de Backup y Restauración ===")
     time.sleep(1)
     
@@ -145,7 +329,11 @@ def main():
     # Paso 1: Crear backup
     print("\n1. Creando backup...")
     time.sleep(2)
-    backup_file, binary_log_pos = create_full_backup()
+    backup_file, binary_log_pos = create_full_backup(workers=args.workers, codec=args.codec,
+                                                      compression_level=args.level, store=args.store,
+                                                      change_detection=args.change_detection,
+                                                      throttle=args.throttle, dump_format=args.format,
+                                                      encrypt=args.encrypt)
     if not backup_file:
         print("Error: No se pudo crear el backup")
         return
@@ -183,7 +371,7 @@ def main():
     # Paso 3: Restaurar desde backup
     print("\n3. Restaurando desde backup...")
     time.sleep(2)
-    if not restore_full_backup(backup_file):
+    if not restore_full_backup(backup_file, workers=args.restore_workers):
         print("Error: No se pudo restaurar el backup")
         return
     
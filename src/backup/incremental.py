@@ -1,12 +1,23 @@
+import argparse
 import os
+import re
 import subprocess
 from datetime import datetime
+from src.db import metrics
 from src.db.config import DatabaseConfig
-from src.db.utils import execute_query, get_table_list, get_table_structure, get_table_data, show_table_data
+from src.db.schema import invalidate_schema
+from src.db.utils import execute_query, fetch_one, get_mysql_command, show_table_data
 import time
 from typing import Optional, Tuple
 from src.db.disaster_simulator import simulate_disaster
 from src.backup.full import restore_full_backup
+from src.backup.binlog import BinlogReader, BinlogSqlWriter, file_sequence
+from src.backup.binlog_index import BinlogIndex, update_index
+from src.backup.catalog import BackupCatalog
+from src.backup.compression import BackupWriter, backup_filename, iter_lines, stream_to_process
+
+# Comentario que el escritor de binlog antepone a cada transacción
+_POSITION_MARKER = re.compile(rb"^# at ([^:\s]+):(\d+)")
 
 def get_binary_log_info():
     """
@@ -15,22 +26,12 @@ def get_binary_log_info():
     Returns:
         tuple: (nombre del archivo binlog actual, posición)
     """
-    result = execute_query("SHOW MASTER STATUS;")
-    if not result:
-        raise Exception("No se pudo obtener información del binary log")
-        
-    # El resultado tiene este formato:
-    # File    Position    Binlog_Do_DB    Binlog_Ignore_DB    Executed_Gtid_Set
-    # mysql-bin.000001    1234            ...
-    lines = result.strip().split('\n')
-    if len(lines) < 2:  # necesitamos al menos el header y una línea de datos
+    # Columnas: File, Position, Binlog_Do_DB, Binlog_Ignore_DB, Executed_Gtid_Set
+    row = fetch_one("SHOW MASTER STATUS")
+    if not row:
         raise Exception("No hay información de binary log disponible")
         
-    fields = lines[1].split('\t')
-    if len(fields) < 2:
-        raise Exception("Formato de binary log inesperado")
-        
-    return fields[0], int(fields[1])
+    return row[0], int(row[1])
 
 def enable_binary_logging():
     """
@@ -38,11 +39,11 @@ def enable_binary_logging():
     """
     try:
         # Verificar si binary logging está habilitado
-        result = execute_query("SHOW VARIABLES LIKE 'log_bin';")
-        if result is None:
+        row = fetch_one("SHOW VARIABLES LIKE 'log_bin'")
+        if row is None:
             raise Exception("No se pudo verificar el estado del binary logging")
             
-        is_enabled = 'ON' in result.upper()
+        is_enabled = str(row[1]).upper() == 'ON'
         
         if not is_enabled:
             print("Binary logging no está habilitado. Habilitando...")
@@ -59,37 +60,6 @@ def enable_binary_logging():
         print(f"Error verificando binary logging: {e}")
         raise
 
-def get_last_backup_position() -> Optional[str]:
-    """
-    Lee la última posición de backup guardada
-    Returns:
-        str: Última posición en formato 'file:position'
-    """
-    try:
-        with open('backups/last_position.txt', 'r') as f:
-            return f.read().strip()
-    except FileNotFoundError:
-        return None
-    except Exception as e:
-        print(f"Error leyendo última posición de backup: {e}")
-        return None
-
-def save_backup_position(position: str) -> bool:
-    """
-    Guarda la posición actual del backup
-    Args:
-        position (str): Posición en formato 'file:position'
-    Returns:
-        bool: True si se guardó correctamente
-    """
-    try:
-        with open('backups/last_position.txt', 'w') as f:
-            f.write(position)
-        return True
-    except Exception as e:
-        print(f"Error guardando posición de backup: {e}")
-        return False
-
 def get_binary_log_position() -> Optional[str]:
     """
     Obtiene la posición actual del binary log
@@ -97,23 +67,14 @@ def get_binary_log_position() -> Optional[str]:
         str: Posición en formato 'file:position'
     """
     try:
-        result = execute_query("SHOW MASTER STATUS")
-        if not result:
-            return None
-            
         print("Obteniendo posición del binary log...")
         
-        # Parsear el resultado
-        lines = result.strip().split('\n')        
-        if len(lines) < 2:
-            return None
-            
-        # La segunda línea contiene los datos
-        fields = lines[1].split()
-        if len(fields) < 2:
+        # Columnas: File, Position, Binlog_Do_DB, Binlog_Ignore_DB, Executed_Gtid_Set
+        row = fetch_one("SHOW MASTER STATUS")
+        if not row:
             return None
             
-        position = f"{fields[0]}:{fields[1]}"
+        position = f"{row[0]}:{row[1]}"
         print(f"Posición del binary log: {position}\n")
         return position
         
@@ -121,20 +82,34 @@ def get_binary_log_position() -> Optional[str]:
         print(f"Error obteniendo posición del binary log: {e}")
         return None
 
-def create_incremental_backup() -> Tuple[Optional[str], Optional[str], Optional[str]]:
+@metrics.instrumented('incremental_backup', success=lambda result: result[0] is not None)
+def create_incremental_backup(codec: Optional[str] = None, compression_level: Optional[int] = None,
+                              encrypt: Optional[bool] = None) -> Tuple[Optional[str], Optional[str], Optional[str]]:
     """
-    Crea un backup incremental válido usando mysqlbinlog.
+    Crea un backup incremental leyendo directamente los archivos binlog.
+    Los eventos se recorren en orden desde la posición final del último backup
+    del catálogo hasta la actual, atravesando todos los archivos intermedios, y
+    se comprimen en línea con el códec indicado. El nuevo backup se registra en
+    el catálogo como hijo de ese último backup.
+    Args:
+        codec (str): Códec de compresión (por defecto DatabaseConfig.BACKUP_CODEC)
+        compression_level (int): Nivel de compresión del códec
+        encrypt (bool): Cifrar el backup después de comprimirlo (por defecto DatabaseConfig.BACKUP_ENCRYPTION)
     Returns:
         tuple: (nombre_archivo_backup, posicion_inicio, posicion_fin)
     """
-    # Obtener la última posición
-    last_position = get_last_backup_position()
-    if not last_position:
+    catalog = BackupCatalog()
+
+    # Obtener la última posición respaldada
+    parent = catalog.latest()
+    if not parent or not parent['end_file']:
         print("No se encontró un backup previo. Se requiere un backup completo primero.")
         return None, None, None
+    last_position = f"{parent['end_file']}:{parent['end_pos']}"
 
     # Obtener la posición actual
-    current_position = get_binary_log_position()
+    with metrics.phase('binlog_position'):
+        current_position = get_binary_log_position()
     if not current_position:
         print("No se pudo obtener la posición actual del binary log.")
         return None, None, None
@@ -144,115 +119,193 @@ def create_incremental_backup() -> Tuple[Optional[str], Optional[str], Optional[
 
     # Nombre del archivo backup
     timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    backup_file = f'backups/backup_incremental_{timestamp}.sql'
+    backup_file = backup_filename(
+        os.path.join(DatabaseConfig.BACKUP_DIR, f'backup_incremental_{timestamp}.sql'), codec
+    )
 
     print(f"Creando backup incremental desde {last_position} hasta {current_position}")
+    if last_file != current_file:
+        print(f"Detectado cambio de archivo binlog de {last_file} a {current_file}")
 
+    backup_id = catalog.start_backup('incremental', backup_file, parent['id'], last_position,
+                                     codec or DatabaseConfig.BACKUP_CODEC)
     try:
-        # Caso sencillo: ambos en el mismo archivo binlog
-        if last_file == current_file:
-            cmd = [
-                "mysqlbinlog",
-                f"--start-position={last_pos}",
-                f"--stop-position={current_pos}",
-                f"/var/lib/mysql/{last_file}"
-            ]
-            with open(backup_file, "w") as f:
-                subprocess.run(cmd, stdout=f, check=True)
-        
-        else:
-            # Caso donde se cruzó de archivo binlog
-            print(f"Detectado cambio de archivo binlog de {last_file} a {current_file}")
-            
-            # Extraer desde last_file desde last_pos hasta el final
-            cmd1 = [
-                "mysqlbinlog",
-                f"--start-position={last_pos}",
-                f"/var/lib/mysql/{last_file}"
-            ]
-            # Extraer archivos intermedios si los hubiera (no implementado aquí)
-
-            # Extraer desde el inicio del current_file hasta current_pos
-            cmd2 = [
-                "mysqlbinlog",
-                f"--stop-position={current_pos}",
-                f"/var/lib/mysql/{current_file}"
-            ]
-            with open(backup_file, "w") as f:
-                subprocess.run(cmd1, stdout=f, check=True)
-                subprocess.run(cmd2, stdout=f, check=True)
-
-        print(f"Backup incremental creado: {backup_file}")
-        
-        # Guardar la nueva posición
-        save_backup_position(current_position)
+        reader = BinlogReader()
+        with BackupWriter(backup_file, codec, compression_level, encrypt=encrypt) as f, \
+                metrics.phase('binlog') as phase:
+            sql = BinlogSqlWriter(f)
+            for event in reader.events(last_file, int(last_pos), current_file, int(current_pos)):
+                sql.write_event(event)
+            sql.close()
+            phase.add(rows=sql.events, bytes=f.bytes_in)
 
-        return backup_file, last_position, current_position
-    
-    except subprocess.CalledProcessError as e:
-        print(f"Error ejecutando mysqlbinlog: {e}")
+        # Registrar el backup; la siguiente ejecución continúa desde su posición final
+        catalog.finish_backup(backup_id, current_position, f)
+    except Exception as e:
+        # Cualquier error (también del driver o de un evento mal formado) deja el backup como fallido
+        if isinstance(e, (OSError, ValueError)):
+            print(f"Error leyendo el binary log: {e}")
+        else:
+            print(f"Error inesperado: {type(e).__name__}: {e}")
+        catalog.fail_backup(backup_id, str(e))
+        if os.path.exists(backup_file):
+            os.remove(backup_file)
         return None, None, None
 
-def restore_incremental_backup(backup_file: str) -> bool:
+    print(f"Backup incremental creado: {backup_file} "
+          f"({sql.events} eventos, {sql.transactions} transacciones)")
+    print(f"Compresión ({f.codec.name}): {f.bytes_in} -> {f.bytes_out} bytes")
+
+    # Indexar los binlogs nuevos para la recuperación a un punto en el tiempo; el backup ya está registrado
+    try:
+        with metrics.phase('binlog_index'):
+            update_index(current_file)
+    except Exception as e:
+        print(f"Advertencia: no se pudo actualizar el índice de binlog: {e}")
+
+    return backup_file, last_position, current_position
+
+def _cut_at_position(stop_file: str, stop_pos: int):
+    """
+    Crea un filtro que deja pasar el backup incremental hasta la primera
+    transacción ubicada en (stop_file, stop_pos) o después.
+    """
+    stop = (file_sequence(stop_file), stop_pos)
+
+    def transform(reader):
+        for line in iter_lines(reader):
+            match = _POSITION_MARKER.match(line)
+            if match and (file_sequence(match.group(1).decode()), int(match.group(2))) >= stop:
+                yield b"DELIMITER ;\n"
+                return
+            yield line
+
+    return transform
+
+def find_stop_position(until: str) -> Optional[Tuple[str, int]]:
     """
-    Restaura un backup incremental aplicando el archivo generado por mysqlbinlog.
-    Este proceso incluye primero restaurar el último backup completo y luego aplicar
-    los cambios incrementales.
+    Busca en el índice de binlog la posición de corte para una fecha o un GTID.
+    Antes de buscar se indexan los binlogs nuevos, si están disponibles.
 
     Args:
-        backup_file (str): Ruta al archivo incremental .sql
+        until (str): Fecha 'YYYY-MM-DD HH:MM:SS' o GTID 'uuid:n'
+
+    Returns:
+        tuple: (archivo, posición) o None si el punto es posterior a todo lo indexado
+    """
+    try:
+        index = update_index()
+    except (OSError, ValueError) as e:
+        print(f"Advertencia: no se pudo actualizar el índice de binlog, se usa el existente: {e}")
+        index = BinlogIndex()
+    return index.find(until)
+
+@metrics.instrumented('incremental_restore', success=bool)
+def restore_incremental_backup(backup_file: Optional[str] = None, until: Optional[str] = None) -> bool:
+    """
+    Restaura la cadena de backups que termina en un backup incremental.
+    La cadena se obtiene del catálogo: primero se restaura su backup completo y
+    luego se aplican en orden todos los incrementales hasta el indicado. Los
+    archivos comprimidos se descomprimen en línea.
+
+    Con `until` la cadena se elige por la posición del binlog correspondiente
+    (obtenida del índice de binlog con una búsqueda binaria, sin decodificar los
+    binlogs) y el último incremental se detiene antes de la primera transacción
+    posterior a ese instante (o GTID).
+
+    Args:
+        backup_file (str): Ruta al último incremental a aplicar (por defecto el backup más reciente)
+        until (str): Fecha 'YYYY-MM-DD HH:MM:SS' o GTID 'uuid:n' hasta donde restaurar
 
     Returns:
         bool: True si se restauró correctamente, False si hubo errores.
     """
     print(f"\nIniciando proceso de restauración completa + incremental\n")
 
-    # Validar archivo incremental
-    if not os.path.isfile(backup_file):
-        print(f"✗ Error: el archivo {backup_file} no existe.")
-        return False
+    stop = None
+    if until:
+        try:
+            stop = find_stop_position(until)
+        except ValueError as e:
+            print(f"✗ Error: punto de restauración inválido: {e}")
+            return False
+        if stop is None:
+            print(f"Ninguna transacción indexada es posterior a {until}; se aplica la cadena completa")
+        else:
+            print(f"Restaurando hasta {until} (antes de {stop[0]}:{stop[1]})")
 
-    # Primero encontrar y restaurar el último backup completo
-    print("\n=== Paso 1: Restaurando el último backup completo ===")
-    backup_dir = "backups"
-    full_backups = [f for f in os.listdir(backup_dir) if f.startswith("backup_completo_")]
-    if not full_backups:
-        print("✗ Error: No se encontró un backup completo")
+    try:
+        chain = BackupCatalog().restore_chain(position=stop, backup_path=None if stop else backup_file)
+    except ValueError as e:
+        print(f"✗ Error: {e}")
         return False
+    if not chain:
+        print("✗ Error: el catálogo no tiene una cadena de backups que cubra el punto solicitado")
+        return False
+
+    for backup in chain:
+        if not os.path.exists(backup['path']):
+            print(f"✗ Error: el archivo {backup['path']} no existe.")
+            return False
+
+    # Primero restaurar el backup completo de la cadena
+    full, incrementals = chain[0], chain[1:]
+    print("\n=== Paso 1: Restaurando el backup completo ===")
+    print(f"Restaurando desde: {full['path']}")
     
-    latest_full_backup = os.path.join(backup_dir, sorted(full_backups)[-1])
-    print(f"Restaurando desde: {latest_full_backup}")
-    
-    if not restore_full_backup(latest_full_backup):
+    if not restore_full_backup(full['path']):
         print("✗ Error al restaurar el backup completo")
         return False
     
     print("✓ Backup completo restaurado correctamente")
 
-    # Ahora restaurar el backup incremental
-    print("\n=== Paso 2: Aplicando backup incremental ===")
+    # Ahora aplicar los incrementales en orden
+    print(f"\n=== Paso 2: Aplicando {len(incrementals)} backups incrementales ===")
     
-    # Leer configuración de conexión
-    db_params = DatabaseConfig.get_connection_params()
-    cmd = [
-        "mysql",
-        f"--host={db_params['host']}",
-        f"--user={db_params['user']}",
-        f"--password={db_params['password']}",
-        f"--port={db_params['port']}",
-        db_params['database'],
-    ]
+    cmd = get_mysql_command()
+    for number, backup in enumerate(incrementals, start=1):
+        last = number == len(incrementals)
+        transform = _cut_at_position(*stop) if last and stop else None
+        print(f"[{number}/{len(incrementals)}] {backup['path']} "
+              f"({backup['start_file']}:{backup['start_pos']} -> {backup['end_file']}:{backup['end_pos']})")
+        try:
+            with metrics.phase('apply_incremental') as phase:
+                stream_to_process(backup['path'], cmd, transform)
+                phase.add(bytes=backup['bytes_in'] or 0)
+        except subprocess.CalledProcessError as e:
+            print(f"✗ Error restaurando el backup incremental {backup['path']}: {e}")
+            return False
+        finally:
+            # Los binlogs pueden contener DDL
+            invalidate_schema()
 
-    try:
-        with open(backup_file, "r") as f:
-            subprocess.run(cmd, stdin=f, check=True)
-        print("✓ Backup incremental restaurado correctamente")
-        return True
-    except subprocess.CalledProcessError as e:
-        print(f"✗ Error restaurando el backup incremental: {e}")
-        return False
+    print("✓ Backups incrementales restaurados correctamente")
+    return True
 
 def main():
+    parser = argparse.ArgumentParser(description="Backup incremental, simulación de desastre y restauración")
+    parser.add_argument("--codec", default=DatabaseConfig.BACKUP_CODEC,
+                        help="Códec de compresión: none, gzip, zstd o lz4")
+    parser.add_argument("--level", type=int, default=DatabaseConfig.BACKUP_COMPRESSION_LEVEL,
+                        help="Nivel de compresión")
+    parser.add_argument("--encrypt", action="store_true", default=DatabaseConfig.BACKUP_ENCRYPTION,
+                        help="Cifrar el backup (AEAD) después de comprimirlo")
+    parser.add_argument("--restore", nargs="?", const="", metavar="BACKUP",
+                        help="Solo restaurar la cadena que termina en el backup indicado "
+                             "(sin valor, la más reciente) sin la demostración")
+    parser.add_argument("--until",
+                        help="Restaurar hasta una fecha 'YYYY-MM-DD HH:MM:SS' o un GTID 'uuid:n'")
+    parser.add_argument("--profile", action="store_true",
+                        help="Perfilar el backup y la restauración con cProfile")
+    args = parser.parse_args()
+    if args.profile:
+        DatabaseConfig.METRICS_PROFILE = True
+
+    if args.restore is not None:
+        if not restore_incremental_backup(args.restore or None, args.until):
+            raise SystemExit(1)
+        return
+
     print("\n=== Sistema de Backup Incremental ===\n")
     
     print("Estado inicial de la tabla employees:")
@@ -292,7 +345,7 @@ def main():
 
     # Crear el backup incremental
     print("Creando backup incremental...\n")
-    backup_file, start_pos, end_pos = create_incremental_backup()
+    backup_file, start_pos, end_pos = create_incremental_backup(args.codec, args.level, args.encrypt)
     if backup_file:
         print("\n✓ Backup incremental creado exitosamente")
         print(f"Archivo de backup: {backup_file}")
@@ -312,7 +365,7 @@ def main():
 
         # Restaurar usando el backup incremental (que incluye restaurar el backup completo)
         print("\n=== Iniciando proceso de restauración ===")
-        if restore_incremental_backup(backup_file):
+        if restore_incremental_backup(backup_file, args.until):
             print("\nEstado final de la tabla después de la restauración:")
             show_table_data('employees')
             print("\n¡Proceso completo de backup y restauración finalizado exitosamente!")
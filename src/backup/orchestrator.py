@@ -0,0 +1,452 @@
+"""
+Orquestación de backups de varias instancias MySQL y bases de datos.
+Lee los destinos de un archivo JSON (BACKUP_TARGETS_FILE o --targets) o de la
+variable de entorno BACKUP_TARGETS, y hace el backup de todos en paralelo:
+- Cada destino (una base de datos de un servidor) corre en un proceso nuevo con
+  su propia configuración: conexión, directorio de backups, catálogo, almacén
+  de chunks, índice del binlog, métricas y catálogo de esquema
+- Nunca corren más de ORCHESTRATOR_MAX_CONCURRENT backups a la vez, ni más de
+  ORCHESTRATOR_MAX_PER_HOST contra un mismo servidor (dos volcados pesados en un
+  servidor compiten por el mismo disco y buffer pool)
+- Los destinos más grandes (DATA_LENGTH + INDEX_LENGTH en information_schema)
+  se programan primero, para que el más largo no empiece al final
+- Al terminar se guarda un único reporte con duración y bytes por destino
+
+Formato de los destinos:
+
+    {
+      "defaults": {"user": "backup", "password_env": "BACKUP_PASSWORD"},
+      "targets": [
+        {"host": "mysql-a", "databases": ["ventas", "compras"]},
+        {"name": "clientes", "host": "mysql-b", "port": 3307, "database": "clientes",
+         "config": {"DUMP_WORKERS": 4, "BACKUP_CODEC": "zstd"}}
+      ]
+    }
+
+Cada entrada admite host, port, user, password (o password_env, la variable de
+entorno que la contiene), database o databases, name, server (agrupa en el
+límite por servidor destinos con distinto host, p. ej. un alias y su IP),
+backup_dir, binlog_dir (para los incrementales; obligatorio salvo para el
+servidor de DatabaseConfig, cuyos binlogs están en BINLOG_DIR) y config
+(atributos de DatabaseConfig). Una entrada con varias bases de datos se expande en un destino
+por base. También se acepta una lista de entradas sin "defaults".
+
+Uso:
+    python3 -m src.backup.orchestrator
+    python3 -m src.backup.orchestrator --targets backups/targets.json --max-concurrent 8 --max-per-host 2
+    python3 -m src.backup.orchestrator --kind incremental --only clientes --only mysql-a_ventas
+    python3 -m src.backup.orchestrator --dry-run
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import queue
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from typing import List, Optional
+
+import mysql.connector
+from mysql.connector import errors
+
+from src.db.config import DatabaseConfig
+
+KINDS = ("full", "incremental")
+_ENTRY_FIELDS = {'name', 'host', 'port', 'user', 'password', 'password_env', 'database', 'databases', 'server',
+                 'backup_dir', 'binlog_dir', 'config'}
+_NAME_PATTERN = re.compile(r"^[A-Za-z0-9._-]+$")
+_SIZE_QUERY = ("SELECT COALESCE(SUM(DATA_LENGTH + INDEX_LENGTH), 0) FROM information_schema.TABLES "
+               "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_TYPE = 'BASE TABLE'")
+
+
+def _expand(entry: dict, defaults: dict) -> List[dict]:
+    """Convierte una entrada del archivo en un destino por base de datos."""
+    merged = {**defaults, **entry}
+    merged['config'] = {**defaults.get('config', {}), **entry.get('config', {})}
+    unknown = set(merged) - _ENTRY_FIELDS
+    if unknown:
+        raise ValueError(f"Campos desconocidos en un destino: {', '.join(sorted(unknown))}")
+    if not merged.get('host'):
+        raise ValueError(f"Destino sin host: {entry}")
+    databases = merged.get('databases') or ([merged['database']] if merged.get('database') else [])
+    if not databases:
+        raise ValueError(f"Destino sin base de datos: {entry}")
+    if merged.get('name') and len(databases) > 1:
+        raise ValueError(f"'name' no puede usarse con varias bases de datos: {entry}")
+    for name in merged['config']:
+        if not name.isupper() or not hasattr(DatabaseConfig, name):
+            raise ValueError(f"Atributo de DatabaseConfig desconocido en un destino: {name}")
+
+    password = merged.get('password')
+    if password is None and merged.get('password_env'):
+        password = os.environ.get(merged['password_env'])
+        if password is None:
+            raise ValueError(f"La variable de entorno {merged['password_env']} no está definida")
+
+    host, port = merged['host'], int(merged.get('port', 3306))
+    targets = []
+    for database in databases:
+        name = merged.get('name') or (f"{host}_{database}" if port == 3306 else f"{host}_{port}_{database}")
+        if not _NAME_PATTERN.match(name):
+            raise ValueError(f"Nombre de destino inválido (letras, números, '.', '_' o '-'): {name}")
+        targets.append({
+            'name': name,
+            'host': host,
+            'port': port,
+            'user': merged.get('user', DatabaseConfig.USER),
+            'password': password if password is not None else DatabaseConfig.PASSWORD,
+            'database': database,
+            'server': merged.get('server') or f"{host}:{port}",
+            'backup_dir': merged.get('backup_dir') or os.path.join(DatabaseConfig.BACKUP_TARGETS_DIR, name),
+            'binlog_dir': merged.get('binlog_dir'),
+            'config': merged['config'],
+        })
+    return targets
+
+
+def load_targets(path: Optional[str] = None) -> List[dict]:
+    """
+    Carga los destinos de la variable de entorno BACKUP_TARGETS o de un archivo JSON.
+
+    Args:
+        path (str): Archivo de destinos (por defecto DatabaseConfig.BACKUP_TARGETS_FILE);
+            si se indica, tiene prioridad sobre BACKUP_TARGETS
+
+    Returns:
+        list: Un destino por base de datos, con conexión, servidor, directorio y configuración
+
+    Raises:
+        FileNotFoundError: Si no hay BACKUP_TARGETS y el archivo no existe
+        ValueError: Si un destino es inválido o hay nombres repetidos
+    """
+    text = os.environ.get("BACKUP_TARGETS") if path is None else None
+    if text is None:
+        path = path or DatabaseConfig.BACKUP_TARGETS_FILE
+        with open(path, 'r') as f:
+            text = f.read()
+    data = json.loads(text)
+    if isinstance(data, list):
+        data = {'targets': data}
+    targets = []
+    for entry in data.get('targets', []):
+        targets.extend(_expand(entry, data.get('defaults', {})))
+    if not targets:
+        raise ValueError("No hay destinos configurados")
+    repeated = [name for name, count in Counter(target['name'] for target in targets).items() if count > 1]
+    if repeated:
+        raise ValueError(f"Nombres de destino repetidos: {', '.join(repeated)}")
+    return targets
+
+
+def target_overrides(target: dict) -> dict:
+    """Atributos de DatabaseConfig con los que corre el backup de un destino."""
+    backup_dir = target['backup_dir']
+    overrides = {
+        'HOST': target['host'],
+        'PORT': target['port'],
+        'USER': target['user'],
+        'PASSWORD': target['password'],
+        'DATABASE': target['database'],
+        'BACKUP_DIR': backup_dir,
+        'CATALOG_PATH': os.path.join(backup_dir, "catalog.db"),
+        'CHUNK_STORE_DIR': os.path.join(backup_dir, "chunks"),
+        'BINLOG_INDEX_DIR': os.path.join(backup_dir, "binlog_index"),
+        'METRICS_DIR': os.path.join(backup_dir, "metrics"),
+        'SCHEMA_CACHE_PATH': os.path.join(backup_dir, "schema.json"),
+    }
+    if target['binlog_dir']:
+        overrides['BINLOG_DIR'] = target['binlog_dir']
+    overrides.update(target['config'])
+    return overrides
+
+
+def has_binlog_source(target: dict) -> bool:
+    """
+    Indica si se sabe de dónde leer los binlogs de un destino para un incremental.
+
+    BINLOG_DIR por defecto es el volumen de datos del servidor configurado en
+    DatabaseConfig, de modo que solo vale para ese servidor; cualquier otro
+    necesita binlog_dir (o BINLOG_DIR en config). Sin esto un incremental de un
+    servidor remoto se armaría con los binlogs de otro, con nombres que coinciden.
+    """
+    if target['binlog_dir'] or 'BINLOG_DIR' in target['config']:
+        return True
+    return (target['host'], target['port']) == (DatabaseConfig.HOST, int(DatabaseConfig.PORT))
+
+
+def _last_backup_size(target: dict) -> Optional[int]:
+    """Bytes leídos por el último backup completo del destino, si su catálogo existe."""
+    path = os.path.join(target['backup_dir'], "catalog.db")
+    if not os.path.exists(path):
+        return None
+    from src.backup.catalog import BackupCatalog
+    record = BackupCatalog(path).latest_full()
+    return record['bytes_in'] if record else None
+
+
+def estimate_size(target: dict) -> Optional[int]:
+    """
+    Tamaño estimado de la base de datos de un destino.
+
+    Returns:
+        int: DATA_LENGTH + INDEX_LENGTH de sus tablas; si el servidor no responde, los bytes
+             del último backup completo del destino; None si no hay ninguna estimación
+    """
+    try:
+        conn = mysql.connector.connect(host=target['host'], port=target['port'], user=target['user'],
+                                       password=target['password'], database=target['database'],
+                                       connect_timeout=DatabaseConfig.CONNECT_TIMEOUT)
+        try:
+            cursor = conn.cursor()
+            cursor.execute(_SIZE_QUERY)
+            return int(cursor.fetchone()[0])
+        finally:
+            conn.close()
+    except errors.Error as e:
+        print(f"Advertencia: no se pudo estimar el tamaño de {target['name']}: {e}")
+        return _last_backup_size(target)
+
+
+def _run_target(target: dict, kind: str, arguments: dict, results):
+    """Ejecuta el backup de un destino en un proceso nuevo y envía el resultado por `results`."""
+    for name, value in target_overrides(target).items():
+        setattr(DatabaseConfig, name, value)
+    from src.backup.catalog import BackupCatalog
+    from src.backup.full import create_full_backup
+    from src.backup.incremental import create_incremental_backup
+    from src.db.pool import close_pool
+
+    started = time.perf_counter()
+    path, error = None, None
+    try:
+        if kind == "full":
+            path, _ = create_full_backup(**arguments)
+        else:
+            path, _, _ = create_incremental_backup(**arguments)
+        if path is None:
+            error = "el backup no generó un archivo (ver la salida del destino)"
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    elapsed = time.perf_counter() - started
+
+    record = BackupCatalog().find(path) if path else None
+    results.put({
+        'name': target['name'],
+        'ok': error is None,
+        'path': path,
+        'seconds': elapsed,
+        'bytes_in': record['bytes_in'] if record else None,
+        'bytes_out': record['bytes_out'] if record else None,
+        'error': error,
+    })
+    close_pool()
+
+
+def plan(targets: List[dict]) -> List[dict]:
+    """
+    Estima el tamaño de cada destino y los ordena de mayor a menor.
+
+    Las estimaciones se hacen en paralelo; los destinos sin estimación van al final.
+
+    Returns:
+        list: Los destinos, con 'estimated_bytes', en el orden en que se programan
+    """
+    with ThreadPoolExecutor(max_workers=min(16, len(targets))) as executor:
+        sizes = list(executor.map(estimate_size, targets))
+    for target, size in zip(targets, sizes):
+        target['estimated_bytes'] = size
+    return sorted(targets, key=lambda target: -1 if target['estimated_bytes'] is None
+                  else target['estimated_bytes'], reverse=True)
+
+
+def run_targets(targets: List[dict], kind: str = "full", arguments: Optional[dict] = None,
+                max_concurrent: Optional[int] = None, max_per_host: Optional[int] = None) -> List[dict]:
+    """
+    Ejecuta los backups de los destinos respetando los límites de concurrencia.
+
+    Cada vez que se libera un lugar se lanza el primer destino pendiente (en el
+    orden recibido, de mayor a menor) cuyo servidor no está en su límite.
+
+    Args:
+        targets (list): Destinos ya ordenados por plan()
+        kind (str): 'full' o 'incremental'
+        arguments (dict): Argumentos de create_full_backup / create_incremental_backup
+        max_concurrent (int): Backups simultáneos en total (por defecto ORCHESTRATOR_MAX_CONCURRENT)
+        max_per_host (int): Backups simultáneos por servidor (por defecto ORCHESTRATOR_MAX_PER_HOST)
+
+    Returns:
+        list: Resultado por destino, en el orden en que empezaron
+
+    Raises:
+        ValueError: Si es un incremental y algún destino no tiene de dónde leer sus binlogs
+    """
+    if kind == "incremental":
+        missing = [target['name'] for target in targets if not has_binlog_source(target)]
+        if missing:
+            raise ValueError(f"Destinos sin binlog_dir para el backup incremental: {', '.join(missing)}")
+    max_concurrent = max(1, max_concurrent or DatabaseConfig.ORCHESTRATOR_MAX_CONCURRENT)
+    max_per_host = max(1, max_per_host or DatabaseConfig.ORCHESTRATOR_MAX_PER_HOST)
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    pending = list(targets)
+    running = {}
+    per_server = Counter()
+    finished = {}
+    order = []
+    origin = time.perf_counter()
+
+    def finish(name: str, result: dict):
+        process, target, started = running.pop(name)
+        process.join()
+        per_server[target['server']] -= 1
+        finished[name] = {
+            'name': name, 'server': target['server'], 'database': target['database'], 'kind': kind,
+            'estimated_bytes': target.get('estimated_bytes'),
+            'started': started - origin, 'wall_seconds': time.perf_counter() - started, **result,
+        }
+        status = "ok" if finished[name]['ok'] else f"FALLÓ ({finished[name]['error']})"
+        print(f"[{time.perf_counter() - origin:8.1f}s] fin    {name}: {status}")
+
+    while pending or running:
+        for target in list(pending):
+            if len(running) >= max_concurrent:
+                break
+            if per_server[target['server']] >= max_per_host:
+                continue
+            pending.remove(target)
+            process = context.Process(target=_run_target, args=(target, kind, arguments or {}, results),
+                                      name=f"backup-{target['name']}")
+            process.start()
+            running[target['name']] = (process, target, time.perf_counter())
+            per_server[target['server']] += 1
+            order.append(target['name'])
+            print(f"[{time.perf_counter() - origin:8.1f}s] inicio {target['name']} ({target['server']})")
+
+        # Leer antes de join: un proceso con datos pendientes en la cola no termina
+        try:
+            result = results.get(timeout=1)
+            finish(result['name'], result)
+            continue
+        except queue.Empty:
+            pass
+        dead = [name for name, (process, _, _) in running.items() if not process.is_alive()]
+        if dead:
+            # Un resultado puede haber llegado justo después del timeout
+            try:
+                while True:
+                    result = results.get(timeout=0.5)
+                    finish(result['name'], result)
+            except queue.Empty:
+                pass
+            for name in dead:
+                if name in running:
+                    exitcode = running[name][0].exitcode
+                    finish(name, {'name': name, 'ok': False, 'path': None, 'seconds': None, 'bytes_in': None,
+                                  'bytes_out': None, 'error': f"el proceso terminó sin resultado (código {exitcode})"})
+    return [finished[name] for name in order]
+
+
+def summarize(results: List[dict], wall_seconds: float) -> dict:
+    """Totales del reporte agregado."""
+    busy = sum(result['wall_seconds'] for result in results)
+    return {
+        'targets': len(results),
+        'ok': sum(1 for result in results if result['ok']),
+        'failed': sum(1 for result in results if not result['ok']),
+        'bytes_in': sum(result['bytes_in'] or 0 for result in results),
+        'bytes_out': sum(result['bytes_out'] or 0 for result in results),
+        'wall_seconds': wall_seconds,
+        'backup_seconds': busy,
+        # Backups simultáneos en promedio (1 = secuencial)
+        'parallelism': busy / wall_seconds if wall_seconds else None,
+    }
+
+
+def print_report(report: dict):
+    """Muestra una línea por destino y los totales."""
+    print(f"\n{'destino':<32} {'servidor':<22} {'inicio':>8} {'segundos':>9} {'leído MB':>10} {'escrito MB':>11}")
+    for result in report['results']:
+        read = f"{result['bytes_in'] / 1048576:.1f}" if result['bytes_in'] else "-"
+        written = f"{result['bytes_out'] / 1048576:.1f}" if result['bytes_out'] else "-"
+        status = "" if result['ok'] else f"  FALLÓ: {result['error']}"
+        print(f"{result['name']:<32} {result['server']:<22} {result['started']:8.1f} {result['wall_seconds']:9.1f} "
+              f"{read:>10} {written:>11}{status}")
+    totals = report['totals']
+    print(f"\n{totals['ok']}/{totals['targets']} destinos correctos en {totals['wall_seconds']:.1f}s "
+          f"({totals['backup_seconds']:.1f}s de backups, paralelismo medio {totals['parallelism'] or 0:.1f}); "
+          f"{totals['bytes_in'] / 1048576:.1f} MB leídos, {totals['bytes_out'] / 1048576:.1f} MB escritos")
+
+
+def save_report(report: dict, report_dir: Optional[str] = None) -> str:
+    """Guarda el reporte como JSON en ORCHESTRATOR_REPORT_DIR y retorna la ruta."""
+    report_dir = report_dir or DatabaseConfig.ORCHESTRATOR_REPORT_DIR
+    os.makedirs(report_dir, exist_ok=True)
+    path = os.path.join(report_dir, f"orchestrator_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=1, default=str)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--targets", help="Archivo JSON de destinos (por defecto BACKUP_TARGETS o BACKUP_TARGETS_FILE)")
+    parser.add_argument("--kind", choices=KINDS, default="full", help="Tipo de backup")
+    parser.add_argument("--only", action="append", help="Destino a incluir (repetible; por defecto todos)")
+    parser.add_argument("--max-concurrent", type=int, default=DatabaseConfig.ORCHESTRATOR_MAX_CONCURRENT,
+                        help="Backups simultáneos en total")
+    parser.add_argument("--max-per-host", type=int, default=DatabaseConfig.ORCHESTRATOR_MAX_PER_HOST,
+                        help="Backups simultáneos contra un mismo servidor")
+    parser.add_argument("--codec", help="Códec de compresión (por defecto el de cada destino)")
+    parser.add_argument("--dry-run", action="store_true", help="Mostrar el orden planificado sin hacer backups")
+    args = parser.parse_args()
+
+    try:
+        targets = load_targets(args.targets)
+    except (OSError, ValueError) as e:
+        print(f"Error: no se pudieron cargar los destinos: {e}")
+        sys.exit(2)
+    if args.only:
+        unknown = set(args.only) - {target['name'] for target in targets}
+        if unknown:
+            print(f"Error: destinos desconocidos: {', '.join(sorted(unknown))}")
+            sys.exit(2)
+        targets = [target for target in targets if target['name'] in args.only]
+    if args.kind == "incremental":
+        missing = [target['name'] for target in targets if not has_binlog_source(target)]
+        if missing:
+            print(f"Error: destinos sin binlog_dir para el backup incremental: {', '.join(missing)}")
+            sys.exit(2)
+
+    targets = plan(targets)
+    print(f"=== Backup {args.kind} de {len(targets)} destinos "
+          f"(máximo {args.max_concurrent} simultáneos, {args.max_per_host} por servidor) ===")
+    for target in targets:
+        size = target['estimated_bytes']
+        print(f"  {target['name']:<32} {target['server']:<22} "
+              f"{f'{size / 1048576:.1f} MB' if size is not None else 'tamaño desconocido':>18}")
+    if args.dry_run:
+        return
+
+    arguments = {'codec': args.codec} if args.codec else {}
+    started_at = datetime.now().isoformat(timespec='seconds')
+    started = time.perf_counter()
+    results = run_targets(targets, args.kind, arguments, args.max_concurrent, args.max_per_host)
+    report = {
+        'kind': args.kind,
+        'started_at': started_at,
+        'finished_at': datetime.now().isoformat(timespec='seconds'),
+        'limits': {'max_concurrent': args.max_concurrent, 'max_per_host': args.max_per_host},
+        'totals': summarize(results, time.perf_counter() - started),
+        'results': results,
+    }
+    print_report(report)
+    print(f"\nReporte guardado en {save_report(report)}")
+    sys.exit(0 if report['totals']['failed'] == 0 else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,251 @@
+"""
+Módulo de restauración paralela de backups completos.
+Crea las tablas sin índices secundarios, reparte los INSERT de cada tabla entre
+varias conexiones y, una vez cargados todos los datos, construye los índices
+secundarios en paralelo.
+"""
+import queue
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional, Tuple
+
+from src.backup.compression import backup_size, open_backup_reader
+from src.backup.restore import RestoreProgress, iter_statements, reader_position
+from src.db import metrics
+from src.db.config import DatabaseConfig
+from src.db.pool import get_pool
+
+_TABLE_STATEMENT = re.compile(r"^(DROP TABLE IF EXISTS|CREATE TABLE|INSERT INTO)\s+`((?:[^`]|``)+)`", re.IGNORECASE)
+_VIEW_STATEMENT = re.compile(r"^(DROP VIEW|CREATE\s+(OR REPLACE\s+)?(ALGORITHM|DEFINER|SQL SECURITY|VIEW)\b)",
+                             re.IGNORECASE)
+_KEYS_STATEMENT = re.compile(r"^/\*!\d+\s+ALTER TABLE\s+`(?:[^`]|``)+`\s+(DISABLE|ENABLE) KEYS", re.IGNORECASE)
+_TRANSACTION_STATEMENT = re.compile(r"^(START TRANSACTION|BEGIN|COMMIT|ROLLBACK)\b|^SET\s+AUTOCOMMIT\b", re.IGNORECASE)
+_SECONDARY_KEY = re.compile(r"^\s*((?:UNIQUE |FULLTEXT |SPATIAL )?KEY)\s+`(?:[^`]|``)+`\s*\(([^)]*)\)")
+_FOREIGN_KEY = re.compile(r"FOREIGN KEY\s*\(([^)]*)\)", re.IGNORECASE)
+_COLUMN_NAME = re.compile(r"`((?:[^`]|``)+)`")
+
+# Sesión de carga: sin verificación de llaves foráneas ni de unicidad
+_LOAD_SESSION = (
+    "SET SESSION FOREIGN_KEY_CHECKS=0",
+    "SET SESSION UNIQUE_CHECKS=0",
+)
+
+
+def split_secondary_indexes(create_statement: str) -> Tuple[str, Optional[str]]:
+    """
+    Separa los índices secundarios de una sentencia CREATE TABLE.
+
+    Se conservan la clave primaria, los índices que usan las llaves foráneas
+    (MySQL los crearía de todos modos) y los que empiezan por una columna
+    AUTO_INCREMENT (MySQL exige que esté indexada).
+
+    Args:
+        create_statement (str): Sentencia generada por SHOW CREATE TABLE
+
+    Returns:
+        tuple: (CREATE TABLE sin índices diferibles, ALTER TABLE que los agrega o None)
+    """
+    lines = create_statement.split('\n')
+    header, body, footer = lines[0], lines[1:-1], lines[-1]
+    table = _TABLE_STATEMENT.match(header.strip())
+
+    fk_columns = [
+        _columns(match.group(1)) for match in _FOREIGN_KEY.finditer(create_statement)
+    ]
+    auto_increment = [
+        _COLUMN_NAME.match(line.strip()).group(1)
+        for line in body
+        if 'AUTO_INCREMENT' in line and _COLUMN_NAME.match(line.strip())
+    ]
+
+    kept, deferred = [], []
+    for line in body:
+        definition = line.rstrip()
+        if definition.endswith(','):
+            definition = definition[:-1]
+        match = _SECONDARY_KEY.match(definition)
+        if match:
+            columns = _columns(match.group(2))
+            needed = any(columns[:len(fk)] == fk for fk in fk_columns) or (
+                columns and columns[0] in auto_increment
+            )
+            if not needed:
+                deferred.append(definition.strip())
+                continue
+        kept.append(definition)
+
+    if not deferred or table is None:
+        return create_statement, None
+
+    create = '\n'.join([header, ',\n'.join(kept), footer])
+    alter = f"ALTER TABLE `{table.group(2)}` " + ", ".join(f"ADD {definition}" for definition in deferred)
+    return create, alter
+
+
+def _columns(column_list: str) -> List[str]:
+    """Extrae los nombres de columna de una lista `a`,`b`(10)."""
+    return [match.group(1) for match in _COLUMN_NAME.finditer(column_list)]
+
+
+def _open_load_connection(session_statements: List[str]):
+    """Abre una conexión dedicada configurada para carga masiva."""
+    conn = get_pool().new_connection()
+    cursor = conn.cursor()
+    for statement in list(session_statements) + list(_LOAD_SESSION):
+        cursor.execute(statement)
+    cursor.close()
+    return conn
+
+
+def _run_loaders(work: queue.Queue, workers: int, session_statements: List[str], failures: list) -> List[threading.Thread]:
+    """Inicia los workers que ejecutan los INSERT (tabla, sentencia) recibidos por la cola."""
+
+    def loader():
+        conn = None
+        try:
+            conn = _open_load_connection(session_statements)
+            cursor = conn.cursor()
+            while True:
+                item = work.get()
+                if item is None:
+                    break
+                if not failures:
+                    table, statement = item
+                    started = time.perf_counter()
+                    cursor.execute(statement)
+                    metrics.observe('insert', time.perf_counter() - started, table, bytes=len(statement))
+            cursor.close()
+        except Exception as e:
+            failures.append(e)
+            # Vaciar la cola para no bloquear al lector
+            while work.get() is not None:
+                pass
+        finally:
+            if conn is not None:
+                conn.close()
+
+    threads = [threading.Thread(target=loader) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    return threads
+
+
+def build_indexes(alters: List[str], workers: int, session_statements: List[str]):
+    """
+    Ejecuta en paralelo los ALTER TABLE que agregan los índices secundarios.
+    Cada tabla se procesa en una sola sentencia, que construye todos sus índices en una pasada.
+    """
+    if not alters:
+        return
+
+    local = threading.local()
+    connections = []
+    lock = threading.Lock()
+
+    def run(alter):
+        if not hasattr(local, 'conn'):
+            local.conn = _open_load_connection(session_statements)
+            with lock:
+                connections.append(local.conn)
+        cursor = local.conn.cursor()
+        cursor.execute(alter)
+        cursor.close()
+
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for future in [executor.submit(run, alter) for alter in alters]:
+                future.result()
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+def apply_backup_parallel(backup_file: str, workers: Optional[int] = None,
+                          buffer_size: Optional[int] = None) -> dict:
+    """
+    Restaura un backup completo usando varias conexiones.
+
+    El archivo se lee una sola vez. Las sentencias DROP/CREATE se ejecutan en
+    orden en una conexión coordinadora, con los índices secundarios diferidos;
+    los INSERT se reparten entre `workers` conexiones a través de una cola
+    acotada (la memoria no depende del tamaño del backup). Cuando todos los
+    datos están cargados, se construyen los índices secundarios en paralelo.
+    Las llaves foráneas no se verifican hasta que todo está cargado: las
+    sesiones de carga desactivan FOREIGN_KEY_CHECKS y se cierran al terminar.
+
+    Args:
+        backup_file (str): Ruta al archivo de backup (comprimido o no)
+        workers (int): Conexiones de carga (por defecto DatabaseConfig.RESTORE_WORKERS)
+        buffer_size (int): Bytes leídos en cada lectura del archivo
+
+    Returns:
+        dict: Resumen con bytes, sentencias, throughput, duración e índices diferidos
+
+    Raises:
+        Exception: El primer error ocurrido en la carga o en la creación de índices
+    """
+    workers = max(1, workers or DatabaseConfig.RESTORE_WORKERS)
+    progress = RestoreProgress(backup_size(backup_file))
+    work = queue.Queue(maxsize=workers * DatabaseConfig.RESTORE_QUEUE_DEPTH)
+    failures = []
+    session_statements = []
+    alters = []
+    threads = None
+
+    coordinator = _open_load_connection([])
+    try:
+        cursor = coordinator.cursor()
+        with open_backup_reader(backup_file) as reader:
+            for statement in iter_statements(reader, buffer_size):
+                if failures:
+                    break
+                if _TRANSACTION_STATEMENT.match(statement) or _KEYS_STATEMENT.match(statement):
+                    # Cada worker confirma sus propias sentencias; DISABLE KEYS no aplica
+                    # porque los índices secundarios ya están diferidos
+                    progress.update(reader_position(reader), 0, applied=False)
+                    continue
+
+                table_statement = _TABLE_STATEMENT.match(statement)
+                if table_statement is None and _VIEW_STATEMENT.match(statement):
+                    # Las vistas van al final del backup y solo necesitan que las tablas existan
+                    cursor.execute(statement)
+                elif table_statement is None:
+                    # Sentencias de sesión (SET ...): se aplican a todas las conexiones
+                    cursor.execute(statement)
+                    if cursor.with_rows:
+                        cursor.fetchall()
+                    if threads is None:
+                        session_statements.append(statement)
+                elif table_statement.group(1).upper() == "INSERT INTO":
+                    if threads is None:
+                        threads = _run_loaders(work, workers, session_statements, failures)
+                    work.put((table_statement.group(2), statement))
+                else:
+                    if table_statement.group(1).upper() == "CREATE TABLE":
+                        statement, alter = split_secondary_indexes(statement)
+                        if alter:
+                            alters.append(alter)
+                    cursor.execute(statement)
+                progress.update(reader_position(reader), len(statement))
+        cursor.close()
+    finally:
+        if threads is not None:
+            for _ in threads:
+                work.put(None)
+            for thread in threads:
+                thread.join()
+        coordinator.close()
+
+    if failures:
+        raise failures[0]
+
+    print(f"Datos cargados; creando índices secundarios de {len(alters)} tablas...")
+    with metrics.phase('build_indexes'):
+        build_indexes(alters, workers, session_statements)
+
+    progress.report()
+    summary = progress.summary()
+    summary['deferred_index_tables'] = len(alters)
+    return summary
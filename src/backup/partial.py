@@ -0,0 +1,288 @@
+"""
+Módulo de restauración parcial desde un backup completo.
+Cada backup completo se acompaña de un índice (`<backup>.idx`) con la posición
+de la estructura y de los datos de cada tabla, y de cada rango de clave
+volcado. Con él se restauran solo las tablas (o los rangos de clave) pedidos,
+leyendo únicamente sus secciones: el tiempo depende del tamaño de la tabla y
+no del de toda la base de datos.
+
+Uso:
+    python3 -m src.backup.partial --table employees
+    python3 -m src.backup.partial --backup backups/backup_completo_X.sql.gz --table employees \
+        --rename employees=employees_recuperada
+    python3 -m src.backup.partial --table employees --from 1000 --to 2000
+"""
+import argparse
+import json
+import os
+import re
+import time
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from src.backup.catalog import BackupCatalog
+from src.backup.compression import open_backup_reader_at
+from src.backup.restore import iter_statements
+from src.db.pool import get_pool
+from src.db.schema import invalidate_schema
+
+INDEX_FORMAT = "sections/1"
+INDEX_EXTENSION = ".idx"
+
+_CONSTRAINT_NAME = re.compile(r"CONSTRAINT `[^`]+` (FOREIGN KEY|CHECK)")
+_PRIMARY_KEY = re.compile(r"PRIMARY KEY \(`([^`]+)`\)")
+
+
+def section_index_path(backup_file: str) -> str:
+    """Ruta del índice de secciones de un backup."""
+    return backup_file + INDEX_EXTENSION
+
+
+def write_section_index(backup_file: str, writer, sections: Dict[str, dict]):
+    """
+    Escribe el índice de secciones de un backup completo de forma atómica.
+
+    Args:
+        backup_file (str): Ruta del backup
+        writer (BackupWriter): Escritor ya cerrado del backup (aporta los frames y el tamaño)
+        sections (dict): Secciones por tabla devueltas por write_tables
+    """
+    index = {
+        'format': INDEX_FORMAT,
+        'bytes': writer.bytes_in,
+        'frames': writer.frames,
+        'tables': {
+            table: {
+                'structure': [section['structure_offset'], section['structure_bytes']],
+                'data': [section['data_offset'], section['data_bytes']],
+                'pk': section['pk'],
+                'ranges': section['ranges'],
+            }
+            for table, section in sections.items()
+        },
+    }
+    path = section_index_path(backup_file)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump(index, f, default=str)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+def load_section_index(backup_file: str) -> dict:
+    """
+    Lee el índice de secciones de un backup.
+
+    Raises:
+        ValueError: Si el backup no tiene índice
+    """
+    try:
+        with open(section_index_path(backup_file), 'r') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        raise ValueError(f"{backup_file} no tiene índice de secciones; use la restauración completa")
+    if index.get('format') != INDEX_FORMAT:
+        raise ValueError(f"Formato de índice no soportado en {section_index_path(backup_file)}")
+    return index
+
+
+class _SectionReader:
+    """Stream de lectura limitado a `length` bytes de un backup desde `offset`."""
+
+    def __init__(self, backup_file: str, frames: list, offset: int, length: int):
+        self._reader = open_backup_reader_at(backup_file, offset, frames)
+        self._remaining = length
+
+    def read(self, size: int = -1) -> bytes:
+        if size is None or size < 0 or size > self._remaining:
+            size = self._remaining
+        data = self._reader.read(size) if size else b""
+        self._remaining -= len(data)
+        return data
+
+    def close(self):
+        self._reader.close()
+
+
+def iter_section(backup_file: str, index: dict, offset: int, length: int) -> Iterator[str]:
+    """Itera las sentencias SQL de una sección del backup."""
+    reader = _SectionReader(backup_file, index['frames'], offset, length)
+    try:
+        yield from iter_statements(reader)
+    finally:
+        reader.close()
+
+
+def _rename(statement: str, table: str, target: str) -> str:
+    """Cambia la primera referencia a la tabla; al renombrar, los nombres de restricciones se descartan."""
+    if target == table:
+        return statement
+    statement = statement.replace(f"`{table}`", f"`{target}`", 1)
+    # Los nombres de las llaves foráneas son únicos por base de datos: MySQL genera otros
+    return _CONSTRAINT_NAME.sub(r"\1", statement)
+
+
+def overlapping_ranges(entry: dict, start=None, end=None) -> List[dict]:
+    """Rangos de clave volcados que pueden contener filas de [start, end)."""
+    return [
+        section for section in entry['ranges']
+        if (section['end'] is None or start is None or int(section['end']) > int(start))
+        and (section['start'] is None or end is None or int(section['start']) < int(end))
+    ]
+
+
+def _load(cursor, statements: Iterator[str], table: str, target: str) -> Tuple[int, int]:
+    prefix = f"INSERT INTO `{table}`"
+    count = size = 0
+    for statement in statements:
+        if statement.startswith(prefix):
+            statement = f"INSERT INTO `{target}`" + statement[len(prefix):]
+        cursor.execute(statement)
+        count += 1
+        size += len(statement)
+    return count, size
+
+
+def restore_table(conn, backup_file: str, index: dict, table: str, target: Optional[str] = None,
+                  key_range: Optional[Tuple] = None) -> dict:
+    """
+    Restaura una tabla (o un rango de su clave primaria) desde un backup completo.
+
+    Sin rango, la tabla destino se recrea con la estructura del backup y se
+    cargan todos sus datos. Con rango, las secciones que lo contienen se cargan
+    en una tabla auxiliar y solo las filas del rango se copian (REPLACE) a la
+    tabla destino, que se crea si no existe; el resto de sus filas no cambia.
+
+    Args:
+        conn (MySQLConnection): Conexión de restauración
+        backup_file (str): Ruta del backup completo
+        index (dict): Índice de secciones del backup
+        table (str): Tabla del backup
+        target (str): Tabla destino (por defecto, la misma)
+        key_range (tuple): (inicio inclusivo, fin exclusivo) de la clave primaria; None en un extremo = abierto
+
+    Returns:
+        dict: 'table', 'target', 'statements', 'bytes_read', 'rows' (filas copiadas, solo con rango)
+
+    Raises:
+        ValueError: Si la tabla no está en el backup o el rango no aplica a su clave
+    """
+    entry = index['tables'].get(table)
+    if entry is None:
+        raise ValueError(f"La tabla `{table}` no está en {backup_file}")
+    target = target or table
+
+    structure = [statement for statement in iter_section(backup_file, index, *entry['structure'])
+                 if statement.lstrip().upper().startswith(("DROP TABLE", "CREATE TABLE"))]
+    create = next(statement for statement in structure if statement.lstrip().upper().startswith("CREATE TABLE"))
+    cursor = conn.cursor()
+    result = {'table': table, 'target': target, 'statements': 0, 'bytes_read': 0, 'rows': None}
+    try:
+        if key_range is None:
+            for statement in structure:
+                cursor.execute(_rename(statement, table, target))
+            result['statements'], result['bytes_read'] = _load(
+                cursor, iter_section(backup_file, index, *entry['data']), table, target)
+            conn.commit()
+            return result
+
+        pk = entry['pk'] or next(iter(_PRIMARY_KEY.findall(create)), None)
+        if pk is None:
+            raise ValueError(f"La tabla `{table}` no tiene una clave primaria de una columna")
+        start, end = key_range
+        staging = f"_parcial_{target}"[:64]
+        cursor.execute(_rename(create, table, target).replace("CREATE TABLE", "CREATE TABLE IF NOT EXISTS", 1))
+        cursor.execute(f"DROP TABLE IF EXISTS `{staging}`")
+        cursor.execute(f"CREATE TABLE `{staging}` LIKE `{target}`")
+        try:
+            for section in overlapping_ranges(entry, start, end):
+                statements, size = _load(cursor, iter_section(backup_file, index, section['offset'],
+                                                              section['length']), table, staging)
+                result['statements'] += statements
+                result['bytes_read'] += size
+
+            conditions, params = [], []
+            if start is not None:
+                conditions.append(f"`{pk}` >= %s")
+                params.append(start)
+            if end is not None:
+                conditions.append(f"`{pk}` < %s")
+                params.append(end)
+            where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+            cursor.execute(f"REPLACE INTO `{target}` SELECT * FROM `{staging}`{where}", tuple(params))
+            result['rows'] = cursor.rowcount
+            conn.commit()
+        finally:
+            cursor.execute(f"DROP TABLE IF EXISTS `{staging}`")
+        return result
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
+
+
+def restore_tables(backup_file: str, tables: List[str], rename: Optional[Dict[str, str]] = None,
+                   key_range: Optional[Tuple] = None) -> List[dict]:
+    """
+    Restaura solo algunas tablas de un backup completo usando su índice de secciones.
+
+    Args:
+        backup_file (str): Ruta del backup completo
+        tables (list): Tablas a restaurar
+        rename (dict): Tabla destino por tabla del backup (p. ej. {'employees': 'employees_recuperada'})
+        key_range (tuple): (inicio, fin) de la clave primaria a restaurar en cada tabla
+
+    Returns:
+        list: Resultado de restore_table por tabla
+    """
+    index = load_section_index(backup_file)
+    rename = rename or {}
+    conn = get_pool().new_connection()
+    results = []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SET FOREIGN_KEY_CHECKS=0")
+        cursor.execute("SET SQL_MODE = 'NO_AUTO_VALUE_ON_ZERO'")
+        cursor.close()
+        conn.autocommit = False
+        for table in tables:
+            started = time.perf_counter()
+            result = restore_table(conn, backup_file, index, table, rename.get(table), key_range)
+            result['elapsed'] = time.perf_counter() - started
+            results.append(result)
+            rows = f", {result['rows']} filas en el rango" if result['rows'] is not None else ""
+            print(f"Tabla `{table}` restaurada en `{result['target']}`: {result['statements']} sentencias, "
+                  f"{result['bytes_read']} bytes{rows} en {result['elapsed']:.1f}s")
+    finally:
+        conn.close()
+        invalidate_schema()
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backup", help="Backup completo (por defecto el más reciente del catálogo)")
+    parser.add_argument("--table", action="append", required=True, help="Tabla a restaurar (repetible)")
+    parser.add_argument("--rename", action="append", default=[],
+                        help="Restaurar una tabla con otro nombre: tabla=destino (repetible)")
+    parser.add_argument("--from", dest="start", help="Inicio inclusivo del rango de clave primaria")
+    parser.add_argument("--to", dest="end", help="Fin exclusivo del rango de clave primaria")
+    args = parser.parse_args()
+
+    backup_file = args.backup
+    if backup_file is None:
+        latest = BackupCatalog().latest_full()
+        if latest is None:
+            print("No hay backups completos en el catálogo")
+            return
+        backup_file = latest['path']
+
+    rename = dict(item.split("=", 1) for item in args.rename)
+    key_range = (args.start, args.end) if args.start is not None or args.end is not None else None
+    print(f"Restauración parcial desde: {backup_file}")
+    restore_tables(backup_file, args.table, rename, key_range)
+
+
+if __name__ == "__main__":
+    main()
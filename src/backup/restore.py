@@ -0,0 +1,316 @@
+"""
+Módulo de restauración por streaming.
+Lee el archivo de backup en buffers de tamaño fijo, lo divide en sentencias SQL
+y las ejecuta una a una sobre una conexión dedicada, con memoria constante,
+reporte de progreso y puntos de control para reanudar tras un fallo.
+"""
+import codecs
+import json
+import os
+import re
+import time
+from typing import Iterator, Optional
+
+from src.backup.compression import backup_size, open_backup_reader
+from src.db import metrics
+from src.db.config import DatabaseConfig
+from src.db.pool import get_pool
+
+# Caracteres que cambian el estado del analizador fuera de literales y comentarios
+_NORMAL_SPECIAL = re.compile(r"[;'\"`#]|--|/\*")
+_SESSION_STATEMENT = re.compile(r"^(/\*!\d*\s*)?SET\s", re.IGNORECASE)
+_INSERT_TABLE = re.compile(r"^INSERT INTO\s+`((?:[^`]|``)+)`", re.IGNORECASE)
+# Sentencias que MySQL confirma de forma implícita (antes y después de ejecutarlas)
+_IMPLICIT_COMMIT = re.compile(r"^(/\*!\d*\s*)?(CREATE|DROP|ALTER|RENAME|TRUNCATE|LOCK|UNLOCK)\s", re.IGNORECASE)
+
+
+def iter_statements(stream, buffer_size: Optional[int] = None) -> Iterator[str]:
+    """
+    Divide un stream binario de SQL en sentencias, leyendo en buffers de tamaño fijo.
+
+    Respeta literales entre comillas simples, dobles y backticks (con escapes
+    por barra invertida y comillas duplicadas) y comentarios `--`, `#` y
+    `/* */`. Los comentarios anteriores a una sentencia se descartan; los
+    comentarios condicionales `/*! ... */` se conservan porque son ejecutables.
+    No interpreta `DELIMITER`, por lo que no aplica a la salida de mysqlbinlog.
+
+    Args:
+        stream: Stream binario con el contenido SQL
+        buffer_size (int): Bytes leídos en cada lectura (por defecto DatabaseConfig.RESTORE_BUFFER_SIZE)
+
+    Yields:
+        str: Sentencia SQL sin el `;` final
+    """
+    buffer_size = buffer_size or DatabaseConfig.RESTORE_BUFFER_SIZE
+    decoder = codecs.getincrementaldecoder('utf-8')()
+    buf = ""
+    pos = 0           # Posición de análisis dentro de buf
+    code_start = -1   # Inicio del código de la sentencia actual (-1 si aún no hay código)
+    state = None      # None, o el delimitador del literal/comentario abierto
+    eof = False
+
+    while True:
+        if not eof:
+            data = stream.read(buffer_size)
+            eof = not data
+            # Compactar el buffer descartando lo ya emitido
+            keep = code_start if code_start >= 0 else pos
+            buf = buf[keep:] + decoder.decode(data, final=eof)
+            pos -= keep
+            if code_start >= 0:
+                code_start = 0
+
+        while True:
+            if state is None:
+                match = _NORMAL_SPECIAL.search(buf, pos)
+                if match:
+                    end = match.start()
+                else:
+                    end = len(buf)
+                    # Un '-' o '/' final puede ser el inicio de un comentario partido entre buffers
+                    if not eof and buf.endswith(('-', '/')):
+                        end -= 1
+                text = buf[pos:end]
+                if code_start < 0 and text.strip():
+                    code_start = pos + len(text) - len(text.lstrip())
+                if not match:
+                    pos = end
+                    break
+                token = match.group()
+                pos = match.end()
+                if token == ';':
+                    if code_start >= 0:
+                        yield buf[code_start:match.start()].strip()
+                    code_start = -1
+                elif token in ("'", '"', '`'):
+                    if code_start < 0:
+                        code_start = match.start()
+                    state = token
+                elif token == '#':
+                    state = '\n'
+                elif token == '--':
+                    # `--` solo inicia un comentario si lo sigue un espacio o fin de línea
+                    if pos >= len(buf) and not eof:
+                        pos = match.start()
+                        break
+                    if pos >= len(buf) or buf[pos] in ' \t\r\n':
+                        state = '\n'
+                    elif code_start < 0:
+                        code_start = match.start()
+                else:  # '/*'
+                    if pos >= len(buf) and not eof:
+                        pos = match.start()
+                        break
+                    if pos < len(buf) and buf[pos] == '!' and code_start < 0:
+                        code_start = match.start()
+                    state = '*/'
+            elif state in ('\n', '*/'):
+                end = buf.find(state, pos)
+                if end < 0:
+                    # Conservar el último carácter por si '*/' queda partido entre buffers
+                    pos = max(pos, len(buf) - 1)
+                    break
+                pos = end + len(state)
+                state = None
+            else:
+                quote = state
+                end = buf.find(quote, pos) if quote == '`' else _find_quote_end(buf, pos, quote)
+                if end < 0:
+                    break
+                if end + 1 >= len(buf) and not eof:
+                    # No se sabe aún si la comilla está duplicada
+                    break
+                if end + 1 < len(buf) and buf[end + 1] == quote:
+                    pos = end + 2
+                    continue
+                pos = end + 1
+                state = None
+
+        if eof:
+            if code_start >= 0 and buf[code_start:].strip():
+                yield buf[code_start:].strip()
+            return
+
+
+def _find_quote_end(buf: str, pos: int, quote: str) -> int:
+    """Busca la comilla de cierre saltando los escapes con barra invertida."""
+    while True:
+        end = buf.find(quote, pos)
+        if end < 0:
+            return -1
+        backslash = buf.find('\\', pos, end)
+        if backslash < 0:
+            return end
+        if backslash + 1 >= len(buf):
+            return -1
+        pos = backslash + 2
+
+
+def checkpoint_path(backup_file: str) -> str:
+    """Ruta del archivo de punto de control asociado a un backup."""
+    return f"{backup_file}.checkpoint"
+
+
+def load_checkpoint(backup_file: str) -> int:
+    """
+    Lee el número de sentencias ya aplicadas de una restauración anterior.
+
+    Returns:
+        int: Sentencias confirmadas (0 si no hay punto de control)
+    """
+    try:
+        with open(checkpoint_path(backup_file), 'r') as f:
+            return int(json.load(f).get('statements', 0))
+    except FileNotFoundError:
+        return 0
+    except (ValueError, OSError) as e:
+        print(f"Advertencia: punto de control ilegible, se restaura desde el inicio ({e})")
+        return 0
+
+
+def save_checkpoint(backup_file: str, statements: int, bytes_read: int):
+    """Guarda de forma atómica el número de sentencias confirmadas."""
+    path = checkpoint_path(backup_file)
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        json.dump({'statements': statements, 'bytes_read': bytes_read}, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
+
+class RestoreProgress:
+    """Acumula y reporta el progreso de una restauración."""
+
+    def __init__(self, total_bytes: int, interval: Optional[float] = None):
+        self.total_bytes = total_bytes
+        self.interval = DatabaseConfig.RESTORE_PROGRESS_INTERVAL if interval is None else interval
+        self.bytes_read = 0
+        self.bytes_applied = 0
+        self.statements = 0
+        self.skipped = 0
+        self.started = time.monotonic()
+        self._last_report = self.started
+
+    def update(self, bytes_read: int, statement_bytes: int, applied: bool = True):
+        self.bytes_read = bytes_read
+        if applied:
+            self.statements += 1
+            self.bytes_applied += statement_bytes
+        else:
+            self.skipped += 1
+        now = time.monotonic()
+        if now - self._last_report >= self.interval:
+            self._last_report = now
+            self.report()
+
+    def summary(self) -> dict:
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        rate = self.bytes_read / elapsed
+        remaining = max(self.total_bytes - self.bytes_read, 0)
+        return {
+            'bytes_read': self.bytes_read,
+            'total_bytes': self.total_bytes,
+            'bytes_applied': self.bytes_applied,
+            'statements': self.statements,
+            'skipped_statements': self.skipped,
+            'elapsed': elapsed,
+            'throughput': rate,
+            'statements_per_second': self.statements / elapsed,
+            'eta': remaining / rate if rate > 0 else None,
+        }
+
+    def report(self):
+        info = self.summary()
+        percent = 100.0 * info['bytes_read'] / info['total_bytes'] if info['total_bytes'] else 100.0
+        eta = time.strftime('%H:%M:%S', time.gmtime(info['eta'])) if info['eta'] is not None else "--:--:--"
+        print(f"Progreso: {percent:5.1f}% | {info['bytes_applied'] / 1048576:.1f} MB aplicados | "
+              f"{info['statements']} sentencias | {info['throughput'] / 1048576:.1f} MB/s | ETA {eta}")
+
+
+def reader_position(reader) -> int:
+    """Bytes del archivo (comprimido) consumidos hasta ahora."""
+    raw = getattr(reader, 'raw', reader)
+    try:
+        return raw.tell()
+    except (OSError, ValueError):
+        return 0
+
+
+def _checkpoint(conn, backup_file: str, statements: int, bytes_read: int) -> int:
+    """Confirma la transacción y guarda el punto de control; retorna `statements`."""
+    started = time.perf_counter()
+    conn.commit()
+    save_checkpoint(backup_file, statements, bytes_read)
+    metrics.observe('checkpoint', time.perf_counter() - started)
+    return statements
+
+
+def apply_backup(backup_file: str, resume: bool = False, checkpoint_every: Optional[int] = None,
+                 buffer_size: Optional[int] = None) -> dict:
+    """
+    Aplica un backup sentencia por sentencia sobre una conexión dedicada.
+
+    La conexión se abre con la misma configuración que el pool pero no se
+    devuelve a él, porque el backup modifica variables de sesión
+    (FOREIGN_KEY_CHECKS, SQL_MODE, AUTOCOMMIT). Cada `checkpoint_every`
+    sentencias se confirma la transacción y se guarda el punto de control;
+    con `resume` se saltan las sentencias ya confirmadas, repitiendo solo las
+    sentencias `SET` de sesión.
+
+    Las sentencias DDL (DROP/CREATE TABLE en cada límite de tabla, ALTER TABLE
+    ... DISABLE KEYS) confirman implícitamente todo lo anterior, así que el
+    punto de control se guarda también antes y después de cada una: al
+    reanudar nunca se repite un INSERT ya confirmado.
+
+    Args:
+        backup_file (str): Ruta al archivo de backup (comprimido o no)
+        resume (bool): Reanudar desde el último punto de control
+        checkpoint_every (int): Sentencias entre puntos de control
+        buffer_size (int): Bytes leídos en cada lectura del archivo
+
+    Returns:
+        dict: Resumen con bytes, sentencias, throughput y duración
+
+    Raises:
+        mysql.connector.Error: Si una sentencia falla (el punto de control queda en el último commit)
+    """
+    checkpoint_every = checkpoint_every or DatabaseConfig.RESTORE_CHECKPOINT_EVERY
+    skip = load_checkpoint(backup_file) if resume else 0
+    if skip:
+        print(f"Reanudando desde la sentencia {skip}")
+
+    progress = RestoreProgress(backup_size(backup_file))
+    conn = get_pool().new_connection()
+    try:
+        cursor = conn.cursor()
+        index = 0
+        checkpointed = skip
+        with open_backup_reader(backup_file) as reader:
+            for index, statement in enumerate(iter_statements(reader, buffer_size), start=1):
+                if index <= skip and not _SESSION_STATEMENT.match(statement):
+                    progress.update(reader_position(reader), 0, applied=False)
+                    continue
+                implicit_commit = bool(_IMPLICIT_COMMIT.match(statement))
+                if implicit_commit and index - 1 > checkpointed:
+                    # La sentencia confirmará lo pendiente aunque falle después
+                    checkpointed = _checkpoint(conn, backup_file, index - 1, progress.bytes_read)
+                started = time.perf_counter()
+                cursor.execute(statement)
+                if cursor.with_rows:
+                    cursor.fetchall()
+                insert = _INSERT_TABLE.match(statement)
+                metrics.observe('insert' if insert else 'statement', time.perf_counter() - started,
+                                insert.group(1) if insert else None, bytes=len(statement))
+                progress.update(reader_position(reader), len(statement))
+                if implicit_commit or index % checkpoint_every == 0:
+                    checkpointed = _checkpoint(conn, backup_file, index, progress.bytes_read)
+        conn.commit()
+        cursor.close()
+    finally:
+        conn.close()
+
+    if os.path.exists(checkpoint_path(backup_file)):
+        os.remove(checkpoint_path(backup_file))
+    progress.report()
+    return progress.summary()
@@ -0,0 +1,454 @@
+"""
+Módulo de decodificación de eventos de filas del binary log (formato ROW).
+Interpreta los eventos TABLE_MAP y WRITE/UPDATE/DELETE_ROWS y convierte las
+imágenes de fila en valores de Python (los mismos tipos que devuelve el
+driver), de modo que puedan agruparse por clave primaria o escribirse como
+SQL con `sql_literal`.
+"""
+import datetime
+import decimal
+import json
+import struct
+from typing import Iterator, List, Tuple
+
+from src.backup.binlog import (
+    DELETE_ROWS_EVENT, DELETE_ROWS_EVENT_V1, STMT_END_F, TABLE_MAP_EVENT, UPDATE_ROWS_EVENT,
+    UPDATE_ROWS_EVENT_V1, WRITE_ROWS_EVENT, WRITE_ROWS_EVENT_V1, BinlogEvent,
+)
+
+# Tipos de columna de MySQL
+T_DECIMAL, T_TINY, T_SHORT, T_LONG, T_FLOAT, T_DOUBLE, T_NULL, T_TIMESTAMP = 0, 1, 2, 3, 4, 5, 6, 7
+T_LONGLONG, T_INT24, T_DATE, T_TIME, T_DATETIME, T_YEAR, T_NEWDATE = 8, 9, 10, 11, 12, 13, 14
+T_VARCHAR, T_BIT, T_TIMESTAMP2, T_DATETIME2, T_TIME2 = 15, 16, 17, 18, 19
+T_JSON, T_NEWDECIMAL, T_ENUM, T_SET = 245, 246, 247, 248
+T_TINY_BLOB, T_MEDIUM_BLOB, T_LONG_BLOB, T_BLOB, T_VAR_STRING, T_STRING, T_GEOMETRY = 249, 250, 251, 252, 253, 254, 255
+
+_NUMERIC_TYPES = {T_DECIMAL, T_TINY, T_SHORT, T_LONG, T_FLOAT, T_DOUBLE, T_LONGLONG, T_INT24, T_NEWDECIMAL}
+_INTEGER_SIZES = {T_TINY: 1, T_SHORT: 2, T_INT24: 3, T_LONG: 4, T_LONGLONG: 8}
+_DECIMAL_DIGIT_BYTES = [0, 1, 1, 2, 2, 3, 3, 4, 4, 4]
+
+# Metadatos opcionales de TABLE_MAP (binlog_row_metadata)
+_META_SIGNEDNESS = 1
+_META_COLUMN_NAME = 4
+_META_SIMPLE_PRIMARY_KEY = 8
+_META_PRIMARY_KEY_WITH_PREFIX = 9
+
+WRITE, UPDATE, DELETE = 'write', 'update', 'delete'
+_ROWS_KIND = {
+    WRITE_ROWS_EVENT: WRITE, WRITE_ROWS_EVENT_V1: WRITE,
+    UPDATE_ROWS_EVENT: UPDATE, UPDATE_ROWS_EVENT_V1: UPDATE,
+    DELETE_ROWS_EVENT: DELETE, DELETE_ROWS_EVENT_V1: DELETE,
+}
+
+
+def read_packed_int(data: bytes, offset: int) -> Tuple[int, int]:
+    """Lee un entero de longitud variable del protocolo de MySQL; retorna (valor, nuevo offset)."""
+    first = data[offset]
+    if first < 251:
+        return first, offset + 1
+    size = {252: 2, 253: 3, 254: 8}[first]
+    return int.from_bytes(data[offset + 1:offset + 1 + size], 'little'), offset + 1 + size
+
+
+class TableMap:
+    """Descripción de una tabla según un evento TABLE_MAP."""
+    __slots__ = ('table_id', 'schema', 'table', 'types', 'metadata', 'unsigned',
+                 'column_names', 'primary_key', 'raw')
+
+    def __init__(self, event: BinlogEvent):
+        self.raw = event.raw
+        body = event.body
+        self.table_id = int.from_bytes(body[0:6], 'little')
+        offset = 8
+        length = body[offset]
+        self.schema = body[offset + 1:offset + 1 + length].decode('utf-8')
+        offset += length + 2
+        length = body[offset]
+        self.table = body[offset + 1:offset + 1 + length].decode('utf-8')
+        offset += length + 2
+
+        count, offset = read_packed_int(body, offset)
+        self.types = list(body[offset:offset + count])
+        offset += count
+        meta_length, offset = read_packed_int(body, offset)
+        self.metadata = _parse_column_metadata(self.types, body[offset:offset + meta_length])
+        offset += meta_length + (count + 7) // 8  # metadatos y bitmap de columnas nulables
+
+        self.unsigned = [False] * count
+        self.column_names = None
+        self.primary_key = None
+        while offset < len(body):
+            kind = body[offset]
+            length, offset = read_packed_int(body, offset + 1)
+            value = body[offset:offset + length]
+            offset += length
+            if kind == _META_SIGNEDNESS:
+                numeric = [i for i, column_type in enumerate(self.types) if column_type in _NUMERIC_TYPES]
+                for bit, column in enumerate(numeric):
+                    self.unsigned[column] = bool(value[bit // 8] & (0x80 >> (bit % 8)))
+            elif kind == _META_COLUMN_NAME:
+                names, position = [], 0
+                while position < len(value):
+                    size, position = read_packed_int(value, position)
+                    names.append(value[position:position + size].decode('utf-8'))
+                    position += size
+                self.column_names = names
+            elif kind in (_META_SIMPLE_PRIMARY_KEY, _META_PRIMARY_KEY_WITH_PREFIX):
+                columns, position = [], 0
+                while position < len(value):
+                    column, position = read_packed_int(value, position)
+                    columns.append(column)
+                    if kind == _META_PRIMARY_KEY_WITH_PREFIX:
+                        _, position = read_packed_int(value, position)
+                self.primary_key = columns
+
+    @property
+    def key(self) -> Tuple[str, str]:
+        return self.schema, self.table
+
+
+def _parse_column_metadata(types: List[int], data: bytes) -> List[int]:
+    """Interpreta los metadatos por columna del TABLE_MAP (longitudes, precisión, etc.)."""
+    metadata = []
+    offset = 0
+    for column_type in types:
+        if column_type in (T_FLOAT, T_DOUBLE, T_BLOB, T_GEOMETRY, T_JSON,
+                           T_TIMESTAMP2, T_DATETIME2, T_TIME2):
+            metadata.append(data[offset])
+            offset += 1
+        elif column_type in (T_VARCHAR, T_BIT, T_VAR_STRING):
+            metadata.append(struct.unpack_from('<H', data, offset)[0])
+            offset += 2
+        elif column_type in (T_NEWDECIMAL, T_STRING, T_ENUM, T_SET):
+            # Dos bytes en orden (alto, bajo): precisión/escala o tipo real/longitud
+            metadata.append((data[offset] << 8) | data[offset + 1])
+            offset += 2
+        else:
+            metadata.append(0)
+    return metadata
+
+
+class RowsEvent:
+    """
+    Evento de filas decodificado.
+
+    Attributes:
+        kind (str): 'write', 'update' o 'delete'
+        table (TableMap): Tabla afectada
+        full_image (bool): True si las imágenes incluyen todas las columnas (binlog_row_image=FULL)
+        rows (list): Para write/delete, tuplas de valores; para update, pares (antes, después)
+    """
+
+    def __init__(self, event: BinlogEvent, table: TableMap):
+        self.raw = event.raw
+        self.kind = _ROWS_KIND[event.type_code]
+        self.table = table
+        body = event.body
+        self.flags = struct.unpack_from('<H', body, 6)[0]
+        offset = 8
+        if event.type_code in (WRITE_ROWS_EVENT, UPDATE_ROWS_EVENT, DELETE_ROWS_EVENT):
+            offset += struct.unpack_from('<H', body, offset)[0]  # datos extra (incluye su longitud)
+        count, offset = read_packed_int(body, offset)
+        bitmap_size = (count + 7) // 8
+        present = _bitmap(body[offset:offset + bitmap_size], count)
+        offset += bitmap_size
+        present_after = present
+        if self.kind == UPDATE:
+            present_after = _bitmap(body[offset:offset + bitmap_size], count)
+            offset += bitmap_size
+        self.full_image = all(present) and all(present_after)
+
+        self.rows = []
+        while offset < len(body):
+            row, offset = _read_row(body, offset, table, present)
+            if self.kind == UPDATE:
+                after, offset = _read_row(body, offset, table, present_after)
+                row = (row, after)
+            self.rows.append(row)
+
+    @property
+    def statement_end(self) -> bool:
+        return bool(self.flags & STMT_END_F)
+
+
+def decode_rows_event(event: BinlogEvent, tables: dict) -> RowsEvent:
+    """
+    Decodifica un evento de filas usando los TABLE_MAP vistos.
+
+    Args:
+        event (BinlogEvent): Evento WRITE/UPDATE/DELETE_ROWS
+        tables (dict): table_id -> TableMap
+
+    Raises:
+        ValueError: Si no hay TABLE_MAP para el evento o contiene un tipo no soportado
+    """
+    table_id = int.from_bytes(event.body[0:6], 'little')
+    table = tables.get(table_id)
+    if table is None:
+        raise ValueError(f"Evento de filas sin TABLE_MAP (table_id {table_id})")
+    return RowsEvent(event, table)
+
+
+def is_rows_event(event: BinlogEvent) -> bool:
+    return event.type_code in _ROWS_KIND
+
+
+def _bitmap(data: bytes, count: int) -> List[bool]:
+    return [bool(data[i // 8] & (1 << (i % 8))) for i in range(count)]
+
+
+def _read_row(body: bytes, offset: int, table: TableMap, present: List[bool]) -> Tuple[tuple, int]:
+    columns = [i for i, used in enumerate(present) if used]
+    null_size = (len(columns) + 7) // 8
+    nulls = _bitmap(body[offset:offset + null_size], len(columns))
+    offset += null_size
+    values = [None] * len(present)
+    for position, column in enumerate(columns):
+        if nulls[position]:
+            continue
+        values[column], offset = _read_value(
+            body, offset, table.types[column], table.metadata[column], table.unsigned[column]
+        )
+    return tuple(values), offset
+
+
+def _read_value(data: bytes, offset: int, column_type: int, meta: int, unsigned: bool):
+    """Lee un valor de columna de una imagen de fila; retorna (valor, nuevo offset)."""
+    size = _INTEGER_SIZES.get(column_type)
+    if size:
+        value = int.from_bytes(data[offset:offset + size], 'little', signed=not unsigned)
+        return value, offset + size
+    if column_type == T_FLOAT:
+        return struct.unpack_from('<f', data, offset)[0], offset + 4
+    if column_type == T_DOUBLE:
+        return struct.unpack_from('<d', data, offset)[0], offset + 8
+    if column_type == T_NEWDECIMAL:
+        return _read_decimal(data, offset, meta >> 8, meta & 0xff)
+    if column_type in (T_VARCHAR, T_VAR_STRING):
+        prefix = 1 if meta < 256 else 2
+        length = int.from_bytes(data[offset:offset + prefix], 'little')
+        offset += prefix
+        return data[offset:offset + length], offset + length
+    if column_type == T_STRING:
+        real_type, length = meta >> 8, meta & 0xff
+        if real_type in (T_ENUM, T_SET):
+            return int.from_bytes(data[offset:offset + length], 'little'), offset + length
+        # Longitudes de CHAR mayores a 255 guardan bits extra en el tipo real
+        max_length = (((real_type & 0x30) ^ 0x30) << 4) | length
+        prefix = 1 if max_length < 256 else 2
+        length = int.from_bytes(data[offset:offset + prefix], 'little')
+        offset += prefix
+        return data[offset:offset + length], offset + length
+    if column_type in (T_BLOB, T_GEOMETRY, T_JSON, T_TINY_BLOB, T_MEDIUM_BLOB, T_LONG_BLOB):
+        length = int.from_bytes(data[offset:offset + meta], 'little')
+        offset += meta
+        value = data[offset:offset + length]
+        if column_type == T_JSON:
+            value = json.dumps(_read_json(value), ensure_ascii=False) if value else 'null'
+        return value, offset + length
+    if column_type == T_BIT:
+        length = (meta >> 8) + (1 if meta & 0xff else 0)
+        return int.from_bytes(data[offset:offset + length], 'big'), offset + length
+    if column_type == T_YEAR:
+        return (1900 + data[offset]) if data[offset] else 0, offset + 1
+    if column_type in (T_DATE, T_NEWDATE):
+        value = int.from_bytes(data[offset:offset + 3], 'little')
+        return _date(value >> 9, (value >> 5) & 15, value & 31), offset + 3
+    if column_type == T_TIMESTAMP2:
+        seconds = int.from_bytes(data[offset:offset + 4], 'big')
+        fraction, offset = _read_fraction(data, offset + 4, meta)
+        if seconds == 0 and fraction == 0:
+            return '0000-00-00 00:00:00', offset
+        moment = datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc).replace(microsecond=fraction)
+        return moment.strftime('%Y-%m-%d %H:%M:%S.%f' if meta else '%Y-%m-%d %H:%M:%S'), offset
+    if column_type == T_DATETIME2:
+        packed = int.from_bytes(data[offset:offset + 5], 'big') - 0x8000000000
+        fraction, offset = _read_fraction(data, offset + 5, meta)
+        ymd, hms = packed >> 17, packed & 0x1ffff
+        year_month = ymd >> 5
+        date = _date(year_month // 13, year_month % 13, ymd & 31)
+        text = f"{date} {hms >> 12:02d}:{(hms >> 6) & 63:02d}:{hms & 63:02d}"
+        return (f"{text}.{fraction:06d}" if meta else text), offset
+    if column_type == T_TIME2:
+        return _read_time2(data, offset, meta)
+    if column_type == T_TIMESTAMP:
+        seconds = struct.unpack_from('<I', data, offset)[0]
+        if seconds == 0:
+            return '0000-00-00 00:00:00', offset + 4
+        moment = datetime.datetime.fromtimestamp(seconds, datetime.timezone.utc)
+        return moment.strftime('%Y-%m-%d %H:%M:%S'), offset + 4
+    if column_type == T_DATETIME:
+        value = struct.unpack_from('<Q', data, offset)[0]
+        date, time = divmod(value, 1000000)
+        text = (f"{_date(date // 10000, date // 100 % 100, date % 100)} "
+                f"{time // 10000:02d}:{time // 100 % 100:02d}:{time % 100:02d}")
+        return text, offset + 8
+    if column_type == T_TIME:
+        value = int.from_bytes(data[offset:offset + 3], 'little', signed=True)
+        sign, value = ('-' if value < 0 else ''), abs(value)
+        return f"{sign}{value // 10000:02d}:{value // 100 % 100:02d}:{value % 100:02d}", offset + 3
+    raise ValueError(f"Tipo de columna no soportado en el binlog: {column_type}")
+
+
+def _date(year: int, month: int, day: int) -> str:
+    # Texto en lugar de datetime.date: admite fechas cero ('0000-00-00') y parciales
+    return f"{year:04d}-{month:02d}-{day:02d}"
+
+
+def _read_fraction(data: bytes, offset: int, fsp: int) -> Tuple[int, int]:
+    """Lee la parte fraccionaria de TIMESTAMP2/DATETIME2; retorna (microsegundos, offset)."""
+    size = (fsp + 1) // 2
+    if not size:
+        return 0, offset
+    value = int.from_bytes(data[offset:offset + size], 'big')
+    return value * (100 ** (3 - size)), offset + size
+
+
+def _read_time2(data: bytes, offset: int, fsp: int) -> Tuple[str, int]:
+    """Decodifica TIME2 igual que my_time_packed_from_binary de MySQL."""
+    intpart = int.from_bytes(data[offset:offset + 3], 'big') - 0x800000
+    if fsp in (1, 2):
+        fraction = data[offset + 3]
+        if intpart < 0 and fraction:
+            intpart, fraction = intpart + 1, fraction - 0x100
+        packed, offset = (intpart << 24) + fraction * 10000, offset + 4
+    elif fsp in (3, 4):
+        fraction = int.from_bytes(data[offset + 3:offset + 5], 'big')
+        if intpart < 0 and fraction:
+            intpart, fraction = intpart + 1, fraction - 0x10000
+        packed, offset = (intpart << 24) + fraction * 100, offset + 5
+    elif fsp in (5, 6):
+        packed, offset = int.from_bytes(data[offset:offset + 6], 'big') - 0x800000000000, offset + 6
+    else:
+        packed, offset = intpart << 24, offset + 3
+
+    sign = '-' if packed < 0 else ''
+    packed = abs(packed)
+    hms, micro = packed >> 24, packed % (1 << 24)
+    text = f"{sign}{(hms >> 12) % 1024:02d}:{(hms >> 6) % 64:02d}:{hms % 64:02d}"
+    return (f"{text}.{micro:06d}" if fsp else text), offset
+
+
+def _read_decimal(data: bytes, offset: int, precision: int, scale: int) -> Tuple[decimal.Decimal, int]:
+    """Decodifica el formato binario de DECIMAL (grupos de 9 dígitos en big endian)."""
+    integral = precision - scale
+    full_int, partial_int = divmod(integral, 9)
+    full_frac, partial_frac = divmod(scale, 9)
+    size = (full_int * 4 + _DECIMAL_DIGIT_BYTES[partial_int]
+            + full_frac * 4 + _DECIMAL_DIGIT_BYTES[partial_frac])
+    raw = bytearray(data[offset:offset + size])
+    negative = not raw[0] & 0x80
+    raw[0] ^= 0x80
+    if negative:
+        raw = bytearray(b ^ 0xff for b in raw)
+
+    digits = []
+    position = 0
+
+    def take(byte_count, width):
+        nonlocal position
+        value = int.from_bytes(raw[position:position + byte_count], 'big')
+        position += byte_count
+        digits.append(str(value).zfill(width))
+
+    if partial_int:
+        take(_DECIMAL_DIGIT_BYTES[partial_int], partial_int)
+    for _ in range(full_int):
+        take(4, 9)
+    integer_part = ''.join(digits) or '0'
+    digits = []
+    for _ in range(full_frac):
+        take(4, 9)
+    if partial_frac:
+        take(_DECIMAL_DIGIT_BYTES[partial_frac], partial_frac)
+    fraction_part = ''.join(digits)
+
+    text = ('-' if negative else '') + integer_part + ('.' + fraction_part if fraction_part else '')
+    return decimal.Decimal(text), offset + size
+
+
+# Tipos del formato binario de JSON de MySQL
+_JSON_SMALL_OBJECT, _JSON_LARGE_OBJECT, _JSON_SMALL_ARRAY, _JSON_LARGE_ARRAY = 0, 1, 2, 3
+_JSON_LITERAL, _JSON_INT16, _JSON_UINT16, _JSON_INT32, _JSON_UINT32 = 4, 5, 6, 7, 8
+_JSON_INT64, _JSON_UINT64, _JSON_DOUBLE, _JSON_STRING, _JSON_OPAQUE = 9, 10, 11, 12, 15
+
+
+def _read_json(data: bytes):
+    """Convierte un valor JSON binario de MySQL en un objeto de Python."""
+    return _json_value(data[0], data, 1, len(data) - 1)
+
+
+def _json_value(kind: int, data: bytes, offset: int, length: int):
+    if kind in (_JSON_SMALL_OBJECT, _JSON_LARGE_OBJECT, _JSON_SMALL_ARRAY, _JSON_LARGE_ARRAY):
+        return _json_container(kind, data, offset)
+    if kind == _JSON_LITERAL:
+        return {0: None, 1: True, 2: False}[data[offset]]
+    if kind in (_JSON_INT16, _JSON_UINT16):
+        return int.from_bytes(data[offset:offset + 2], 'little', signed=kind == _JSON_INT16)
+    if kind in (_JSON_INT32, _JSON_UINT32):
+        return int.from_bytes(data[offset:offset + 4], 'little', signed=kind == _JSON_INT32)
+    if kind in (_JSON_INT64, _JSON_UINT64):
+        return int.from_bytes(data[offset:offset + 8], 'little', signed=kind == _JSON_INT64)
+    if kind == _JSON_DOUBLE:
+        return struct.unpack_from('<d', data, offset)[0]
+    if kind == _JSON_STRING:
+        size, offset = _json_varlen(data, offset)
+        return data[offset:offset + size].decode('utf-8')
+    if kind == _JSON_OPAQUE:
+        offset += 1  # tipo de columna del valor opaco
+        size, offset = _json_varlen(data, offset)
+        return data[offset:offset + size].decode('utf-8', 'replace')
+    raise ValueError(f"Tipo JSON binario no soportado: {kind}")
+
+
+def _json_varlen(data: bytes, offset: int) -> Tuple[int, int]:
+    value, shift = 0, 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7f) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, offset
+
+
+def _json_container(kind: int, data: bytes, start: int):
+    large = kind in (_JSON_LARGE_OBJECT, _JSON_LARGE_ARRAY)
+    size = 4 if large else 2
+    read = lambda position: int.from_bytes(data[position:position + size], 'little')  # noqa: E731
+    count = read(start)
+    header = start + 2 * size
+    is_object = kind in (_JSON_SMALL_OBJECT, _JSON_LARGE_OBJECT)
+
+    keys = []
+    if is_object:
+        for i in range(count):
+            entry = header + i * (size + 2)
+            key_offset = read(entry)
+            key_length = struct.unpack_from('<H', data, entry + size)[0]
+            keys.append(data[start + key_offset:start + key_offset + key_length].decode('utf-8'))
+        header += count * (size + 2)
+
+    values = []
+    for i in range(count):
+        entry = header + i * (1 + size)
+        value_type = data[entry]
+        if value_type in (_JSON_LITERAL, _JSON_INT16, _JSON_UINT16) or (
+                large and value_type in (_JSON_INT32, _JSON_UINT32)):
+            # Valores pequeños guardados dentro de la propia entrada
+            values.append(_json_value(value_type, data, entry + 1, size))
+        else:
+            values.append(_json_value(value_type, data, start + read(entry + 1), 0))
+
+    return dict(zip(keys, values)) if is_object else values
+
+
+def iter_row_changes(events: Iterator[BinlogEvent]) -> Iterator[RowsEvent]:
+    """Decodifica los eventos de filas de una secuencia, siguiendo sus TABLE_MAP."""
+    tables = {}
+    for event in events:
+        if event.type_code == TABLE_MAP_EVENT:
+            table = TableMap(event)
+            tables[table.table_id] = table
+        elif is_rows_event(event):
+            yield decode_rows_event(event, tables)
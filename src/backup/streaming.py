@@ -0,0 +1,410 @@
+"""
+Módulo de backup continuo del binary log.
+Servicio asyncio de larga duración que sigue los archivos binlog a medida que
+el servidor los escribe y los guarda en segmentos incrementales. Cada segmento
+se sella (se cierra, se sincroniza a disco y se renombra) al superar un tamaño
+o una antigüedad, siempre en el límite de una transacción, y se registra en el
+catálogo como hijo del anterior. La pérdida máxima de datos (RPO) queda
+acotada por la antigüedad máxima de un segmento en lugar del intervalo del cron.
+
+Para seguir un servidor remoto basta con replicar sus binlogs a un directorio
+local y apuntar --binlog-dir a él, p. ej. con
+`mysqlbinlog --read-from-remote-server --raw --stop-never --result-file=DIR/`.
+
+Uso:
+    python3 -m src.backup.streaming [--binlog-dir DIR] [--codec gzip]
+"""
+import argparse
+import asyncio
+import os
+import signal
+import time
+from datetime import datetime
+from typing import AsyncIterator, List, Optional, Tuple
+
+from src.backup.binlog import (
+    ANONYMOUS_GTID_EVENT, FORMAT_DESCRIPTION_EVENT, GTID_EVENT, QUERY_EVENT, BinlogEvent,
+    BinlogReader, BinlogSqlWriter, is_begin, parse_query_event,
+)
+from src.backup.binlog_index import BinlogIndex
+from src.backup.catalog import BackupCatalog
+from src.backup.compression import BackupWriter, backup_filename
+from src.db.config import DatabaseConfig
+
+SEGMENT_PREFIX = "backup_stream_"
+PART_SUFFIX = ".part"
+
+
+class BinlogTailSource:
+    """
+    Sigue los archivos binlog de un directorio desde una posición.
+
+    Los eventos se entregan en lotes; al llegar al final del archivo activo se
+    espera `poll_interval` segundos y se vuelve a leer desde la última posición.
+    Un archivo se da por terminado cuando el índice ya lista el siguiente (el
+    servidor escribe el ROTATE antes de crearlo) y una última lectura no
+    encuentra eventos nuevos.
+
+    Args:
+        reader (BinlogReader): Lector sobre el directorio de binlogs
+        start_file (str): Archivo desde el que empezar
+        start_pos (int): Posición desde la que empezar
+        poll_interval (float): Segundos entre lecturas al alcanzar el final
+            (por defecto DatabaseConfig.STREAM_POLL_INTERVAL)
+    """
+
+    def __init__(self, reader: BinlogReader, start_file: str, start_pos: int,
+                 poll_interval: Optional[float] = None):
+        self.reader = reader
+        self.file = start_file
+        self.position = start_pos
+        self.poll_interval = poll_interval or DatabaseConfig.STREAM_POLL_INTERVAL
+        self._events = None
+        self._described = None  # archivo cuyo FORMAT_DESCRIPTION ya se entregó
+
+    def _read_batch(self, size: int) -> List[BinlogEvent]:
+        """Lee hasta `size` eventos completos (bloqueante; se ejecuta en un hilo)."""
+        if self._events is None:
+            self._events = self.reader.file_events(self.file, self.position)
+        batch = []
+        for event in self._events:
+            if event.type_code == FORMAT_DESCRIPTION_EVENT and event.position < self.position:
+                if self._described == self.file:
+                    continue
+            else:
+                self.position = event.next_position
+            self._described = self.file
+            batch.append(event)
+            if len(batch) >= size:
+                return batch
+        self._events = None
+        return batch
+
+    def _next_file(self) -> Optional[str]:
+        files = self.reader.list_files(self.file)
+        index = files.index(self.file) if self.file in files else -1
+        return files[index + 1] if 0 <= index < len(files) - 1 else None
+
+    async def batches(self, stop: asyncio.Event, size: Optional[int] = None) -> AsyncIterator[List[BinlogEvent]]:
+        """
+        Entrega lotes de eventos hasta que se active `stop`.
+
+        Args:
+            stop (asyncio.Event): Señal de parada
+            size (int): Eventos por lote (por defecto DatabaseConfig.STREAM_BATCH_EVENTS)
+        """
+        size = size or DatabaseConfig.STREAM_BATCH_EVENTS
+        while not stop.is_set():
+            batch = await asyncio.to_thread(self._read_batch, size)
+            if batch:
+                yield batch
+                continue
+            next_file = await asyncio.to_thread(self._next_file)
+            if next_file is not None:
+                # Última lectura del archivo terminado antes de pasar al siguiente
+                batch = await asyncio.to_thread(self._read_batch, size)
+                if batch:
+                    yield batch
+                    continue
+                self.file, self.position = next_file, 4
+                continue
+            try:
+                await asyncio.wait_for(stop.wait(), self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+
+
+class SegmentWriter:
+    """
+    Escribe los eventos en segmentos de backup incremental y los sella.
+
+    Solo se escriben transacciones completas: los eventos de la transacción en
+    curso se guardan en memoria hasta su COMMIT, de modo que un segmento
+    sellado termina siempre en un límite de transacción y su posición final es
+    exactamente desde donde continuar.
+
+    Args:
+        catalog (BackupCatalog): Catálogo donde se registran los segmentos
+        parent (dict): Backup del que continúa el primer segmento
+        codec (str): Códec de compresión (por defecto DatabaseConfig.BACKUP_CODEC)
+        compression_level (int): Nivel de compresión del códec
+    """
+
+    def __init__(self, catalog: BackupCatalog, parent: dict, codec: Optional[str] = None,
+                 compression_level: Optional[int] = None):
+        self.catalog = catalog
+        self.parent_id = parent['id']
+        self.end = (parent['end_file'], parent['end_pos'])
+        self.codec = codec or DatabaseConfig.BACKUP_CODEC
+        self.compression_level = compression_level
+        self.sealed = 0
+        self._description = None
+        self._transaction = []
+        self._in_transaction = False
+        self._in_begin = False
+        self._segment = None  # (id, ruta, BackupWriter, BinlogSqlWriter, inicio)
+        self._transactions = 0
+
+    @property
+    def age(self) -> float:
+        """Segundos desde que se abrió el segmento actual (0 si no hay segmento)."""
+        return time.monotonic() - self._segment[4] if self._segment else 0.0
+
+    @property
+    def size(self) -> int:
+        return self._segment[2].bytes_in if self._segment else 0
+
+    def write(self, events: List[BinlogEvent]) -> Optional[dict]:
+        """
+        Escribe un lote de eventos; sella el segmento si supera el tamaño máximo.
+
+        Returns:
+            dict: Registro del segmento sellado, o None
+        """
+        sealed = None
+        for event in events:
+            code = event.type_code
+            if code == FORMAT_DESCRIPTION_EVENT:
+                # Rige los eventos siguientes; no mueve la posición (se entrega al
+                # reanudar aunque la posición sea posterior)
+                self._description = event
+                if self._segment:
+                    self._segment[3].write_event(event)
+                continue
+            if code in (GTID_EVENT, ANONYMOUS_GTID_EVENT):
+                self._in_transaction = True
+            elif code == QUERY_EVENT and is_begin(event):
+                self._in_transaction = self._in_begin = True
+            ends = self._ends_transaction(event)
+            if not self._in_transaction and not ends:
+                # Eventos entre transacciones (ROTATE, PREVIOUS_GTIDS, STOP)
+                self.end = (event.file, event.next_position)
+                continue
+
+            self._transaction.append(event)
+            if ends:
+                self._commit()
+                self.end = (event.file, event.next_position)
+                if self.size >= DatabaseConfig.STREAM_SEGMENT_BYTES:
+                    sealed = self.seal() or sealed
+        return sealed
+
+    def _ends_transaction(self, event: BinlogEvent) -> bool:
+        """True si el evento cierra la transacción en curso (o es una sentencia DDL autónoma)."""
+        if not event.is_transaction_boundary():
+            return False
+        if event.type_code == QUERY_EVENT and self._in_begin:
+            # Dentro de BEGIN solo COMMIT/ROLLBACK cierran (formato STATEMENT o MIXED)
+            return parse_query_event(event)['query'] in ('COMMIT', 'ROLLBACK')
+        return True
+
+    def _commit(self):
+        if self._segment is None:
+            self._open()
+        sql = self._segment[3]
+        for event in self._transaction:
+            sql.write_event(event)
+        self._transaction = []
+        self._in_transaction = self._in_begin = False
+        self._transactions += 1
+
+    def _open(self):
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S_%f')
+        path = backup_filename(os.path.join(DatabaseConfig.BACKUP_DIR, f"{SEGMENT_PREFIX}{timestamp}.sql"),
+                               self.codec)
+        backup_id = self.catalog.start_backup('incremental', path, self.parent_id,
+                                              f"{self.end[0]}:{self.end[1]}", self.codec)
+        writer = BackupWriter(path + PART_SUFFIX, self.codec, self.compression_level)
+        sql = BinlogSqlWriter(writer)
+        if self._description is not None:
+            sql.write_event(self._description)
+        self._segment = (backup_id, path, writer, sql, time.monotonic())
+        self._transactions = 0
+
+    def seal(self) -> Optional[dict]:
+        """
+        Sella el segmento actual: cierra y sincroniza el archivo, lo renombra a su
+        nombre definitivo y lo registra como completo con su posición final.
+
+        Returns:
+            dict: Registro del segmento, o None si no había segmento abierto
+        """
+        if self._segment is None:
+            return None
+        backup_id, path, writer, sql, _ = self._segment
+        self._segment = None
+        sql.close()
+        writer.close()
+        os.replace(path + PART_SUFFIX, path)
+        _fsync_directory(os.path.dirname(path))
+        record = self.catalog.finish_backup(backup_id, f"{self.end[0]}:{self.end[1]}", writer)
+        self.parent_id = backup_id
+        self.sealed += 1
+        print(f"Segmento sellado: {path} ({self._transactions} transacciones, "
+              f"hasta {self.end[0]}:{self.end[1]}, {writer.bytes_out} bytes)")
+        return record
+
+    def abort(self, error: str):
+        """Descarta el segmento abierto (sus transacciones se releerán al reanudar)."""
+        if self._segment is None:
+            return
+        backup_id, path, writer, _, _ = self._segment
+        self._segment = None
+        writer.close()
+        os.remove(path + PART_SUFFIX)
+        self.catalog.fail_backup(backup_id, error)
+
+
+def _fsync_directory(path: str):
+    """Sincroniza un directorio para que un renombrado sobreviva a una caída."""
+    fd = os.open(path or ".", os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def recover_segments(catalog: BackupCatalog) -> int:
+    """
+    Descarta los segmentos que quedaron a medias por una caída.
+
+    Un segmento solo cuenta si el catálogo lo marcó como completo; los que
+    siguen 'running' se marcan como fallidos y se borran sus archivos.
+
+    Returns:
+        int: Segmentos descartados
+    """
+    discarded = 0
+    for backup in catalog.running():
+        if not os.path.basename(backup['path']).startswith(SEGMENT_PREFIX):
+            continue
+        for path in (backup['path'] + PART_SUFFIX, backup['path']):
+            if os.path.exists(path):
+                os.remove(path)
+        catalog.fail_backup(backup['id'], "Segmento interrumpido")
+        discarded += 1
+    return discarded
+
+
+class StreamingBackup:
+    """
+    Servicio que sigue el binlog y escribe segmentos incrementales.
+
+    Un lector y un escritor se comunican por una cola acotada
+    (DatabaseConfig.STREAM_QUEUE_DEPTH lotes): si el almacenamiento es lento, la
+    cola se llena y el lector deja de leer hasta que haya espacio. Al reanudar
+    (tras una parada limpia o una caída) se continúa desde la posición final
+    del último backup completo del catálogo, que es la última posición durable.
+
+    Args:
+        binlog_dir (str): Directorio de binlogs a seguir (por defecto DatabaseConfig.BINLOG_DIR)
+        codec (str): Códec de compresión de los segmentos
+        compression_level (int): Nivel de compresión del códec
+        catalog (BackupCatalog): Catálogo de backups
+    """
+
+    def __init__(self, binlog_dir: Optional[str] = None, codec: Optional[str] = None,
+                 compression_level: Optional[int] = None, catalog: Optional[BackupCatalog] = None):
+        self.reader = BinlogReader(binlog_dir)
+        self.codec = codec
+        self.compression_level = compression_level
+        self.catalog = catalog or BackupCatalog()
+        self.stop = asyncio.Event()
+        self.stalls = 0  # veces que el lector esperó por una cola llena
+
+    def resume_position(self) -> Tuple[dict, str, int]:
+        """
+        Obtiene el backup del que continuar y su posición final.
+
+        Raises:
+            ValueError: Si el catálogo no tiene un backup completo del que partir
+        """
+        discarded = recover_segments(self.catalog)
+        if discarded:
+            print(f"Descartados {discarded} segmentos interrumpidos")
+        parent = self.catalog.latest()
+        if not parent or not parent['end_file']:
+            raise ValueError("No se encontró un backup previo. Se requiere un backup completo primero.")
+        return parent, parent['end_file'], parent['end_pos']
+
+    async def _produce(self, source: BinlogTailSource, queue: asyncio.Queue):
+        try:
+            async for batch in source.batches(self.stop):
+                if queue.full():
+                    self.stalls += 1
+                await queue.put(batch)
+        finally:
+            await queue.put(None)
+
+    async def _consume(self, segments: SegmentWriter, queue: asyncio.Queue):
+        max_age = DatabaseConfig.STREAM_SEGMENT_SECONDS
+        while True:
+            timeout = max(max_age - segments.age, 0.01) if segments.age else None
+            try:
+                batch = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                await asyncio.to_thread(segments.seal)
+                continue
+            if batch is None:
+                break
+            await asyncio.to_thread(segments.write, batch)
+            if segments.age >= max_age:
+                await asyncio.to_thread(segments.seal)
+        # Parada limpia: se sella lo escrito; la transacción en curso se relee al reanudar
+        await asyncio.to_thread(segments.seal)
+
+    async def run(self):
+        """Ejecuta el servicio hasta que se active `stop`."""
+        parent, start_file, start_pos = self.resume_position()
+        print(f"Siguiendo el binlog desde {start_file}:{start_pos} en {self.reader.binlog_dir}")
+        source = BinlogTailSource(self.reader, start_file, start_pos)
+        segments = SegmentWriter(self.catalog, parent, self.codec, self.compression_level)
+        queue = asyncio.Queue(maxsize=DatabaseConfig.STREAM_QUEUE_DEPTH)
+
+        producer = asyncio.create_task(self._produce(source, queue))
+        try:
+            await self._consume(segments, queue)
+            await producer
+        except BaseException as e:
+            self.stop.set()
+            producer.cancel()
+            segments.abort(str(e) or type(e).__name__)
+            raise
+        finally:
+            print(f"Servicio detenido: {segments.sealed} segmentos sellados, "
+                  f"hasta {segments.end[0]}:{segments.end[1]} "
+                  f"({self.stalls} esperas por almacenamiento lento)")
+
+        # Indexar lo respaldado para la recuperación a un punto en el tiempo
+        try:
+            await asyncio.to_thread(BinlogIndex(reader=self.reader).update, segments.end[0])
+        except (OSError, ValueError) as e:
+            print(f"Advertencia: no se pudo actualizar el índice de binlog: {e}")
+
+
+async def _serve(service: StreamingBackup):
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, service.stop.set)
+    await service.run()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--binlog-dir", default=DatabaseConfig.BINLOG_DIR,
+                        help="Directorio de los archivos binlog a seguir")
+    parser.add_argument("--codec", default=DatabaseConfig.BACKUP_CODEC,
+                        help="Códec de compresión: none, gzip, zstd o lz4")
+    parser.add_argument("--level", type=int, default=DatabaseConfig.BACKUP_COMPRESSION_LEVEL,
+                        help="Nivel de compresión")
+    args = parser.parse_args()
+
+    try:
+        asyncio.run(_serve(StreamingBackup(args.binlog_dir, args.codec, args.level)))
+    except ValueError as e:
+        print(f"✗ Error: {e}")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,294 @@
+"""
+Módulo de limitación de carga del volcado.
+Protege la latencia de producción mientras corre un backup completo:
+- Un token bucket limita las filas y los bytes por segundo que leen los workers
+- Un hilo monitor lee periódicamente señales del servidor (Threads_running,
+  retraso de replicación y latencia de una consulta de prueba) y ajusta un
+  factor entre THROTTLE_MIN_FACTOR y 1: lo reduce a la mitad cuando alguna
+  señal supera su umbral y lo aumenta de a poco cuando todas están por debajo
+  de la mitad del umbral
+- El factor escala los límites de filas y bytes por segundo, el tamaño de cada
+  bloque leído y la cantidad de workers que leen a la vez
+
+Cada decisión del monitor se imprime y se registra como evento de las métricas
+de la ejecución (src/db/metrics.py).
+"""
+import threading
+import time
+from typing import Optional
+
+from mysql.connector import errors
+
+from src.db import metrics
+from src.db.config import DatabaseConfig
+from src.db.pool import get_pool
+
+
+class TokenBucket:
+    """
+    Token bucket de `rate` unidades por segundo, con ráfagas de hasta un segundo.
+
+    Args:
+        rate (float): Unidades por segundo (None = sin límite)
+    """
+
+    def __init__(self, rate: Optional[float]):
+        self.rate = rate
+        self._tokens = rate or 0.0
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def take(self, amount: float) -> float:
+        """
+        Descuenta `amount` unidades y retorna los segundos que el llamador debe esperar.
+        El saldo puede quedar negativo: la espera salda la deuda.
+        """
+        with self._lock:
+            if not self.rate or amount <= 0:
+                return 0.0
+            now = time.monotonic()
+            self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= amount
+            return -self._tokens / self.rate if self._tokens < 0 else 0.0
+
+    def set_rate(self, rate: Optional[float]):
+        with self._lock:
+            now = time.monotonic()
+            if self.rate:
+                self._tokens = min(self.rate, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self.rate = rate
+            if rate:
+                self._tokens = min(self._tokens, rate)
+
+
+class Throttle:
+    """
+    Limitador adaptativo compartido por los workers de un volcado.
+
+    Args:
+        workers (int): Workers del volcado
+        max_rows_per_second (float): Límite de filas por segundo con el factor en 1
+        max_bytes_per_second (float): Límite de bytes por segundo con el factor en 1
+        interval (float): Segundos entre lecturas de las señales del servidor
+    """
+
+    def __init__(self, workers: int = 1, max_rows_per_second: Optional[float] = None,
+                 max_bytes_per_second: Optional[float] = None, interval: Optional[float] = None):
+        self.workers = max(1, workers)
+        self.max_rows_per_second = max_rows_per_second or DatabaseConfig.THROTTLE_MAX_ROWS_PER_SECOND
+        self.max_bytes_per_second = max_bytes_per_second or DatabaseConfig.THROTTLE_MAX_BYTES_PER_SECOND
+        self.interval = interval or DatabaseConfig.THROTTLE_INTERVAL
+        self.factor = 1.0
+        self.decisions = []
+        self._rows = TokenBucket(self.max_rows_per_second)
+        self._bytes = TokenBucket(self.max_bytes_per_second)
+        self._active = 0
+        self._slots = threading.Condition()
+        self._stop = threading.Event()
+        self._monitor = None
+
+    # --- Uso desde los workers ---
+
+    def chunk_size(self, base: int) -> int:
+        """Filas a leer en la próxima consulta según el factor actual."""
+        return max(DatabaseConfig.THROTTLE_MIN_CHUNK_ROWS, int(base * self.factor))
+
+    def allowed_workers(self) -> int:
+        return max(1, round(self.workers * self.factor))
+
+    def acquire_slot(self):
+        """Espera hasta que la cantidad de workers activos sea menor que la permitida."""
+        with self._slots:
+            while self._active >= self.allowed_workers():
+                self._slots.wait(self.interval)
+            self._active += 1
+
+    def release_slot(self):
+        with self._slots:
+            self._active -= 1
+            self._slots.notify_all()
+
+    def wait(self, rows: int = 0, bytes: int = 0):
+        """
+        Consume filas y bytes del token bucket, esperando si hace falta.
+
+        Debe llamarse entre bloques, con un lugar de worker tomado: si el factor
+        bajó, el worker cede su lugar y espera a que vuelva a estar permitido.
+        """
+        delay = max(self._rows.take(rows), self._bytes.take(bytes))
+        if delay > 0:
+            time.sleep(delay)
+        started = time.perf_counter()
+        with self._slots:
+            if self._active > self.allowed_workers():
+                self._active -= 1
+                self._slots.notify_all()
+                while self._active >= self.allowed_workers():
+                    self._slots.wait(self.interval)
+                self._active += 1
+        paused = time.perf_counter() - started
+        if delay > 0 or paused > 0.001:
+            metrics.observe('throttle', delay + paused)
+
+    # --- Monitor de señales del servidor ---
+
+    def start(self):
+        """Inicia el hilo que lee las señales del servidor y ajusta el factor."""
+        if self._monitor is None:
+            self._monitor = threading.Thread(target=self._run, name="throttle-monitor", daemon=True)
+            self._monitor.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._monitor is not None:
+            self._monitor.join()
+            self._monitor = None
+        with self._slots:
+            self._slots.notify_all()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _run(self):
+        conn = None
+        try:
+            conn = get_pool().new_connection()
+            while not self._stop.wait(self.interval):
+                try:
+                    self.adjust(read_signals(conn, self.workers))
+                except errors.Error as e:
+                    print(f"Advertencia: no se pudieron leer las señales del servidor: {e}")
+        except errors.Error as e:
+            print(f"Advertencia: limitación adaptativa desactivada, sin conexión de monitoreo: {e}")
+        finally:
+            if conn is not None:
+                conn.close()
+
+    def adjust(self, signals: dict) -> dict:
+        """
+        Ajusta el factor según las señales leídas y registra la decisión.
+
+        Args:
+            signals (dict): 'threads_running', 'replication_lag' y 'probe_latency' (None = desconocida)
+
+        Returns:
+            dict: Decisión registrada
+        """
+        limits = {
+            'threads_running': DatabaseConfig.THROTTLE_MAX_THREADS_RUNNING,
+            'replication_lag': DatabaseConfig.THROTTLE_MAX_REPLICATION_LAG,
+            'probe_latency': DatabaseConfig.THROTTLE_MAX_PROBE_LATENCY,
+        }
+        known = {name: value for name, value in signals.items() if value is not None and limits.get(name)}
+        pressure = [name for name, value in known.items() if value > limits[name]]
+        idle = all(value <= limits[name] / 2 for name, value in known.items())
+
+        previous = self.factor
+        if pressure:
+            self.factor = max(DatabaseConfig.THROTTLE_MIN_FACTOR, self.factor / 2)
+            action = "reducir"
+        elif idle and self.factor < 1.0:
+            self.factor = min(1.0, self.factor + DatabaseConfig.THROTTLE_STEP)
+            action = "aumentar"
+        else:
+            action = "mantener"
+
+        if self.factor != previous:
+            self._rows.set_rate(self.max_rows_per_second * self.factor if self.max_rows_per_second else None)
+            self._bytes.set_rate(self.max_bytes_per_second * self.factor if self.max_bytes_per_second else None)
+            with self._slots:
+                self._slots.notify_all()
+
+        decision = {
+            'time': time.time(),
+            'action': action,
+            'factor': round(self.factor, 3),
+            'previous_factor': round(previous, 3),
+            'pressure': pressure,
+            'signals': signals,
+            'workers': self.allowed_workers(),
+            'rows_per_second': self._rows.rate,
+            'bytes_per_second': self._bytes.rate,
+        }
+        self.decisions.append(decision)
+        run = metrics.current()
+        if run is not None:
+            run.event(event='throttle', **decision)
+        if action != "mantener":
+            causes = ", ".join(f"{name}={signals[name]}" for name in pressure) or "servidor sin carga"
+            print(f"Limitación: {action} a {self.factor:.2f} ({causes}); "
+                  f"{self.allowed_workers()} workers, bloques x{self.factor:.2f}")
+        return decision
+
+
+def _status_value(cursor, variable: str) -> Optional[int]:
+    cursor.execute("SHOW GLOBAL STATUS LIKE %s", (variable,))
+    row = cursor.fetchone()
+    return int(row[1]) if row else None
+
+
+def _replication_lag(cursor) -> Optional[int]:
+    """Segundos de retraso si el servidor es una réplica (None si no lo es o no se conoce)."""
+    for statement, column in (("SHOW REPLICA STATUS", "Seconds_Behind_Source"),
+                              ("SHOW SLAVE STATUS", "Seconds_Behind_Master")):
+        try:
+            cursor.execute(statement)
+        except errors.Error:
+            continue
+        row = cursor.fetchone()
+        if cursor.with_rows:
+            cursor.fetchall()
+        if not row or column not in cursor.column_names:
+            return None
+        value = row[cursor.column_names.index(column)]
+        return int(value) if value is not None else None
+    return None
+
+
+def read_signals(conn, own_threads: int = 0) -> dict:
+    """
+    Lee las señales de carga del servidor.
+
+    Args:
+        conn (MySQLConnection): Conexión de monitoreo
+        own_threads (int): Consultas propias del volcado, descontadas de Threads_running
+
+    Returns:
+        dict: 'threads_running', 'replication_lag' (segundos) y 'probe_latency' (segundos)
+    """
+    cursor = conn.cursor()
+    try:
+        started = time.perf_counter()
+        cursor.execute(DatabaseConfig.THROTTLE_PROBE_QUERY)
+        cursor.fetchall()
+        latency = time.perf_counter() - started
+        running = _status_value(cursor, 'Threads_running')
+        if running is not None:
+            # Incluye la conexión de monitoreo y los workers del propio volcado
+            running = max(0, running - own_threads - 1)
+        lag = _replication_lag(cursor)
+    finally:
+        cursor.close()
+    return {'threads_running': running, 'replication_lag': lag, 'probe_latency': round(latency, 6)}
+
+
+def create_throttle(workers: int, enabled: Optional[bool] = None) -> Optional[Throttle]:
+    """
+    Crea el limitador del volcado si está habilitado.
+
+    Args:
+        workers (int): Workers del volcado
+        enabled (bool): Habilitar la limitación (por defecto DatabaseConfig.THROTTLE_ENABLED)
+
+    Returns:
+        Throttle: Limitador sin iniciar, o None
+    """
+    if not (DatabaseConfig.THROTTLE_ENABLED if enabled is None else enabled):
+        return None
+    return Throttle(workers)
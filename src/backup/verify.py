@@ -0,0 +1,340 @@
+"""
+Módulo de verificación de datos por checksums.
+Al crear un backup completo se calcula, para cada tabla y cada rango de su
+clave primaria, la cantidad de filas y un checksum independiente del orden
+(BIT_XOR del CRC32 de cada fila), en el mismo snapshot que los datos
+volcados. Tras una restauración se recalculan en paralelo entre tablas y se
+comparan: los rangos que no coinciden se informan con sus límites de clave.
+
+Uso:
+    python3 -m src.backup.verify --backup backups/backup_completo_X.sql.gz
+"""
+import argparse
+import queue
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from src.backup.catalog import BackupCatalog
+from src.backup.dump import INTEGER_TYPES
+from src.db.config import DatabaseConfig
+from src.db.pool import get_pool
+from src.db.schema import get_schema
+
+
+def _columns(table: str) -> List[Tuple[str, str, bool]]:
+    """Retorna (columna, tipo, es parte de la clave primaria) de cada columna, en orden."""
+    return [(column['name'], column['type'], column['pk'] is not None) for column in get_schema().columns(table)]
+
+
+def _row_checksum(columns: List[str]) -> str:
+    """Expresión SQL con el CRC32 de una fila; ISNULL distingue NULL de la cadena vacía."""
+    quoted = [f"`{column}`" for column in columns]
+    nulls = ", ".join(f"ISNULL({column})" for column in quoted)
+    return f"CRC32(CONCAT_WS('#', {', '.join(quoted)}, CONCAT({nulls})))"
+
+
+def plan_table(conn, table: str, range_rows: Optional[int] = None) -> dict:
+    """
+    Define cómo se divide una tabla en rangos de clave para calcular sus checksums.
+
+    Las tablas con clave primaria entera de una sola columna se dividen en
+    rangos de igual amplitud de unas `range_rows` filas; el resto se verifica
+    como un único rango.
+
+    Returns:
+        dict: 'table', 'columns', 'pk', 'low', 'step' (pk, low y step son None sin rangos)
+              y 'buckets' (cantidad de rangos)
+    """
+    range_rows = range_rows or DatabaseConfig.VERIFY_RANGE_ROWS
+    columns = _columns(table)
+    pk_columns = [name for name, _, is_pk in columns if is_pk]
+    plan = {'table': table, 'columns': [name for name, _, _ in columns], 'pk': None, 'low': None, 'step': None,
+            'buckets': 1}
+    if len(pk_columns) != 1 or dict((n, t) for n, t, _ in columns)[pk_columns[0]] not in INTEGER_TYPES:
+        return plan
+
+    pk = pk_columns[0]
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT MIN(`{pk}`), MAX(`{pk}`) FROM `{table}`")
+    low, high = cursor.fetchone()
+    cursor.execute(
+        "SELECT TABLE_ROWS FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s",
+        (table,)
+    )
+    estimated = int((cursor.fetchone() or (0,))[0] or 0)
+    cursor.close()
+    if low is None:
+        return plan
+    span = int(high) - int(low) + 1
+    step = max(1, -(-span // max(1, -(-estimated // range_rows))))
+    plan.update(pk=pk, low=int(low), step=step, buckets=-(-span // step))
+    return plan
+
+
+def _slices(plan: dict, buckets: int, parts: int) -> List[Tuple[Optional[int], Optional[int]]]:
+    """Divide los rangos de una tabla en `parts` consultas; la primera y la última quedan abiertas."""
+    if plan['pk'] is None or parts <= 1 or buckets <= 1:
+        return [(None, None)]
+    size = -(-buckets // parts)
+    edges = list(range(size, buckets, size))
+    return list(zip([None] + edges, edges + [None]))
+
+
+def checksum_slice(conn, plan: dict, first: Optional[int] = None,
+                   last: Optional[int] = None) -> Dict[int, Tuple[int, int]]:
+    """
+    Calcula filas y checksum de los rangos [first, last) de una tabla.
+
+    Returns:
+        dict: {número de rango: (filas, checksum)}
+    """
+    expression = _row_checksum(plan['columns'])
+    table = plan['table']
+    if plan['pk'] is None:
+        query, params = f"SELECT 0, COUNT(*), BIT_XOR({expression}) FROM `{table}`", ()
+    else:
+        pk, low, step = plan['pk'], plan['low'], plan['step']
+        conditions, params = [], []
+        if first is not None:
+            conditions.append(f"`{pk}` >= %s")
+            params.append(low + first * step)
+        if last is not None:
+            conditions.append(f"`{pk}` < %s")
+            params.append(low + last * step)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        query = (f"SELECT FLOOR((`{pk}` - {low}) / {step}) AS bucket, COUNT(*), BIT_XOR({expression}) "
+                 f"FROM `{table}`{where} GROUP BY bucket")
+
+    cursor = conn.cursor()
+    try:
+        # Los TIMESTAMP se convierten a texto según la zona horaria de la sesión
+        cursor.execute("SET SESSION time_zone = '+00:00'")
+        cursor.execute(query, tuple(params))
+        result = {int(bucket): (int(rows), int(checksum or 0)) for bucket, rows, checksum in cursor.fetchall()}
+    finally:
+        cursor.close()
+    if plan['pk'] is None and not result:
+        result = {0: (0, 0)}
+    return result
+
+
+def _checksum_task(conn, task: tuple) -> Dict[int, Tuple[int, int]]:
+    return checksum_slice(conn, *task)
+
+
+def _run(tasks: List, connections: List, handler) -> List:
+    """Reparte las tareas entre las conexiones (un hilo por conexión) y retorna los resultados."""
+    pending = queue.Queue()
+    for index, task in enumerate(tasks):
+        pending.put((index, task))
+    results = [None] * len(tasks)
+    failures = []
+
+    def worker(conn):
+        while not failures:
+            try:
+                index, task = pending.get_nowait()
+            except queue.Empty:
+                return
+            try:
+                results[index] = handler(conn, task)
+            except Exception as e:
+                failures.append(e)
+
+    threads = [threading.Thread(target=worker, args=(conn,)) for conn in connections]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    if failures:
+        raise failures[0]
+    return results
+
+
+def compute_checksums(tables: List[str], connections: List, range_rows: Optional[int] = None) -> List[dict]:
+    """
+    Calcula los checksums de las tablas con las conexiones del snapshot del backup.
+
+    Debe llamarse después de volcar los datos: cambia la zona horaria de las sesiones.
+
+    Args:
+        tables (list): Tablas a verificar
+        connections (list): Conexiones abiertas con open_consistent_snapshot
+        range_rows (int): Filas aproximadas por rango (por defecto DatabaseConfig.VERIFY_RANGE_ROWS)
+
+    Returns:
+        list: Registros para BackupCatalog.record_checksums
+    """
+    plans = _run(tables, connections, lambda conn, table: plan_table(conn, table, range_rows))
+    tasks = [(plan, first, last) for plan in plans
+             for first, last in _slices(plan, plan['buckets'], len(connections))]
+    results = {plan['table']: {} for plan in plans}
+    for (plan, _, _), result in zip(tasks, _run(tasks, connections, _checksum_task)):
+        results[plan['table']].update(result)
+    return [
+        {'name': plan['table'], 'pk': plan['pk'], 'range_low': plan['low'], 'range_step': plan['step'],
+         'bucket': bucket, 'rows': rows, 'checksum': checksum}
+        for plan in plans
+        for bucket, (rows, checksum) in sorted(results[plan['table']].items())
+    ]
+
+
+def _expected_by_table(records: List[dict]) -> Dict[str, dict]:
+    tables = {}
+    for record in records:
+        table = tables.setdefault(record['name'], {
+            'pk': record['pk'], 'low': record['range_low'], 'step': record['range_step'], 'buckets': {},
+        })
+        table['buckets'][record['bucket']] = (record['rows'], record['checksum'])
+    return tables
+
+
+def _bucket_range(expected: dict, bucket: int) -> Tuple[Optional[int], Optional[int]]:
+    if expected['pk'] is None:
+        return None, None
+    start = expected['low'] + bucket * expected['step']
+    return start, start + expected['step']
+
+
+def compare_table(table: str, expected: dict, actual: Dict[int, Tuple[int, int]]) -> List[dict]:
+    """
+    Compara los rangos de una tabla y une los rangos contiguos que difieren.
+
+    Returns:
+        list: Diferencias con 'table', 'pk', 'start', 'end' (clave, fin excluido),
+              'expected_rows' y 'actual_rows'
+    """
+    mismatches = []
+    for bucket in sorted(set(expected['buckets']) | set(actual)):
+        wanted = expected['buckets'].get(bucket, (0, 0))
+        found = actual.get(bucket, (0, 0))
+        if wanted == found:
+            continue
+        start, end = _bucket_range(expected, bucket)
+        last = mismatches[-1] if mismatches else None
+        if last and last['end'] is not None and last['end'] == start:
+            last['end'] = end
+            last['expected_rows'] += wanted[0]
+            last['actual_rows'] += found[0]
+        else:
+            mismatches.append({'table': table, 'pk': expected['pk'], 'start': start, 'end': end,
+                               'expected_rows': wanted[0], 'actual_rows': found[0]})
+    return mismatches
+
+
+def verify_checksums(records: List[dict], workers: Optional[int] = None) -> dict:
+    """
+    Recalcula los checksums en la base de datos y los compara con los del backup.
+
+    Cada tabla grande se divide en varias consultas por rango de clave, y todas
+    las consultas se reparten entre `workers` conexiones.
+
+    Args:
+        records (list): Checksums registrados con el backup (BackupCatalog.checksums)
+        workers (int): Conexiones en paralelo (por defecto DatabaseConfig.VERIFY_WORKERS)
+
+    Returns:
+        dict: 'tables', 'matched', 'mismatches' (ver compare_table), 'missing_tables' y 'elapsed'
+    """
+    started = time.perf_counter()
+    workers = max(1, workers or DatabaseConfig.VERIFY_WORKERS)
+    expected = _expected_by_table(records)
+
+    pool = get_pool()
+    connections = [pool.new_connection() for _ in range(workers)]
+    try:
+        cursor = connections[0].cursor()
+        cursor.execute("SELECT TABLE_NAME FROM information_schema.TABLES WHERE TABLE_SCHEMA = DATABASE()")
+        existing = {row[0] for row in cursor.fetchall()}
+        cursor.close()
+        missing = sorted(table for table in expected if table not in existing)
+
+        tasks = []
+        for table, info in expected.items():
+            if table in missing:
+                continue
+            plan = {'table': table, 'columns': [name for name, _, _ in _columns(table)],
+                    'pk': info['pk'], 'low': info['low'], 'step': info['step']}
+            buckets = max(info['buckets']) + 1 if info['buckets'] else 1
+            tasks.extend((plan, first, last) for first, last in _slices(plan, buckets, workers))
+        results = _run(tasks, connections, _checksum_task)
+    finally:
+        for conn in connections:
+            conn.close()
+
+    actual = {plan['table']: {} for plan, _, _ in tasks}
+    for (plan, _, _), result in zip(tasks, results):
+        actual[plan['table']].update(result)
+    mismatches = []
+    for table in sorted(actual):
+        mismatches.extend(compare_table(table, expected[table], actual[table]))
+    different = {mismatch['table'] for mismatch in mismatches}
+    return {
+        'tables': len(expected),
+        'matched': len(actual) - len(different),
+        'mismatches': mismatches,
+        'missing_tables': missing,
+        'elapsed': time.perf_counter() - started,
+    }
+
+
+def print_report(report: dict):
+    """Muestra el resultado de verify_checksums."""
+    print(f"Verificación por checksums: {report['matched']} de {report['tables']} tablas coinciden "
+          f"({report['elapsed']:.1f}s)")
+    for table in report['missing_tables']:
+        print(f"  - {table}: la tabla no existe")
+    for mismatch in report['mismatches']:
+        if mismatch['pk'] is None:
+            where = "toda la tabla"
+        else:
+            start = "" if mismatch['start'] is None else mismatch['start']
+            end = "" if mismatch['end'] is None else mismatch['end']
+            where = f"{mismatch['pk']} en [{start}, {end})"
+        print(f"  - {mismatch['table']}: {where} difiere "
+              f"({mismatch['expected_rows']} filas en el backup, {mismatch['actual_rows']} en la base)")
+
+
+def verify_backup(backup_file: str, workers: Optional[int] = None,
+                  catalog: Optional[BackupCatalog] = None) -> Optional[dict]:
+    """
+    Verifica la base de datos contra los checksums registrados para un backup completo.
+
+    Returns:
+        dict: Resultado de verify_checksums, o None si el backup no tiene checksums
+    """
+    catalog = catalog or BackupCatalog()
+    record = catalog.find(backup_file)
+    if record is None:
+        print(f"El backup {backup_file} no está en el catálogo; se omite la verificación")
+        return None
+    records = catalog.checksums(record['id'])
+    if not records:
+        print(f"El backup {backup_file} no tiene checksums registrados; se omite la verificación")
+        return None
+    report = verify_checksums(records, workers)
+    print_report(report)
+    return report
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backup", help="Backup completo cuyos checksums se verifican (por defecto el más reciente)")
+    parser.add_argument("--workers", type=int, default=DatabaseConfig.VERIFY_WORKERS,
+                        help="Conexiones que calculan checksums en paralelo")
+    args = parser.parse_args()
+
+    catalog = BackupCatalog()
+    backup_file = args.backup
+    if backup_file is None:
+        latest = catalog.latest_full()
+        if latest is None:
+            print("No hay backups completos en el catálogo")
+            return
+        backup_file = latest['path']
+    verify_backup(backup_file, args.workers, catalog)
+
+
+if __name__ == "__main__":
+    main()
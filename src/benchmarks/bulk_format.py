@@ -0,0 +1,126 @@
+"""
+Benchmark de restauración: sentencias INSERT multi-fila vs archivos TSV con LOAD DATA.
+Crea una tabla con datos sintéticos (texto con tabuladores y saltos de línea,
+NULL y una columna binaria), la vuelca en ambos formatos con el mismo códec,
+la restaura con cada camino y compara filas por segundo. Después de cada
+restauración se verifica con CHECKSUM TABLE que los datos sean idénticos.
+
+Uso:
+    python3 -m src.benchmarks.bulk_format --rows 200000 --codec gzip
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from src.backup.bulk import _open_bulk_connection, dump_table_tsv, get_columns, load_file, load_statement, table_info
+from src.backup.compression import BackupWriter, backup_filename
+from src.backup.restore import apply_backup
+from src.db.pool import close_pool, get_pool
+from src.db.utils import execute_query, fetch_one, get_table_data, get_table_structure
+
+TABLE = "bench_bulk_format"
+# Texto con tabulador, salto de línea y barra invertida (escapes de MySQL)
+NOTE = "'nota {}:\\ttab\\nsalto\\\\barra'"
+
+
+def create_dataset(rows: int, batch: int = 1000):
+    """Crea la tabla de prueba con `rows` filas que ejercitan los escapes de ambos formatos."""
+    execute_query(f"DROP TABLE IF EXISTS `{TABLE}`", fetch=False)
+    execute_query(
+        f"CREATE TABLE `{TABLE}` ("
+        "id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(100) NOT NULL, amount DECIMAL(10,2), "
+        "note TEXT, payload VARBINARY(64), created_at DATETIME, KEY idx_name (name))",
+        fetch=False
+    )
+    for offset in range(0, rows, batch):
+        count = min(batch, rows - offset)
+        values = ",".join(
+            f"('nombre {i}', {i % 10000}.25, "
+            f"{'NULL' if i % 7 == 0 else NOTE.format(i)}, "
+            f"UNHEX(SHA1({i})), NOW())"
+            for i in range(offset, offset + count)
+        )
+        execute_query(f"INSERT INTO `{TABLE}` (name, amount, note, payload, created_at) VALUES {values}",
+                      fetch=False)
+
+
+def table_checksum() -> int:
+    return fetch_one(f"CHECKSUM TABLE `{TABLE}`")[1]
+
+
+def bench_sql(tmp: str, codec: str) -> dict:
+    """Vuelca con INSERT multi-fila y restaura con el camino de sentencias SQL."""
+    path = backup_filename(os.path.join(tmp, "bench.sql"), codec)
+    started = time.perf_counter()
+    with BackupWriter(path, codec) as f:
+        f.write("SET FOREIGN_KEY_CHECKS=0;\nSET AUTOCOMMIT = 0;\nSTART TRANSACTION;\n")
+        f.write(f"DROP TABLE IF EXISTS `{TABLE}`;\n{get_table_structure(TABLE)};\n")
+        for chunk in get_table_data(TABLE):
+            f.write(f"{chunk}\n")
+        f.write("COMMIT;\n")
+    dump_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    apply_backup(path)
+    restore_time = time.perf_counter() - started
+    return {'bytes': os.path.getsize(path), 'dump': dump_time, 'restore': restore_time}
+
+
+def bench_tsv(tmp: str, codec: str) -> dict:
+    """Vuelca a TSV y restaura con LOAD DATA LOCAL INFILE."""
+    path = backup_filename(os.path.join(tmp, "bench.tsv"), codec)
+    structure = get_table_structure(TABLE)
+    columns = get_columns(TABLE)
+    task = {'table': TABLE, 'start': None, 'end': None}
+    started = time.perf_counter()
+    with get_pool().connection() as conn, BackupWriter(path, codec) as out:
+        written = dump_table_tsv(task, columns, conn, out)
+    dump_time = time.perf_counter() - started
+
+    info = table_info(columns)
+    entry = {'file': os.path.basename(path), 'rows': written}
+    started = time.perf_counter()
+    execute_query(f"DROP TABLE IF EXISTS `{TABLE}`", fetch=False)
+    execute_query(structure, fetch=False)
+    conn = _open_bulk_connection()
+    try:
+        load_file(conn, tmp, TABLE, entry, info)
+    finally:
+        conn.close()
+    restore_time = time.perf_counter() - started
+    return {'bytes': os.path.getsize(path), 'dump': dump_time, 'restore': restore_time}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=200000, help="Filas de la tabla de prueba")
+    parser.add_argument("--codec", default="gzip", help="Códec de compresión de ambos volcados")
+    args = parser.parse_args()
+
+    print(f"=== Benchmark de restauración SQL vs LOAD DATA ({args.rows} filas, {args.codec}) ===\n")
+    create_dataset(args.rows)
+    expected = table_checksum()
+    print(f"Sentencia de carga: {load_statement(TABLE, 'bench.tsv', table_info(get_columns(TABLE)))}\n")
+
+    results = []
+    with tempfile.TemporaryDirectory(dir=".") as tmp:
+        for name, bench in (("INSERT multi-fila", bench_sql), ("TSV + LOAD DATA", bench_tsv)):
+            result = bench(tmp, args.codec)
+            result['name'] = name
+            result['identical'] = table_checksum() == expected
+            results.append(result)
+
+    execute_query(f"DROP TABLE IF EXISTS `{TABLE}`", fetch=False)
+    close_pool()
+
+    base_restore = results[0]['restore']
+    for result in results:
+        print(f"{result['name']:<18} {result['bytes'] / 1048576:8.2f} MB  volcado {result['dump']:7.2f}s  "
+              f"restauración {result['restore']:7.2f}s ({args.rows / result['restore']:10.0f} filas/s, "
+              f"x{base_restore / result['restore']:.1f})  "
+              f"{'datos idénticos' if result['identical'] else 'DATOS DISTINTOS'}")
+
+
+if __name__ == "__main__":
+    main()
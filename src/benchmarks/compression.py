@@ -0,0 +1,86 @@
+"""
+Benchmark de los códecs de compresión de backups.
+Mide la razón de compresión y el throughput de compresión y descompresión de
+cada códec disponible, sobre un backup existente o sobre datos SQL sintéticos.
+
+Uso:
+    python3 -m src.benchmarks.compression --input backups/backup_completo_X.sql.gz
+    python3 -m src.benchmarks.compression --size-mb 64 --level 3
+"""
+import argparse
+import os
+import tempfile
+import time
+
+from src.backup.compression import CODECS, READ_BUFFER_SIZE, BackupWriter, open_backup_reader
+
+def synthetic_sql(size_mb: int):
+    """Genera bloques de INSERT sintéticos hasta alcanzar `size_mb` megabytes."""
+    target = size_mb * 1024 * 1024
+    produced = 0
+    row_id = 0
+    while produced < target:
+        rows = []
+        for _ in range(1000):
+            row_id += 1
+            rows.append(f"({row_id},'empleado {row_id}','puesto {row_id % 37}','2026-01-{row_id % 28 + 1:02d} 10:00:00')")
+        block = ("INSERT INTO `employees` VALUES\n" + ",\n".join(rows) + ";\n").encode('utf-8')
+        produced += len(block)
+        yield block
+
+def read_blocks(path: str):
+    """Lee un backup existente (descomprimiéndolo si hace falta) por bloques."""
+    with open_backup_reader(path) as reader:
+        while True:
+            block = reader.read(READ_BUFFER_SIZE)
+            if not block:
+                break
+            yield block
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="Backup a usar como muestra (si se omite se generan datos sintéticos)")
+    parser.add_argument("--size-mb", type=int, default=64, help="Tamaño de la muestra sintética")
+    parser.add_argument("--level", type=int, default=None, help="Nivel de compresión")
+    parser.add_argument("--threads", type=int, default=0, help="Hilos de compresión (solo zstd)")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sample = os.path.join(tmp, "sample.sql")
+        with open(sample, 'wb') as f:
+            blocks = read_blocks(args.input) if args.input else synthetic_sql(args.size_mb)
+            for block in blocks:
+                f.write(block)
+        size = os.path.getsize(sample)
+        print(f"=== Benchmark de compresión ({size / 1048576:.1f} MB) ===\n")
+
+        for codec in CODECS.values():
+            if not codec.available():
+                print(f"{codec.name:<6} no disponible (biblioteca no instalada)")
+                continue
+            target = os.path.join(tmp, f"sample.sql{codec.extension}.out")
+
+            start = time.perf_counter()
+            with BackupWriter(target, codec.name, args.level, args.threads) as writer, open(sample, 'rb') as src:
+                while True:
+                    block = src.read(READ_BUFFER_SIZE)
+                    if not block:
+                        break
+                    writer.write_bytes(block)
+            compress_time = time.perf_counter() - start
+
+            start = time.perf_counter()
+            with open_backup_reader(target) as reader:
+                while reader.read(READ_BUFFER_SIZE):
+                    pass
+            decompress_time = time.perf_counter() - start
+
+            compressed = os.path.getsize(target)
+            mb = size / 1048576
+            print(f"{codec.name:<6} ratio {size / compressed:6.2f}  "
+                  f"compresión {mb / compress_time:8.1f} MB/s  "
+                  f"descompresión {mb / decompress_time:8.1f} MB/s  ({compressed / 1048576:.1f} MB)")
+            os.remove(target)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Benchmark de sentencias por segundo: cliente `mysql` por subproceso vs pool de conexiones.
+
+Uso:
+    python3 -m src.benchmarks.connection_overhead --statements 200 --threads 4
+"""
+import argparse
+import subprocess
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from src.db.pool import get_pool, close_pool
+from src.db.utils import get_mysql_command, execute_query
+
+QUERY = "SELECT 1"
+
+def run_subprocess(statements: int) -> float:
+    """Ejecuta `statements` consultas lanzando un proceso mysql por cada una."""
+    command = get_mysql_command(["-N", "-e", QUERY])
+    start = time.perf_counter()
+    for _ in range(statements):
+        subprocess.run(command, capture_output=True, text=True, check=True)
+    return time.perf_counter() - start
+
+def run_pool(statements: int, threads: int) -> float:
+    """Ejecuta `statements` consultas repartidas en `threads` hilos sobre el pool."""
+    get_pool()  # Crear el pool fuera de la medición
+    execute_query(QUERY)
+    start = time.perf_counter()
+    if threads <= 1:
+        for _ in range(statements):
+            execute_query(QUERY)
+    else:
+        with ThreadPoolExecutor(max_workers=threads) as executor:
+            list(executor.map(lambda _: execute_query(QUERY), range(statements)))
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--statements", type=int, default=200, help="Sentencias a ejecutar por modo")
+    parser.add_argument("--threads", type=int, default=1, help="Hilos concurrentes para el modo pool")
+    args = parser.parse_args()
+
+    print(f"=== Benchmark de conexión ({args.statements} sentencias) ===\n")
+    results = [
+        ("subproceso mysql", run_subprocess(args.statements)),
+        ("pool (1 hilo)", run_pool(args.statements, 1)),
+    ]
+    if args.threads > 1:
+        results.append((f"pool ({args.threads} hilos)", run_pool(args.statements, args.threads)))
+    close_pool()
+
+    baseline = args.statements / results[0][1]
+    for name, elapsed in results:
+        rate = args.statements / elapsed
+        print(f"{name:<20} {elapsed:8.3f}s  {rate:10.1f} sent/s  x{rate / baseline:.1f}")
+
+if __name__ == "__main__":
+    main()
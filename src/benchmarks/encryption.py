@@ -0,0 +1,128 @@
+"""
+Benchmark del costo del cifrado autenticado de backups.
+Escribe la misma muestra con cada códec, sin cifrar y cifrada (con una clave
+temporal si no hay una configurada), y compara:
+- Throughput de escritura (compresión + cifrado) y su sobrecosto
+- Throughput de lectura secuencial, descifrando con uno y con varios hilos
+- Lectura aleatoria de secciones a partir de los frames del índice (como la
+  restauración parcial)
+- Bytes agregados por el encabezado y las etiquetas de autenticación
+
+Uso:
+    python3 -m src.benchmarks.encryption --size-mb 256 --codec gzip --codec zstd
+    python3 -m src.benchmarks.encryption --input backups/backup_completo_X.sql.gz --cipher chacha20-poly1305
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from src.backup.compression import (CODECS, READ_BUFFER_SIZE, BackupWriter, get_codec, open_backup_reader,
+                                    open_backup_reader_at)
+from src.backup.encryption import CIPHERS, available, load_key
+from src.benchmarks.compression import read_blocks, synthetic_sql
+from src.db.config import DatabaseConfig
+
+
+def write_sample(sample: str, target: str, codec: str, encrypt: bool, section_bytes: int):
+    """Copia la muestra a un backup, iniciando un frame cada `section_bytes` (como las secciones por tabla)."""
+    started = time.perf_counter()
+    with BackupWriter(target, codec, encrypt=encrypt) as writer, open(sample, 'rb') as src:
+        next_section = 0
+        while True:
+            if writer.bytes_in >= next_section:
+                writer.start_frame()
+                next_section += section_bytes
+            block = src.read(READ_BUFFER_SIZE)
+            if not block:
+                break
+            writer.write_bytes(block)
+    return time.perf_counter() - started, writer
+
+
+def read_all(path: str, workers: int) -> float:
+    DatabaseConfig.BACKUP_ENCRYPTION_WORKERS = workers
+    started = time.perf_counter()
+    with open_backup_reader(path) as reader:
+        while reader.read(READ_BUFFER_SIZE):
+            pass
+    return time.perf_counter() - started
+
+
+def read_sections(path: str, frames: list, count: int, length: int, seed: int) -> float:
+    """Segundos promedio para leer `length` bytes desde el inicio de un frame al azar."""
+    rng = random.Random(seed)
+    starts = [rng.choice(frames)[0] for _ in range(count)]
+    started = time.perf_counter()
+    for offset in starts:
+        with open_backup_reader_at(path, offset, frames) as reader:
+            reader.read(length)
+    return (time.perf_counter() - started) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--input", help="Backup a usar como muestra (si se omite se generan datos sintéticos)")
+    parser.add_argument("--size-mb", type=int, default=128, help="Tamaño de la muestra sintética")
+    parser.add_argument("--codec", action="append", help="Códec a medir (repetible; por defecto todos los disponibles)")
+    parser.add_argument("--cipher", choices=sorted(CIPHERS), default=DatabaseConfig.BACKUP_ENCRYPTION_CIPHER,
+                        help="Cifrado AEAD")
+    parser.add_argument("--workers", type=int, default=max(2, DatabaseConfig.BACKUP_ENCRYPTION_WORKERS),
+                        help="Hilos de descifrado de la lectura en paralelo")
+    parser.add_argument("--section-mb", type=float, default=4, help="Bytes sin comprimir entre frames")
+    parser.add_argument("--sections", type=int, default=50, help="Lecturas aleatorias de secciones")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla de las lecturas aleatorias")
+    args = parser.parse_args()
+
+    if not available():
+        print("Error: el cifrado requiere la biblioteca cryptography, que no está instalada")
+        return
+    DatabaseConfig.BACKUP_ENCRYPTION_CIPHER = args.cipher
+    try:
+        load_key()
+    except (OSError, ValueError):
+        # Sin clave configurada se mide con una temporal
+        DatabaseConfig.BACKUP_ENCRYPTION_KEY = os.urandom(32).hex()
+    codecs = [get_codec(name) for name in args.codec] if args.codec else \
+        [codec for codec in CODECS.values() if codec.available()]
+    section_bytes = int(args.section_mb * 1048576)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        sample = os.path.join(tmp, "sample.sql")
+        with open(sample, 'wb') as f:
+            for block in read_blocks(args.input) if args.input else synthetic_sql(args.size_mb):
+                f.write(block)
+        mb = os.path.getsize(sample) / 1048576
+        print(f"=== Costo del cifrado {args.cipher} ({mb:.1f} MB, registros de "
+              f"{DatabaseConfig.BACKUP_ENCRYPTION_RECORD_BYTES // 1024} KB) ===\n")
+        print(f"{'códec':<6} {'modo':<9} {'escritura MB/s':>14} {'lectura MB/s':>13} "
+              f"{f'lectura x{args.workers} MB/s':>17} {'sección ms':>11} {'bytes extra':>12}")
+
+        for codec in codecs:
+            results = {}
+            for encrypt in (False, True):
+                target = os.path.join(tmp, f"sample{codec.extension}{'.enc' if encrypt else ''}")
+                write_time, writer = write_sample(sample, target, codec.name, encrypt, section_bytes)
+                results[encrypt] = {
+                    'write': write_time,
+                    'read': read_all(target, 1),
+                    'read_parallel': read_all(target, args.workers),
+                    'section': read_sections(target, writer.frames, args.sections, READ_BUFFER_SIZE, args.seed),
+                    'bytes_out': writer.bytes_out,
+                }
+                os.remove(target)
+            for encrypt, result in results.items():
+                extra = result['bytes_out'] - results[False]['bytes_out']
+                print(f"{codec.name:<6} {'cifrado' if encrypt else 'plano':<9} {mb / result['write']:14.1f} "
+                      f"{mb / result['read']:13.1f} {mb / result['read_parallel']:17.1f} "
+                      f"{result['section'] * 1000:11.2f} {extra:12d}")
+            plain, encrypted = results[False], results[True]
+            print(f"{'':<6} {'sobrecosto':<9} {encrypted['write'] / plain['write'] - 1:+14.1%} "
+                  f"{encrypted['read'] / plain['read'] - 1:+13.1%} "
+                  f"{encrypted['read_parallel'] / plain['read_parallel'] - 1:+17.1%} "
+                  f"{encrypted['section'] / plain['section'] - 1:+11.1%}\n")
+
+
+if __name__ == "__main__":
+    main()
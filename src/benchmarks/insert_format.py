@@ -0,0 +1,81 @@
+"""
+Benchmark del formato de los INSERT del backup: una fila por sentencia vs INSERT multi-fila.
+Crea una tabla temporal con datos sintéticos, la vuelca en ambos formatos y mide
+el tamaño del volcado y el tiempo de restauración a través del cliente `mysql`.
+
+Uso:
+    python3 -m src.benchmarks.insert_format --rows 100000
+"""
+import argparse
+import os
+import subprocess
+import tempfile
+import time
+
+from src.db.pool import close_pool
+from src.db.utils import execute_query, get_mysql_command, get_table_data, get_table_structure
+
+TABLE = "bench_insert_format"
+
+def create_dataset(rows: int, batch: int = 1000):
+    """Crea la tabla de prueba con `rows` filas sintéticas."""
+    execute_query(f"DROP TABLE IF EXISTS `{TABLE}`", fetch=False)
+    execute_query(
+        f"CREATE TABLE `{TABLE}` ("
+        "id INT AUTO_INCREMENT PRIMARY KEY, name VARCHAR(100) NOT NULL, "
+        "amount DECIMAL(10,2), note TEXT, created_at DATETIME, KEY idx_name (name))",
+        fetch=False
+    )
+    for offset in range(0, rows, batch):
+        count = min(batch, rows - offset)
+        values = ",".join(
+            f"('nombre {i}', {i % 10000}.25, 'nota de prueba número {i}', NOW())"
+            for i in range(offset, offset + count)
+        )
+        execute_query(f"INSERT INTO `{TABLE}` (name, amount, note, created_at) VALUES {values}", fetch=False)
+
+def dump_to_file(path: str, extended_insert: bool) -> float:
+    """Vuelca la tabla de prueba al archivo indicado y retorna los segundos empleados."""
+    start = time.perf_counter()
+    with open(path, 'w') as f:
+        f.write("SET FOREIGN_KEY_CHECKS=0;\nSET AUTOCOMMIT = 0;\nSTART TRANSACTION;\n")
+        f.write(f"DROP TABLE IF EXISTS `{TABLE}`;\n{get_table_structure(TABLE)};\n")
+        for chunk in get_table_data(TABLE, extended_insert=extended_insert):
+            f.write(f"{chunk}\n")
+        f.write("COMMIT;\n")
+    return time.perf_counter() - start
+
+def restore_file(path: str) -> float:
+    """Restaura el archivo con el cliente mysql y retorna los segundos empleados."""
+    start = time.perf_counter()
+    with open(path, 'r') as f:
+        subprocess.run(get_mysql_command(["--max-allowed-packet=1G"]), stdin=f, check=True)
+    return time.perf_counter() - start
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--rows", type=int, default=100000, help="Filas de la tabla de prueba")
+    args = parser.parse_args()
+
+    print(f"=== Benchmark de formato INSERT ({args.rows} filas) ===\n")
+    create_dataset(args.rows)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        results = []
+        for name, extended in (("una fila por INSERT", False), ("INSERT multi-fila", True)):
+            path = os.path.join(tmp, f"{'extended' if extended else 'single'}.sql")
+            dump_time = dump_to_file(path, extended)
+            restore_time = restore_file(path)
+            results.append((name, os.path.getsize(path), dump_time, restore_time))
+
+    execute_query(f"DROP TABLE IF EXISTS `{TABLE}`", fetch=False)
+    close_pool()
+
+    base_restore = results[0][3]
+    for name, size, dump_time, restore_time in results:
+        print(f"{name:<22} {size / 1048576:8.2f} MB  volcado {dump_time:7.2f}s  "
+              f"restauración {restore_time:7.2f}s ({args.rows / restore_time:10.0f} filas/s, "
+              f"x{base_restore / restore_time:.1f})")
+
+if __name__ == "__main__":
+    main()
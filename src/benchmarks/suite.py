@@ -0,0 +1,378 @@
+"""
+Suite reproducible de benchmarks de backup y restauración.
+Genera un conjunto de datos sintético configurable (tablas, filas, ancho de
+fila, columnas BLOB y volumen de escrituras para el binlog) a partir de una
+semilla, y mide backup completo, backup incremental, restauración completa y
+restauración incremental contra el MySQL de docker-compose. Cada fase corre
+en un proceso nuevo, de modo que su memoria máxima (RSS) se mide aislada.
+Los resultados se guardan en JSON para comparar ejecuciones y detectar
+regresiones.
+
+Uso:
+    python3 -m src.benchmarks.suite --tables 4 --rows 200000 --row-bytes 200 --blob-bytes 2048
+    python3 -m src.benchmarks.suite --writes 50000 --repeat 3 --output backups/bench/base.json
+    python3 -m src.benchmarks.suite --baseline backups/bench/base.json --tolerance 0.15
+"""
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import queue
+import random
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import List, Optional
+
+from src.db import metrics
+from src.db.config import DatabaseConfig
+from src.db.pool import close_pool, get_pool
+from src.db.utils import execute_query, fetch_one
+
+TABLE_PREFIX = "bench_t"
+PHASES = ("full_backup", "incremental_backup", "full_restore", "incremental_restore")
+RESULT_FORMAT = "bench/1"
+
+
+def _tables(count: int) -> List[str]:
+    return [f"{TABLE_PREFIX}{number:02d}" for number in range(count)]
+
+
+def _random_text(rng: random.Random, size: int) -> str:
+    alphabet = "abcdefghijklmnopqrstuvwxyz0123456789 "
+    return "".join(rng.choice(alphabet) for _ in range(size))
+
+
+def generate_dataset(tables: int, rows: int, row_bytes: int, blob_bytes: int, seed: int,
+                     batch: int = 1000) -> dict:
+    """
+    Crea las tablas de prueba con datos sintéticos deterministas.
+
+    Cada tabla tiene clave primaria entera, un texto de `row_bytes` bytes, un
+    DECIMAL, una fecha y, si `blob_bytes` es mayor que cero, un BLOB. La misma
+    semilla produce siempre los mismos datos.
+
+    Returns:
+        dict: Parámetros del conjunto de datos y bytes generados
+    """
+    rng = random.Random(seed)
+    # Un banco de textos evita que generar los datos domine el tiempo total
+    texts = [_random_text(rng, row_bytes) for _ in range(256)]
+    blobs = [rng.randbytes(blob_bytes) for _ in range(64)] if blob_bytes else []
+    generated = 0
+    # Sentencias de pocos MB aunque las filas lleven BLOB grandes
+    batch = max(1, min(batch, 4 * 1024 * 1024 // (row_bytes + 2 * blob_bytes + 64)))
+    for table in _tables(tables):
+        execute_query(f"DROP TABLE IF EXISTS `{table}`", fetch=False)
+        blob_column = ", payload MEDIUMBLOB" if blob_bytes else ""
+        execute_query(
+            f"CREATE TABLE `{table}` (id INT PRIMARY KEY, name VARCHAR({max(1, row_bytes)}) NOT NULL, "
+            f"amount DECIMAL(12,2), created_at DATETIME{blob_column}, KEY idx_amount (amount))",
+            fetch=False
+        )
+        for offset in range(0, rows, batch):
+            values = []
+            for row_id in range(offset + 1, min(rows, offset + batch) + 1):
+                blob = f", 0x{rng.choice(blobs).hex()}" if blob_bytes else ""
+                values.append(f"({row_id}, '{rng.choice(texts)}', {rng.randrange(10 ** 8) / 100:.2f}, "
+                              f"'2026-01-{row_id % 28 + 1:02d} 10:00:00'{blob})")
+            statement = ",".join(values)
+            generated += len(statement)
+            execute_query(f"INSERT INTO `{table}` VALUES {statement}", fetch=False)
+    return {'tables': tables, 'rows': rows, 'row_bytes': row_bytes, 'blob_bytes': blob_bytes,
+            'seed': seed, 'generated_bytes': generated}
+
+
+def generate_writes(tables: int, rows: int, changes: int, seed: int, rate: Optional[float] = None,
+                    batch: int = 100) -> dict:
+    """
+    Aplica `changes` cambios de fila (70% UPDATE, 20% INSERT, 10% DELETE) para generar binlog.
+
+    Los INSERT continúan desde el mayor id existente: en una repetición
+    anterior la restauración incremental ya reinsertó los ids siguientes a `rows`.
+
+    Args:
+        rate (float): Cambios por segundo; None aplica los cambios lo más rápido posible
+
+    Returns:
+        dict: Cambios pedidos, filas insertadas, actualizadas y borradas, y segundos empleados
+    """
+    rng = random.Random(seed + 1)
+    names = _tables(tables)
+    next_id = max(fetch_one(f"SELECT COALESCE(MAX(id), 0) FROM `{table}`")[0] for table in names) + 1
+    affected = {'INSERT': 0, 'UPDATE': 0, 'DELETE': 0}
+    started = time.perf_counter()
+    for done in range(0, changes, batch):
+        statements = []
+        for _ in range(min(batch, changes - done)):
+            table = rng.choice(names)
+            roll = rng.random()
+            if roll < 0.7:
+                statements.append(f"UPDATE `{table}` SET amount = {rng.randrange(10 ** 8) / 100:.2f} "
+                                  f"WHERE id = {rng.randrange(1, rows + 1)}")
+            elif roll < 0.9:
+                statements.append(f"INSERT INTO `{table}` (id, name, amount, created_at) "
+                                  f"VALUES ({next_id}, 'nueva', 1.00, NOW())")
+                next_id += 1
+            else:
+                statements.append(f"DELETE FROM `{table}` WHERE id = {rng.randrange(1, rows + 1)}")
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            for statement in statements:
+                cursor.execute(statement)
+                affected[statement.split(None, 1)[0]] += max(cursor.rowcount, 0)
+            conn.commit()
+            cursor.close()
+        if rate:
+            # Mantener el ritmo pedido: esperar hasta el instante en que tocaría el siguiente lote
+            delay = (done + len(statements)) / rate - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+    return {'changes': changes, 'inserted': affected['INSERT'], 'updated': affected['UPDATE'],
+            'deleted': affected['DELETE'], 'rows': sum(affected.values()),
+            'seconds': time.perf_counter() - started}
+
+
+def _run_phase(phase: str, arguments: dict, overrides: dict, results):
+    """Ejecuta una fase en un proceso nuevo y envía sus métricas por `results`."""
+    for name, value in overrides.items():
+        setattr(DatabaseConfig, name, value)
+    from src.backup.catalog import BackupCatalog
+    from src.backup.full import create_full_backup, restore_full_backup
+    from src.backup.incremental import create_incremental_backup, restore_incremental_backup
+
+    started = time.perf_counter()
+    cpu = time.process_time()
+    path, ok, replay = None, True, None
+    if phase == "full_backup":
+        path, _ = create_full_backup(**arguments)
+        ok = path is not None
+    elif phase == "incremental_backup":
+        path, _, _ = create_incremental_backup(**arguments)
+        ok = path is not None
+    elif phase == "full_restore":
+        ok = restore_full_backup(arguments['path'], workers=arguments.get('workers'), verify=False)
+    elif phase == "incremental_restore":
+        # restore_incremental_backup restaura primero el backup completo de la cadena: se mide
+        # aparte la aplicación de los incrementales (fase apply_incremental) para que una regresión
+        # en ella no quede escondida detrás del tiempo de la restauración completa
+        with metrics.run("incremental_restore") as active:
+            ok = restore_incremental_backup(arguments['path'])
+        replay = active.phases.get('apply_incremental') if active is not None else None
+    elapsed = time.perf_counter() - started
+
+    record = BackupCatalog().find(path or arguments.get('path', ''))
+    results.put({
+        'phase': phase,
+        'ok': bool(ok),
+        'path': path or arguments.get('path'),
+        'seconds': replay['seconds'] if replay else elapsed,
+        'total_seconds': elapsed,
+        'cpu_seconds': time.process_time() - cpu,
+        # ru_maxrss está en KB en Linux
+        'peak_rss_bytes': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        'bytes_in': record['bytes_in'] if record else None,
+        'bytes_out': record['bytes_out'] if record else None,
+    })
+    close_pool()
+
+
+def run_phase(phase: str, arguments: dict, overrides: dict) -> dict:
+    """
+    Ejecuta una fase en un proceso nuevo ('spawn'), para que su RSS máximo no arrastre el de otras fases.
+
+    Raises:
+        RuntimeError: Si el proceso termina sin resultados
+    """
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    process = context.Process(target=_run_phase, args=(phase, arguments, overrides, results))
+    process.start()
+    # Leer antes de join: un proceso con datos pendientes en la cola no termina
+    while True:
+        try:
+            result = results.get(timeout=1)
+            break
+        except queue.Empty:
+            if not process.is_alive():
+                raise RuntimeError(f"La fase {phase} terminó sin resultados (código {process.exitcode})")
+    process.join()
+    return result
+
+
+def _summarize(runs: List[dict]) -> dict:
+    """Mediana de las repeticiones de una fase, con throughput derivado de las filas de cada una."""
+    seconds = statistics.median(run['seconds'] for run in runs)
+    rows = statistics.median(run['rows'] for run in runs)
+    last = runs[-1]
+    size = last['bytes_in'] or 0
+    return {
+        'phase': last['phase'],
+        'ok': all(run['ok'] for run in runs),
+        'runs': len(runs),
+        'seconds': seconds,
+        'seconds_min': min(run['seconds'] for run in runs),
+        'seconds_max': max(run['seconds'] for run in runs),
+        'cpu_seconds': statistics.median(run['cpu_seconds'] for run in runs),
+        'peak_rss_bytes': max(run['peak_rss_bytes'] for run in runs),
+        'bytes_in': last['bytes_in'],
+        'bytes_out': last['bytes_out'],
+        'mb_per_second': size / 1048576 / seconds if size and seconds else None,
+        'rows_per_second': rows / seconds if rows and seconds else None,
+    }
+
+
+def _environment() -> dict:
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'python': sys.version.split()[0],
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+        'mysql': fetch_one("SELECT VERSION()")[0],
+        'commit': commit,
+    }
+
+
+def compare_results(current: dict, baseline: dict, tolerance: float) -> List[dict]:
+    """
+    Compara dos resultados por fase.
+
+    Returns:
+        list: Fases cuyo tiempo empeoró más que `tolerance` (fracción) respecto de la base
+    """
+    previous = {phase['phase']: phase for phase in baseline['phases']}
+    regressions = []
+    for phase in current['phases']:
+        base = previous.get(phase['phase'])
+        if not base or not base['seconds']:
+            continue
+        change = phase['seconds'] / base['seconds'] - 1
+        phase['change_vs_baseline'] = change
+        if change > tolerance:
+            regressions.append({'phase': phase['phase'], 'seconds': phase['seconds'],
+                                'baseline_seconds': base['seconds'], 'change': change})
+    return regressions
+
+
+def print_results(result: dict):
+    print(f"\n{'fase':<20} {'segundos':>9} {'MB/s':>8} {'filas/s':>10} {'RSS MB':>8} {'escrito MB':>11}")
+    for phase in result['phases']:
+        mb_s = f"{phase['mb_per_second']:.1f}" if phase['mb_per_second'] else "-"
+        rows_s = f"{phase['rows_per_second']:.0f}" if phase['rows_per_second'] else "-"
+        written = f"{phase['bytes_out'] / 1048576:.1f}" if phase['bytes_out'] else "-"
+        change = phase.get('change_vs_baseline')
+        change = f"  ({change:+.0%} vs base)" if change is not None else ""
+        status = "" if phase['ok'] else "  FALLÓ"
+        print(f"{phase['phase']:<20} {phase['seconds']:9.2f} {mb_s:>8} {rows_s:>10} "
+              f"{phase['peak_rss_bytes'] / 1048576:8.1f} {written:>11}{change}{status}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--tables", type=int, default=4, help="Tablas del conjunto de datos")
+    parser.add_argument("--rows", type=int, default=100000, help="Filas por tabla")
+    parser.add_argument("--row-bytes", type=int, default=100, help="Bytes de texto por fila")
+    parser.add_argument("--blob-bytes", type=int, default=0, help="Bytes de la columna BLOB (0 = sin BLOB)")
+    parser.add_argument("--writes", type=int, default=20000, help="Cambios de fila entre el backup completo y el incremental")
+    parser.add_argument("--write-rate", type=float, default=None, help="Cambios por segundo (por defecto sin límite)")
+    parser.add_argument("--seed", type=int, default=42, help="Semilla del generador de datos")
+    parser.add_argument("--repeat", type=int, default=1, help="Repeticiones de cada fase (se informa la mediana)")
+    parser.add_argument("--workers", type=int, default=DatabaseConfig.DUMP_WORKERS, help="Workers de volcado")
+    parser.add_argument("--restore-workers", type=int, default=DatabaseConfig.RESTORE_WORKERS,
+                        help="Workers de restauración")
+    parser.add_argument("--codec", default=DatabaseConfig.BACKUP_CODEC, help="Códec de compresión")
+    parser.add_argument("--backup-dir", default=os.path.join(DatabaseConfig.BACKUP_DIR, "bench"),
+                        help="Directorio (con su propio catálogo) para los backups del benchmark")
+    parser.add_argument("--output", help="Archivo JSON de resultados (por defecto en --backup-dir)")
+    parser.add_argument("--baseline", help="Resultados anteriores con los que comparar")
+    parser.add_argument("--tolerance", type=float, default=0.10,
+                        help="Empeoramiento máximo aceptado respecto de la base (fracción)")
+    parser.add_argument("--keep", action="store_true", help="No borrar las tablas de prueba al terminar")
+    args = parser.parse_args()
+
+    os.makedirs(args.backup_dir, exist_ok=True)
+    overrides = {
+        'BACKUP_DIR': args.backup_dir,
+        'CATALOG_PATH': os.path.join(args.backup_dir, "catalog.db"),
+        'CHUNK_STORE_DIR': os.path.join(args.backup_dir, "chunks"),
+        'BINLOG_INDEX_DIR': os.path.join(args.backup_dir, "binlog_index"),
+        'METRICS_DIR': os.path.join(args.backup_dir, "metrics"),
+        'SCHEMA_CACHE_PATH': os.path.join(args.backup_dir, "schema.json"),
+        'DUMP_WORKERS': args.workers,
+        'RESTORE_WORKERS': args.restore_workers,
+        'BACKUP_CODEC': args.codec,
+        'VERIFY_AFTER_RESTORE': False,
+        # La fase incremental_restore toma el tiempo de aplicación de las métricas
+        'METRICS_ENABLED': True,
+    }
+    total_rows = args.tables * args.rows
+
+    print(f"=== Suite de benchmarks ({args.tables} tablas x {args.rows} filas, semilla {args.seed}) ===")
+    started = time.perf_counter()
+    dataset = generate_dataset(args.tables, args.rows, args.row_bytes, args.blob_bytes, args.seed)
+    print(f"Datos generados en {time.perf_counter() - started:.1f}s ({dataset['generated_bytes'] / 1048576:.1f} MB)")
+
+    runs = {phase: [] for phase in PHASES}
+    writes = None
+    # Filas de las tablas al empezar cada repetición: crecen con los INSERT de las anteriores
+    dataset_rows = total_rows
+    try:
+        for repetition in range(args.repeat):
+            print(f"\n--- Repetición {repetition + 1}/{args.repeat} ---")
+            full = run_phase("full_backup", {'codec': args.codec}, overrides)
+            runs['full_backup'].append({**full, 'rows': dataset_rows})
+            writes = generate_writes(args.tables, args.rows, args.writes, args.seed + repetition, args.write_rate)
+            incremental = run_phase("incremental_backup", {'codec': args.codec}, overrides)
+            runs['incremental_backup'].append({**incremental, 'rows': writes['rows']})
+            runs['full_restore'].append({**run_phase("full_restore", {'path': full['path']}, overrides),
+                                         'rows': dataset_rows})
+            # Se mide solo la aplicación de los incrementales, que reaplica las filas cambiadas
+            runs['incremental_restore'].append({**run_phase("incremental_restore", {'path': incremental['path']},
+                                                            overrides), 'rows': writes['rows']})
+            dataset_rows += writes['inserted'] - writes['deleted']
+    finally:
+        if not args.keep:
+            for table in _tables(args.tables):
+                execute_query(f"DROP TABLE IF EXISTS `{table}`", fetch=False)
+
+    result = {
+        'format': RESULT_FORMAT,
+        'started_at': datetime.now().isoformat(timespec='seconds'),
+        'environment': _environment(),
+        'dataset': dataset,
+        'writes': writes,
+        'options': {'workers': args.workers, 'restore_workers': args.restore_workers, 'codec': args.codec,
+                    'repeat': args.repeat},
+        'phases': [_summarize(runs[phase]) for phase in PHASES if runs[phase]],
+    }
+    close_pool()
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, 'r') as f:
+            regressions = compare_results(result, json.load(f), args.tolerance)
+        result['regressions'] = regressions
+
+    output = args.output or os.path.join(args.backup_dir, f"results_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+
+    print_results(result)
+    print(f"\nResultados guardados en {output}")
+    if regressions:
+        for regression in regressions:
+            print(f"Regresión en {regression['phase']}: {regression['seconds']:.2f}s vs "
+                  f"{regression['baseline_seconds']:.2f}s ({regression['change']:+.0%})")
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,28 +1,140 @@
 """
 Módulo de configuración de la base de datos.
 Contiene las credenciales y configuración para conectarse a MySQL.
+Los parámetros de conexión pueden sobrescribirse con las variables de entorno
+MYSQL_HOST, MYSQL_PORT, MYSQL_USER, MYSQL_PASSWORD y MYSQL_DATABASE.
 """
+import os
+
 
 class DatabaseConfig:
     # Configuración de la base de datos
-    HOST = "localhost"  # Nombre del servicio en docker-compose
-    USER = "test_user"
-    PASSWORD = "test_password"
-    DATABASE = "test_db"
-    PORT = 3306
-
-    @staticmethod
-    def get_connection_params():
+    HOST = os.environ.get("MYSQL_HOST", "db")  # Nombre del servicio en docker-compose
+    USER = os.environ.get("MYSQL_USER", "test_user")
+    PASSWORD = os.environ.get("MYSQL_PASSWORD", "test_password")
+    DATABASE = os.environ.get("MYSQL_DATABASE", "test_db")
+    PORT = int(os.environ.get("MYSQL_PORT", "3306"))
+
+    # Configuración del pool de conexiones
+    POOL_SIZE = 8  # Máximo de conexiones simultáneas
+    POOL_TIMEOUT = 30  # Segundos de espera por una conexión libre
+    POOL_HEALTH_CHECK_INTERVAL = 30  # Segundos de inactividad antes de verificar una conexión
+    CONNECT_TIMEOUT = 10
+    RECONNECT_ATTEMPTS = 3
+
+    # Configuración del volcado de datos
+    DUMP_CHUNK_SIZE = 1000  # Filas leídas por consulta durante el backup
+    DUMP_WORKERS = 1  # Conexiones que vuelcan tablas en paralelo
+    DUMP_SHARD_ROWS = 500000  # Filas estimadas a partir de las cuales se divide una tabla en rangos
+    DUMP_EXTENDED_INSERT = True  # Agrupar varias filas por sentencia INSERT
+    DUMP_MAX_STATEMENT_BYTES = None  # Tamaño máximo por sentencia; None usa @@max_allowed_packet
+    DUMP_DISABLE_KEYS = False  # Envolver los datos con ALTER TABLE ... DISABLE/ENABLE KEYS
+    DUMP_CHANGE_DETECTION = "none"  # 'none', 'update_time' o 'checksum' (copiar las tablas sin cambios)
+    DUMP_FORMAT = "sql"  # 'sql' (sentencias INSERT) o 'tsv' (un archivo por tabla para LOAD DATA)
+    SNAPSHOT_LOCK_WAIT_TIMEOUT = 60  # Segundos máximos esperando el bloqueo global del snapshot
+
+    # Limitación adaptativa del volcado (protege la latencia de producción)
+    THROTTLE_ENABLED = False
+    THROTTLE_MAX_ROWS_PER_SECOND = None  # Límite de filas por segundo sin presión; None = sin límite
+    THROTTLE_MAX_BYTES_PER_SECOND = None  # Límite de bytes de SQL por segundo sin presión; None = sin límite
+    THROTTLE_INTERVAL = 2  # Segundos entre lecturas de las señales del servidor
+    THROTTLE_MAX_THREADS_RUNNING = 32  # Threads_running (sin contar el volcado) considerado carga alta
+    THROTTLE_MAX_REPLICATION_LAG = 10  # Segundos de retraso de replicación considerados carga alta
+    THROTTLE_MAX_PROBE_LATENCY = 0.05  # Segundos de la consulta de prueba considerados carga alta
+    THROTTLE_PROBE_QUERY = "SELECT 1"
+    THROTTLE_MIN_FACTOR = 0.1  # Factor mínimo de velocidad, bloques y workers
+    THROTTLE_STEP = 0.1  # Aumento del factor por intervalo sin carga
+    THROTTLE_MIN_CHUNK_ROWS = 100  # Filas mínimas por consulta al reducir los bloques
+
+    # Ubicación de los backups
+    BACKUP_DIR = "backups"
+    CATALOG_PATH = f"{BACKUP_DIR}/catalog.db"  # Catálogo SQLite con un registro por backup
+    SCHEMA_CACHE_PATH = f"{BACKUP_DIR}/schema.json"  # Caché en disco del catálogo de esquema; None = solo en memoria
+    SCHEMA_CACHE_TTL = 30  # Segundos antes de revalidar la huella del esquema (detecta DDL)
+    BACKUP_STORE = "file"  # 'file' (un archivo por backup) o 'chunks' (almacén deduplicado)
+
+    # Verificación de datos por checksums
+    BACKUP_CHECKSUMS = True  # Calcular checksums por tabla y rango de clave al crear un backup completo
+    VERIFY_RANGE_ROWS = 100000  # Filas aproximadas por rango de clave verificado
+    VERIFY_WORKERS = 4  # Conexiones que recalculan checksums en paralelo
+    VERIFY_AFTER_RESTORE = True  # Verificar los checksums al terminar una restauración completa
+
+    # Configuración del almacén de chunks deduplicado
+    CHUNK_STORE_DIR = f"{BACKUP_DIR}/chunks"
+    CHUNK_MIN_BYTES = 4 * 1024
+    CHUNK_AVG_BYTES = 16 * 1024  # Tamaño medio esperado de un chunk
+    CHUNK_MAX_BYTES = 64 * 1024
+    CHUNK_WORKERS = 4  # Hilos que comprimen y escriben chunks nuevos
+
+    # Instrumentación y métricas
+    METRICS_ENABLED = True  # Medir fases y tablas de cada backup y restauración
+    METRICS_DIR = f"{BACKUP_DIR}/metrics"  # events.jsonl y un archivo .prom por operación (textfile collector)
+    METRICS_PROFILE = False  # Perfilar cada ejecución con cProfile (METRICS_DIR/profiles)
+
+    # Configuración de compresión de los archivos de backup
+    BACKUP_CODEC = "gzip"  # 'none', 'gzip', 'zstd' (requiere zstandard) o 'lz4' (requiere lz4)
+    BACKUP_COMPRESSION_LEVEL = None  # None usa el nivel por defecto de cada códec
+    BACKUP_COMPRESSION_THREADS = 0  # Hilos de compresión (solo zstd)
+
+    # Cifrado autenticado de los archivos de backup (src/backup/encryption.py, requiere cryptography)
+    BACKUP_ENCRYPTION = False  # Cifrar los backups después de comprimirlos
+    BACKUP_ENCRYPTION_CIPHER = "aes-256-gcm"  # 'aes-256-gcm' o 'chacha20-poly1305'
+    BACKUP_ENCRYPTION_KEY = os.environ.get("BACKUP_ENCRYPTION_KEY")  # Clave maestra de 32 bytes (hex o base64)
+    BACKUP_ENCRYPTION_KEY_FILE = os.environ.get("BACKUP_ENCRYPTION_KEY_FILE")  # Archivo con la clave, fuera de BACKUP_DIR
+    BACKUP_ENCRYPTION_RECORD_BYTES = 1024 * 1024  # Bytes comprimidos por registro cifrado (unidad de acceso aleatorio)
+    BACKUP_ENCRYPTION_WORKERS = 4  # Hilos que descifran registros por adelantado al leer
+
+    # Configuración de la restauración
+    RESTORE_BUFFER_SIZE = 1024 * 1024  # Bytes leídos del backup en cada lectura
+    RESTORE_CHECKPOINT_EVERY = 1000  # Sentencias entre commits con punto de control
+    RESTORE_PROGRESS_INTERVAL = 5  # Segundos entre reportes de progreso
+    RESTORE_WORKERS = 1  # Conexiones que cargan datos en paralelo (1 = restauración secuencial)
+    RESTORE_QUEUE_DEPTH = 4  # Sentencias pendientes por worker en la restauración paralela
+
+    # Configuración de la lectura de binary logs
+    BINLOG_DIR = "/var/lib/mysql"  # Volumen de datos de MySQL montado en solo lectura
+    BINLOG_READ_BUFFER = 1024 * 1024  # Bytes del buffer de lectura de cada archivo binlog
+    BINLOG_VERIFY_CHECKSUMS = True  # Verificar el CRC32 de cada evento
+    BINLOG_INDEX_DIR = f"{BACKUP_DIR}/binlog_index"  # Índice timestamp/GTID -> posición del binlog
+    BINLOG_INDEX_GTID_INTERVAL = 1000  # Transacciones entre registros del índice de GTID
+
+    # Configuración del backup continuo del binlog
+    STREAM_SEGMENT_BYTES = 64 * 1024 * 1024  # Bytes sin comprimir a partir de los cuales se sella un segmento
+    STREAM_SEGMENT_SECONDS = 60  # Antigüedad máxima de un segmento (acota el RPO)
+    STREAM_POLL_INTERVAL = 0.5  # Segundos entre lecturas al alcanzar el final del binlog
+    STREAM_BATCH_EVENTS = 1000  # Eventos por lote entre el lector y el escritor
+    STREAM_QUEUE_DEPTH = 16  # Lotes pendientes antes de frenar la lectura
+
+    # Simulacros de recuperación (src/backup/drill.py)
+    DRILL_RTO_TARGET = 300  # Segundos máximos desde el desastre hasta los datos restaurados y verificados
+    DRILL_RPO_TARGET = 3600  # Segundos máximos entre el punto de recuperación y el desastre
+    DRILL_DELETE_FRACTION = 0.1  # Fracción de filas borradas en el escenario delete_rows
+    DRILL_CORRUPT_FRACTION = 0.05  # Fracción de filas alteradas en el escenario corrupt_column
+    DRILL_REPORT_DIR = f"{BACKUP_DIR}/drills"  # Un reporte JSON por ejecución de los simulacros
+
+    # Backups de varias instancias y bases de datos (src/backup/orchestrator.py)
+    BACKUP_TARGETS_FILE = os.environ.get("BACKUP_TARGETS_FILE", "targets.json")  # JSON con los destinos
+    BACKUP_TARGETS_DIR = f"{BACKUP_DIR}/targets"  # Un subdirectorio (con su catálogo) por destino
+    ORCHESTRATOR_MAX_CONCURRENT = 4  # Backups simultáneos en total
+    ORCHESTRATOR_MAX_PER_HOST = 1  # Backups simultáneos contra un mismo servidor MySQL
+    ORCHESTRATOR_REPORT_DIR = f"{BACKUP_DIR}/orchestrator"  # Un reporte JSON agregado por ejecución
+
+    # Configuración de la compactación de incrementales
+    COMPACTION_MAX_STATEMENT_BYTES = 4 * 1024 * 1024  # Tamaño máximo de cada sentencia DELETE/REPLACE
+    COMPACTION_REPLAY_ROWS_PER_SECOND = 5000  # Velocidad de aplicación usada para estimar el ahorro
+
+    @classmethod
+    def get_connection_params(cls):
         """
         Retorna los parámetros de conexión como un diccionario.
         
         Returns:
-            dict: Diccionario con los parámetros de conexión (host, user, password, database)
+            dict: Diccionario con los parámetros de conexión (host, port, user, password, database)
         """
         return {
-            'host': 'db',  # Nombre del servicio en docker-compose
-            'port': 3306,
-            'user': 'test_user',
-            'password': 'test_password',
-            'database': 'test_db'
-        } 
\ No newline at end of file
+            'host': cls.HOST,
+            'port': cls.PORT,
+            'user': cls.USER,
+            'password': cls.PASSWORD,
+            'database': cls.DATABASE
+        }
@@ -1,6 +1,17 @@
-import subprocess
-from src.db.config import DatabaseConfig
-from src.db.utils import get_table_list, execute_query
+import mysql.connector
+from src.db.encoder import column_kind
+from src.db.schema import get_schema, invalidate_schema
+from src.db.utils import get_table_list, execute_query, fetch_one
+
+# Filas por sentencia al borrar o modificar filas elegidas por clave
+_BATCH_ROWS = 1000
+
+# Alteración de una columna según su clase (src/db/encoder.py), en orden de preferencia
+_CORRUPTIONS = {
+    'text': "REVERSE(`{column}`)",
+    'number': "`{column}` DIV 2",
+    'temporal': "`{column}` - INTERVAL 1 DAY",
+}
 
 def simulate_disaster(tables=None, operation="TRUNCATE"):
     """
@@ -32,17 +43,18 @@ def simulate_disaster(tables=None, operation="TRUNCATE"):
         for table in tables:
             try:
                 if operation.upper() == "TRUNCATE":
-                    query = f"TRUNCATE TABLE {table};"
+                    query = f"TRUNCATE TABLE `{table}`"
                 elif operation.upper() == "DROP":
-                    query = f"DROP TABLE {table};"
+                    query = f"DROP TABLE `{table}`"
                 else:
                     raise ValueError(f"Operación no soportada: {operation}")
                 
-                execute_query(query, capture_output=False)
+                execute_query(query, fetch=False)
+                invalidate_schema(table)
                 print(f"- Tabla {table}: {operation} ejecutado correctamente")
                 results['affected_tables'].append(table)
                 
-            except subprocess.CalledProcessError as e:
+            except mysql.connector.Error as e:
                 print(f"- Error en tabla {table}: {e}")
                 results['failed_tables'].append({
                     'table': table,
@@ -85,18 +97,12 @@ def verify_disaster_simulation(tables=None):
         
         for table in tables:
             try:
-                # Usar -N para obtener solo el número sin encabezado
-                result = execute_query(
-                    f"SELECT COUNT(*) FROM {table};",
-                    capture_output=True,
-                    additional_args=["-N"]
-                )
+                row = fetch_one(f"SELECT COUNT(*) FROM `{table}`")
                 
-                if result is None:
+                if row is None:
                     raise ValueError("No se pudo obtener el conteo de la tabla")
                     
-                # La consulta siempre devolverá un string, incluso si está vacío
-                count = int(result.strip() or "0")
+                count = int(row[0])
                 
                 if count == 0:
                     results['empty_tables'].append(table)
@@ -106,7 +112,7 @@ def verify_disaster_simulation(tables=None):
                         'count': count
                     })
                     
-            except (subprocess.CalledProcessError, ValueError) as e:
+            except (mysql.connector.Error, ValueError) as e:
                 results['error_tables'].append({
                     'table': table,
                     'error': str(e)
@@ -116,4 +122,109 @@ def verify_disaster_simulation(tables=None):
         
     except Exception as e:
         print(f"Error durante la verificación: {e}")
-        return None 
\ No newline at end of file
+        return None 
+
+def _pick_rows(table, fraction, seed=None, column=None):
+    """
+    Elige al azar (en el servidor) una fracción de las filas de una tabla.
+
+    Args:
+        table (str): Nombre de la tabla
+        fraction (float): Fracción de filas a elegir (0 a 1)
+        seed (int): Semilla de RAND() para repetir la elección
+        column (str): Si se indica, solo filas donde esa columna no es NULL
+
+    Returns:
+        tuple: (columna de la clave primaria, valores de la clave elegidos en orden)
+
+    Raises:
+        ValueError: Si la tabla no tiene una clave primaria de una sola columna
+    """
+    pk_columns = get_schema().primary_key(table)
+    if len(pk_columns) != 1:
+        raise ValueError(f"La tabla {table} no tiene una clave primaria de una sola columna")
+    pk = pk_columns[0]
+    random_expr = "RAND(%s)" if seed is not None else "RAND()"
+    params = (seed, fraction) if seed is not None else (fraction,)
+    not_null = f" AND `{column}` IS NOT NULL" if column else ""
+    rows = execute_query(
+        f"SELECT `{pk}` FROM `{table}` WHERE {random_expr} < %s{not_null} ORDER BY `{pk}`", params
+    )
+    return pk, [row[0] for row in rows]
+
+def _batches(keys):
+    for offset in range(0, len(keys), _BATCH_ROWS):
+        yield keys[offset:offset + _BATCH_ROWS]
+
+def _affected(table, pk, keys, **details):
+    """Resultado común de los escenarios por fila: tabla, filas y rango de clave afectado (fin excluido)."""
+    numeric = all(isinstance(key, int) for key in keys)
+    return {
+        'table': table,
+        'pk': pk,
+        'rows': len(keys),
+        'start': keys[0] if keys and numeric else None,
+        'end': keys[-1] + 1 if keys and numeric else None,
+        **details,
+    }
+
+def delete_random_rows(table, fraction=0.1, seed=None):
+    """
+    Simula el borrado accidental de filas al azar de una tabla.
+
+    Args:
+        table (str): Nombre de la tabla (con clave primaria de una columna)
+        fraction (float): Fracción de filas a borrar
+        seed (int): Semilla para repetir el escenario
+
+    Returns:
+        dict: 'table', 'pk', 'rows' (filas borradas), 'start' y 'end' (rango de clave afectado)
+
+    Raises:
+        ValueError: Si la tabla no tiene una clave primaria de una sola columna
+    """
+    pk, keys = _pick_rows(table, fraction, seed)
+    for batch in _batches(keys):
+        placeholders = ", ".join(["%s"] * len(batch))
+        execute_query(f"DELETE FROM `{table}` WHERE `{pk}` IN ({placeholders})", tuple(batch), fetch=False)
+    print(f"- Tabla {table}: {len(keys)} filas borradas al azar")
+    return _affected(table, pk, keys)
+
+def corrupt_column(table, column=None, fraction=0.05, seed=None):
+    """
+    Simula la corrupción de una columna en filas al azar de una tabla.
+    El texto se invierte, los números se dividen por dos y las fechas retroceden un día.
+
+    Args:
+        table (str): Nombre de la tabla (con clave primaria de una columna)
+        column (str): Columna a alterar (por defecto la primera de texto, numérica o de fecha
+            que no sea parte de la clave ni generada)
+        fraction (float): Fracción de filas a alterar
+        seed (int): Semilla para repetir el escenario
+
+    Returns:
+        dict: 'table', 'pk', 'column', 'rows' (filas alteradas), 'start' y 'end' (rango de clave afectado)
+
+    Raises:
+        ValueError: Si la tabla no tiene una columna que se pueda alterar
+    """
+    columns = [c for c in get_schema().columns(table) if c['pk'] is None and not c['generated']]
+    if column is None:
+        candidates = [(list(_CORRUPTIONS).index(column_kind(c['type'])), position, c['name'])
+                      for position, c in enumerate(columns) if column_kind(c['type']) in _CORRUPTIONS]
+        if not candidates:
+            raise ValueError(f"La tabla {table} no tiene columnas que se puedan alterar")
+        column = min(candidates)[2]
+    kind = next((column_kind(c['type']) for c in columns if c['name'] == column), None)
+    if kind not in _CORRUPTIONS:
+        raise ValueError(f"La columna {table}.{column} no se puede alterar")
+
+    pk, keys = _pick_rows(table, fraction, seed, column)
+    expression = _CORRUPTIONS[kind].format(column=column)
+    for batch in _batches(keys):
+        placeholders = ", ".join(["%s"] * len(batch))
+        execute_query(f"UPDATE `{table}` SET `{column}` = {expression} WHERE `{pk}` IN ({placeholders})",
+                      tuple(batch), fetch=False)
+    print(f"- Tabla {table}: columna {column} alterada en {len(keys)} filas")
+    return _affected(table, pk, keys, column=column)
+
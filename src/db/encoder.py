@@ -0,0 +1,176 @@
+"""
+Módulo de codificación de filas a literales SQL.
+Convierte las filas que devuelve el driver en las tuplas `(v1,v2,...)` de las
+sentencias INSERT del backup:
+- `sql_literal` convierte un valor cualquiera según su tipo de Python
+- `RowEncoder` compila, a partir de los tipos de columna del catálogo de
+  esquema, una función que codifica un bloque de filas completo: cada fila se
+  arma con un único f-string, sin una llamada por valor ni listas intermedias
+
+Los números se escriben tal cual, los temporales entre comillas, los binarios en
+hexadecimal (`0x...`) y el texto escapado. Si el valor de una columna no tiene
+el tipo esperado (p. ej. el esquema cambió durante el volcado), el bloque se
+codifica de nuevo valor por valor con `sql_literal`; en las columnas numéricas,
+donde un valor de otro tipo no provocaría un error, se comprueba la clase de
+cada valor y los que no son int, Decimal o float se codifican con `sql_literal`.
+"""
+import datetime
+import decimal
+import functools
+from typing import Any, List, Sequence
+
+from src.db.schema import get_schema
+
+# Caracteres que deben escaparse dentro de un literal de texto MySQL, en orden de aplicación
+# (una cadena de str.replace es varias veces más rápida que str.translate con un diccionario)
+_ESCAPES = (
+    ('\\', '\\\\'),
+    ("'", "\\'"),
+    ('\0', '\\0'),
+    ('\n', '\\n'),
+    ('\r', '\\r'),
+    ('\x1a', '\\Z'),
+)
+# Los f-strings no admiten barras invertidas en sus expresiones: los pares se pasan como nombres
+_ESCAPE_CHAIN = "".join(f".replace(E{index}, R{index})" for index in range(len(_ESCAPES)))
+
+NUMERIC_TYPES = ('tinyint', 'smallint', 'mediumint', 'int', 'integer', 'bigint', 'decimal', 'numeric',
+                 'float', 'double', 'real', 'year')
+TEMPORAL_TYPES = ('date', 'datetime', 'timestamp')
+TEXT_TYPES = ('char', 'varchar', 'tinytext', 'text', 'mediumtext', 'longtext', 'enum', 'json')
+BINARY_TYPES = ('binary', 'varbinary', 'tinyblob', 'blob', 'mediumblob', 'longblob', 'geometry', 'point',
+                'linestring', 'polygon', 'multipoint', 'multilinestring', 'multipolygon',
+                'geometrycollection', 'geomcollection')
+# Clases que se escriben tal cual en una columna numérica; cualquier otra (p. ej. un texto con
+# el esquema desactualizado) pasa por sql_literal, nunca se inserta sin comillas en el SQL
+_NUMBER_CLASSES = frozenset((int, decimal.Decimal, float))
+_ZERO = datetime.timedelta(0)
+_ONE_DAY = datetime.timedelta(days=1)
+
+# Expresión de cada tipo de columna dentro del f-string de una fila ({v} es la variable del valor)
+_EXPRESSIONS = {
+    'number': "'NULL' if {v} is None else ({v} if {v}.__class__ in NUMBERS else sql_literal({v}))",
+    'temporal': "'NULL' if {v} is None else Q + str({v}) + Q",
+    'time': "'NULL' if {v} is None else Q + time_literal({v}) + Q",
+    'text': "'NULL' if {v} is None else Q + {v}" + _ESCAPE_CHAIN + " + Q",
+    'json': "'NULL' if {v} is None else Q + as_text({v})" + _ESCAPE_CHAIN + " + Q",
+    'binary': "'NULL' if {v} is None else ('0x' + {v}.hex() if {v} else Q + Q)",
+    'other': "sql_literal({v})",
+}
+
+
+def time_literal(value: datetime.timedelta) -> str:
+    """Formatea un TIME de MySQL ([-]HHH:MM:SS[.ffffff]); str() no sirve para valores negativos ni de más de 24 h."""
+    if _ZERO <= value < _ONE_DAY:
+        return str(value)
+    sign = "-" if value < _ZERO else ""
+    value = abs(value)
+    seconds = value.days * 86400 + value.seconds
+    text = f"{sign}{seconds // 3600:02d}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+    return f"{text}.{value.microseconds:06d}" if value.microseconds else text
+
+
+def escape_text(value: str) -> str:
+    """Escapa un texto para usarlo dentro de un literal MySQL entre comillas simples."""
+    for old, new in _ESCAPES:
+        value = value.replace(old, new)
+    return value
+
+
+def as_text(value) -> str:
+    """Texto que el driver puede entregar sin decodificar (p. ej. JSON)."""
+    return value.decode('utf-8') if isinstance(value, (bytes, bytearray)) else str(value)
+
+
+def sql_literal(value: Any) -> str:
+    """
+    Convierte un valor de Python devuelto por el driver en un literal SQL.
+
+    Args:
+        value: Valor de una columna
+
+    Returns:
+        str: Literal SQL equivalente
+    """
+    if value is None:
+        return "NULL"
+    if isinstance(value, bool):
+        return "1" if value else "0"
+    if isinstance(value, (int, decimal.Decimal)):
+        return str(value)
+    if isinstance(value, float):
+        return repr(value)
+    if isinstance(value, (bytes, bytearray)):
+        return f"0x{value.hex()}" if value else "''"
+    if isinstance(value, datetime.timedelta):
+        return f"'{time_literal(value)}'"
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return f"'{value}'"
+    if isinstance(value, set):
+        value = ','.join(sorted(value))
+    return f"'{escape_text(str(value))}'"
+
+
+def column_kind(data_type: str) -> str:
+    """Clase de codificación de un DATA_TYPE de MySQL."""
+    if data_type in NUMERIC_TYPES:
+        return 'number'
+    if data_type in TEMPORAL_TYPES:
+        return 'temporal'
+    if data_type == 'time':
+        return 'time'
+    if data_type == 'json':
+        return 'json'
+    if data_type in TEXT_TYPES:
+        return 'text'
+    if data_type in BINARY_TYPES:
+        return 'binary'
+    # set (el driver entrega un set), bit (int) y tipos desconocidos
+    return 'other'
+
+
+@functools.lru_cache(maxsize=256)
+def _compile(kinds: tuple):
+    """Compila la función que codifica un bloque de filas con las clases de columna dadas."""
+    names = [f"v{index}" for index in range(len(kinds))]
+    fields = ",".join("{" + _EXPRESSIONS[kind].format(v=name) + "}" for kind, name in zip(kinds, names))
+    targets = "".join(f"{name}," for name in names)
+    source = f'def encode(rows):\n    return [f"({fields})" for {targets} in rows]\n'
+    namespace = {'Q': "'", 'NUMBERS': _NUMBER_CLASSES, 'time_literal': time_literal, 'as_text': as_text, 'sql_literal': sql_literal}
+    for index, (old, new) in enumerate(_ESCAPES):
+        namespace[f"E{index}"] = old
+        namespace[f"R{index}"] = new
+    exec(compile(source, f"<row encoder {','.join(kinds)}>", 'exec'), namespace)
+    return namespace['encode']
+
+
+class RowEncoder:
+    """
+    Codificador de filas de una tabla, compilado según sus tipos de columna.
+
+    Args:
+        columns (list): Columnas en el orden de SELECT * ({'type': DATA_TYPE en minúsculas, ...})
+    """
+
+    def __init__(self, columns: Sequence[dict]):
+        self.kinds = tuple(column_kind(column['type']) for column in columns)
+        self._encode = _compile(self.kinds) if self.kinds else None
+
+    def encode(self, rows: Sequence[tuple]) -> List[str]:
+        """
+        Codifica un bloque de filas.
+
+        Returns:
+            list: Una tupla SQL `(v1,v2,...)` por fila
+        """
+        if self._encode is not None:
+            try:
+                return self._encode(rows)
+            except (AttributeError, TypeError, ValueError):
+                pass
+        return [f"({','.join(sql_literal(value) for value in row)})" for row in rows]
+
+
+def row_encoder(table: str) -> RowEncoder:
+    """Codificador de una tabla según el catálogo de esquema."""
+    return RowEncoder(get_schema().columns(table))
@@ -0,0 +1,361 @@
+"""
+Módulo de instrumentación de backups y restauraciones.
+Cada ejecución (`run`) acumula por fase y por tabla la duración, las filas,
+los bytes y los reintentos. Al terminar se agrega una línea JSON por fase y
+un resumen a `METRICS_DIR/events.jsonl`, y se reescribe el archivo
+`METRICS_DIR/<operación>.prom` para el textfile collector de node_exporter.
+Opcionalmente la ejecución se perfila con cProfile.
+
+Las fases se abren con `phase()` (una por paso o por tabla); las mediciones
+de grano fino, como cada bloque leído o codificado, se suman con `observe()`
+sin generar eventos. Fuera de una ejecución ambas funciones no hacen nada.
+"""
+import cProfile
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from functools import wraps
+from typing import Callable, Dict, Optional, Tuple
+
+from src.db.config import DatabaseConfig
+
+_FIELDS = ('seconds', 'calls', 'rows', 'bytes', 'retries')
+_HELP = {
+    'seconds': "Segundos acumulados",
+    'calls': "Veces que se ejecutó",
+    'rows': "Filas procesadas",
+    'bytes': "Bytes procesados",
+    'retries': "Reintentos (reconexiones)",
+}
+
+_current = None
+_current_lock = threading.Lock()
+_local = threading.local()
+
+
+def _new_stats() -> dict:
+    return dict.fromkeys(_FIELDS, 0)
+
+
+class Run:
+    """
+    Métricas de una ejecución de backup o restauración.
+
+    Las fases de distintos hilos se suman en los mismos contadores, por lo que
+    la duración de una fase ejecutada por varios workers puede superar la
+    duración total de la ejecución.
+
+    Args:
+        operation (str): Operación ('full_backup', 'incremental_backup', ...)
+        labels (dict): Etiquetas adicionales del resumen (códec, workers, ...)
+    """
+
+    def __init__(self, operation: str, labels: Optional[dict] = None):
+        self.operation = operation
+        self.labels = labels or {}
+        self.started_at = datetime.now().isoformat(timespec='seconds')
+        self.phases: Dict[str, dict] = {}
+        self.tables: Dict[str, Dict[str, dict]] = {}
+        self.events = []
+        self.elapsed = 0.0
+        self.success = None  # None hasta terminar; False si el llamador informó un error
+        self._started = time.perf_counter()
+        self._lock = threading.Lock()
+
+    def add(self, phase: str, table: Optional[str] = None, **values):
+        """Suma valores (seconds, calls, rows, bytes, retries) a una fase y, si se indica, a una tabla."""
+        with self._lock:
+            targets = [self.phases.setdefault(phase, _new_stats())]
+            if table is not None:
+                targets.append(self.tables.setdefault(table, {}).setdefault(phase, _new_stats()))
+            for stats in targets:
+                for key, value in values.items():
+                    stats[key] += value
+
+    def event(self, **fields):
+        with self._lock:
+            self.events.append({'operation': self.operation, **fields})
+
+    def summary(self) -> dict:
+        """Resumen serializable de la ejecución."""
+        with self._lock:
+            return {
+                'event': 'run',
+                'operation': self.operation,
+                'started_at': self.started_at,
+                'elapsed': round(self.elapsed, 6),
+                'success': bool(self.success),
+                'labels': self.labels,
+                'phases': {name: dict(stats) for name, stats in self.phases.items()},
+                'tables': {table: {name: dict(stats) for name, stats in phases.items()}
+                           for table, phases in self.tables.items()},
+            }
+
+
+class Phase:
+    """Fase abierta con `phase()`; acumula filas, bytes y reintentos hasta cerrarse."""
+
+    def __init__(self, name: str, table: Optional[str]):
+        self.name = name
+        self.table = table
+        self.rows = 0
+        self.bytes = 0
+        self.retries = 0
+
+    def add(self, rows: int = 0, bytes: int = 0, retries: int = 0):
+        self.rows += rows
+        self.bytes += bytes
+        self.retries += retries
+
+
+def current() -> Optional[Run]:
+    """Retorna la ejecución activa, o None."""
+    return _current
+
+
+def _stack() -> list:
+    stack = getattr(_local, 'stack', None)
+    if stack is None:
+        stack = _local.stack = []
+    return stack
+
+
+@contextmanager
+def phase(name: str, table: Optional[str] = None):
+    """
+    Mide una fase de la ejecución activa y registra su evento al cerrarse.
+
+    Args:
+        name (str): Nombre de la fase ('schema', 'dump', 'write', ...)
+        table (str): Tabla a la que corresponde la fase, si aplica
+
+    Yields:
+        Phase: Fase a la que sumar filas, bytes y reintentos (también sin ejecución activa)
+    """
+    item = Phase(name, table)
+    run = _current
+    if run is None:
+        yield item
+        return
+
+    stack = _stack()
+    stack.append(item)
+    started = time.perf_counter()
+    error = None
+    try:
+        yield item
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        stack.pop()
+        seconds = time.perf_counter() - started
+        run.add(name, table, seconds=seconds, calls=1, rows=item.rows, bytes=item.bytes, retries=item.retries)
+        run.event(event='phase', phase=name, table=table, seconds=round(seconds, 6), rows=item.rows,
+                  bytes=item.bytes, retries=item.retries, error=error)
+
+
+def observe(name: str, seconds: float = 0.0, table: Optional[str] = None,
+            rows: int = 0, bytes: int = 0, calls: int = 1):
+    """
+    Suma una medición de grano fino a la ejecución activa, sin registrar un evento.
+
+    Args:
+        name (str): Nombre de la fase ('fetch', 'encode', ...)
+        seconds (float): Duración medida
+        table (str): Tabla medida, si aplica
+        rows (int): Filas procesadas
+        bytes (int): Bytes procesados
+        calls (int): Mediciones incluidas
+    """
+    run = _current
+    if run is not None:
+        run.add(name, table, seconds=seconds, calls=calls, rows=rows, bytes=bytes)
+
+
+def retry(count: int = 1):
+    """Registra reintentos en la fase abierta del hilo actual (o en 'other' si no hay)."""
+    run = _current
+    if run is None:
+        return
+    stack = _stack()
+    if stack:
+        stack[-1].add(retries=count)
+    else:
+        run.add('other', retries=count)
+
+
+def _write_atomic(path: str, content: str):
+    tmp = f"{path}.tmp"
+    with open(tmp, 'w') as f:
+        f.write(content)
+    os.replace(tmp, path)
+
+
+def _label_value(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(**labels) -> str:
+    return "{" + ",".join(f'{key}="{_label_value(value)}"' for key, value in labels.items()) + "}"
+
+
+def prometheus_text(summary: dict) -> str:
+    """
+    Formatea el resumen de una ejecución en el formato de texto de Prometheus.
+
+    Args:
+        summary (dict): Resumen creado por Run.summary
+
+    Returns:
+        str: Contenido del archivo .prom
+    """
+    operation = summary['operation']
+    lines = []
+
+    def metric(name: str, help_text: str, samples):
+        lines.append(f"# HELP mysql_backup_{name} {help_text}")
+        lines.append(f"# TYPE mysql_backup_{name} gauge")
+        for labels, value in samples:
+            lines.append(f"mysql_backup_{name}{_labels(**labels)} {value}")
+
+    base = {'operation': operation}
+    metric("run_duration_seconds", "Duración de la última ejecución", [(base, summary['elapsed'])])
+    metric("run_success", "1 si la última ejecución terminó correctamente", [(base, int(summary['success']))])
+    metric("run_timestamp_seconds", "Hora de fin de la última ejecución", [(base, int(time.time()))])
+
+    phases = sorted(summary['phases'].items())
+    tables = [(table, name, stats) for table, names in sorted(summary['tables'].items())
+              for name, stats in sorted(names.items())]
+    for field in _FIELDS:
+        metric(f"phase_{field}", f"{_HELP[field]} por fase en la última ejecución",
+               [({**base, 'phase': name}, round(stats[field], 6)) for name, stats in phases])
+    for field in ('seconds', 'rows', 'bytes', 'retries'):
+        metric(f"table_{field}", f"{_HELP[field]} por tabla y fase en la última ejecución",
+               [({**base, 'table': table, 'phase': name}, round(stats[field], 6))
+                for table, name, stats in tables])
+    return "\n".join(lines) + "\n"
+
+
+def export(run: Run, metrics_dir: Optional[str] = None) -> Tuple[str, str]:
+    """
+    Escribe los eventos JSON y el archivo de Prometheus de una ejecución.
+
+    Args:
+        run (Run): Ejecución terminada
+        metrics_dir (str): Directorio de métricas (por defecto DatabaseConfig.METRICS_DIR)
+
+    Returns:
+        tuple: (ruta del log JSON, ruta del archivo .prom)
+    """
+    metrics_dir = metrics_dir or DatabaseConfig.METRICS_DIR
+    os.makedirs(metrics_dir, exist_ok=True)
+    summary = run.summary()
+    log_path = os.path.join(metrics_dir, "events.jsonl")
+    with open(log_path, 'a') as f:
+        for event in run.events:
+            f.write(json.dumps(event, default=str) + "\n")
+        f.write(json.dumps(summary, default=str) + "\n")
+    prom_path = os.path.join(metrics_dir, f"{run.operation}.prom")
+    _write_atomic(prom_path, prometheus_text(summary))
+    return log_path, prom_path
+
+
+def print_summary(run: Run, limit: int = 10):
+    """Imprime las fases y las tablas más lentas de una ejecución."""
+    summary = run.summary()
+    print(f"Métricas de {run.operation}: {summary['elapsed']:.2f}s")
+    for name, stats in sorted(summary['phases'].items(), key=lambda item: -item[1]['seconds']):
+        print(f"  {name:<16} {stats['seconds']:>9.2f}s {stats['calls']:>8} llamadas "
+              f"{stats['rows']:>11} filas {stats['bytes']:>14} bytes {stats['retries']:>4} reintentos")
+    # Las fases de una tabla se superponen (el volcado incluye lectura, codificación y escritura)
+    tables = sorted(summary['tables'].items(),
+                    key=lambda item: -max(stats['seconds'] for stats in item[1].values()))
+    for table, phases in tables[:limit]:
+        detail = ", ".join(f"{name} {stats['seconds']:.2f}s"
+                           for name, stats in sorted(phases.items(), key=lambda item: -item[1]['seconds']))
+        print(f"  tabla `{table}`: {detail}")
+
+
+@contextmanager
+def run(operation: str, profile: Optional[bool] = None, **labels):
+    """
+    Instrumenta una ejecución de backup o restauración.
+
+    Dentro de otra ejecución (p. ej. la restauración del backup completo que
+    hace la restauración incremental) se mide como una fase más de la externa.
+
+    Args:
+        operation (str): Nombre de la operación
+        profile (bool): Perfilar la ejecución con cProfile (por defecto DatabaseConfig.METRICS_PROFILE);
+            el perfil se guarda en METRICS_DIR/profiles/<operación>_<fecha>.prof
+        labels: Etiquetas adicionales del resumen
+
+    Yields:
+        Run: Ejecución creada (None si está anidada en otra o si DatabaseConfig.METRICS_ENABLED es False)
+    """
+    global _current
+    if not DatabaseConfig.METRICS_ENABLED:
+        yield None
+        return
+    with _current_lock:
+        outer = _current
+        if outer is None:
+            _current = Run(operation, labels)
+    if outer is not None:
+        with phase(operation):
+            yield None
+        return
+
+    active = _current
+    profiler = None
+    if DatabaseConfig.METRICS_PROFILE if profile is None else profile:
+        profiler = cProfile.Profile()
+        profiler.enable()
+    try:
+        yield active
+        if active.success is None:
+            active.success = True
+    finally:
+        if profiler is not None:
+            profiler.disable()
+        active.elapsed = time.perf_counter() - active._started
+        with _current_lock:
+            _current = None
+        try:
+            log_path, prom_path = export(active)
+            print_summary(active)
+            print(f"Métricas exportadas a {log_path} y {prom_path}")
+            if profiler is not None:
+                profile_dir = os.path.join(DatabaseConfig.METRICS_DIR, "profiles")
+                os.makedirs(profile_dir, exist_ok=True)
+                profile_path = os.path.join(
+                    profile_dir, f"{operation}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.prof")
+                profiler.dump_stats(profile_path)
+                print(f"Perfil cProfile guardado en {profile_path}")
+        except OSError as e:
+            print(f"Advertencia: no se pudieron exportar las métricas: {e}")
+
+
+def instrumented(operation: str, success: Optional[Callable] = None):
+    """
+    Decorador que ejecuta la función dentro de `run(operation)`.
+
+    Args:
+        operation (str): Nombre de la operación
+        success (callable): Recibe el valor retornado y decide si la ejecución fue correcta
+            (las funciones de backup informan los errores en su valor de retorno)
+    """
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            with run(operation) as active:
+                result = function(*args, **kwargs)
+                if active is not None and success is not None:
+                    active.success = bool(success(result))
+                return result
+        return wrapper
+    return decorator
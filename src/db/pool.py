@@ -0,0 +1,187 @@
+"""
+Módulo de pool de conexiones a MySQL.
+Mantiene un conjunto acotado de conexiones persistentes que se reutilizan entre
+consultas y entre hilos, evitando lanzar un proceso `mysql` por cada sentencia.
+"""
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional
+
+import mysql.connector
+from mysql.connector import errors
+
+from src.db import metrics
+from src.db.config import DatabaseConfig
+
+
+class ConnectionPool:
+    """
+    Pool de conexiones acotado y seguro para uso concurrente.
+
+    Las conexiones se crean bajo demanda hasta `size`. Si todas están en uso,
+    `acquire` espera hasta `timeout` segundos antes de fallar. Las conexiones
+    que estuvieron ociosas más de `health_check_interval` segundos se verifican
+    con un ping (reconectando si es necesario) antes de entregarse.
+    """
+
+    def __init__(self, size: Optional[int] = None, timeout: Optional[float] = None,
+                 health_check_interval: Optional[float] = None, params: Optional[dict] = None):
+        self.size = size or DatabaseConfig.POOL_SIZE
+        self.timeout = timeout if timeout is not None else DatabaseConfig.POOL_TIMEOUT
+        self.health_check_interval = (
+            health_check_interval if health_check_interval is not None
+            else DatabaseConfig.POOL_HEALTH_CHECK_INTERVAL
+        )
+        self._params = params or DatabaseConfig.get_connection_params()
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(self.size)
+        self._closed = False
+
+    def new_connection(self, **options):
+        """
+        Abre una conexión nueva fuera del pool.
+        Útil para sesiones dedicadas (snapshots, restauraciones) que no deben
+        devolverse al pool con estado de sesión modificado.
+
+        Args:
+            options: Opciones adicionales de mysql.connector.connect (p. ej. allow_local_infile)
+
+        Returns:
+            MySQLConnection: Conexión abierta en modo autocommit
+        """
+        return mysql.connector.connect(
+            **self._params,
+            autocommit=True,
+            connection_timeout=DatabaseConfig.CONNECT_TIMEOUT,
+            **options,
+        )
+
+    def acquire(self, timeout: Optional[float] = None):
+        """
+        Obtiene una conexión del pool.
+
+        Args:
+            timeout (float): Segundos máximos de espera por una conexión libre
+
+        Returns:
+            MySQLConnection: Conexión lista para usar
+
+        Raises:
+            mysql.connector.errors.PoolError: Si el pool está cerrado o no hay conexiones libres a tiempo
+        """
+        if self._closed:
+            raise errors.PoolError("El pool de conexiones está cerrado")
+
+        wait = self.timeout if timeout is None else timeout
+        if not self._slots.acquire(timeout=wait):
+            raise errors.PoolError(f"No hay conexiones libres en el pool tras {wait}s")
+
+        try:
+            return self._checkout()
+        except Exception:
+            self._slots.release()
+            raise
+
+    def _checkout(self):
+        """Entrega una conexión ociosa sana o crea una nueva."""
+        while True:
+            try:
+                conn, last_used = self._idle.get_nowait()
+            except queue.Empty:
+                return self.new_connection()
+
+            if time.monotonic() - last_used < self.health_check_interval:
+                return conn
+
+            try:
+                conn.ping(reconnect=True, attempts=DatabaseConfig.RECONNECT_ATTEMPTS, delay=1)
+                return conn
+            except errors.Error:
+                metrics.retry()
+                self._close_quietly(conn)
+
+    def release(self, conn, discard: bool = False):
+        """
+        Devuelve una conexión al pool.
+
+        Args:
+            conn (MySQLConnection): Conexión obtenida con `acquire`
+            discard (bool): Si es True, la conexión se cierra en lugar de reutilizarse
+        """
+        try:
+            if conn.unread_result:
+                # Un cursor abandonado a mitad de lectura deja la sesión inutilizable
+                discard = True
+            if not discard and not self._closed and conn.is_connected():
+                if conn.in_transaction:
+                    conn.rollback()
+                self._idle.put((conn, time.monotonic()))
+            else:
+                self._close_quietly(conn)
+        except errors.Error:
+            self._close_quietly(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self, timeout: Optional[float] = None):
+        """
+        Context manager que obtiene una conexión y la devuelve al terminar.
+        Si ocurre un error de conexión o de interfaz, la conexión se descarta.
+        """
+        conn = self.acquire(timeout)
+        discard = False
+        try:
+            yield conn
+        except (errors.InterfaceError, errors.OperationalError):
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    def close(self):
+        """Cierra todas las conexiones ociosas y rechaza nuevas solicitudes."""
+        self._closed = True
+        while True:
+            try:
+                conn, _ = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._close_quietly(conn)
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ConnectionPool:
+    """
+    Retorna el pool de conexiones compartido, creándolo en el primer uso.
+
+    Returns:
+        ConnectionPool: Pool configurado con `DatabaseConfig`
+    """
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ConnectionPool()
+    return _pool
+
+
+def close_pool():
+    """Cierra el pool compartido si existe."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.close()
+            _pool = None
@@ -0,0 +1,353 @@
+"""
+Módulo de catálogo del esquema.
+Mantiene en memoria (y opcionalmente en disco, junto a los backups) las tablas,
+columnas, tipos, claves primarias y sentencias CREATE TABLE de la base de datos:
+- Las tablas y una huella de su definición se leen con una sola consulta a
+  information_schema; las columnas y claves primarias de todas las tablas, con otra
+- Las sentencias CREATE TABLE se leen al pedirlas por primera vez (no están en
+  information_schema) y se guardan con el resto
+- Las vistas se listan aparte: no son tablas que volcar, y sus definiciones
+  (CREATE VIEW) se leen sin caché al pedirlas, porque CREATE OR REPLACE VIEW no
+  cambia ninguna huella
+- Antes de responder, si pasaron más de SCHEMA_CACHE_TTL segundos desde la última
+  validación, se vuelve a leer la huella: las tablas creadas, eliminadas o
+  modificadas por un DDL se recargan y el resto sigue en caché
+
+La huella de cada tabla combina sus opciones (motor, collation, comentario,
+formato de fila), CREATE_TIME y sumas CRC32 de sus columnas, índices y llaves
+foráneas. AUTO_INCREMENT se guarda aparte: al cambiar solo invalida la sentencia
+CREATE TABLE, que lo incluye.
+"""
+import contextlib
+import json
+import os
+import threading
+import time
+from typing import List, Optional, Tuple
+
+from mysql.connector import errors
+
+from src.db import metrics
+from src.db.config import DatabaseConfig
+from src.db.pool import get_pool
+
+# Una fila por tabla: opciones, CREATE_TIME, AUTO_INCREMENT y sumas de columnas, índices y llaves foráneas
+_FINGERPRINT_QUERY = (
+    "SELECT t.TABLE_NAME, t.ENGINE, t.TABLE_COLLATION, t.ROW_FORMAT, t.CREATE_OPTIONS, t.TABLE_COMMENT, "
+    "t.CREATE_TIME, "
+    "(SELECT CONCAT(COUNT(*), ':', SUM(CRC32(CONCAT_WS('#', c.ORDINAL_POSITION, c.COLUMN_NAME, c.COLUMN_TYPE, "
+    "c.IS_NULLABLE, c.COLUMN_DEFAULT, c.EXTRA, c.COLLATION_NAME, c.GENERATION_EXPRESSION)))) "
+    "FROM information_schema.COLUMNS c WHERE c.TABLE_SCHEMA = t.TABLE_SCHEMA AND c.TABLE_NAME = t.TABLE_NAME), "
+    "(SELECT CONCAT(COUNT(*), ':', SUM(CRC32(CONCAT_WS('#', s.INDEX_NAME, s.SEQ_IN_INDEX, s.COLUMN_NAME, "
+    "s.SUB_PART, s.NON_UNIQUE, s.INDEX_TYPE)))) "
+    "FROM information_schema.STATISTICS s WHERE s.TABLE_SCHEMA = t.TABLE_SCHEMA AND s.TABLE_NAME = t.TABLE_NAME), "
+    "(SELECT CONCAT(COUNT(*), ':', SUM(CRC32(CONCAT_WS('#', r.CONSTRAINT_NAME, r.REFERENCED_TABLE_NAME, "
+    "r.UPDATE_RULE, r.DELETE_RULE)))) "
+    "FROM information_schema.REFERENTIAL_CONSTRAINTS r "
+    "WHERE r.CONSTRAINT_SCHEMA = t.TABLE_SCHEMA AND r.TABLE_NAME = t.TABLE_NAME), "
+    "t.AUTO_INCREMENT "
+    "FROM information_schema.TABLES t "
+    "WHERE t.TABLE_SCHEMA = DATABASE() AND t.TABLE_TYPE = 'BASE TABLE' "
+    "ORDER BY t.TABLE_NAME"
+)
+
+# Columnas de todas las tablas, con su posición en la clave primaria
+_COLUMNS_QUERY = (
+    "SELECT c.TABLE_NAME, c.COLUMN_NAME, c.DATA_TYPE, c.COLUMN_TYPE, c.IS_NULLABLE, c.EXTRA, s.SEQ_IN_INDEX "
+    "FROM information_schema.COLUMNS c "
+    "LEFT JOIN information_schema.STATISTICS s ON s.TABLE_SCHEMA = c.TABLE_SCHEMA "
+    "AND s.TABLE_NAME = c.TABLE_NAME AND s.COLUMN_NAME = c.COLUMN_NAME AND s.INDEX_NAME = 'PRIMARY' "
+    "WHERE c.TABLE_SCHEMA = DATABASE() "
+    "ORDER BY c.TABLE_NAME, c.ORDINAL_POSITION"
+)
+
+# Vistas de la base de datos (el volcado las escribe después de todas las tablas)
+_VIEWS_QUERY = (
+    "SELECT TABLE_NAME FROM information_schema.VIEWS WHERE TABLE_SCHEMA = DATABASE() ORDER BY TABLE_NAME"
+)
+
+CACHE_VERSION = 1
+
+
+def _text(value) -> Optional[str]:
+    """Algunas columnas de information_schema llegan como bytes según la versión del servidor."""
+    if isinstance(value, (bytes, bytearray)):
+        return value.decode('utf-8')
+    return value
+
+
+class SchemaCatalog:
+    """
+    Caché del esquema de la base de datos configurada.
+
+    Args:
+        cache_path (str): Archivo JSON donde persistir el catálogo entre procesos (None = solo en memoria)
+        ttl (float): Segundos durante los que no se revalida la huella del esquema
+    """
+
+    def __init__(self, cache_path: Optional[str] = None, ttl: Optional[float] = None):
+        self.cache_path = cache_path
+        self.ttl = ttl if ttl is not None else DatabaseConfig.SCHEMA_CACHE_TTL
+        self._tables = {}
+        self._views = []
+        self._validated_at = None
+        self._lock = threading.RLock()
+        self._load_cache()
+
+    # --- Consultas ---
+
+    def tables(self) -> List[str]:
+        """Tablas de la base de datos (sin vistas), ordenadas por nombre."""
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._tables)
+
+    def views(self) -> List[str]:
+        """Vistas de la base de datos, ordenadas por nombre."""
+        with self._lock:
+            self._ensure_fresh()
+            return list(self._views)
+
+    def view_statements(self, conn=None) -> List[Tuple[str, str]]:
+        """
+        Sentencias CREATE VIEW de todas las vistas, leídas del servidor en cada llamada.
+
+        Las vistas que usan otras vistas quedan después de ellas, para que las
+        sentencias puedan ejecutarse en orden.
+
+        Args:
+            conn (MySQLConnection): Conexión a usar (p. ej. la del snapshot); por defecto una del pool
+
+        Returns:
+            list: (vista, sentencia CREATE VIEW) por vista
+        """
+        views = self.views()
+        if not views:
+            return []
+        started = time.perf_counter()
+        statements = {}
+        with contextlib.ExitStack() as stack:
+            if conn is None:
+                conn = stack.enter_context(get_pool().connection())
+            cursor = conn.cursor()
+            try:
+                for view in views:
+                    cursor.execute(f"SHOW CREATE VIEW `{view}`")
+                    statements[view] = _text(cursor.fetchone()[1])
+            finally:
+                cursor.close()
+        metrics.observe('schema', time.perf_counter() - started)
+
+        # SHOW CREATE VIEW escribe cada referencia como `base`.`objeto`
+        ordered, pending = [], dict(statements)
+        while pending:
+            ready = [view for view, statement in pending.items()
+                     if not any(f"`{other}`" in statement for other in pending if other != view)]
+            # Un ciclo no puede existir en el servidor; si la búsqueda por texto lo sugiere, se sigue en orden
+            for view in ready or [next(iter(pending))]:
+                ordered.append((view, pending.pop(view)))
+        return ordered
+
+    def columns(self, table: str) -> List[dict]:
+        """
+        Columnas de una tabla en el orden de SELECT *.
+
+        Returns:
+            list: {'name', 'type', 'column_type', 'nullable', 'generated', 'pk'} por columna;
+                  'type' es DATA_TYPE en minúsculas y 'pk' la posición en la clave primaria (o None)
+
+        Raises:
+            KeyError: Si la tabla no existe
+        """
+        with self._lock:
+            return [dict(column) for column in self._entry(table)['columns']]
+
+    def primary_key(self, table: str) -> List[str]:
+        """Columnas de la clave primaria de una tabla, en orden (vacía si no tiene)."""
+        columns = [column for column in self.columns(table) if column['pk'] is not None]
+        return [column['name'] for column in sorted(columns, key=lambda column: column['pk'])]
+
+    def column_types(self, table: str) -> dict:
+        """DATA_TYPE en minúsculas de cada columna de una tabla."""
+        return {column['name']: column['type'] for column in self.columns(table)}
+
+    def create_statement(self, table: str) -> str:
+        """
+        Sentencia CREATE TABLE de una tabla, leída del servidor la primera vez.
+
+        Raises:
+            KeyError: Si la tabla no existe
+        """
+        with self._lock:
+            entry = self._entry(table)
+            if entry['create'] is not None:
+                return entry['create']
+        # La consulta corre sin el bloqueo, para que los workers del volcado no se esperen entre sí
+        started = time.perf_counter()
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            try:
+                cursor.execute(f"SHOW CREATE TABLE `{table}`")
+                create = cursor.fetchone()[1]
+            finally:
+                cursor.close()
+        metrics.observe('schema', time.perf_counter() - started, table)
+        with self._lock:
+            # Si un refresh reemplazó la entrada mientras tanto, la sentencia leída no se guarda
+            if self._tables.get(table) is entry:
+                entry['create'] = create
+                self._save_cache()
+        return create
+
+    # --- Validación e invalidación ---
+
+    def refresh(self) -> List[str]:
+        """
+        Revalida la huella del esquema y recarga lo que cambió.
+
+        Returns:
+            list: Tablas creadas, eliminadas o modificadas desde la última validación
+        """
+        with self._lock:
+            started = time.perf_counter()
+            with get_pool().connection() as conn:
+                cursor = conn.cursor()
+                try:
+                    # MySQL 8 cachea CREATE_TIME y AUTO_INCREMENT de information_schema (24 h por defecto)
+                    try:
+                        cursor.execute("SET SESSION information_schema_stats_expiry = 0")
+                    except errors.Error:
+                        pass
+                    cursor.execute(_FINGERPRINT_QUERY)
+                    rows = cursor.fetchall()
+                    current = {}
+                    for row in rows:
+                        current[_text(row[0])] = {
+                            'definition': "|".join("" if value is None else str(_text(value)) for value in row[1:10]),
+                            'auto_increment': row[10],
+                        }
+                    changed = sorted(
+                        {table for table in self._tables if table not in current}
+                        | {table for table, info in current.items()
+                           if self._tables.get(table, {}).get('definition') != info['definition']}
+                    )
+                    columns = None
+                    if any(table in current for table in changed):
+                        cursor.execute(_COLUMNS_QUERY)
+                        columns = cursor.fetchall()
+                    cursor.execute(_VIEWS_QUERY)
+                    views = [_text(row[0]) for row in cursor.fetchall()]
+                finally:
+                    cursor.close()
+
+            tables = {}
+            for table, info in current.items():
+                entry = self._tables.get(table)
+                if table in changed:
+                    entry = {'columns': [], 'create': None}
+                elif entry.get('auto_increment') != info['auto_increment']:
+                    entry['create'] = None
+                entry.update(info)
+                tables[table] = entry
+            for table, name, data_type, column_type, nullable, extra, pk in columns or []:
+                table = _text(table)
+                if table in changed and table in tables:
+                    extra = _text(extra) or ''
+                    tables[table]['columns'].append({
+                        'name': _text(name),
+                        'type': _text(data_type).lower(),
+                        'column_type': _text(column_type),
+                        'nullable': nullable == 'YES',
+                        'generated': 'GENERATED' in extra.upper(),
+                        'pk': int(pk) if pk is not None else None,
+                    })
+            self._tables = tables
+            self._views = views
+            self._validated_at = time.monotonic()
+            metrics.observe('schema', time.perf_counter() - started)
+            if changed:
+                self._save_cache()
+            return changed
+
+    def invalidate(self, table: Optional[str] = None):
+        """
+        Descarta una tabla (o todo el catálogo) para que se recargue en el próximo uso.
+        Debe llamarse después de ejecutar DDL desde este proceso.
+        """
+        with self._lock:
+            if table is None:
+                self._tables = {}
+            else:
+                self._tables.pop(table, None)
+            self._validated_at = None
+
+    def _ensure_fresh(self):
+        if self._validated_at is None or time.monotonic() - self._validated_at > self.ttl:
+            self.refresh()
+
+    def _entry(self, table: str) -> dict:
+        self._ensure_fresh()
+        entry = self._tables.get(table)
+        if entry is None:
+            # Puede haberse creado después de la última validación
+            self.refresh()
+            entry = self._tables.get(table)
+        if entry is None:
+            raise KeyError(f"La tabla `{table}` no existe en {DatabaseConfig.DATABASE}")
+        return entry
+
+    # --- Persistencia ---
+
+    def _cache_key(self) -> dict:
+        params = DatabaseConfig.get_connection_params()
+        return {'version': CACHE_VERSION, 'host': params['host'], 'port': params['port'],
+                'database': params['database']}
+
+    def _load_cache(self):
+        """Carga el catálogo guardado; se revalida igual en el primer uso."""
+        if not self.cache_path or not os.path.exists(self.cache_path):
+            return
+        try:
+            with open(self.cache_path) as f:
+                data = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Advertencia: se ignora el catálogo de esquema {self.cache_path}: {e}")
+            return
+        if data.get('key') == self._cache_key():
+            self._tables = data.get('tables', {})
+
+    def _save_cache(self):
+        if not self.cache_path:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.cache_path) or ".", exist_ok=True)
+            with open(f"{self.cache_path}.tmp", 'w') as f:
+                json.dump({'key': self._cache_key(), 'tables': self._tables}, f, default=str)
+            os.replace(f"{self.cache_path}.tmp", self.cache_path)
+        except OSError as e:
+            print(f"Advertencia: no se pudo guardar el catálogo de esquema: {e}")
+
+
+_schema = None
+_schema_lock = threading.Lock()
+
+
+def get_schema() -> SchemaCatalog:
+    """
+    Retorna el catálogo de esquema compartido, creándolo en el primer uso.
+
+    Returns:
+        SchemaCatalog: Catálogo configurado con `DatabaseConfig`
+    """
+    global _schema
+    if _schema is None:
+        with _schema_lock:
+            if _schema is None:
+                _schema = SchemaCatalog(DatabaseConfig.SCHEMA_CACHE_PATH)
+    return _schema
+
+
+def invalidate_schema(table: Optional[str] = None):
+    """Invalida el catálogo compartido (si existe) después de ejecutar DDL."""
+    if _schema is not None:
+        _schema.invalidate(table)
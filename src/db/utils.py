@@ -1,172 +1,323 @@
-import subprocess
+import time
+from src.db import metrics
 from src.db.config import DatabaseConfig
-from typing import Optional, List
+from src.db.encoder import row_encoder
+from src.db.pool import get_pool
+from src.db.schema import get_schema
+from typing import Optional, List, Any, Iterator
 
-def get_table_list():
+# Margen de cada INSERT multi-fila para el prefijo, separadores y la cabecera del paquete,
+# y tamaño mínimo aceptado (un límite menor dejaría una fila por sentencia sin avisar)
+STATEMENT_OVERHEAD_BYTES = 1024
+MIN_STATEMENT_BYTES = 4096
+
+def get_mysql_command(additional_args: Optional[List[str]] = None) -> List[str]:
     """
-    Obtiene la lista de tablas en la base de datos.
-    
+    Construye la línea de comandos del cliente `mysql` para la base configurada.
+    Se usa para reproducir archivos de backup a través del cliente.
+
+    Args:
+        additional_args (list): Argumentos adicionales para mysql
+
     Returns:
-        list: Lista de nombres de tablas
+        list: Comando listo para subprocess
     """
     db_params = DatabaseConfig.get_connection_params()
     command = [
         "mysql",
         f"--host={db_params['host']}",
+        f"--port={db_params['port']}",
         f"--user={db_params['user']}",
         f"--password={db_params['password']}",
-        db_params['database'],
-        "-N",  # No mostrar headers
-        "-e",  # Ejecutar comando
-        "SHOW TABLES;"
     ]
-    
-    result = subprocess.run(command, capture_output=True, text=True, check=True)
-    return result.stdout.strip().split('\n')
+    if additional_args:
+        command.extend(additional_args)
+    command.append(db_params['database'])
+    return command
+
+def execute_query(query: str, params: Optional[tuple] = None, fetch: bool = True) -> Optional[List[tuple]]:
+    """
+    Ejecuta una consulta SQL usando una conexión del pool.
+
+    Args:
+        query (str): Consulta SQL a ejecutar
+        params (tuple): Parámetros para la consulta (placeholders %s)
+        fetch (bool): Si es True, retorna las filas del resultado
+
+    Returns:
+        list: Filas del resultado como tuplas si fetch es True (vacía si no hay resultado)
+        None: Si fetch es False
+
+    Raises:
+        mysql.connector.Error: Si hay un error ejecutando la consulta
+    """
+    with get_pool().connection() as conn:
+        cursor = conn.cursor()
+        try:
+            cursor.execute(query, params)
+            rows = cursor.fetchall() if cursor.with_rows else []
+        finally:
+            cursor.close()
+    return rows if fetch else None
+
+def fetch_one(query: str, params: Optional[tuple] = None) -> Optional[tuple]:
+    """
+    Ejecuta una consulta y retorna solo la primera fila.
+
+    Args:
+        query (str): Consulta SQL a ejecutar
+        params (tuple): Parámetros para la consulta
+
+    Returns:
+        tuple: Primera fila del resultado, o None si no hay filas
+    """
+    rows = execute_query(query, params)
+    return rows[0] if rows else None
+
+def get_table_list():
+    """
+    Obtiene la lista de tablas en la base de datos desde el catálogo de esquema.
+
+    Returns:
+        list: Lista de nombres de tablas
+    """
+    return get_schema().tables()
 
 def get_table_structure(table_name):
     """
     Obtiene la estructura CREATE TABLE de una tabla.
-    
+
     Args:
         table_name (str): Nombre de la tabla
-        
+
     Returns:
         str: Comando CREATE TABLE
     """
-    db_params = DatabaseConfig.get_connection_params()
-    command = [
-        "mysql",
-        f"--host={db_params['host']}",
-        f"--user={db_params['user']}",
-        f"--password={db_params['password']}",
-        db_params['database'],
-        "-N",
-        "-e",
-        f"SHOW CREATE TABLE {table_name};"
-    ]
-    
-    result = subprocess.run(command, capture_output=True, text=True, check=True)
-    return result.stdout.split('\t')[1]
+    return get_schema().create_statement(table_name)
 
-def get_table_data(table_name):
+def get_primary_key(table_name: str) -> List[str]:
     """
-    Obtiene los datos de una tabla en formato INSERT.
-    
+    Obtiene las columnas de la clave primaria de una tabla, en orden.
+
     Args:
         table_name (str): Nombre de la tabla
-        
+
     Returns:
-        str: Comandos INSERT
+        list: Nombres de las columnas de la clave primaria (vacía si no tiene)
     """
-    db_params = DatabaseConfig.get_connection_params()
-    command = [
-        "mysql",
-        f"--host={db_params['host']}",
-        f"--user={db_params['user']}",
-        f"--password={db_params['password']}",
-        db_params['database'],
-        "-e",
-        f"SELECT * FROM {table_name};"
-    ]
-    
-    result = subprocess.run(command, capture_output=True, text=True, check=True)
-    rows = result.stdout.strip().split('\n')[1:]  # Ignorar header
-    
-    if not rows:
-        return ""
-        
-    # Convertir datos a INSERT statements
-    inserts = []
-    for row in rows:
-        values = [f"'{val}'" if val else "NULL" for val in row.split('\t')]
-        inserts.append(f"INSERT INTO `{table_name}` VALUES ({','.join(values)});")
-    
-    return '\n'.join(inserts)
+    return get_schema().primary_key(table_name)
+
+def iter_table_rows(table_name: str, chunk_size: Optional[int] = None, conn=None,
+                    start: Any = None, end: Any = None, throttle=None) -> Iterator[List[tuple]]:
+    """
+    Recorre los datos de una tabla en bloques sin cargarla completa en memoria.
+
+    Si la tabla tiene clave primaria se pagina por rangos de la clave
+    (`WHERE pk > ultimo ORDER BY pk LIMIT n`), de modo que cada consulta es
+    acotada y usa el índice. Sin clave primaria se lee con un cursor sin buffer.
+
+    Args:
+        table_name (str): Nombre de la tabla
+        chunk_size (int): Filas por bloque (por defecto DatabaseConfig.DUMP_CHUNK_SIZE)
+        conn (MySQLConnection): Conexión a usar; si es None se toma una del pool
+        start: Límite inferior inclusivo de la clave primaria (solo claves de una columna)
+        end: Límite superior exclusivo de la clave primaria (solo claves de una columna)
+        throttle (Throttle): Limitador del volcado (src/backup/throttle.py); ajusta el tamaño
+            de cada bloque y espera entre consultas
+
+    Yields:
+        list: Bloque de filas como tuplas
+    """
+    if conn is None:
+        with get_pool().connection() as pooled:
+            yield from iter_table_rows(table_name, chunk_size, pooled, start, end, throttle)
+        return
+
+    chunk_size = chunk_size or DatabaseConfig.DUMP_CHUNK_SIZE
+    pk_columns = get_primary_key(table_name)
+
+    if not pk_columns:
+        # Sin clave no se limita: pausar un cursor sin buffer arriesga net_write_timeout
+        cursor = conn.cursor()
+        try:
+            started = time.perf_counter()
+            cursor.execute(f"SELECT * FROM `{table_name}`")
+            while True:
+                rows = cursor.fetchmany(chunk_size)
+                metrics.observe('fetch', time.perf_counter() - started, table_name, len(rows))
+                if not rows:
+                    break
+                yield rows
+                started = time.perf_counter()
+        finally:
+            cursor.close()
+        return
+
+    pk_list = ", ".join(f"`{col}`" for col in pk_columns)
+    placeholders = ", ".join(["%s"] * len(pk_columns))
+
+    # Límites del rango (usados al repartir una tabla grande entre varios workers)
+    bounds = []
+    bound_params = []
+    if start is not None:
+        bounds.append(f"`{pk_columns[0]}` >= %s")
+        bound_params.append(start)
+    if end is not None:
+        bounds.append(f"`{pk_columns[0]}` < %s")
+        bound_params.append(end)
+
+    first_where = f"WHERE {' AND '.join(bounds)} " if bounds else ""
+    next_where = "WHERE " + " AND ".join(bounds + [f"({pk_list}) > ({placeholders})"]) + " "
+    first_query = f"SELECT * FROM `{table_name}` {first_where}ORDER BY {pk_list} LIMIT %s"
+    next_query = f"SELECT * FROM `{table_name}` {next_where}ORDER BY {pk_list} LIMIT %s"
+
+    cursor = conn.cursor()
+    try:
+        limit = throttle.chunk_size(chunk_size) if throttle else chunk_size
+        started = time.perf_counter()
+        cursor.execute(first_query, tuple(bound_params) + (limit,))
+        pk_indexes = [cursor.column_names.index(col) for col in pk_columns]
+        while True:
+            rows = cursor.fetchall()
+            metrics.observe('fetch', time.perf_counter() - started, table_name, len(rows))
+            if not rows:
+                break
+            yield rows
+            if len(rows) < limit:
+                break
+            last = rows[-1]
+            if throttle:
+                throttle.wait(rows=len(rows))
+                limit = throttle.chunk_size(chunk_size)
+            started = time.perf_counter()
+            cursor.execute(next_query, tuple(bound_params) + tuple(last[i] for i in pk_indexes) + (limit,))
+    finally:
+        cursor.close()
+
+def get_max_allowed_packet() -> int:
+    """
+    Obtiene el tamaño máximo de paquete aceptado por el servidor.
+
+    Returns:
+        int: Valor de @@max_allowed_packet en bytes
+    """
+    return int(fetch_one("SELECT @@max_allowed_packet")[0])
+
+def check_statement_bytes(max_statement_bytes: int):
+    """
+    Rechaza un tamaño máximo de sentencia que no deja lugar para agrupar filas.
+
+    Raises:
+        ValueError: Si es menor que MIN_STATEMENT_BYTES
+    """
+    if max_statement_bytes < MIN_STATEMENT_BYTES:
+        raise ValueError(f"El tamaño máximo de sentencia ({max_statement_bytes} bytes) debe ser de al menos "
+                         f"{MIN_STATEMENT_BYTES} bytes")
+
+def get_table_data(table_name, chunk_size: Optional[int] = None, conn=None,
+                   start: Any = None, end: Any = None,
+                   max_statement_bytes: Optional[int] = None, extended_insert: bool = True,
+                   throttle=None):
+    """
+    Genera los datos de una tabla en formato INSERT, un bloque a la vez.
+
+    Con `extended_insert` se agrupan varias filas por sentencia
+    (`INSERT INTO t VALUES (...),(...);`, una fila por línea) sin superar
+    `max_statement_bytes`, que reduce el parseo y los viajes de red al restaurar.
+    Las filas pendientes se arrastran entre bloques, así que el tamaño de la
+    sentencia no depende de `chunk_size`.
+
+    Args:
+        table_name (str): Nombre de la tabla
+        chunk_size (int): Filas leídas por consulta
+        conn (MySQLConnection): Conexión a usar; si es None se toma una del pool
+        start: Límite inferior inclusivo de la clave primaria
+        end: Límite superior exclusivo de la clave primaria
+        max_statement_bytes (int): Tamaño máximo de cada sentencia, al menos MIN_STATEMENT_BYTES
+            (por defecto DatabaseConfig.DUMP_MAX_STATEMENT_BYTES o @@max_allowed_packet del servidor)
+        extended_insert (bool): Si es False, genera una sentencia INSERT por fila
+        throttle (Throttle): Limitador del volcado, aplicado a cada consulta de filas
+
+    Yields:
+        str: Comandos INSERT de un bloque de filas, separados por salto de línea
+
+    Raises:
+        ValueError: Si `max_statement_bytes` es menor que MIN_STATEMENT_BYTES
+    """
+    prefix = f"INSERT INTO `{table_name}` VALUES"
+    encoder = row_encoder(table_name)
+
+    if not extended_insert:
+        for rows in iter_table_rows(table_name, chunk_size, conn, start, end, throttle):
+            started = time.perf_counter()
+            block = '\n'.join(f"{prefix} {values};" for values in encoder.encode(rows))
+            metrics.observe('encode', time.perf_counter() - started, table_name, len(rows), len(block))
+            yield block
+        return
+
+    max_bytes = max_statement_bytes or DatabaseConfig.DUMP_MAX_STATEMENT_BYTES or get_max_allowed_packet()
+    check_statement_bytes(max_bytes)
+    # Margen para el prefijo, separadores y la cabecera del paquete
+    max_bytes -= len(prefix) + STATEMENT_OVERHEAD_BYTES
+
+    pending = []
+    pending_bytes = 0
+    for rows in iter_table_rows(table_name, chunk_size, conn, start, end, throttle):
+        started = time.perf_counter()
+        statements = []
+        for values in encoder.encode(rows):
+            size = (len(values) if values.isascii() else len(values.encode('utf-8'))) + 2
+            if pending and pending_bytes + size > max_bytes:
+                statements.append(f"{prefix}\n" + ',\n'.join(pending) + ';')
+                pending = []
+                pending_bytes = 0
+            pending.append(values)
+            pending_bytes += size
+        block = '\n'.join(statements)
+        metrics.observe('encode', time.perf_counter() - started, table_name, len(rows), len(block))
+        if statements:
+            yield block
+
+    if pending:
+        yield f"{prefix}\n" + ',\n'.join(pending) + ';'
 
 def show_table_data(table_name):
     """
     Muestra los datos actuales de una tabla.
-    
+
     Args:
         table_name (str): Nombre de la tabla
-        
+
     Returns:
         bool: True si se mostraron los datos correctamente, False en caso de error
     """
     try:
-        db_params = DatabaseConfig.get_connection_params()
-        command = [
-            "mysql",
-            f"--host={db_params['host']}",
-            f"--user={db_params['user']}",
-            f"--password={db_params['password']}",
-            db_params['database'],
-            "-e",
-            f"SELECT * FROM {table_name};"
-        ]
-        
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        with get_pool().connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f"SELECT * FROM `{table_name}`")
+            columns = list(cursor.column_names)
+            data = [["NULL" if val is None else str(val) for val in row] for row in cursor.fetchall()]
+            cursor.close()
+
         print(f"\nEstado actual de la tabla {table_name}:")
-        
+
         # Formatear la salida para que sea más legible
-        lines = result.stdout.strip().split('\n')
-        if len(lines) > 1:
-            columns = lines[0].split('\t')
-            data = [line.split('\t') for line in lines[1:]]
-            widths = [max(len(str(row[i])) for row in [columns] + data) for i in range(len(columns))]
-            
+        if data:
+            widths = [max(len(row[i]) for row in [columns] + data) for i in range(len(columns))]
+
             # Imprimir el encabezado
             header = "  ".join(f"{col:<{width}}" for col, width in zip(columns, widths))
             print(header)
             print("-" * len(header))
-            
+
             # Imprimir los datos
             for row in data:
-                print("  ".join(f"{str(val):<{width}}" for val, width in zip(row, widths)))
+                print("  ".join(f"{val:<{width}}" for val, width in zip(row, widths)))
         else:
             print("La tabla está vacía")
         print("\n")
         return True
-        
+
     except Exception as e:
         print(f"Error al mostrar los datos de la tabla {table_name}: {e}")
         return False
-
-def execute_query(query: str, capture_output: bool = True, additional_args: Optional[List[str]] = None) -> Optional[str]:
-    """
-    Ejecuta una consulta SQL en la base de datos.
-    
-    Args:
-        query (str): Consulta SQL a ejecutar
-        capture_output (bool): Si es True, captura y retorna la salida
-        additional_args (list): Lista de argumentos adicionales para mysql
-        
-    Returns:
-        str: Resultado de la consulta si capture_output es True
-        None: Si capture_output es False
-    
-    Raises:
-        subprocess.CalledProcessError: Si hay un error ejecutando la consulta
-        Exception: Para otros errores inesperados
-    """
-    db_params = DatabaseConfig.get_connection_params()
-    command = [
-        "mysql",
-        f"--host={db_params['host']}",
-        f"--user={db_params['user']}",
-        f"--password={db_params['password']}",
-        db_params['database']
-    ]
-    
-    if additional_args:
-        command.extend(additional_args)
-        
-    command.extend(["-e", query])
-    
-    if capture_output:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return result.stdout if result.stdout else ""
-    else:
-        subprocess.run(command, check=True)
-        return None 
\ No newline at end of file
@@ -0,0 +1,252 @@
+"""
+Pruebas del backup continuo del binary log (src.backup.streaming).
+
+Los binlogs se generan en un directorio temporal con eventos sintéticos
+(FORMAT_DESCRIPTION, GTID anónimo, BEGIN, sentencia, XID) con su CRC32, de modo
+que el lector, el escritor de segmentos y el servicio se prueban sin servidor.
+
+Uso:
+    python3 -m pytest -q tests
+"""
+import asyncio
+import os
+import struct
+import zlib
+
+import pytest
+
+from src.backup.binlog import (
+    ANONYMOUS_GTID_EVENT, BINLOG_MAGIC, CHECKSUM_ALG_CRC32, FORMAT_DESCRIPTION_EVENT, HEADER,
+    HEADER_SIZE, QUERY_EVENT, XID_EVENT, BinlogReader,
+)
+from src.backup.catalog import BackupCatalog
+from src.backup.compression import BackupWriter
+from src.backup.streaming import PART_SUFFIX, SegmentWriter, StreamingBackup, recover_segments
+from src.db.config import DatabaseConfig
+
+BINLOG_NAME = "mysql-bin.000001"
+TIMESTAMP = 1700000000
+
+
+def _event(type_code: int, body: bytes, position: int) -> bytes:
+    """Evento con cabecera v4 y CRC32 que comienza en `position`."""
+    size = HEADER_SIZE + len(body) + 4
+    raw = HEADER.pack(TIMESTAMP, type_code, 1, size, position + size, 0) + body
+    return raw + struct.pack('<I', zlib.crc32(raw))
+
+
+def _query(position: int, query: str, db: str = "test") -> bytes:
+    body = struct.pack('<IIBHH', 1, 0, len(db), 0, 0) + db.encode() + b"\0" + query.encode()
+    return _event(QUERY_EVENT, body, position)
+
+
+class FakeBinlog:
+    """
+    Archivo binlog sintético al que se agregan transacciones como lo haría el servidor.
+
+    Cada transacción es GTID anónimo, BEGIN, la sentencia y XID; `commits` guarda
+    la posición final (la del evento siguiente al XID) de cada transacción completa.
+    """
+
+    def __init__(self, directory: str):
+        self.path = os.path.join(directory, BINLOG_NAME)
+        body = (struct.pack('<H', 4) + b"8.0.36".ljust(50, b"\0") + struct.pack('<IB', TIMESTAMP, HEADER_SIZE)
+                + bytes(40) + bytes([CHECKSUM_ALG_CRC32]))
+        self.position = 4
+        self.commits = []
+        with open(self.path, 'wb') as f:
+            f.write(BINLOG_MAGIC)
+        self._append([_event(FORMAT_DESCRIPTION_EVENT, body, 4)])
+        self.start = self.position
+
+    def _append(self, raws):
+        with open(self.path, 'ab') as f:
+            for raw in raws:
+                f.write(raw)
+                self.position += len(raw)
+
+    def _raw(self, kind, value):
+        if kind == 'gtid':
+            return _event(ANONYMOUS_GTID_EVENT, bytes(42), self.position)
+        if kind == 'query':
+            return _query(self.position, value)
+        return _event(XID_EVENT, struct.pack('<Q', value), self.position)
+
+    def begin(self, statement: str):
+        """Escribe el comienzo de una transacción sin su XID."""
+        for kind, value in (('gtid', None), ('query', "BEGIN"), ('query', statement)):
+            self._append([self._raw(kind, value)])
+
+    def commit(self):
+        self._append([self._raw('xid', len(self.commits) + 1)])
+        self.commits.append(self.position)
+
+    def transaction(self, statement: str):
+        self.begin(statement)
+        self.commit()
+
+
+@pytest.fixture
+def env(tmp_path, monkeypatch):
+    """Directorios temporales, configuración del servicio y un backup completo de partida."""
+    backup_dir = tmp_path / "backups"
+    binlog_dir = tmp_path / "binlog"
+    backup_dir.mkdir()
+    binlog_dir.mkdir()
+    overrides = {
+        'BACKUP_DIR': str(backup_dir),
+        'CATALOG_PATH': str(backup_dir / "catalog.db"),
+        'BINLOG_DIR': str(binlog_dir),
+        'BINLOG_INDEX_DIR': str(backup_dir / "binlog_index"),
+        'BACKUP_CODEC': "none",
+        'BACKUP_ENCRYPTION': False,
+        'STREAM_POLL_INTERVAL': 0.01,
+        'STREAM_SEGMENT_BYTES': 64 * 1024 * 1024,
+        'STREAM_SEGMENT_SECONDS': 3600,
+    }
+    for name, value in overrides.items():
+        monkeypatch.setattr(DatabaseConfig, name, value)
+
+    binlog = FakeBinlog(str(binlog_dir))
+    catalog = BackupCatalog()
+    full_path = str(backup_dir / "backup_completo_test.sql")
+    full_id = catalog.start_backup('full', full_path, codec="none")
+    writer = BackupWriter(full_path, "none")
+    writer.write("-- backup completo\n")
+    writer.close()
+    full = catalog.finish_backup(full_id, f"{BINLOG_NAME}:{binlog.start}", writer)
+    return catalog, binlog, full
+
+
+def _events(binlog: FakeBinlog, start: int):
+    return list(BinlogReader(os.path.dirname(binlog.path)).file_events(BINLOG_NAME, start))
+
+
+def _content(record: dict) -> str:
+    with open(record['path'], 'r') as f:
+        return f.read()
+
+
+def _serve(service: StreamingBackup, seconds: float):
+    """Ejecuta el servicio y lo detiene (parada limpia) tras `seconds`."""
+    async def run():
+        asyncio.get_running_loop().call_later(seconds, service.stop.set)
+        await service.run()
+    asyncio.run(run())
+
+
+def test_segments_sealed_only_at_transaction_boundaries(env, monkeypatch):
+    catalog, binlog, full = env
+    for n in range(3):
+        binlog.transaction(f"INSERT INTO t VALUES ({n})")
+    events = _events(binlog, binlog.start)
+
+    # Por debajo del tamaño máximo nunca se sella, aunque se escriban transacciones completas
+    segments = SegmentWriter(catalog, full)
+    segments.write(events)
+    assert segments.sealed == 0 and segments.size > 0
+    segments.abort("prueba")
+
+    # Con un tamaño mínimo se sella tras cada COMMIT, nunca a mitad de una transacción
+    monkeypatch.setattr(DatabaseConfig, 'STREAM_SEGMENT_BYTES', 1)
+    segments = SegmentWriter(catalog, full)
+    sealed = []
+    for i in range(0, len(events), 2):
+        record = segments.write(events[i:i + 2])
+        if record:
+            sealed.append(record)
+        elif segments.size == 0:
+            # Lote que deja una transacción a medias: no se abre ni se sella nada
+            assert segments.seal() is None
+
+    assert [r['end_pos'] for r in sealed] == binlog.commits
+    previous = full
+    for n, record in enumerate(sealed):
+        assert record['parent_id'] == previous['id']
+        assert (record['start_file'], record['start_pos']) == (previous['end_file'], previous['end_pos'])
+        assert not os.path.exists(record['path'] + PART_SUFFIX)
+        content = _content(record)
+        assert content.count("INSERT INTO t") == 1 and f"VALUES ({n})" in content
+        previous = record
+
+
+def test_segment_sealed_on_age(env, monkeypatch):
+    catalog, binlog, full = env
+    monkeypatch.setattr(DatabaseConfig, 'STREAM_SEGMENT_SECONDS', 0.05)
+    binlog.transaction("INSERT INTO t VALUES (1)")
+    binlog.begin("INSERT INTO t VALUES (2)")
+    service = StreamingBackup(catalog=catalog)
+    segments = SegmentWriter(catalog, full)
+
+    async def run():
+        queue = asyncio.Queue()
+        consumer = asyncio.create_task(service._consume(segments, queue))
+        await queue.put(_events(binlog, binlog.start))
+        await asyncio.sleep(0.3)
+        sealed = segments.sealed
+        await queue.put(None)
+        await consumer
+        return sealed
+
+    # Sellado por antigüedad sin nuevos lotes; la transacción abierta queda fuera
+    assert asyncio.run(run()) == 1
+    assert catalog.latest()['end_pos'] == binlog.commits[0]
+    assert segments.sealed == 1
+
+
+def test_recover_segments_removes_part_files(env):
+    catalog, binlog, full = env
+    binlog.transaction("INSERT INTO t VALUES (1)")
+
+    # Caída con un segmento abierto: solo existe el .part y el registro sigue 'running'
+    segments = SegmentWriter(catalog, full)
+    segments.write(_events(binlog, binlog.start))
+    backup_id, path = segments._segment[:2]
+    segments._segment[2].close()
+    assert os.path.exists(path + PART_SUFFIX)
+
+    # Caída entre el renombrado y el registro en el catálogo
+    renamed = os.path.join(DatabaseConfig.BACKUP_DIR, "backup_stream_20240101_000000_000000.sql")
+    renamed_id = catalog.start_backup('incremental', renamed, full['id'], f"{BINLOG_NAME}:{binlog.start}", "none")
+    with open(renamed, 'w') as f:
+        f.write("-- segmento\n")
+    # Un backup en curso que no es un segmento no se toca
+    other_id = catalog.start_backup('full', os.path.join(DatabaseConfig.BACKUP_DIR, "backup_completo_x.sql"))
+
+    assert recover_segments(catalog) == 2
+    assert not os.path.exists(path + PART_SUFFIX) and not os.path.exists(path)
+    assert not os.path.exists(renamed)
+    assert catalog.get(backup_id)['status'] == 'failed'
+    assert catalog.get(renamed_id)['status'] == 'failed'
+    assert catalog.get(other_id)['status'] == 'running'
+
+    parent, start_file, start_pos = StreamingBackup(catalog=catalog).resume_position()
+    assert (parent['id'], start_file, start_pos) == (full['id'], BINLOG_NAME, binlog.start)
+
+
+def test_restart_resumes_at_last_sealed_segment(env):
+    catalog, binlog, full = env
+    binlog.transaction("INSERT INTO t VALUES (1)")
+    binlog.transaction("INSERT INTO t VALUES (2)")
+    binlog.begin("INSERT INTO t VALUES (3)")
+
+    # Parada limpia con una transacción a medias: se sella hasta el último COMMIT
+    _serve(StreamingBackup(catalog=catalog), 0.3)
+    first = catalog.latest()
+    assert first['type'] == 'incremental' and first['parent_id'] == full['id']
+    assert (first['end_file'], first['end_pos']) == (BINLOG_NAME, binlog.commits[1])
+    assert "VALUES (3)" not in _content(first)
+
+    binlog.commit()
+    binlog.transaction("INSERT INTO t VALUES (4)")
+    service = StreamingBackup(catalog=catalog)
+    assert service.resume_position() == (first, BINLOG_NAME, binlog.commits[1])
+    _serve(service, 0.3)
+
+    second = catalog.latest()
+    assert second['parent_id'] == first['id']
+    assert (second['start_file'], second['start_pos']) == (BINLOG_NAME, binlog.commits[1])
+    assert second['end_pos'] == binlog.commits[3] == binlog.position
+    content = _content(second)
+    assert "VALUES (3)" in content and "VALUES (4)" in content
+    assert "VALUES (1)" not in content and "VALUES (2)" not in content